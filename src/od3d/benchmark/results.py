@@ -49,6 +49,8 @@ class OD3D_Results(Dict[str, Union[torch.Tensor, List]]):
         ]
         self.device = device
         self.logging_dir = logging_dir
+        # tensors added per key since the last finalize, concatenated only once on access
+        self._chunks: Dict[str, List[torch.Tensor]] = {}
 
         if init_dict is not None:
             self.__add__(other=init_dict)
@@ -59,23 +61,87 @@ class OD3D_Results(Dict[str, Union[torch.Tensor, List]]):
             if isinstance(val, torch.Tensor):
                 if val.dim() == 0:
                     val = val[None,]
-                if key not in self.keys():
+                if key not in self:
                     self[key] = val.to(
                         device=self.device,
                     )  # torch.Tensor(size=val.shape, device=self.device, dtype=val.dtype)
                 else:
-                    self[key] = torch.cat(
-                        [self[key], val.to(device=self.device)],
-                        dim=0,
+                    self._chunks.setdefault(key, []).append(
+                        val.to(device=self.device),
                     )
             elif isinstance(val, List):
-                if key not in self.keys():
+                if key not in self:
                     self[key] = []
                 self[key] += val
             else:
                 self[key] = val
         return self
 
+    def finalize_key(self, key: str):
+        chunks = self._chunks.pop(key, None)
+        if chunks is not None:
+            dict.__setitem__(
+                self,
+                key,
+                torch.cat([dict.__getitem__(self, key)] + chunks, dim=0),
+            )
+
+    def finalize(self):
+        """Concatenates all pending tensor chunks into contiguous tensors."""
+        for key in list(self._chunks.keys()):
+            self.finalize_key(key)
+        return self
+
+    def __getitem__(self, key):
+        if key in self._chunks:
+            self.finalize_key(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, val):
+        # on unpickling, items are set before the attributes are restored
+        if "_chunks" in self.__dict__:
+            self._chunks.pop(key, None)
+        super().__setitem__(key, val)
+
+    def __delitem__(self, key):
+        self._chunks.pop(key, None)
+        super().__delitem__(key)
+
+    def get(self, key, default=None):
+        if key in self._chunks:
+            self.finalize_key(key)
+        return super().get(key, default)
+
+    def pop(self, key, *args):
+        if key in self._chunks:
+            self.finalize_key(key)
+        return super().pop(key, *args)
+
+    def __iter__(self):
+        # overriding __iter__ also makes dict(results) and {**results} read via __getitem__
+        self.finalize()
+        return super().__iter__()
+
+    def keys(self):
+        self.finalize()
+        return super().keys()
+
+    def items(self):
+        self.finalize()
+        return super().items()
+
+    def values(self):
+        self.finalize()
+        return super().values()
+
+    def copy(self):
+        self.finalize()
+        return super().copy()
+
+    def __getstate__(self):
+        self.finalize()
+        return self.__dict__
+
     def add_prefix(self, prefix: str):
         res = {}
         for key, val in self.items():
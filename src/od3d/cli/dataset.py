@@ -477,6 +477,25 @@ def extract_meta(
     OD3D_Dataset.subclasses[config.dataset.class_name].extract_meta(config.dataset)
 
 
+@app.command()
+def migrate_meta(
+    dataset: str = typer.Option("co3d", "-d", "--dataset"),
+    platform: str = typer.Option("local", "-p", "--platform"),
+    remove_yaml: bool = typer.Option(False, "-r", "--remove-yaml"),
+):
+    logging.basicConfig(level=logging.INFO)
+
+    config = od3d.io.load_hierarchical_config(
+        platform=platform,
+        overrides=["+datasets@dataset=" + dataset],
+    )
+
+    OD3D_Dataset.subclasses[config.dataset.class_name].migrate_meta(
+        config.dataset,
+        remove_yaml=remove_yaml,
+    )
+
+
 @app.command()
 def rsync(
     dataset: str = typer.Option("co3d_only_first", "-d", "--dataset"),
@@ -19,7 +19,13 @@ def pca(X, C=2, center=True, return_V=False):
     else:
         X_flat = X
 
-    _, _, pca_V = torch.pca_lowrank(X_flat, center=center, q=C)
+    # covariance accumulated over chunks of rows, to bound the memory of the float64 statistics
+    from od3d.cv.cluster.pca import IncrementalPCA
+
+    pca_stats = IncrementalPCA()
+    for X_chunk in X_flat.split(65536, dim=0):
+        pca_stats.partial_fit(X_chunk)
+    pca_V = pca_stats.get_components(C=C, center=center).to(dtype=X_flat.dtype)
 
     if return_V:
         return pca_V
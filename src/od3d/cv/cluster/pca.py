@@ -0,0 +1,129 @@
+import logging
+
+logger = logging.getLogger(__name__)
+from pathlib import Path
+from typing import Dict
+
+import torch
+
+
+class IncrementalPCA:
+    """
+    Principal Component Analysis (PCA) from streamed batches, in constant memory.
+    Count, mean and co-moment (FxF) are accumulated with the parallel update of Chan et al.,
+    the components are the eigenvectors of the resulting covariance.
+    """
+
+    def __init__(self, dtype=torch.float64):
+        self.dtype = dtype
+        self.count = 0
+        self.mean = None
+        self.comoment = None
+        self.components_prev = None
+
+    def partial_fit(self, X: torch.Tensor):
+        """
+        Args:
+            X (torch.Tensor): ...xF
+        """
+        X = X.detach().reshape(-1, X.shape[-1]).to(dtype=self.dtype)
+        N = X.shape[0]
+        if N == 0:
+            return self
+        X_mean = X.mean(dim=0)
+        X_centered = X - X_mean
+        X_comoment = X_centered.T @ X_centered
+        if self.count == 0:
+            self.mean = X_mean
+            self.comoment = X_comoment
+        else:
+            count = self.count + N
+            delta = X_mean - self.mean.to(X.device)
+            self.mean = self.mean.to(X.device) + delta * (N / count)
+            self.comoment = (
+                self.comoment.to(X.device)
+                + X_comoment
+                + torch.outer(delta, delta) * (self.count * N / count)
+            )
+        self.count += N
+        return self
+
+    def get_covariance(self, center=True):
+        covariance = self.comoment / max(self.count - 1, 1)
+        if not center:
+            covariance = covariance + torch.outer(self.mean, self.mean) * (
+                self.count / max(self.count - 1, 1)
+            )
+        return covariance
+
+    def get_components(self, C: int, center=True):
+        """
+        Returns:
+            V (torch.Tensor): FxC components, sorted by decreasing variance.
+        """
+        eigvals, eigvecs = torch.linalg.eigh(self.get_covariance(center=center))
+        return eigvecs.flip(dims=(-1,))[:, :C]
+
+    def get_explained_variance(self, C: int, center=True):
+        eigvals = torch.linalg.eigvalsh(self.get_covariance(center=center))
+        return eigvals.flip(dims=(-1,))[:C]
+
+    def get_components_change(self, C: int, center=True):
+        """
+        Returns:
+            change (float): distance of the subspace spanned by the C components to the one at the previous call,
+                in [0, 1], 1 at the first call.
+        """
+        components = self.get_components(C=C, center=center)
+        if (
+            self.components_prev is None
+            or self.components_prev.shape != components.shape
+        ):
+            change = 1.0
+        else:
+            overlap = (
+                self.components_prev.to(components.device).T @ components
+            ).norm() ** 2
+            change = max(1.0 - overlap.item() / C, 0.0)
+        self.components_prev = components
+        return change
+
+    def transform(self, X: torch.Tensor, C: int, center=True):
+        V = self.get_components(C=C, center=center).to(dtype=X.dtype, device=X.device)
+        if center:
+            X = X - self.mean.to(dtype=X.dtype, device=X.device)
+        return X @ V
+
+    def state_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean.cpu() if self.mean is not None else None,
+            "comoment": self.comoment.cpu() if self.comoment is not None else None,
+        }
+
+    def load_state_dict(self, state_dict: Dict):
+        self.count = state_dict["count"]
+        self.mean = state_dict["mean"]
+        self.comoment = state_dict["comoment"]
+        if self.mean is not None:
+            self.dtype = self.mean.dtype
+        self.components_prev = None
+
+    def save(self, fpath: Path, **kwargs):
+        fpath = Path(fpath)
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        fpath_tmp = fpath.with_suffix(fpath.suffix + ".tmp")
+        torch.save({**self.state_dict(), **kwargs}, fpath_tmp)
+        fpath_tmp.replace(fpath)
+
+    @classmethod
+    def read(cls, fpath: Path):
+        """
+        Returns:
+            pca (IncrementalPCA): partial statistics.
+            state_dict (Dict): state including extra keys passed to save.
+        """
+        state_dict = torch.load(Path(fpath))
+        pca = cls()
+        pca.load_state_dict(state_dict)
+        return pca, state_dict
@@ -48,6 +48,104 @@ def voxel_downsampling(
     min_steps=1,
 ):
     """
+    Keeps for each occupied voxel the point closest to its center. Points are assigned to voxels
+    by integer cell keys, counts and representatives are segment reductions, i.e. linear in the points.
+
+    Args:
+        pts3d_cls (torch.Tensor): Nx3
+
+    Returns:
+        pts3d_cls (torch.Tensor): (<=K)x3
+    """
+    device = pts3d_cls.device
+    bounds_max, _ = pts3d_cls.max(dim=-2)
+    bounds_min, _ = pts3d_cls.min(dim=-2)
+    bounds = bounds_max - bounds_min
+    voxel_size = (bounds.prod(dim=-1) / K) ** (1 / 3)
+    steps = (bounds / voxel_size).int()
+    steps[steps < min_steps] = min_steps
+
+    # voxel centers are placed as torch.linspace(bounds_min, bounds_max, steps) per axis,
+    # the nearest center of a point is the nearest center per axis
+    steps_size = torch.where(
+        steps > 1,
+        bounds / (steps - 1).clamp(min=1),
+        torch.ones_like(bounds),
+    )
+    pts3d_cells = ((pts3d_cls - bounds_min) / steps_size).round().long()
+    pts3d_cells = torch.minimum(pts3d_cells.clamp(min=0), (steps - 1).long())
+
+    # flat keys in the layout of torch.meshgrid(x, y, z, indexing="xy"), i.e. (Y, X, Z)
+    steps = steps.tolist()
+    pts3d_voxel_ids = (pts3d_cells[:, 1] * steps[0] + pts3d_cells[:, 0]) * steps[
+        2
+    ] + pts3d_cells[:, 2]
+    voxels_count = steps[0] * steps[1] * steps[2]
+
+    voxel_counts = torch.bincount(pts3d_voxel_ids, minlength=voxels_count)
+    voxel_ids = voxel_counts.nonzero()[:, 0]
+    voxel_counts = voxel_counts[voxel_ids]
+    voxel_ids = voxel_ids[
+        voxel_counts.argsort(descending=True)[: int(len(voxel_ids) * top_bins_perc)]
+    ]
+
+    if return_voxel_grid:
+        occ_grid = torch.zeros(size=(steps[1], steps[0], steps[2])).to(
+            device=device,
+            dtype=torch.bool,
+        )
+        occ_grid.view(-1)[voxel_ids] = True
+        occ_grid_range = bounds
+        occ_grid_offset = bounds_min
+        return occ_grid, occ_grid_range, occ_grid_offset
+
+    # representative point per voxel: min distance to the center, ties resolved by the lowest point id
+    pts3d_dist = (pts3d_cls - (bounds_min + pts3d_cells * steps_size)).norm(dim=-1)
+    voxel_dist_min = torch.full(
+        (voxels_count,),
+        torch.inf,
+        device=device,
+        dtype=pts3d_dist.dtype,
+    ).scatter_reduce(0, pts3d_voxel_ids, pts3d_dist, reduce="amin")
+    pts3d_ids = torch.arange(pts3d_cls.shape[0], device=device)
+    pts3d_ids_closest = torch.where(
+        pts3d_dist <= voxel_dist_min[pts3d_voxel_ids],
+        pts3d_ids,
+        pts3d_cls.shape[0],
+    )
+    voxel_pts3d_id = torch.full(
+        (voxels_count,),
+        pts3d_cls.shape[0],
+        device=device,
+        dtype=torch.long,
+    ).scatter_reduce(0, pts3d_voxel_ids, pts3d_ids_closest, reduce="amin")
+    pts3d_ids = voxel_pts3d_id[voxel_ids]
+
+    pts3d_mask = torch.zeros(size=(pts3d_cls.shape[0],)).to(
+        dtype=torch.bool,
+        device=device,
+    )
+    pts3d_mask[pts3d_ids] = True
+
+    pts3d_cls = pts3d_cls[pts3d_mask]
+
+    if return_mask:
+        return pts3d_cls, pts3d_mask
+    else:
+        return pts3d_cls
+
+
+def voxel_downsampling_cdist(
+    pts3d_cls,
+    K,
+    top_bins_perc=1.0,
+    return_mask=False,
+    return_voxel_grid=False,
+    min_steps=1,
+):
+    """
+    Reference implementation of voxel_downsampling with a cdist between all voxel centers and points.
+
     Args:
         pts3d_cls (torch.Tensor): Nx3
 
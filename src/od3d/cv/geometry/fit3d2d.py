@@ -1,3 +1,6 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 import torch
@@ -175,6 +178,124 @@ def gpu_iterative(pts1, pxl2, weights, proj_mat):
     pass
 
 
+# persistent thread pool for opencv pnp, cv2 releases the GIL while solving, as (workers, pool)
+_pnp_pool = (None, None)
+
+
+def get_pnp_pool(workers: int = None):
+    global _pnp_pool
+    if workers is None:
+        workers = os.cpu_count()
+    pool_workers, pool = _pnp_pool
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown(wait=False)
+        pool = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="od3d_pnp",
+        )
+        _pnp_pool = (workers, pool)
+    return pool
+
+
+def solve_pnp_opencv(
+    pts1,
+    pxl2,
+    proj_mat_ext,
+    method,
+    prev_so3_mat=None,
+    prev_transl=None,
+):
+    """solves a single pnp problem with opencv
+    Paramters
+    ---------
+    pts1 np.ndarray: Nx3, float
+    pxl2 np.ndarray: Nx2, float
+    proj_mat_ext np.ndarray: 3x3, float
+    method str: describes which method should be used
+
+    Returns
+    -------
+    transf: 4x4, np.ndarray, identity if less than 4 points are given
+    """
+    transf = np.eye(4)
+    if len(pts1) < 4:
+        return transf
+
+    if prev_so3_mat is not None:
+        prev_so3_log, _ = cv2.Rodrigues(prev_so3_mat)
+        prev_transl = prev_transl[:, None]
+
+    if method == "cpu-iterative-continue":
+        retval, r, t = cv2.solvePnP(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            prev_so3_log,
+            prev_transl,
+            useExtrinsicGuess=True,
+            flags=cv2.SOLVEPNP_ITERATIVE,
+        )
+
+    elif method == "cpu-iterative":
+        retval, r, t = cv2.solvePnP(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            useExtrinsicGuess=False,
+            flags=cv2.SOLVEPNP_ITERATIVE,
+        )
+
+    elif method == "cpu-epnp":
+        retval, r, t = cv2.solvePnP(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            flags=cv2.SOLVEPNP_EPNP,
+        )
+
+    elif method == "cpu-ransac-iterative-continue":
+        retval, r, t, mask_inliers = cv2.solvePnPRansac(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            prev_so3_log,
+            prev_transl,
+            useExtrinsicGuess=True,
+            flags=cv2.SOLVEPNP_ITERATIVE,
+        )
+
+    elif method == "cpu-ransac-iterative":
+        retval, r, t, mask_inliers = cv2.solvePnPRansac(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            useExtrinsicGuess=False,
+            flags=cv2.SOLVEPNP_ITERATIVE,
+        )
+
+    elif method == "cpu-ransac-epnp":
+        retval, r, t, mask_inliers = cv2.solvePnPRansac(
+            pts1,
+            pxl2,
+            proj_mat_ext,
+            0,
+            flags=cv2.SOLVEPNP_EPNP,
+        )
+    else:
+        raise NotImplementedError(f"Unknown pnp method {method}.")
+
+    R, _ = cv2.Rodrigues(r)
+    transf[:3, :3] = R
+    transf[:3, 3] = t[:, 0]
+    return transf
+
+
 def fit_se3_to_corresp_3d_2d_opencv(
     pts1,
     pxl2,
@@ -182,8 +303,9 @@ def fit_se3_to_corresp_3d_2d_opencv(
     proj_mat,
     method,
     prev_se3_mats=None,
+    workers: int = None,
 ):
-    """calculates se3 fit
+    """calculates se3 fit, the K problems are copied to cpu at once and solved concurrently in a persistent thread pool
     Paramters
     ---------
     pts1 torch.Tensor: KxNxC1, float
@@ -191,6 +313,7 @@ def fit_se3_to_corresp_3d_2d_opencv(
     weights torch.Tensor: KxN, float
     proj_mat torch.Tensor: 2x3, float
     method str: describes which method should be used
+    workers int: number of threads, defaults to the number of cpus, 0 solves sequentially
 
     Returns
     -------
@@ -200,8 +323,6 @@ def fit_se3_to_corresp_3d_2d_opencv(
     dtype = pts1.dtype
     device = pts1.device
     K = len(pts1)
-    N_ver = 4
-    se3_mats = []  # torch.zeros(size=(K, 4, 4), dtype=dtype, device=device)
 
     proj_mat_ext = torch.cat(
         (proj_mat, torch.zeros(size=(1, 3), dtype=dtype, device=device)),
@@ -210,99 +331,37 @@ def fit_se3_to_corresp_3d_2d_opencv(
     proj_mat_ext[2, 2] = 1.0
     proj_mat_ext = proj_mat_ext.detach().cpu().numpy()
 
-    if prev_se3_mats is not None:
-        prev_se3_mats_np = prev_se3_mats[:, :3, :3].detach().cpu().numpy()
-        prev_transl_np = prev_se3_mats[:, :3, 3].detach().cpu().numpy()
-        prev_so3_log_np = np.zeros(shape=(K, 3, 1), dtype=prev_transl_np.dtype)
-        for k in range(K):
-            prev_so3_log_np[k], _ = cv2.Rodrigues(prev_se3_mats_np[k])
-
-    for k in range(K):
-        pts1_k = pts1[k].permute(1, 0)
-        pxl2_k = pxl2[k].permute(1, 0)
-        weights_k = weights[k] > 0.5
-
-        if weights_k.sum() < N_ver:
-            transf_pred = torch.eye(n=4, dtype=dtype, device=device)
-            se3_mats.append(transf_pred)
-            continue
-        # 3 x H*W
-
-        pts1_k = pts1_k[:, weights_k]
-        pxl2_k = pxl2_k[:, weights_k]
-
-        pts1_k = pts1_k.permute(1, 0).detach().cpu().numpy()
-        pxl2_k = pxl2_k.permute(1, 0).detach().cpu().numpy()
-
-        if method == "cpu-iterative-continue":
-            retval, r, t = cv2.solvePnP(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                prev_so3_log_np[k],
-                prev_transl_np[k][:, None],
-                useExtrinsicGuess=True,
-                flags=cv2.SOLVEPNP_ITERATIVE,
-            )
-
-        elif method == "cpu-iterative":
-            retval, r, t = cv2.solvePnP(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                useExtrinsicGuess=False,
-                flags=cv2.SOLVEPNP_ITERATIVE,
-            )
+    pts1_np = pts1.detach().cpu().numpy()
+    pxl2_np = pxl2.detach().cpu().numpy()
+    weights_np = (weights > 0.5).detach().cpu().numpy()
 
-        elif method == "cpu-epnp":
-            retval, r, t = cv2.solvePnP(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                flags=cv2.SOLVEPNP_EPNP,
-            )
-
-        elif method == "cpu-ransac-iterative-continue":
-            retval, r, t, mask_inliers = cv2.solvePnPRansac(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                prev_so3_log_np[k],
-                prev_transl_np[k][:, None],
-                useExtrinsicGuess=True,
-                flags=cv2.SOLVEPNP_ITERATIVE,
-            )
-
-        elif method == "cpu-ransac-iterative":
-            retval, r, t, mask_inliers = cv2.solvePnPRansac(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                useExtrinsicGuess=False,
-                flags=cv2.SOLVEPNP_ITERATIVE,
-            )
-
-        elif method == "cpu-ransac-epnp":
-            retval, r, t, mask_inliers = cv2.solvePnPRansac(
-                pts1_k,
-                pxl2_k,
-                proj_mat_ext,
-                0,
-                flags=cv2.SOLVEPNP_EPNP,
-            )
-
-        R, _ = cv2.Rodrigues(r)
-        transf_pred = torch.eye(4, dtype=dtype, device=device)
-        transf_pred[:3, :3] = torch.from_numpy(R).type(dtype).to(device)
-        transf_pred[:3, 3] = torch.from_numpy(t[:, 0]).type(dtype).to(device)
+    if prev_se3_mats is not None:
+        prev_se3_mats_np = prev_se3_mats.detach().cpu().numpy()
+        prevs_so3_mat = prev_se3_mats_np[:, :3, :3]
+        prevs_transl = prev_se3_mats_np[:, :3, 3]
+    else:
+        prevs_so3_mat = [None] * K
+        prevs_transl = [None] * K
+
+    jobs = [
+        (
+            pts1_np[k][weights_np[k]],
+            pxl2_np[k][weights_np[k]],
+            proj_mat_ext,
+            method,
+            prevs_so3_mat[k],
+            prevs_transl[k],
+        )
+        for k in range(K)
+    ]
+    if workers == 0 or K <= 1:
+        se3_mats = [solve_pnp_opencv(*job) for job in jobs]
+    else:
+        se3_mats = list(get_pnp_pool(workers).map(solve_pnp_opencv, *zip(*jobs)))
 
-        se3_mats.append(transf_pred)
-    se3_mats = torch.stack(se3_mats)
+    if K == 0:
+        return torch.zeros(size=(0, 4, 4), dtype=dtype, device=device)
+    se3_mats = torch.from_numpy(np.stack(se3_mats)).to(dtype=dtype, device=device)
     return se3_mats
 
 
@@ -1,5 +1,10 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 import copy
 import heapq
+import math
 
 import numpy as np
 import open3d
@@ -17,25 +22,223 @@ def simplify_mesh(
     isotropic=True,
     valence_aware=True,
 ):
-    mesh_astakape = AstakaPeMesh(
-        vs=np.asarray(mesh_o3d.vertices),
+    verts, faces = simplify_mesh_arrays(
+        verts=np.asarray(mesh_o3d.vertices),
         faces=np.asarray(mesh_o3d.triangles),
+        target_v=mesh_vertices_count,
+        isotropic=isotropic,
+        valence_aware=valence_aware,
+    )
+    vertices = open3d.utility.Vector3dVector(verts)
+    faces = open3d.utility.Vector3iVector(faces)
+    o3d_obj_mesh = open3d.geometry.TriangleMesh(vertices=vertices, triangles=faces)
+    return o3d_obj_mesh
+
+
+def get_verts_quadrics(verts: np.ndarray, faces: np.ndarray):
+    """
+    Args:
+        verts (np.ndarray): Vx3
+        faces (np.ndarray): Fx3
+    Returns:
+        quadrics (np.ndarray): Vx4x4, sum of the plane quadrics of all faces adjacent to each vertex.
+    """
+    faces_normals = np.cross(
+        verts[faces[:, 1]] - verts[faces[:, 0]],
+        verts[faces[:, 2]] - verts[faces[:, 0]],
+    )
+    faces_normals /= np.linalg.norm(faces_normals, axis=1, keepdims=True) + 1e-24
+    faces_center = verts[faces].mean(axis=1)
+    faces_planes = np.concatenate(
+        [faces_normals, -(faces_normals * faces_center).sum(axis=1, keepdims=True)],
+        axis=1,
     )
+    faces_quadrics = faces_planes[:, :, None] * faces_planes[:, None, :]
+    quadrics = np.zeros((len(verts), 4, 4))
+    np.add.at(quadrics, faces.reshape(-1), np.repeat(faces_quadrics, 3, axis=0))
+    return quadrics
+
 
+def get_valence_weights(valences: np.ndarray):
+    """Vectorized AstakaPeMesh.valence_weight."""
+    valence_penalty = np.abs(valences - OPTIM_VALENCE) * VALENCE_WEIGHT + 1.0
+    return np.where(valences == 3, valence_penalty * 100000, valence_penalty)
+
+
+def simplify_mesh_arrays(
+    verts: np.ndarray,
+    faces: np.ndarray,
+    target_v=500,
+    isotropic=True,
+    valence_aware=True,
+):
+    """
+    Collapses edges in order of their cost until target_v vertices remain, each collapse moves the
+    remaining vertex to the edge midpoint. Boundary edges and edges violating the link condition are not collapsed.
+    The cost is the edge length (isotropic) or the quadric error of the midpoint, optionally weighted by the
+    valence of the resulting vertex.
+    Outdated heap entries are skipped lazily, using a per vertex counter which is increased on each collapse.
+
+    Args:
+        verts (np.ndarray): Vx3
+        faces (np.ndarray): Fx3
+    Returns:
+        verts (np.ndarray): V'x3
+        faces (np.ndarray): F'x3
+    """
+    verts = np.array(verts, dtype=np.float64)
+    faces_arr = np.array(faces, dtype=np.int64).reshape(-1, 3)
+    verts_count = len(verts)
+    faces_count = len(faces_arr)
+
+    # vertex to faces adjacency, faces of collapsed edges are removed lazily
+    faces_flat = faces_arr.reshape(-1)
+    verts_faces_counts = np.bincount(faces_flat, minlength=verts_count)
+    verts_faces = np.split(
+        np.argsort(faces_flat, kind="stable") // 3,
+        np.cumsum(verts_faces_counts)[:-1],
+    )
+    verts_faces = [vf.tolist() for vf in verts_faces]
+    verts_faces_counts = verts_faces_counts.tolist()
+    faces = faces_arr.tolist()
+    faces_alive = [True] * faces_count
+    verts_alive = [True] * verts_count
+    verts_stamps = [0] * verts_count
+
+    quadrics = None
+    if not isotropic:
+        quadrics = get_verts_quadrics(verts=verts, faces=faces_arr)
+
+    # initial costs of all edges
+    edges = np.sort(
+        np.concatenate(
+            [faces_arr[:, [0, 1]], faces_arr[:, [1, 2]], faces_arr[:, [2, 0]]],
+            axis=0,
+        ),
+        axis=1,
+    )
+    edges, edges_faces_counts = np.unique(edges, axis=0, return_counts=True)
     if isotropic:
-        mesh_astakape = mesh_astakape.edge_based_simplification(
-            target_v=mesh_vertices_count,
-            valence_aware=valence_aware,
-        )
+        edges_cost = np.linalg.norm(verts[edges[:, 0]] - verts[edges[:, 1]], axis=1)
     else:
-        mesh_astakape = mesh_astakape.simplification(
-            target_v=mesh_vertices_count,
-            valence_aware=valence_aware,
+        edges_mid = np.concatenate(
+            [0.5 * (verts[edges[:, 0]] + verts[edges[:, 1]]), np.ones((len(edges), 1))],
+            axis=1,
         )
-    vertices = open3d.utility.Vector3dVector(mesh_astakape.vs)
-    faces = open3d.utility.Vector3iVector(mesh_astakape.faces)
-    o3d_obj_mesh = open3d.geometry.TriangleMesh(vertices=vertices, triangles=faces)
-    return o3d_obj_mesh
+        edges_quadrics = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+        edges_cost = np.einsum("ei,eij,ej->e", edges_mid, edges_quadrics, edges_mid)
+    if valence_aware:
+        faces_counts_arr = np.array(verts_faces_counts)
+        edges_cost = edges_cost * get_valence_weights(
+            faces_counts_arr[edges[:, 0]]
+            + faces_counts_arr[edges[:, 1]]
+            - 2 * edges_faces_counts,
+        )
+    heap = [
+        (cost, v0, v1, 0, 0)
+        for cost, (v0, v1) in zip(edges_cost.tolist(), edges.tolist())
+    ]
+    heapq.heapify(heap)
+    verts_list = verts.tolist()
+
+    def get_faces_alive(v):
+        vf = [f for f in verts_faces[v] if faces_alive[f]]
+        verts_faces[v] = vf
+        return vf
+
+    def get_neighbors(vf, v):
+        # neighbor vertex -> count of shared faces
+        neighbors = {}
+        for f in vf:
+            for u in faces[f]:
+                if u != v:
+                    neighbors[u] = neighbors.get(u, 0) + 1
+        return neighbors
+
+    def get_costs(v0, neighbors):
+        """Costs of collapsing v0 with each of its neighbors (neighbor vertex -> count of shared faces)."""
+        us = list(neighbors.keys())
+        if isotropic:
+            costs = [math.dist(verts_list[v0], verts_list[u]) for u in us]
+        else:
+            v4_mids = np.ones((len(us), 4))
+            v4_mids[:, :3] = 0.5 * (
+                np.array(verts_list[v0]) + np.array([verts_list[u] for u in us])
+            )
+            costs = np.einsum(
+                "ni,nij,nj->n",
+                v4_mids,
+                quadrics[v0] + quadrics[us],
+                v4_mids,
+            ).tolist()
+        if valence_aware:
+            costs = [
+                cost
+                * AstakaPeMesh.valence_weight(
+                    verts_faces_counts[v0] + verts_faces_counts[u] - 2 * neighbors[u],
+                )
+                for cost, u in zip(costs, us)
+            ]
+        return zip(costs, us)
+
+    verts_alive_count = verts_count
+    while verts_alive_count > target_v:
+        if len(heap) == 0:
+            logger.warning("edge cannot be collapsed anymore!")
+            break
+        _, v0, v1, stamp0, stamp1 = heapq.heappop(heap)
+        if (
+            not verts_alive[v0]
+            or not verts_alive[v1]
+            or verts_stamps[v0] != stamp0
+            or verts_stamps[v1] != stamp1
+        ):
+            continue
+
+        vf0 = get_faces_alive(v0)
+        vf1 = get_faces_alive(v1)
+        merged_faces = [f for f in vf0 if v1 in faces[f]]
+        neighbors0 = get_neighbors(vf0, v0)
+        neighbors1 = get_neighbors(vf1, v1)
+        shared_neighbors_count = sum(1 for u in neighbors0 if u in neighbors1)
+        if shared_neighbors_count != 2 or len(merged_faces) != 2:
+            # non-manifold or boundary
+            continue
+
+        for f in merged_faces:
+            faces_alive[f] = False
+            for u in faces[f]:
+                verts_faces_counts[u] -= 1
+        vf1 = [f for f in vf1 if faces_alive[f]]
+        for f in vf1:
+            face = faces[f]
+            face[face.index(v1)] = v0
+        verts_faces[v0] = [f for f in vf0 if faces_alive[f]] + vf1
+        verts_faces[v1] = []
+        verts_faces_counts[v0] = len(verts_faces[v0])
+        verts_faces_counts[v1] = 0
+        verts_alive[v1] = False
+        verts_alive_count -= 1
+
+        verts_list[v0] = [
+            0.5 * (c0 + c1) for c0, c1 in zip(verts_list[v0], verts_list[v1])
+        ]
+        if quadrics is not None:
+            quadrics[v0] += quadrics[v1]
+        verts_stamps[v0] += 1
+        verts_stamps[v1] += 1
+
+        neighbors0 = get_neighbors(verts_faces[v0], v0)
+        for cost, u in get_costs(v0, neighbors0):
+            heapq.heappush(heap, (cost, v0, u, verts_stamps[v0], verts_stamps[u]))
+
+    verts_alive = np.array(verts_alive, dtype=np.bool_)
+    verts_ids_new = np.cumsum(verts_alive) - 1
+    faces = np.array(faces, dtype=np.int64).reshape(-1, 3)[
+        np.array(faces_alive, dtype=np.bool_)
+    ]
+    verts = np.array(verts_list, dtype=np.float64).reshape(-1, 3)
+    return verts[verts_alive], verts_ids_new[faces]
 
 
 class AstakaPeMesh:
@@ -67,7 +67,7 @@ def batch_point_face_distance(
     return loss
 
 
-def batch_chamfer_distance(
+def batch_chamfer_distance_dense(
     pts1,
     pts2,
     pts1_mask=None,
@@ -76,6 +76,8 @@ def batch_chamfer_distance(
     only_pts2_nn=False,
 ):
     """
+    Chamfer distance from the full (B, N, M) distance matrix, see batch_chamfer_distance for a memory bounded variant.
+
     Args:
         pts1 (torch.Tensor): (B, N, 3)
         pts2 (torch.Tensor): (B, M, 3)
@@ -178,6 +180,241 @@ def batch_chamfer_distance(
     return chamfer_dist
 
 
+# default memory budget for the (chunks of) pairwise distances
+OD3D_DIST_MAX_MEMORY_MB = 1024.0
+
+
+def get_chunk_sizes(N: int, M: int, bytes_per_pair: int, max_memory_mb: float = None):
+    """Returns chunk sizes (n, m), such that n x m pairs fit into max_memory_mb."""
+    if max_memory_mb is None:
+        return max(N, 1), max(M, 1)
+    pairs_count = max(int(max_memory_mb * 1024**2 / bytes_per_pair), 1)
+    chunk_n = min(max(N, 1), max(pairs_count // max(M, 1), 1))
+    chunk_m = min(max(M, 1), max(pairs_count // chunk_n, 1))
+    return chunk_n, chunk_m
+
+
+@torch.no_grad()
+def batch_nearest_neighbors(
+    pts1,
+    pts2,
+    pts1_mask=None,
+    pts2_mask=None,
+    only_pts2_nn=False,
+    max_memory_mb=OD3D_DIST_MAX_MEMORY_MB,
+    use_kdtree=False,
+):
+    """
+    Nearest neighbors between two batched point clouds. The pairwise distances are streamed in chunks,
+    such that at most max_memory_mb are allocated at once. Masked points are never selected as neighbors.
+
+    Args:
+        pts1 (torch.Tensor): (B, N, 3)
+        pts2 (torch.Tensor): (B, M, 3)
+        pts1_mask (torch.Tensor): (B, N)
+        pts2_mask (torch.Tensor): (B, M)
+        only_pts2_nn (bool): if True, the nearest neighbors of pts1 are not computed.
+        max_memory_mb (float): memory budget for a chunk of pairwise distances, None computes all at once.
+        use_kdtree (bool): if True, queries a scipy kd-tree per batch element instead (cpu).
+    Returns:
+        pts2_nn_pts1_id (torch.LongTensor): (B, M), id of nearest pts1 for each pts2
+        pts1_nn_pts2_id (torch.LongTensor): (B, N), id of nearest pts2 for each pts1, None if only_pts2_nn
+    """
+    device = pts1.device
+    B, N = pts1.shape[:2]
+    M = pts2.shape[1]
+
+    if pts1_mask is None:
+        pts1_mask = torch.ones_like(pts1[..., 0], dtype=torch.bool)
+    if pts2_mask is None:
+        pts2_mask = torch.ones_like(pts2[..., 0], dtype=torch.bool)
+    pts1_mask = pts1_mask.bool()
+    pts2_mask = pts2_mask.bool()
+
+    if use_kdtree:
+        return _batch_nearest_neighbors_kdtree(
+            pts1=pts1,
+            pts2=pts2,
+            pts1_mask=pts1_mask,
+            pts2_mask=pts2_mask,
+            only_pts2_nn=only_pts2_nn,
+        )
+
+    pts2_nn_dist = torch.full((B, M), torch.inf, device=device, dtype=pts1.dtype)
+    pts2_nn_pts1_id = torch.zeros((B, M), device=device, dtype=torch.long)
+    if not only_pts2_nn:
+        pts1_nn_dist = torch.full((B, N), torch.inf, device=device, dtype=pts1.dtype)
+        pts1_nn_pts2_id = torch.zeros((B, N), device=device, dtype=torch.long)
+    else:
+        pts1_nn_pts2_id = None
+
+    # distances, pair mask and their min reductions
+    bytes_per_pair = B * (2 * pts1.element_size() + 1)
+    chunk_n, chunk_m = get_chunk_sizes(
+        N=N,
+        M=M,
+        bytes_per_pair=bytes_per_pair,
+        max_memory_mb=max_memory_mb,
+    )
+    for n0 in range(0, N, chunk_n):
+        n1 = min(n0 + chunk_n, N)
+        for m0 in range(0, M, chunk_m):
+            m1 = min(m0 + chunk_m, M)
+            dist = torch.cdist(pts1[:, n0:n1], pts2[:, m0:m1])
+            dist.masked_fill_(
+                ~(pts1_mask[:, n0:n1, None] & pts2_mask[:, None, m0:m1]),
+                torch.inf,
+            )
+
+            # strictly smaller, to keep the first minimum as argmin does
+            dist_min, dist_argmin = dist.min(dim=-2)
+            update = dist_min < pts2_nn_dist[:, m0:m1]
+            pts2_nn_dist[:, m0:m1][update] = dist_min[update]
+            pts2_nn_pts1_id[:, m0:m1][update] = dist_argmin[update] + n0
+
+            if not only_pts2_nn:
+                dist_min, dist_argmin = dist.min(dim=-1)
+                update = dist_min < pts1_nn_dist[:, n0:n1]
+                pts1_nn_dist[:, n0:n1][update] = dist_min[update]
+                pts1_nn_pts2_id[:, n0:n1][update] = dist_argmin[update] + m0
+
+    return pts2_nn_pts1_id, pts1_nn_pts2_id
+
+
+def _batch_nearest_neighbors_kdtree(
+    pts1,
+    pts2,
+    pts1_mask,
+    pts2_mask,
+    only_pts2_nn=False,
+):
+    from scipy.spatial import cKDTree
+
+    device = pts1.device
+    B, N = pts1.shape[:2]
+    M = pts2.shape[1]
+
+    def query(pts_ref, pts_ref_mask, pts_query, pts_query_mask):
+        nn_ids = torch.zeros(pts_query_mask.shape, dtype=torch.long)
+        for b in range(B):
+            ref_ids = pts_ref_mask[b].nonzero()[:, 0].cpu()
+            query_ids = pts_query_mask[b].nonzero()[:, 0].cpu()
+            if len(ref_ids) == 0 or len(query_ids) == 0:
+                continue
+            tree = cKDTree(pts_ref[b, ref_ids.to(device)].detach().cpu().numpy())
+            _, nn_ref_ids = tree.query(
+                pts_query[b, query_ids.to(device)].detach().cpu().numpy(),
+                k=1,
+                workers=-1,
+            )
+            nn_ids[b, query_ids] = ref_ids[torch.from_numpy(nn_ref_ids)]
+        return nn_ids.to(device=device)
+
+    pts2_nn_pts1_id = query(pts1, pts1_mask, pts2, pts2_mask)
+    if not only_pts2_nn:
+        pts1_nn_pts2_id = query(pts2, pts2_mask, pts1, pts1_mask)
+    else:
+        pts1_nn_pts2_id = None
+    return pts2_nn_pts1_id, pts1_nn_pts2_id
+
+
+def batch_chamfer_distance(
+    pts1,
+    pts2,
+    pts1_mask=None,
+    pts2_mask=None,
+    uniform_weight_pts1=True,
+    only_pts2_nn=False,
+    max_memory_mb=OD3D_DIST_MAX_MEMORY_MB,
+    use_kdtree=False,
+):
+    """
+    Args:
+        pts1 (torch.Tensor): (B, N, 3)
+        pts2 (torch.Tensor): (B, M, 3)
+        pts1_mask (torch.Tensor): (B, N)
+        pts2_mask (torch.Tensor): (B, M)
+        max_memory_mb (float): memory budget for a chunk of pairwise distances, None computes all at once.
+        use_kdtree (bool): if True, nearest neighbors are found with a scipy kd-tree (cpu).
+    Returns:
+        chamfer_dist (torch.Tensor): (B,)
+    """
+    if pts1_mask is None:
+        pts1_mask = torch.ones_like(pts1[..., 0], dtype=torch.bool)
+    if pts2_mask is None:
+        pts2_mask = torch.ones_like(pts2[..., 0], dtype=torch.bool)
+
+    M = pts2_mask.shape[-1]
+    N = pts1_mask.shape[-1]
+
+    pts2_nn_pts1_id, pts1_nn_pts2_id = batch_nearest_neighbors(
+        pts1=pts1,
+        pts2=pts2,
+        pts1_mask=pts1_mask,
+        pts2_mask=pts2_mask,
+        only_pts2_nn=only_pts2_nn,
+        max_memory_mb=max_memory_mb,
+        use_kdtree=use_kdtree,
+    )
+
+    from od3d.cv.select import batched_index_select
+
+    # distances are recomputed only for the nearest neighbor pairs to keep the gradients
+    chamfer_dist_pred_from_gt = (
+        batched_index_select(input=pts1, index=pts2_nn_pts1_id, dim=1) - pts2
+    ).norm(dim=-1)
+
+    if uniform_weight_pts1:
+        # each of pts1 has the same total weight, split among the pairs it takes part in
+        pairs_pts1_id = torch.where(pts2_mask.bool(), pts2_nn_pts1_id, N)
+        if not only_pts2_nn:
+            pairs_pts1_id = torch.cat(
+                [
+                    pairs_pts1_id,
+                    torch.where(
+                        pts1_mask.bool(),
+                        torch.arange(N, device=pts1.device)[None,],
+                        N,
+                    ),
+                ],
+                dim=-1,
+            )
+        pts1_counts = torch.zeros(
+            (pairs_pts1_id.shape[0], N + 1),
+            device=pts1.device,
+            dtype=pts1.dtype,
+        ).scatter_add_(
+            1, pairs_pts1_id, torch.ones_like(pairs_pts1_id, dtype=pts1.dtype)
+        )
+        # masked pts1 are not part of any pair, clamp avoids their infinite weights
+        pts1_weights = 1.0 / pts1_counts[:, :N].clamp(min=1.0)
+        pts2_weights_from_pts1 = batched_index_select(
+            index=pts2_nn_pts1_id,
+            input=pts1_weights,
+        )
+        pts2_mask = pts2_mask.clone() * pts2_weights_from_pts1
+        pts1_mask = pts1_mask.clone() * pts1_weights
+
+    chamfer_dist_mean_pred_from_gt = (chamfer_dist_pred_from_gt * pts2_mask).sum(
+        dim=-1,
+    ) / (pts2_mask.sum(dim=-1) + 1e-10)
+
+    if not only_pts2_nn:
+        chamfer_dist_gt_from_pred = (
+            pts1 - batched_index_select(input=pts2, index=pts1_nn_pts2_id, dim=1)
+        ).norm(dim=-1)
+        chamfer_dist_mean_gt_from_pred = (chamfer_dist_gt_from_pred * pts1_mask).sum(
+            dim=-1,
+        ) / (pts1_mask.sum(dim=-1) + 1e-10)
+        chamfer_dist = (
+            chamfer_dist_mean_pred_from_gt + chamfer_dist_mean_gt_from_pred
+        ) / 2.0
+    else:
+        chamfer_dist = chamfer_dist_mean_pred_from_gt
+
+    return chamfer_dist
+
+
 # def batch_point_face_distance_v2(pts3d, meshes, objects_ids, pts3d_mask = None,):
 """
 Args:
@@ -195,6 +432,7 @@ def batch_point_face_distance_v2(
     verts1_mask=None,
     faces1_mask=None,
     pts2_mask=None,
+    max_memory_mb=OD3D_DIST_MAX_MEMORY_MB,
 ):
     """
     Args:
@@ -204,6 +442,7 @@ def batch_point_face_distance_v2(
         verts1_mask (torch.Tensor): (B, N)
         faces1_mask (torch.Tensor): (B, F)
         pts2_mask (torch.Tensor): (B, M)
+        max_memory_mb (float): memory budget for a chunk of point-face pairs, None processes all at once.
     Returns:
         chamfer_dist (torch.Tensor): (B,)
     """
@@ -222,23 +461,63 @@ def batch_point_face_distance_v2(
         if verts1_mask is not None:
             verts = verts[verts1_mask[b]]
 
-        dist = points_faces_dist(pts3d=pts, verts=verts, faces=faces)
+        dist = points_faces_dist(
+            pts3d=pts,
+            verts=verts,
+            faces=faces,
+            max_memory_mb=max_memory_mb,
+        )
         dists.append(dist)
 
     dists = torch.stack(dists, dim=0)
     return dists
 
 
-def points_faces_dist(pts3d, verts, faces):
+def points_faces_dist(pts3d, verts, faces, max_memory_mb=OD3D_DIST_MAX_MEMORY_MB):
     """
+    Mean distance of the points to their closest face, the points are processed in chunks,
+    such that the per point-face intermediates fit into max_memory_mb.
 
     Args:
         pts3d: Px3
         verts: Vx3
         faces: Fx3
+        max_memory_mb (float): memory budget for a chunk of point-face pairs, None processes all at once.
     Returns:
         dist: float
     """
+    # approximate count of per point-face intermediates incl. the ones kept for backward
+    bytes_per_pair = 64 * pts3d.element_size()
+    chunk_p, _ = get_chunk_sizes(
+        N=pts3d.shape[0],
+        M=faces.shape[0],
+        bytes_per_pair=bytes_per_pair,
+        max_memory_mb=max_memory_mb,
+    )
+    pts3d_dists_pt_to_face = torch.cat(
+        [
+            points_faces_closest_dist(
+                pts3d=pts3d[p0 : p0 + chunk_p],
+                verts=verts,
+                faces=faces,
+            )
+            for p0 in range(0, max(pts3d.shape[0], 1), chunk_p)
+        ],
+        dim=0,
+    )
+    return pts3d_dists_pt_to_face.mean()
+
+
+def points_faces_closest_dist(pts3d, verts, faces):
+    """
+
+    Args:
+        pts3d: Px3
+        verts: Vx3
+        faces: Fx3
+    Returns:
+        dist: P, distance of each point to its closest face
+    """
 
     faces_normals = torch.cross(
         verts[faces[:, 1]] - verts[faces[:, 0]],
@@ -388,21 +667,10 @@ def points_faces_dist(pts3d, verts, faces):
         dim=1,
     )[:, 0]
 
-    pts3d_closest_to_face_id = dist_pts3d_faces.min(dim=-2).indices
-    pts3d_to_faces_closest_sel = pts3d[pts3d_closest_to_face_id]
-    pts3d_on_faces_closest_to_pts3d_sel = batched_index_select(
-        pts3d_on_faces_closest.permute(1, 0, 2),
-        index=pts3d_closest_to_face_id[:, None],
-        dim=1,
-    )[:, 0]
-
     pts3d_dists_pt_to_face = (pts3d - pts3d_on_faces_closest_sel).norm(dim=-1)
-    # pts3d_dists_face_to_pt = (pts3d_to_faces_closest_sel - pts3d_on_faces_closest_to_pts3d_sel).norm(dim=-1)
-
-    pts3d_dist = pts3d_dists_pt_to_face.mean()
 
     # from od3d.cv.visual.show import show_scene
     # show_scene(pts3d=[verts, torch.zeros((0, 3)).to(pts3d.device), pts3d[:1000], pts3d_on_face_closest[:1000] ],
     #           lines3d=[torch.stack([pts3d[:1000], pts3d_on_face_closest[:1000]],dim=-2)])
 
-    return pts3d_dist
+    return pts3d_dists_pt_to_face
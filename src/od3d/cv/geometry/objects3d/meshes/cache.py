@@ -0,0 +1,191 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import hashlib
+import os
+import shutil
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import torch
+
+OD3D_MESH_CACHE_VERSION = 1
+OD3D_MESH_CACHE_KEYS = ["verts", "faces", "rgb", "verts_uvs", "faces_uvs", "rgbs_uvs"]
+
+
+class OD3D_MeshCache:
+    """
+    Converts each mesh file (ply, glb, ...) once into a directory of .npy arrays (verts, faces, rgb, uvs),
+    which are memory-mapped read-only on access. Mapped pages are shared by all DataLoader workers
+    through the page cache, each worker keeps an LRU of opened meshes bounded by max_memory_mb.
+    Entries are invalidated if the size or modification time of the mesh file changed.
+    """
+
+    def __init__(self, path_cache: Path = None, max_memory_mb: float = 1024.0):
+        self.path_cache = Path(path_cache) if path_cache is not None else None
+        self.max_memory_mb = max_memory_mb
+        self.entries = OrderedDict()
+        self.entries_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.conversions = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.path_cache is not None
+
+    def get_path_mesh_cache(self, fpath: Path, load_texts=True):
+        fpath = Path(fpath).resolve()
+        stat = os.stat(fpath)
+        hash = hashlib.sha1()
+        hash.update(
+            f"v{OD3D_MESH_CACHE_VERSION},{fpath},{stat.st_size},{stat.st_mtime_ns},texts={load_texts}".encode(
+                "utf-8",
+            ),
+        )
+        return self.path_cache.joinpath(f"{fpath.stem}_{hash.hexdigest()}")
+
+    @staticmethod
+    def get_arrays_from_meshes(meshes):
+        arrays = {
+            "verts": meshes.verts,
+            "faces": meshes.faces,
+            "rgb": meshes.rgb,
+            "verts_uvs": getattr(meshes, "verts_uvs", None),
+            "faces_uvs": getattr(meshes, "faces_uvs", None),
+            "rgbs_uvs": getattr(meshes, "rgbs_uvs", None),
+        }
+        return {
+            key: val.detach().cpu().numpy()
+            for key, val in arrays.items()
+            if isinstance(val, torch.Tensor)
+        }
+
+    @staticmethod
+    def write(path_mesh_cache: Path, arrays):
+        path_mesh_cache = Path(path_mesh_cache)
+        path_tmp = path_mesh_cache.with_name(
+            f"{path_mesh_cache.name}.{os.getpid()}.{np.random.randint(1 << 30)}.tmp",
+        )
+        path_tmp.mkdir(parents=True, exist_ok=True)
+        for key, arr in arrays.items():
+            np.save(path_tmp.joinpath(f"{key}.npy"), np.ascontiguousarray(arr))
+        try:
+            path_tmp.rename(path_mesh_cache)
+        except OSError:
+            # another worker converted the same mesh meanwhile
+            shutil.rmtree(path_tmp, ignore_errors=True)
+
+    @staticmethod
+    def read(path_mesh_cache: Path):
+        arrays = {}
+        for key in OD3D_MESH_CACHE_KEYS:
+            fpath_arr = Path(path_mesh_cache).joinpath(f"{key}.npy")
+            if fpath_arr.exists():
+                arrays[key] = np.load(fpath_arr, mmap_mode="r")
+        return arrays
+
+    def get_arrays(self, fpath: Path, load_texts=True):
+        from od3d.cv.geometry.objects3d.meshes import Meshes
+
+        path_mesh_cache = self.get_path_mesh_cache(fpath=fpath, load_texts=load_texts)
+        key = str(path_mesh_cache)
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        if not path_mesh_cache.exists():
+            mesh = Meshes.read_from_ply_file(
+                fpath=fpath,
+                load_texts=load_texts,
+                use_cache=False,
+            )
+            self.write(
+                path_mesh_cache=path_mesh_cache,
+                arrays=self.get_arrays_from_meshes(mesh),
+            )
+            self.conversions += 1
+
+        arrays = self.read(path_mesh_cache)
+        self.entries[key] = arrays
+        self.entries_nbytes += sum(arr.nbytes for arr in arrays.values())
+        while (
+            self.max_memory_mb is not None
+            and self.entries_nbytes > self.max_memory_mb * 1024**2
+            and len(self.entries) > 1
+        ):
+            _, arrays_evicted = self.entries.popitem(last=False)
+            self.entries_nbytes -= sum(arr.nbytes for arr in arrays_evicted.values())
+            self.evictions += 1
+        return arrays
+
+    def read_mesh(
+        self,
+        fpath: Path,
+        device="cpu",
+        scale=1.0,
+        load_texts=True,
+        **kwargs,
+    ):
+        from od3d.cv.geometry.objects3d.meshes import Meshes
+
+        arrays = self.get_arrays(fpath=fpath, load_texts=load_texts)
+
+        def as_list(key):
+            if key not in arrays:
+                return []
+            # the read-only mapped arrays are not written, Meshes concatenates them into new tensors
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                tensor = torch.from_numpy(arrays[key]).to(device=device)
+            # textures are stacked per mesh
+            return list(tensor) if key == "rgbs_uvs" else [tensor]
+
+        mesh = Meshes(
+            verts=as_list("verts"),
+            faces=as_list("faces"),
+            rgb=as_list("rgb"),
+            verts_uvs=as_list("verts_uvs"),
+            faces_uvs=as_list("faces_uvs"),
+            rgbs_uvs=as_list("rgbs_uvs"),
+            device=device,
+            **kwargs,
+        )
+        mesh.verts = mesh.verts * scale
+        return mesh
+
+    def clear(self):
+        self.entries.clear()
+        self.entries_nbytes = 0
+
+    def get_stats(self):
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "conversions": self.conversions,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "memory_mb": self.entries_nbytes / 1024**2,
+            "hit_rate": self.hits / requests if requests > 0 else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(
+            f"mesh cache (pid {os.getpid()}): {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['conversions']} conversions, {stats['evictions']} evictions, "
+            f"{stats['size']} meshes, {stats['memory_mb']:.1f}/{self.max_memory_mb} MB, "
+            f"hit rate {stats['hit_rate']:.3f}",
+        )
+
+
+# process wide, disabled until a path is set (e.g. by the dataset config mesh_cache_dir)
+OD3D_MESH_CACHE = OD3D_MeshCache(path_cache=None)
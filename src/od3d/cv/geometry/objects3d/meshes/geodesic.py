@@ -0,0 +1,306 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import hashlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import torch
+
+OD3D_GEODESIC_DIST_CACHE_VERSION = 1
+
+
+def get_mesh_geodesic_dist_hash(
+    verts: np.ndarray,
+    faces: np.ndarray,
+    dist_max: float,
+    knn: int = None,
+):
+    hash = hashlib.sha1()
+    hash.update(f"v{OD3D_GEODESIC_DIST_CACHE_VERSION}".encode("utf-8"))
+    hash.update(np.ascontiguousarray(verts, dtype=np.float64).tobytes())
+    hash.update(np.ascontiguousarray(faces, dtype=np.int64).tobytes())
+    hash.update(f"dist_max={float(dist_max)},knn={knn}".encode("utf-8"))
+    return hash.hexdigest()
+
+
+def get_mesh_geodesic_dist_csr(
+    verts: np.ndarray,
+    faces: np.ndarray,
+    dist_max: float,
+    knn: int = None,
+):
+    """
+    Computes the geodesic distances between all vertices of a single mesh, normalized by their maximum.
+    Pairs without a geodesic path (or beyond dist_max) are not stored, the diagonal is always stored as 0.
+
+    Args:
+        verts (np.ndarray): Vx3
+        faces (np.ndarray): Fx3
+        dist_max (float): maximum geodesic distance computed
+        knn (int): if not None, only the knn nearest vertices (incl. itself) are kept per row.
+    Returns:
+        crow (np.ndarray): V+1, col (np.ndarray): N, val (np.ndarray): N
+    """
+    import gdist
+    import scipy.sparse
+
+    verts_count = verts.shape[0]
+    dist = gdist.local_gdist_matrix(
+        vertices=np.ascontiguousarray(verts, dtype=np.float64),
+        triangles=np.ascontiguousarray(faces, dtype=np.int32),
+        max_distance=dist_max,
+    ).tocoo()
+
+    # zero distances between different vertices are treated as missing, as in the dense variant
+    mask = (dist.data != 0) & (dist.row != dist.col)
+    row = dist.row[mask]
+    col = dist.col[mask]
+    val = dist.data[mask].astype(np.float32)
+    if len(val) > 0 and val.max() > 0:
+        val = val / val.max()
+
+    row = np.concatenate([row, np.arange(verts_count)])
+    col = np.concatenate([col, np.arange(verts_count)])
+    val = np.concatenate([val, np.zeros(verts_count, dtype=np.float32)])
+
+    dist = scipy.sparse.csr_matrix(
+        (val, (row, col)),
+        shape=(verts_count, verts_count),
+    )
+    dist.sort_indices()
+    crow = dist.indptr.astype(np.int64)
+    col = dist.indices.astype(np.int64)
+    # explicit zeros (diagonal) are kept by csr_matrix construction
+    val = dist.data.astype(np.float32)
+
+    if knn is not None and knn < verts_count:
+        rows_counts = np.diff(crow)
+        rows = np.repeat(np.arange(verts_count), rows_counts)
+        order = np.lexsort((val, rows))
+        rank = np.arange(len(order)) - np.repeat(crow[:-1], rows_counts)
+        keep = order[rank < knn]
+        keep.sort()
+        col = col[keep]
+        val = val[keep]
+        crow = np.zeros(verts_count + 1, dtype=np.int64)
+        crow[1:] = np.cumsum(np.minimum(rows_counts, knn))
+
+    return crow, col, val
+
+
+def _get_mesh_geodesic_dist_csr_cached(verts, faces, dist_max, knn, fpath_cache):
+    if fpath_cache is not None and Path(fpath_cache).exists():
+        try:
+            cache = np.load(fpath_cache)
+            return cache["crow"], cache["col"], cache["val"]
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Corrupt geodesic dist cache {fpath_cache}, recomputing.")
+
+    crow, col, val = get_mesh_geodesic_dist_csr(
+        verts=verts,
+        faces=faces,
+        dist_max=dist_max,
+        knn=knn,
+    )
+
+    if fpath_cache is not None:
+        fpath_cache = Path(fpath_cache)
+        fpath_cache.parent.mkdir(parents=True, exist_ok=True)
+        fpath_tmp = fpath_cache.with_suffix(f".{np.random.randint(1 << 30)}.tmp.npz")
+        np.savez(fpath_tmp, crow=crow, col=col, val=val)
+        fpath_tmp.replace(fpath_cache)
+    return crow, col, val
+
+
+class OD3D_GeodesicDistBlocks:
+    """
+    Block diagonal geodesic distances of multiple meshes, stored as one sparse CSR block per mesh.
+    Distances across meshes are infinite and never stored.
+    """
+
+    def __init__(
+        self,
+        crows: List[torch.Tensor],
+        cols: List[torch.Tensor],
+        vals: List[torch.Tensor],
+        device=None,
+    ):
+        self.verts_counts = [len(crow) - 1 for crow in crows]
+        self.verts_counts_acc_from_0 = [0] + np.cumsum(self.verts_counts).tolist()
+        self.verts_count = self.verts_counts_acc_from_0[-1]
+
+        # global csr over all meshes, column ids are offset by the mesh verts offset
+        nnz_acc_from_0 = [0] + np.cumsum([len(col) for col in cols]).tolist()
+        self.crow = torch.cat(
+            [crows[0][:1]]
+            + [crow[1:] + nnz_acc_from_0[i] for i, crow in enumerate(crows)],
+        ).to(device=device, dtype=torch.long)
+        self.col = torch.cat(
+            [col + self.verts_counts_acc_from_0[i] for i, col in enumerate(cols)],
+        ).to(device=device, dtype=torch.long)
+        self.val = torch.cat(vals).to(device=device, dtype=torch.float32)
+        self.nnz_acc_from_0 = nnz_acc_from_0
+
+    @property
+    def device(self):
+        return self.val.device
+
+    @property
+    def nnz(self):
+        return len(self.val)
+
+    def __len__(self):
+        return len(self.verts_counts)
+
+    def to(self, device):
+        self.crow = self.crow.to(device)
+        self.col = self.col.to(device)
+        self.val = self.val.to(device)
+        return self
+
+    @classmethod
+    def from_meshes(
+        cls,
+        verts: List[torch.Tensor],
+        faces: List[torch.Tensor],
+        dist_max=99999,
+        knn: int = None,
+        workers: int = 0,
+        path_cache: Path = None,
+        device=None,
+    ):
+        """
+        Args:
+            verts (List[torch.Tensor]): M x (Vx3)
+            faces (List[torch.Tensor]): M x (Fx3), vertex ids local to each mesh
+            dist_max (float): maximum geodesic distance computed
+            knn (int): if not None, only the knn nearest vertices are kept per vertex
+            workers (int): number of processes computing the meshes in parallel
+            path_cache (Path): if not None, each block is cached at path_cache/<mesh_hash>.npz
+        """
+        jobs = []
+        for _verts, _faces in zip(verts, faces):
+            _verts = _verts.detach().cpu().to(torch.float64).numpy()
+            _faces = _faces.detach().cpu().to(torch.int32).numpy()
+            fpath_cache = None
+            if path_cache is not None:
+                mesh_hash = get_mesh_geodesic_dist_hash(
+                    verts=_verts,
+                    faces=_faces,
+                    dist_max=dist_max,
+                    knn=knn,
+                )
+                fpath_cache = Path(path_cache).joinpath(f"{mesh_hash}.npz")
+            jobs.append((_verts, _faces, dist_max, knn, fpath_cache))
+
+        if workers is not None and workers > 0 and len(jobs) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(jobs)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                blocks = list(
+                    executor.map(_get_mesh_geodesic_dist_csr_cached, *zip(*jobs)),
+                )
+        else:
+            blocks = [_get_mesh_geodesic_dist_csr_cached(*job) for job in jobs]
+
+        return cls(
+            crows=[torch.from_numpy(block[0]) for block in blocks],
+            cols=[torch.from_numpy(block[1]) for block in blocks],
+            vals=[torch.from_numpy(block[2]) for block in blocks],
+            device=device,
+        )
+
+    def get_rows_ids(self, verts_ids: torch.LongTensor):
+        """
+        Returns for each of the N rows its entries as flat (N_nnz,) tensors (row in verts_ids, col, nnz id).
+        """
+        verts_ids = verts_ids.to(device=self.device)
+        starts = self.crow[verts_ids]
+        counts = self.crow[verts_ids + 1] - starts
+        rows = torch.repeat_interleave(
+            torch.arange(len(verts_ids), device=self.device),
+            counts,
+        )
+        nnz_ids = (
+            torch.arange(len(rows), device=self.device)
+            - torch.repeat_interleave(torch.cumsum(counts, dim=0) - counts, counts)
+            + torch.repeat_interleave(starts, counts)
+        )
+        return rows, self.col[nnz_ids], nnz_ids
+
+    def get_prob_val(self, sigma: float):
+        """Row normalized probabilities exp(-0.5 (d / sigma)^2) for all stored entries."""
+        prob = torch.exp(-0.5 * (self.val / (sigma + 1e-10)) ** 2)
+        rows = torch.repeat_interleave(
+            torch.arange(self.verts_count, device=self.device),
+            self.crow[1:] - self.crow[:-1],
+        )
+        prob_sum = torch.zeros(self.verts_count, device=self.device).scatter_add_(
+            0,
+            rows,
+            prob,
+        )
+        return prob / prob_sum[rows]
+
+    def get_rows(
+        self,
+        verts_ids: torch.LongTensor,
+        sigma: float = None,
+        cols_offset: int = 0,
+        cols_count: int = None,
+        fill_value: float = None,
+    ):
+        """
+        Densifies only the requested rows.
+
+        Args:
+            verts_ids (torch.LongTensor): N, global vertex ids
+            sigma (float): if not None, returns the geodesic probabilities instead of distances
+            cols_offset (int): first column returned, e.g. the verts offset of a single mesh
+            cols_count (int): number of columns returned, defaults to all vertices
+        Returns:
+            rows (torch.Tensor): N x cols_count
+        """
+        if cols_count is None:
+            cols_count = self.verts_count
+        if fill_value is None:
+            fill_value = 0.0 if sigma is not None else torch.inf
+        val = self.get_prob_val(sigma=sigma) if sigma is not None else self.val
+
+        rows, cols, nnz_ids = self.get_rows_ids(verts_ids=verts_ids)
+        cols = cols - cols_offset
+        mask = (cols >= 0) & (cols < cols_count)
+        dense = torch.full(
+            (len(verts_ids), cols_count),
+            fill_value=fill_value,
+            device=self.device,
+        )
+        dense[rows[mask], cols[mask]] = val[nnz_ids[mask]]
+        return dense
+
+    def get_block(self, mesh_id: int, sigma: float = None):
+        """Returns the dense Vi x Vi block of a single mesh."""
+        offset = self.verts_counts_acc_from_0[mesh_id]
+        return self.get_rows(
+            verts_ids=torch.arange(
+                offset,
+                self.verts_counts_acc_from_0[mesh_id + 1],
+                device=self.device,
+            ),
+            sigma=sigma,
+            cols_offset=offset,
+            cols_count=self.verts_counts[mesh_id],
+        )
+
+    def to_dense(self, sigma: float = None):
+        return self.get_rows(
+            verts_ids=torch.arange(self.verts_count, device=self.device),
+            sigma=sigma,
+        )
@@ -5,7 +5,11 @@ from enum import Enum
 from pathlib import Path
 from typing import List
 
-import nvdiffrast.torch as dr
+try:
+    import nvdiffrast.torch as dr
+except ImportError:
+    # only required for RASTERIZER.NVDIFFRAST
+    dr = None
 
 import torch
 from od3d.cv.geometry.transform import proj3d2d_broadcast
@@ -49,6 +53,7 @@ class FACE_BLEND_TYPE(str, Enum):
 class RASTERIZER(str, Enum):
     PYTORCH3D = "pytorch3d"
     NVDIFFRAST = "nvdiffrast"
+    TORCH = "torch"  # tensor operations only, runs on cpu
 
 
 class MESH_RENDER_MODALITIES(str, Enum):
@@ -121,7 +126,7 @@ class OD3D_Meshes_Deform(OD3D_Objects3D_Deform):
         self.latent_mu = latent_mu
 
     def __getitem__(self, i):
-        if isinstance(i, slice):
+        if isinstance(i, (slice, torch.Tensor, list)):
             verts_deform = self.verts_deform[i]
             latent = self.latent[i] if self.latent is not None else None
             latent_mu = self.latent_mu[i] if self.latent_mu is not None else None
@@ -264,6 +269,9 @@ class Meshes(OD3D_Objects3D):
         verts_coarse_count: int = 150,
         verts_coarse_prob_sigma: float = 0.01,  # 0.001, 0.01, 0.05, 0.1
         geodesic_prob_sigma=0.2,
+        geodesic_dist_knn: int = None,
+        geodesic_dist_workers: int = 0,
+        geodesic_dist_cache_dir: Path = None,
         gaussian_splat_enabled=False,
         gaussian_splat_opacity=0.7,
         gaussian_splat_pts3d_size_rel_to_neighbor_dist=0.5,
@@ -300,7 +308,14 @@ class Meshes(OD3D_Objects3D):
         self.verts_counts = [_verts.shape[0] for _verts in verts]
         self.verts_counts_max = max(self.verts_counts)
 
-        self.rasterizer = rasterizer  # RASTERIZER.NVDIFFRAST # PYTORCH3D or NVDIFFRAST
+        if rasterizer == RASTERIZER.NVDIFFRAST and dr is None:
+            logger.warning(
+                "nvdiffrast not installed, falling back to torch rasterizer."
+            )
+            rasterizer = RASTERIZER.TORCH
+        self.rasterizer = (
+            rasterizer  # RASTERIZER.NVDIFFRAST # PYTORCH3D, NVDIFFRAST or TORCH
+        )
         if instance_deform_net_config is not None:
             affine = instance_deform_net_config.get("affine", False)
             if instance_deform_net_config.head.get("class_name", "MLP") == "CoordMLP":
@@ -364,6 +379,9 @@ class Meshes(OD3D_Objects3D):
         self.pt3d_raster_perspective_correct = pt3d_raster_perspective_correct
 
         self.geodesic_prob_sigma = geodesic_prob_sigma
+        self.geodesic_dist_knn = geodesic_dist_knn
+        self.geodesic_dist_workers = geodesic_dist_workers
+        self.geodesic_dist_cache_dir = geodesic_dist_cache_dir
         self._geodesic_dist = None
         self._verts_coarse = None
         self._verts_ids_coarse = None
@@ -1293,6 +1311,7 @@ class Meshes(OD3D_Objects3D):
         device="cpu",
         scale=1.0,
         load_texts=True,
+        use_cache=True,
         **kwargs,
     ):
         if fpath is None or str(fpath).lower() == "none":
@@ -1310,6 +1329,21 @@ class Meshes(OD3D_Objects3D):
             msg = f"mesh fpath does not exist at {fpath}"
             logger.warning(msg)
             raise Exception(msg)
+
+        from od3d.cv.geometry.objects3d.meshes.cache import OD3D_MESH_CACHE
+
+        if use_cache and OD3D_MESH_CACHE.enabled:
+            try:
+                return OD3D_MESH_CACHE.read_mesh(
+                    fpath=fpath,
+                    device=device,
+                    scale=scale,
+                    load_texts=load_texts,
+                    **kwargs,
+                )
+            except Exception as e:
+                logger.warning(f"could not read mesh {fpath} from mesh cache: {e}")
+
         try:
             import trimesh
 
@@ -1895,71 +1929,43 @@ class Meshes(OD3D_Objects3D):
 
         return Meshes(verts=verts, faces=faces, rgb=rgb, feats_objects=feats_objects)
 
-    def get_geodesic_dist(self, dist_max=99999):
+    def get_geodesic_dist_blocks(self, dist_max=99999):
+        """
+        Returns:
+            geodesic_dist (OD3D_GeodesicDistBlocks): sparse geodesic distances, one block per mesh.
+        """
         if self._geodesic_dist is None:
-            import gdist
+            from od3d.cv.geometry.objects3d.meshes.geodesic import (
+                OD3D_GeodesicDistBlocks,
+            )
 
             meshes_ids = list(range(len(self)))
-            geodesic_dist = (
-                torch.ones(
-                    size=(self.verts_count, self.verts_count),
-                    device=self.device,
-                )
-                * torch.inf
+            self._geodesic_dist = OD3D_GeodesicDistBlocks.from_meshes(
+                verts=[
+                    self.get_verts_with_mesh_id(mesh_id=mesh_id)
+                    for mesh_id in meshes_ids
+                ],
+                faces=[
+                    self.get_faces_with_mesh_id(mesh_id=mesh_id)
+                    for mesh_id in meshes_ids
+                ],
+                dist_max=dist_max,
+                knn=self.geodesic_dist_knn,
+                workers=self.geodesic_dist_workers,
+                path_cache=self.geodesic_dist_cache_dir,
+                device=self.device,
             )
-            for mesh_id in meshes_ids:
-                verts = self.get_verts_with_mesh_id(mesh_id=mesh_id)
-                faces = self.get_faces_with_mesh_id(mesh_id=mesh_id)
-                mesh_verts_geodesic_dist = gdist.local_gdist_matrix(
-                    vertices=verts.detach().cpu().to(torch.float64).numpy(),
-                    triangles=faces.cpu().detach().to(torch.int32).numpy(),
-                    max_distance=dist_max,
-                )
-                # convert  scipy.sparse._csc.csc_matrix to torch.Tensor, fill sparse with torch.inf
-                mesh_verts_geodesic_dist = torch.from_numpy(
-                    mesh_verts_geodesic_dist.toarray(),
-                ).to(
-                    dtype=torch.float32,
-                    device=self.device,
-                )
-                mesh_verts_geodesic_dist = (
-                    mesh_verts_geodesic_dist / mesh_verts_geodesic_dist.max()
-                )
-                mesh_verts_geodesic_dist[mesh_verts_geodesic_dist == 0] = torch.inf
-                mesh_verts_geodesic_dist[
-                    torch.arange(mesh_verts_geodesic_dist.shape[0]).to(self.device),
-                    torch.arange(
-                        mesh_verts_geodesic_dist.shape[0],
-                    ).to(self.device),
-                ] = 0.0
-
-                # mesh_verts_geodesic_dist = torch.from_numpy(mesh_verts_geodesic_dist.toarray()).to(dtype=torch.float32, device=self.device)
-
-                geodesic_dist[
-                    self.verts_counts_acc_from_0[
-                        mesh_id
-                    ] : self.verts_counts_acc_from_0[mesh_id + 1],
-                    self.verts_counts_acc_from_0[
-                        mesh_id
-                    ] : self.verts_counts_acc_from_0[mesh_id + 1],
-                ] = mesh_verts_geodesic_dist
-
-            # euclidean_dist = torch.cdist(self.verts[None,], self.verts[None,])[0]
-            # geodesic_dist = torch.ones_like(euclidean_dist) * torch.inf
-            # would need to get verts nearest neighbors and iteratively propagating geodesic_dist
-            self._geodesic_dist = geodesic_dist
-
         return self._geodesic_dist
 
+    def get_geodesic_dist(self, dist_max=99999):
+        """
+        Returns:
+            geodesic_dist (torch.Tensor): VxV, dense, inf for vertices of different meshes.
+        """
+        return self.get_geodesic_dist_blocks(dist_max=dist_max).to_dense()
+
     def get_geodesic_prob(self):
-        _geodesic_dist = self.get_geodesic_dist().clone()
-        _geodesic_prob = torch.exp(
-            input=-0.5 * (_geodesic_dist / (self.geodesic_prob_sigma + 1e-10)) ** 2,
-        )
-        # replace inf with 0
-        _geodesic_prob[torch.isinf(_geodesic_dist)] = 0.0
-        _geodesic_prob = _geodesic_prob / _geodesic_prob.sum(dim=-1, keepdim=True)
-        return _geodesic_prob
+        return self.get_geodesic_dist_blocks().to_dense(sigma=self.geodesic_prob_sigma)
 
     def get_geodesic_prob_with_noise(self):
         geodesic_prob_with_noise = torch.eye(
@@ -1969,6 +1975,48 @@ class Meshes(OD3D_Objects3D):
         geodesic_prob_with_noise[:-1, :-1] = self.get_geodesic_prob()
         return geodesic_prob_with_noise
 
+    def get_geodesic_prob_rows(
+        self,
+        verts_ids: torch.LongTensor,
+        add_clutter=False,
+        mesh_id: int = None,
+        device=None,
+    ):
+        """
+        Densifies only the requested rows of the geodesic probabilities.
+
+        Args:
+            verts_ids (torch.LongTensor): N, global vertex ids, verts_count refers to clutter if add_clutter.
+            add_clutter (bool): whether to append the clutter column.
+            mesh_id (int): if not None, only returns the columns of this mesh.
+        Returns:
+            geodesic_prob (torch.Tensor): N x V(+1), or N x Vi(+1) if mesh_id is not None.
+        """
+        if device is None:
+            device = self.device
+        geodesic_dist = self.get_geodesic_dist_blocks()
+        verts_ids = verts_ids.to(device=geodesic_dist.device)
+        if mesh_id is not None:
+            cols_offset = self.verts_counts_acc_from_0[mesh_id]
+            cols_count = self.verts_counts[mesh_id]
+        else:
+            cols_offset = 0
+            cols_count = self.verts_count
+        verts_ids_clutter = verts_ids >= self.verts_count
+        geodesic_prob = geodesic_dist.get_rows(
+            verts_ids=verts_ids.clamp(max=self.verts_count - 1),
+            sigma=self.geodesic_prob_sigma,
+            cols_offset=cols_offset,
+            cols_count=cols_count,
+        )
+        geodesic_prob[verts_ids_clutter] = 0.0
+        if add_clutter:
+            geodesic_prob = torch.cat(
+                [geodesic_prob, verts_ids_clutter[:, None].to(geodesic_prob.dtype)],
+                dim=-1,
+            )
+        return geodesic_prob.to(device=device)
+
     @property
     def verts_coarse(self):
         if self._verts_coarse is None:
@@ -4209,16 +4257,84 @@ class Meshes(OD3D_Objects3D):
             # minibatch_size, height, width, 4 (u, v, z / w, triangle_id)
             # start index, triangles count
 
+        elif self.rasterizer == RASTERIZER.TORCH:
+            from od3d.cv.render.rasterize import rasterize_meshes
+
+            verts, verts_counts = self.get_vert_mod_from_objs(
+                mod=VERT_MODALITIES.PT3D,
+                objs_ids=objects_ids,
+                instance_deform=instance_deform,
+                padded=True,
+            )
+            faces, faces_counts = self.get_face_mod_from_objs(
+                mod=FACE_MODALITIES.VERTS_IN_SCENES_ID,
+                objs_ids=objects_ids,
+                padded=True,
+            )
+
+            if objects_ids.dim() == 1:
+                if obj_tform4x4_objs is not None:
+                    cams_tform4x4_objs = cams_tform4x4_obj[:, None] @ obj_tform4x4_objs
+                else:
+                    cams_tform4x4_objs = cams_tform4x4_obj[:, None]
+                scenes_faces_counts = faces_counts
+            elif objects_ids.dim() == 2:
+                if obj_tform4x4_objs is not None:
+                    if obj_tform4x4_objs.dim() == 3:
+                        cams_tform4x4_objs = (
+                            cams_tform4x4_obj[:, None, None]
+                            @ obj_tform4x4_objs[None, :, None]
+                        )
+                    elif obj_tform4x4_objs.dim() == 4:
+                        cams_tform4x4_objs = (
+                            cams_tform4x4_obj[:, None, None]
+                            @ obj_tform4x4_objs[:, :, None]
+                        )
+                    else:
+                        msg = f"not implemented for obj_tform4x4_objs.dim(): {obj_tform4x4_objs.dim()}"
+                        raise NotImplementedError(msg)
+                else:
+                    cams_tform4x4_objs = cams_tform4x4_obj[:, None, None]
+                scenes_faces_counts = faces_counts.sum(dim=-1)
+            else:
+                raise NotImplementedError
+
+            verts_cam = (cams_tform4x4_objs @ add_homog_dim(verts, dim=-1)[..., None])[
+                ..., :3, 0
+            ]
+            verts_cam = self.unpad_mod(objs_mod=verts_cam, objs_lengths=verts_counts)
+            faces = self.unpad_mod(objs_mod=faces, objs_lengths=faces_counts)
+            faces_scene_ids = torch.repeat_interleave(
+                torch.arange(render_count),
+                scenes_faces_counts.cpu(),
+            ).to(device=device)
+
+            fragments = rasterize_meshes(
+                verts_cam=verts_cam,
+                faces=faces,
+                faces_scene_ids=faces_scene_ids,
+                cams_intr4x4=cams_intr4x4,
+                imgs_size=imgs_sizes,
+                faces_per_pixel=faces_per_pixel,
+                blur_radius=blur_radius,
+                cull_backfaces=cull_backfaces,
+                perspective_correct=self.pt3d_raster_perspective_correct,
+                znear=znear,
+                zfar=zfar,
+            )
         else:
             msg = f"Unknown rasterizer {self.rasterizer}."
             raise Exception(msg)
 
             # return {PROJECT_MODALITIES.PT3D_NCDS: color}
 
+        # pytorch3d and torch rasterizer both return fragments
+        use_fragments = self.rasterizer in [RASTERIZER.PYTORCH3D, RASTERIZER.TORCH]
+
         mods2d_rendered = {}
         for modality in modalities:
             if modality == PROJECT_MODALITIES.MASK:
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     mod2d_rendered = self.interpolate_and_blend_face_attributes(
                         fragments,
                         feats_from_faces=None,
@@ -4247,7 +4363,7 @@ class Meshes(OD3D_Objects3D):
                 or modality == PROJECT_MODALITIES.ONEHOT_SMOOTH
                 or modality == PROJECT_MODALITIES.ONEHOT_COARSE
             ):
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     if modality == PROJECT_MODALITIES.ONEHOT:
                         if add_other_objects:
                             num_classes = self.verts_count
@@ -4406,7 +4522,7 @@ class Meshes(OD3D_Objects3D):
                     )  # from B x H x W x F to B x F x H x W
 
             elif modality == PROJECT_MODALITIES.DEPTH:
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     mod2d_rendered = fragments.zbuf.permute(0, 3, 1, 2)
                 elif self.rasterizer == RASTERIZER.NVDIFFRAST:
                     verts_cam_z = transf3d_broadcast(
@@ -4428,7 +4544,7 @@ class Meshes(OD3D_Objects3D):
                     )  # from B x H x W x F to B x F x H x W
 
             elif modality == PROJECT_MODALITIES.MASK_VERTS_VSBL:
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     B = fragments.pix_to_face.shape[0]
                 else:
                     B = rast_out.shape[0]
@@ -4449,7 +4565,7 @@ class Meshes(OD3D_Objects3D):
 
                 for b in range(B):
                     # logger.info(f'meshes_ids {meshes_ids}')
-                    if self.rasterizer == RASTERIZER.PYTORCH3D:
+                    if use_fragments:
                         faces_ids_vsbl = fragments.pix_to_face[b]
                     else:
                         # TODO: this is not verified to work for a batch size larger than 1
@@ -4468,7 +4584,7 @@ class Meshes(OD3D_Objects3D):
                 modality == PROJECT_MODALITIES.FEATS
                 or modality == PROJECT_MODALITIES.FEATS_PBR
             ):
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     feats_from_faces = torch.cat(
                         [
                             self.get_feats_from_faces_with_mesh_id(object_id)
@@ -4749,7 +4865,7 @@ class Meshes(OD3D_Objects3D):
                 or modality == PROJECT_MODALITIES.OBJ_IN_SCENE_ID
                 or modality == PROJECT_MODALITIES.OBJ_ID
             ):
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     feats_from_faces = torch.cat(
                         [
                             self.get_verts_ncds_from_faces_with_mesh_id(object_id)
@@ -4840,7 +4956,7 @@ class Meshes(OD3D_Objects3D):
                         2,
                     )  # from B x H x W x F to B x F x H x W
             elif modality == PROJECT_MODALITIES.RGB:
-                if self.rasterizer == RASTERIZER.PYTORCH3D:
+                if use_fragments:
                     feats_from_faces = torch.cat(
                         [
                             self.get_verts_rgbs_from_faces_with_mesh_id(object_id)
@@ -5329,7 +5445,10 @@ class Meshes(OD3D_Objects3D):
                     f"feats_from_faces must be provided if return_pix_feats is True",
                 )
 
-            from pytorch3d.renderer.mesh.utils import interpolate_face_attributes
+            if self.rasterizer == RASTERIZER.PYTORCH3D:
+                from pytorch3d.renderer.mesh.utils import interpolate_face_attributes
+            else:
+                from od3d.cv.render.rasterize import interpolate_face_attributes
 
             pix_face_feats = interpolate_face_attributes(
                 fragments.pix_to_face,
@@ -6015,21 +6134,16 @@ class Meshes(OD3D_Objects3D):
                     device=device,
                 )  # BxV(*O)(+1) in range 0 to V(*O)(+1) or 0 to V(+1) if not add other objects.
                 if add_other_objects:
-                    if add_clutter:
-                        labels_onehot = (
-                            self.get_geodesic_prob_with_noise()
-                            .clone()
-                            .to(device=device)
-                        )
-
-                    else:
-                        labels_onehot = (
-                            self.get_geodesic_prob().clone().to(device=device)
-                        )
-
-                    labels_ids_out_of_range = labels_ids >= labels_onehot.shape[0]
+                    labels_count = (
+                        self.verts_count + 1 if add_clutter else self.verts_count
+                    )
+                    labels_ids_out_of_range = labels_ids >= labels_count
                     labels_ids[labels_ids_out_of_range] = 0
-                    labels_onehot = labels_onehot[labels_ids]
+                    labels_onehot = self.get_geodesic_prob_rows(
+                        verts_ids=labels_ids.flatten(),
+                        add_clutter=add_clutter,
+                        device=device,
+                    ).reshape(*labels_ids.shape, -1)
                     labels_onehot[labels_ids_out_of_range] = 0
                 else:
                     from od3d.cv.select import batched_index_select
@@ -6068,34 +6182,21 @@ class Meshes(OD3D_Objects3D):
         )
 
         for b, object_id in enumerate(objects_ids):
-            if add_clutter:
-                labels_onehot_all = self.get_geodesic_prob_with_noise()
-            else:
-                labels_onehot_all = self.get_geodesic_prob()
-
-            if add_other_objects:
-                labels_onehot_smooth[
-                    b,
-                    : self.verts_counts[object_id],
-                    : labels_onehot_all.shape[-1],
-                ] = labels_onehot_all[
-                    self.verts_counts_acc_from_0[
-                        object_id
-                    ] : self.verts_counts_acc_from_0[object_id + 1]
-                ]
-            else:
-                labels_onehot_smooth[
-                    b,
-                    : self.verts_counts[object_id],
-                    : self.verts_counts[object_id],
-                ] = labels_onehot_all[
-                    self.verts_counts_acc_from_0[
-                        object_id
-                    ] : self.verts_counts_acc_from_0[object_id + 1],
-                    self.verts_counts_acc_from_0[
-                        object_id
-                    ] : self.verts_counts_acc_from_0[object_id + 1],
-                ]
+            verts_ids = torch.arange(
+                self.verts_counts_acc_from_0[object_id],
+                self.verts_counts_acc_from_0[object_id + 1],
+            )
+            labels_onehot_object = self.get_geodesic_prob_rows(
+                verts_ids=verts_ids,
+                add_clutter=add_clutter and add_other_objects,
+                mesh_id=None if add_other_objects else object_id,
+                device=device,
+            )
+            labels_onehot_smooth[
+                b,
+                : labels_onehot_object.shape[0],
+                : labels_onehot_object.shape[1],
+            ] = labels_onehot_object
 
             if add_clutter:
                 labels_onehot_smooth[b, -1, -1] = 1.0
@@ -6112,23 +6213,14 @@ class Meshes(OD3D_Objects3D):
         if device is None:
             device = self.device
 
-        labels_onehot_all = self.get_geodesic_prob().clone().to(device)
-
-        if add_other_objects:
-            labels_onehot_smooth = labels_onehot_all[
-                self.verts_counts_acc_from_0[object_id] : self.verts_counts_acc_from_0[
-                    object_id + 1
-                ]
-            ]
-        else:
-            labels_onehot_smooth = labels_onehot_all[
-                self.verts_counts_acc_from_0[object_id] : self.verts_counts_acc_from_0[
-                    object_id + 1
-                ],
-                self.verts_counts_acc_from_0[object_id] : self.verts_counts_acc_from_0[
-                    object_id + 1
-                ],
-            ]
+        labels_onehot_smooth = self.get_geodesic_prob_rows(
+            verts_ids=torch.arange(
+                self.verts_counts_acc_from_0[object_id],
+                self.verts_counts_acc_from_0[object_id + 1],
+            ),
+            mesh_id=None if add_other_objects else object_id,
+            device=device,
+        )
 
         if add_clutter:
             _labels_onehot_smooth = torch.zeros(
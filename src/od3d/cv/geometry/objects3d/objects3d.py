@@ -1186,6 +1186,100 @@ class OD3D_Objects3D(abc.ABC, nn.Module):
             feats2d_rendered = mods_rendered
             mask_rendered = None
 
+        return self.get_sim_rendered(
+            feats2d_img=feats2d_img,
+            feats2d_rendered=feats2d_rendered,
+            mask_rendered=mask_rendered,
+            broadcast_batch_and_cams=broadcast_batch_and_cams,
+            feats2d_img_mask=feats2d_img_mask,
+            allow_clutter=allow_clutter,
+            return_sim_pxl=return_sim_pxl,
+            temp=temp,
+            objects_ids=objects_ids,
+            normalize_surface=normalize_surface,
+            object_mask=object_mask,
+            use_neg_mse=use_neg_mse,
+        )
+
+    def get_sim_templates(
+        self,
+        templates,
+        feats2d_img,
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        objects_ids,
+        down_sample_rate=1.0,
+        feats2d_img_mask=None,
+        allow_clutter=True,
+        return_sim_pxl=False,
+        temp=1.0,
+        normalize_surface=False,
+        object_mask=None,
+        use_neg_mse=False,
+    ):
+        """
+        As get_sim_render with broadcast_batch_and_cams=True, but warps pre-rendered templates instead of rendering.
+
+        Args:
+            templates (OD3D_Objects3D_Templates): templates with the same rotations as cams_tform4x4_obj
+            feats2d_img (torch.Tensor): BxCxHxW
+            cams_tform4x4_obj: (B, T, 4, 4) tensor of camera poses in the object frame.
+            cams_intr4x4: (B, T, 4, 4) tensor of camera intrinsics.
+            objects_ids: (B, ) tensor of objects ids.
+        Returns:
+            sim (torch.Tensor): BxT
+            sim_feats2d (torch.Tensor, optional): BxTxHxW
+        """
+        cams_intr4x4, _ = self.cams_downsample(
+            cams_intr4x4,
+            None,
+            down_sample_rate,
+        )
+        feats2d_rendered, mask_rendered = templates.warp(
+            cams_tform4x4_obj=cams_tform4x4_obj,
+            cams_intr4x4=cams_intr4x4,
+            objects_ids=objects_ids,
+            imgs_sizes=feats2d_img.shape[-2:],
+        )
+        return self.get_sim_rendered(
+            feats2d_img=feats2d_img,
+            feats2d_rendered=feats2d_rendered,
+            mask_rendered=mask_rendered if object_mask is not None else None,
+            broadcast_batch_and_cams=True,
+            feats2d_img_mask=feats2d_img_mask,
+            allow_clutter=allow_clutter,
+            return_sim_pxl=return_sim_pxl,
+            temp=temp,
+            objects_ids=objects_ids,
+            normalize_surface=normalize_surface,
+            object_mask=object_mask,
+            use_neg_mse=use_neg_mse,
+        )
+
+    def get_sim_rendered(
+        self,
+        feats2d_img,
+        feats2d_rendered,
+        mask_rendered=None,
+        broadcast_batch_and_cams=False,
+        feats2d_img_mask=None,
+        allow_clutter=True,
+        return_sim_pxl=False,
+        temp=1.0,
+        objects_ids=None,
+        normalize_surface=False,
+        object_mask=None,
+        use_neg_mse=False,
+    ):
+        """
+        Args:
+            feats2d_img (torch.Tensor): BxCxHxW
+            feats2d_rendered (torch.Tensor): Bx(T)xCxHxW
+            mask_rendered (torch.Tensor): Bx(T)x1xHxW, required if object_mask is not None
+        Returns:
+            sim (torch.Tensor): Bx(T)
+            sim_feats2d (torch.Tensor, optional): Bx(T)xHxW
+        """
         sim = self.get_sim_feats2d_img_and_rendered(
             feats2d_img,
             feats2d_rendered,
@@ -0,0 +1,315 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import torch
+
+OD3D_TEMPLATES_VERSION = 1
+
+
+class OD3D_Objects3D_Templates:
+    """
+    Features and masks of all objects rendered once for a fixed grid of camera rotations, at a canonical
+    distance and intrinsics. Renderings for the same rotations with other translations and intrinsics are
+    approximated by warping the templates with the depth of the object center, which replaces the
+    rasterization of B x T renderings by sampling.
+
+    Templates are stored per objects state and grid at path_cache/<hash>, and memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        feats: np.ndarray,
+        masks: np.ndarray,
+        feat_bg: np.ndarray,
+        cams_tform4x4_obj: torch.Tensor,
+        cams_intr4x4: torch.Tensor,
+    ):
+        """
+        Args:
+            feats (np.ndarray): MxTxFxHxW
+            masks (np.ndarray): MxTx1xHxW
+            feat_bg (np.ndarray): F, rendered background feature
+            cams_tform4x4_obj (torch.Tensor): MxTx4x4
+            cams_intr4x4 (torch.Tensor): Mx4x4, at the templates resolution
+        """
+        self.feats = feats
+        self.masks = masks
+        self.feat_bg = torch.from_numpy(np.array(feat_bg))
+        self.cams_tform4x4_obj = cams_tform4x4_obj
+        self.cams_intr4x4 = cams_intr4x4
+        self.feats_device = {}
+        self.masks_device = {}
+
+    @property
+    def imgs_sizes(self):
+        return torch.LongTensor(list(self.feats.shape[-2:]))
+
+    def __len__(self):
+        return self.feats.shape[0]
+
+    @staticmethod
+    def get_hash(objects3d, cams_tform4x4_obj: torch.Tensor, imgs_sizes):
+        hash = hashlib.sha1()
+        hash.update(f"v{OD3D_TEMPLATES_VERSION}".encode("utf-8"))
+        tensors = dict(objects3d.state_dict())
+        if isinstance(getattr(objects3d, "verts", None), torch.Tensor):
+            tensors["verts"] = objects3d.verts
+        for key in sorted(tensors.keys()):
+            hash.update(key.encode("utf-8"))
+            hash.update(tensors[key].detach().cpu().contiguous().numpy().tobytes())
+        hash.update(
+            cams_tform4x4_obj.detach().cpu().to(torch.float32).numpy().tobytes(),
+        )
+        hash.update(f"sizes={[int(s) for s in imgs_sizes]}".encode("utf-8"))
+        return hash.hexdigest()
+
+    @staticmethod
+    @torch.no_grad()
+    def render(objects3d, cams_tform4x4_obj: torch.Tensor, imgs_sizes):
+        """
+        Args:
+            cams_tform4x4_obj (torch.Tensor): Tx4x4, translations are ignored.
+            imgs_sizes: (H, W) at the templates resolution
+        Returns:
+            arrays (Dict[str, np.ndarray]): feats, masks, feat_bg, cams_tform4x4_obj, cams_intr4x4
+        """
+        from od3d.cv.geometry.objects3d.objects3d import PROJECT_MODALITIES
+
+        device = cams_tform4x4_obj.device
+        H, W = int(imgs_sizes[0]), int(imgs_sizes[1])
+        T = len(cams_tform4x4_obj)
+        M = len(objects3d)
+
+        # the object fits into the inner 90% of the templates
+        fxy = float(max(H, W))
+        cams_intr4x4 = torch.eye(4, device=device)[None,].repeat(M, 1, 1)
+        cams_intr4x4[:, 0, 0] = fxy
+        cams_intr4x4[:, 1, 1] = fxy
+        cams_intr4x4[:, 0, 2] = W / 2.0
+        cams_intr4x4[:, 1, 2] = H / 2.0
+
+        feats = []
+        masks = []
+        templates_cams_tform4x4_obj = []
+        for m in range(M):
+            pts3d = objects3d.sample(
+                objects_ids=torch.LongTensor([m]).to(device=device),
+                modalities=PROJECT_MODALITIES.PT3D,
+                add_clutter=False,
+                add_other_objects=False,
+            )
+            radius = pts3d.norm(dim=-1).max()
+            dist = radius * (1.0 + fxy / (0.45 * min(H, W)))
+            _cams_tform4x4_obj = cams_tform4x4_obj.clone()
+            _cams_tform4x4_obj[:, :3, 3] = 0.0
+            _cams_tform4x4_obj[:, 2, 3] = dist
+            mods = objects3d.render(
+                cams_tform4x4_obj=_cams_tform4x4_obj[None,],
+                cams_intr4x4=cams_intr4x4[m : m + 1, None].expand(1, T, 4, 4),
+                imgs_sizes=torch.LongTensor([H, W]),
+                objects_ids=torch.LongTensor([m]).to(device=device),
+                modalities=[PROJECT_MODALITIES.FEATS, PROJECT_MODALITIES.MASK],
+                broadcast_batch_and_cams=True,
+                add_clutter=True,
+                add_other_objects=False,
+            )
+            feats.append(
+                mods[PROJECT_MODALITIES.FEATS][0].to(torch.float16).cpu().numpy(),
+            )
+            masks.append(
+                mods[PROJECT_MODALITIES.MASK][0].to(torch.float16).cpu().numpy(),
+            )
+            templates_cams_tform4x4_obj.append(_cams_tform4x4_obj.cpu().numpy())
+
+        return {
+            "feats": np.stack(feats),
+            "masks": np.stack(masks),
+            "feat_bg": objects3d.feat_clutter.detach().cpu().to(torch.float32).numpy(),
+            "cams_tform4x4_obj": np.stack(templates_cams_tform4x4_obj),
+            "cams_intr4x4": cams_intr4x4.cpu().numpy(),
+        }
+
+    @staticmethod
+    def write(path_templates: Path, arrays):
+        path_templates = Path(path_templates)
+        path_tmp = path_templates.with_name(
+            f"{path_templates.name}.{os.getpid()}.{np.random.randint(1 << 30)}.tmp",
+        )
+        path_tmp.mkdir(parents=True, exist_ok=True)
+        for key, arr in arrays.items():
+            np.save(path_tmp.joinpath(f"{key}.npy"), np.ascontiguousarray(arr))
+        try:
+            path_tmp.rename(path_templates)
+        except OSError:
+            # another process wrote the same templates meanwhile
+            shutil.rmtree(path_tmp, ignore_errors=True)
+
+    @classmethod
+    def read(cls, path_templates: Path):
+        path_templates = Path(path_templates)
+
+        def load(key):
+            return np.load(path_templates.joinpath(f"{key}.npy"), mmap_mode="r")
+
+        return cls(
+            feats=load("feats"),
+            masks=load("masks"),
+            feat_bg=load("feat_bg"),
+            cams_tform4x4_obj=torch.from_numpy(np.array(load("cams_tform4x4_obj"))),
+            cams_intr4x4=torch.from_numpy(np.array(load("cams_intr4x4"))),
+        )
+
+    @classmethod
+    def create_from_objects3d(
+        cls,
+        objects3d,
+        cams_tform4x4_obj: torch.Tensor,
+        imgs_sizes,
+        path_cache: Path = None,
+    ):
+        """
+        Args:
+            objects3d (OD3D_Objects3D): objects to render
+            cams_tform4x4_obj (torch.Tensor): Tx4x4, camera rotations of the grid
+            imgs_sizes: (H, W) at the templates resolution, e.g. the size of the feature maps
+            path_cache (Path): if not None, templates are stored and memory-mapped from path_cache/<hash>
+        """
+        if path_cache is None:
+            arrays = cls.render(
+                objects3d=objects3d,
+                cams_tform4x4_obj=cams_tform4x4_obj,
+                imgs_sizes=imgs_sizes,
+            )
+            return cls(
+                feats=arrays["feats"],
+                masks=arrays["masks"],
+                feat_bg=arrays["feat_bg"],
+                cams_tform4x4_obj=torch.from_numpy(arrays["cams_tform4x4_obj"]),
+                cams_intr4x4=torch.from_numpy(arrays["cams_intr4x4"]),
+            )
+
+        path_templates = Path(path_cache).joinpath(
+            cls.get_hash(
+                objects3d=objects3d,
+                cams_tform4x4_obj=cams_tform4x4_obj,
+                imgs_sizes=imgs_sizes,
+            ),
+        )
+        if not path_templates.exists():
+            logger.info(
+                f"render {len(cams_tform4x4_obj)} templates for {len(objects3d)} objects to {path_templates}",
+            )
+            cls.write(
+                path_templates=path_templates,
+                arrays=cls.render(
+                    objects3d=objects3d,
+                    cams_tform4x4_obj=cams_tform4x4_obj,
+                    imgs_sizes=imgs_sizes,
+                ),
+            )
+        else:
+            logger.info(f"load templates from {path_templates}")
+        return cls.read(path_templates=path_templates)
+
+    def get_templates_with_objects_ids(self, objects_ids: torch.LongTensor, device):
+        """Returns feats (BxTxFxHxW) and masks (BxTx1xHxW), objects are moved to the device once."""
+        objects_ids = objects_ids.tolist()
+        for object_id in set(objects_ids):
+            if object_id not in self.feats_device:
+                self.feats_device[object_id] = torch.from_numpy(
+                    np.array(self.feats[object_id]),
+                ).to(device=device)
+                self.masks_device[object_id] = torch.from_numpy(
+                    np.array(self.masks[object_id]),
+                ).to(device=device)
+        feats = torch.stack([self.feats_device[i] for i in objects_ids])
+        masks = torch.stack([self.masks_device[i] for i in objects_ids])
+        return feats, masks
+
+    def warp(
+        self,
+        cams_tform4x4_obj: torch.Tensor,
+        cams_intr4x4: torch.Tensor,
+        objects_ids: torch.LongTensor,
+        imgs_sizes=None,
+    ):
+        """
+        Approximates the renderings of the templates with the given cameras, assuming all surface points at
+        the depth of the object center.
+
+        Args:
+            cams_tform4x4_obj (torch.Tensor): BxTx4x4, rotations as the templates grid
+            cams_intr4x4 (torch.Tensor): BxTx4x4, at the templates resolution
+            objects_ids (torch.LongTensor): B
+            imgs_sizes: (H, W), defaults to the templates resolution
+        Returns:
+            feats (torch.Tensor): BxTxFxHxW
+            masks (torch.Tensor): BxTx1xHxW
+        """
+        from od3d.cv.geometry.grid import get_pxl2d
+        from od3d.cv.geometry.transform import (
+            add_homog_dim,
+            inv_tform4x4,
+            proj3d2d_broadcast,
+            tform4x4,
+            transf3d_broadcast,
+        )
+        from od3d.cv.visual.sample import sample_pxl2d_grid
+
+        device = cams_tform4x4_obj.device
+        dtype = cams_tform4x4_obj.dtype
+        feats, masks = self.get_templates_with_objects_ids(
+            objects_ids=objects_ids,
+            device=device,
+        )
+        B, T, F, H_t, W_t = feats.shape
+        if imgs_sizes is None:
+            imgs_sizes = self.imgs_sizes
+        H, W = int(imgs_sizes[0]), int(imgs_sizes[1])
+
+        templates_cams_tform4x4_obj = self.cams_tform4x4_obj.to(device=device)[
+            objects_ids
+        ].to(dtype=dtype)
+        templates_cams_intr4x4 = self.cams_intr4x4.to(device=device)[objects_ids].to(
+            dtype=dtype,
+        )
+
+        pxl2d = get_pxl2d(H=H, W=W, dtype=dtype, device=device)
+        # B x T x H x W x 3
+        pts3d_cams = transf3d_broadcast(
+            pts3d=add_homog_dim(pxl2d, dim=-1)[None, None],
+            transf4x4=cams_intr4x4.pinverse()[:, :, None, None],
+        ) * (cams_tform4x4_obj[:, :, 2, 3, None, None, None])
+        pts3d_templates = transf3d_broadcast(
+            pts3d=pts3d_cams,
+            transf4x4=tform4x4(
+                templates_cams_tform4x4_obj,
+                inv_tform4x4(cams_tform4x4_obj),
+            )[:, :, None, None],
+        )
+        pxl2d_templates = proj3d2d_broadcast(
+            pts3d=pts3d_templates,
+            proj4x4=templates_cams_intr4x4[:, None, None, None],
+        )
+
+        feat_bg = self.feat_bg.to(device=device, dtype=dtype)[:, None, None]
+        # outside of the templates only the background remains
+        feats = (
+            sample_pxl2d_grid(
+                feats.reshape(-1, F, H_t, W_t).to(dtype=dtype) - feat_bg,
+                pxl2d=pxl2d_templates.reshape(-1, H, W, 2),
+            ).reshape(B, T, F, H, W)
+            + feat_bg
+        )
+        masks = sample_pxl2d_grid(
+            masks.reshape(-1, 1, H_t, W_t).to(dtype=dtype),
+            pxl2d=pxl2d_templates.reshape(-1, H, W, 2),
+        ).reshape(B, T, 1, H, W)
+        return feats, masks
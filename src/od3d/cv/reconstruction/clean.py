@@ -1,27 +1,73 @@
 import logging
 
 logger = logging.getLogger(__name__)
+from typing import Callable, List, Union
+
 import torch
 from od3d.cv.geometry.downsample import random_sampling
 from od3d.cv.geometry.transform import proj3d2d_broadcast, transf3d_broadcast
 from od3d.cv.visual.sample import sample_pxl2d_pts
 
 
-def get_pcl_clean_with_masks(
+def get_pcl_masks_votes(
     pcl,
     masks,
     cams_tform4x4_obj,
     cams_intr4x4,
+):
+    """
+    Args:
+        pcl (torch.Tensor): Nx3
+        masks (torch.Tensor): Fx1xHxW
+        cams_tform4x4_obj (torch.Tensor): Fx4x4
+        cams_intr4x4 (torch.Tensor): Fx4x4, w.r.t. the resolution of the masks
+    Returns:
+        votes (torch.Tensor): N, sum over frames of the mask values at the projected points
+    """
+    cam_tform_pts3d = transf3d_broadcast(
+        pts3d=pcl,
+        transf4x4=cams_tform4x4_obj[:, None],
+    )
+    pxl2d = proj3d2d_broadcast(pts3d=cam_tform_pts3d, proj4x4=cams_intr4x4[:, None])
+    votes = (
+        (cam_tform_pts3d[:, :, 2:] > 0.0)
+        * sample_pxl2d_pts(
+            masks,
+            pxl2d=pxl2d,
+            padding_mode="value",
+            padding_value=0.0,
+        )
+    ).sum(dim=0)[..., 0]
+    return votes
+
+
+def get_pcl_clean_with_masks(
+    pcl,
+    masks: Union[torch.Tensor, Callable[[List[int]], torch.Tensor]],
+    cams_tform4x4_obj,
+    cams_intr4x4,
     pts3d_prob_thresh=0.6,
     pts3d_count_min=10,
     pts3d_max_count=20000,
     return_mask=False,
+    frames_chunk_size=None,
+    masks_scale=1.0,
 ):
     """
-    Args:
+    Keeps the points which project into the masks for more than pts3d_prob_thresh of the frames.
+    Frames are processed in chunks of frames_chunk_size, which accumulate the per point votes,
+    such that only a chunk of masks is on the device at once.
 
+    Args:
+        pcl (torch.Tensor): Nx3
+        masks (torch.Tensor | Callable): Fx1xHxW, or a function which reads the masks of the given frames ids.
+        cams_tform4x4_obj (torch.Tensor): Fx4x4
+        cams_intr4x4 (torch.Tensor): Fx4x4
+        frames_chunk_size (int): frames per chunk, None processes all frames at once.
+        masks_scale (float): masks are downsampled by this factor before they are moved to the device.
     Returns:
-
+        pcl_clean (torch.Tensor): Mx3
+        mask_pcl (torch.Tensor): N, only if return_mask
     """
     # cams_proj4x4_obj = tform4x4(cams_intr4x4, cams_tform4x4_obj)
     pcl_sampled, mask_pcl = random_sampling(
@@ -30,27 +76,52 @@ def get_pcl_clean_with_masks(
         return_mask=True,
     )
 
-    pts3d_prob = torch.zeros(
-        size=(pcl_sampled.shape[0], 1),
+    frames_count = len(cams_tform4x4_obj)
+    if frames_chunk_size is None:
+        frames_chunk_size = max(frames_count, 1)
+
+    pts3d_votes = torch.zeros(
+        size=(pcl_sampled.shape[0],),
         device=pcl.device,
         dtype=pcl.dtype,
     )
-    cam_tform_pts3d = transf3d_broadcast(
-        pts3d=pcl_sampled,
-        transf4x4=cams_tform4x4_obj[:, None],
-    )
-    pxl2d = proj3d2d_broadcast(pts3d=cam_tform_pts3d, proj4x4=cams_intr4x4[:, None])
-    pts3d_prob += (
-        (cam_tform_pts3d[:, :, 2:] > 0.0)
-        * sample_pxl2d_pts(
-            masks,
-            pxl2d=pxl2d,
-            padding_mode="value",
-            padding_value=0.0,
+    for frame_id_start in range(0, frames_count, frames_chunk_size):
+        frames_ids = list(
+            range(
+                frame_id_start, min(frame_id_start + frames_chunk_size, frames_count)
+            ),
         )
-    ).sum(dim=0)
-    pts3d_prob = pts3d_prob / len(masks)
-    mask_pcl[mask_pcl.clone()] *= pts3d_prob[..., 0] > pts3d_prob_thresh
+        if isinstance(masks, torch.Tensor):
+            masks_chunk = masks[frames_ids[0] : frames_ids[-1] + 1]
+        else:
+            masks_chunk = masks(frames_ids)
+
+        cams_intr4x4_chunk = cams_intr4x4[frames_ids[0] : frames_ids[-1] + 1]
+        if masks_scale != 1.0:
+            H, W = masks_chunk.shape[-2:]
+            H_scaled = max(int(H * masks_scale), 2)
+            W_scaled = max(int(W * masks_scale), 2)
+            masks_chunk = torch.nn.functional.interpolate(
+                masks_chunk.to(dtype=pcl.dtype),
+                size=(H_scaled, W_scaled),
+                mode="bilinear",
+                align_corners=True,
+            )
+            # pixels are sampled with align_corners=True
+            cams_intr4x4_chunk = cams_intr4x4_chunk.clone()
+            cams_intr4x4_chunk[:, 0] *= (W_scaled - 1.0) / (W - 1.0)
+            cams_intr4x4_chunk[:, 1] *= (H_scaled - 1.0) / (H - 1.0)
+
+        pts3d_votes += get_pcl_masks_votes(
+            pcl=pcl_sampled,
+            masks=masks_chunk.to(device=pcl.device),
+            cams_tform4x4_obj=cams_tform4x4_obj[frames_ids[0] : frames_ids[-1] + 1],
+            cams_intr4x4=cams_intr4x4_chunk,
+        )
+        del masks_chunk
+
+    pts3d_prob = pts3d_votes / frames_count
+    mask_pcl[mask_pcl.clone()] *= pts3d_prob > pts3d_prob_thresh
     pcl_clean = pcl[mask_pcl]
 
     if len(pcl_clean) < pts3d_count_min:
@@ -7,6 +7,293 @@ from typing import Union
 
 
 def rasterize_gaussians(
+    cams_tform4x4_obj: torch.Tensor,
+    cams_intr4x4: torch.Tensor,
+    imgs_size: torch.Tensor,
+    pts3d: torch.Tensor,
+    pts3d_mask: torch.Tensor,
+    pts3d_size: Union[float, torch.Tensor] = 0.01,
+    pts3d_opacity: Union[float, torch.Tensor] = 1.0,
+    pts3d_rotation: torch.Tensor = None,
+    z_far: float = 10000.0,
+    z_near: float = 0.01,
+    topK: int = 3,
+    sigma_cutoff: float = 3.0,
+    tile_size: int = 16,
+    max_candidates: int = 2**24,
+):
+    """
+    Rasterizes the gaussians of all batch elements at once. Each gaussian is binned into the image tiles covered by
+    its sigma_cutoff footprint. The depth sorted gaussians of each tile are alpha composited in slices, while the topK
+    gaussians with the largest contribution are kept per pixel.
+    Without topK, falls back to rasterize_gaussians_dense.
+
+    Args:
+        cams_tform4x4_obj (torch.Tensor): B x 4 x 4,
+        cams_intr4x4 (torch.Tensor): B x 4 x 4,
+        imgs_size (torch.Tensor): 2, (height, width)
+        pts3d (torch.Tensor): B x N x 3
+        pts3d_mask (torch.Tensor): B x N
+        pts3d_size (Union[float, torch.Tensor]): float or B x N  or B x N x 3
+        pts3d_opacity (Union[float, torch.Tensor]): float or B x N
+        pts3d_rotation (torch.Tensor): B x N x 4, quaternions
+        z_far (float)
+        z_near (float)
+        topK (int): number of gaussians per pixel
+        sigma_cutoff (float): gaussians are neglected beyond sigma_cutoff standard deviations
+        tile_size (int): side length of the image tiles in pixels
+        max_candidates (int): upper bound of pixel-gaussian pairs evaluated at once
+    Returns:
+        px_to_gs_id (torch.Tensor): B x H x W x topK, ids in N
+        px_to_gs_opacity (torch.Tensor): B x H x W x topK
+        gs_depth (torch.Tensor): B x N
+        gs_normal (list): empty
+    """
+    if topK is None:
+        return rasterize_gaussians_dense(
+            cams_tform4x4_obj=cams_tform4x4_obj,
+            cams_intr4x4=cams_intr4x4,
+            imgs_size=imgs_size,
+            pts3d=pts3d,
+            pts3d_mask=pts3d_mask,
+            pts3d_size=pts3d_size,
+            pts3d_opacity=pts3d_opacity,
+            pts3d_rotation=pts3d_rotation,
+            z_far=z_far,
+            z_near=z_near,
+            topK=topK,
+        )
+
+    device = pts3d.device
+    dtype = pts3d.dtype
+    B, N = pts3d.shape[:2]
+    H, W = int(imgs_size[0]), int(imgs_size[1])
+    K = topK
+    T = tile_size
+    tiles_x = (W + T - 1) // T
+    tiles_y = (H + T - 1) // T
+    tiles_count = B * tiles_y * tiles_x
+    gs_normal = []
+
+    # B x N x 3
+    pts3d_cam = transf3d_broadcast(pts3d=pts3d, transf4x4=cams_tform4x4_obj[:, None])
+    gs_depth = pts3d_cam[..., 2]
+    means2d = proj3d2d_broadcast(pts3d=pts3d_cam, proj4x4=cams_intr4x4[:, None])
+
+    if isinstance(pts3d_size, float):
+        pts3d_size = torch.ones_like(pts3d) * pts3d_size
+    elif pts3d_size.dim() == 2:
+        pts3d_size = pts3d_size[..., None].expand(B, N, 3)
+    if isinstance(pts3d_opacity, torch.Tensor):
+        pts3d_opacity = pts3d_opacity.reshape(B, N)
+    else:
+        pts3d_opacity = torch.full((B, N), pts3d_opacity, device=device, dtype=dtype)
+
+    cov3d_var = pts3d_size**2
+    if pts3d_rotation is None:
+        cov3d = torch.diag_embed(cov3d_var)
+    else:
+        from pytorch3d.transforms import quaternion_to_matrix
+
+        cov3d = quaternion_to_matrix(pts3d_rotation) * cov3d_var[..., None]
+
+    # J_K = [fx/z, 0, -fx*x/z^2; 0, fy/z, -fy*y/z^2]
+    fx = cams_intr4x4[:, None, 0, 0]
+    fy = cams_intr4x4[:, None, 1, 1]
+    jacobian3d2d = torch.zeros((B, N, 2, 3), device=device, dtype=dtype)
+    jacobian3d2d[..., 0, 0] = fx / (gs_depth.abs() + 1e-10)
+    jacobian3d2d[..., 0, 2] = -fx * pts3d_cam[..., 0] / (gs_depth**2 + 1e-10)
+    jacobian3d2d[..., 1, 1] = fy / (gs_depth.abs() + 1e-10)
+    jacobian3d2d[..., 1, 2] = -fy * pts3d_cam[..., 1] / (gs_depth**2 + 1e-10)
+    cov2d = jacobian3d2d @ cov3d @ jacobian3d2d.transpose(-1, -2)
+
+    gs_valid = pts3d_mask.bool() & (gs_depth > z_near) & (gs_depth < z_far)
+    cov2d = torch.where(
+        gs_valid[..., None, None],
+        cov2d,
+        torch.eye(2, device=device, dtype=dtype).expand(B, N, 2, 2),
+    )
+    inv_cov2d = torch.inverse(cov2d)
+
+    # pixel bounding boxes of the sigma_cutoff footprints, pixels are at integer coordinates
+    means2d_detached = means2d.detach()
+    radius2d = (
+        sigma_cutoff * cov2d.detach().diagonal(dim1=-2, dim2=-1).clamp(min=0).sqrt()
+    )
+    x_min = torch.ceil(means2d_detached[..., 0] - radius2d[..., 0])
+    x_max = torch.floor(means2d_detached[..., 0] + radius2d[..., 0])
+    y_min = torch.ceil(means2d_detached[..., 1] - radius2d[..., 1])
+    y_max = torch.floor(means2d_detached[..., 1] + radius2d[..., 1])
+    gs_valid = (
+        gs_valid
+        & (x_max >= 0)
+        & (x_min <= W - 1)
+        & (y_max >= 0)
+        & (y_min <= H - 1)
+        & torch.isfinite(x_min + x_max + y_min + y_max)
+    )
+    tx0 = x_min.clamp(0, W - 1).long() // T
+    tx1 = x_max.clamp(0, W - 1).long() // T
+    ty0 = y_min.clamp(0, H - 1).long() // T
+    ty1 = y_max.clamp(0, H - 1).long() // T
+
+    px_to_gs_id = torch.zeros((tiles_count, T * T, K), dtype=torch.long, device=device)
+    px_to_gs_opacity = torch.zeros((tiles_count, T * T, K), dtype=dtype, device=device)
+
+    def get_outputs():
+        def tiles_to_imgs(x):
+            x = x.reshape(B, tiles_y, tiles_x, T, T, K).permute(0, 1, 3, 2, 4, 5)
+            return x.reshape(B, tiles_y * T, tiles_x * T, K)[:, :H, :W]
+
+        return (
+            tiles_to_imgs(px_to_gs_id),
+            tiles_to_imgs(px_to_gs_opacity),
+            gs_depth,
+            gs_normal,
+        )
+
+    gs_b, gs_n = gs_valid.nonzero(as_tuple=True)
+    if len(gs_b) == 0:
+        return get_outputs()
+
+    # bin gaussians into tiles: one (gaussian, tile) pair per covered tile
+    tnx = tx1[gs_b, gs_n] - tx0[gs_b, gs_n] + 1
+    tny = ty1[gs_b, gs_n] - ty0[gs_b, gs_n] + 1
+    tcounts = tnx * tny
+    pairs_gs = torch.repeat_interleave(torch.arange(len(gs_b), device=device), tcounts)
+    pairs_offsets = torch.arange(
+        len(pairs_gs), device=device
+    ) - torch.repeat_interleave(
+        torch.cumsum(tcounts, dim=0) - tcounts,
+        tcounts,
+    )
+    pairs_tx = tx0[gs_b, gs_n][pairs_gs] + pairs_offsets % tnx[pairs_gs]
+    pairs_ty = ty0[gs_b, gs_n][pairs_gs] + pairs_offsets // tnx[pairs_gs]
+    pairs_tiles = (gs_b[pairs_gs] * tiles_y + pairs_ty) * tiles_x + pairs_tx
+
+    # sort by depth, then by tile, and rank the gaussians front to back within each tile
+    order = torch.sort(gs_depth[gs_b, gs_n].detach()[pairs_gs], stable=True).indices
+    order = order[torch.sort(pairs_tiles[order], stable=True).indices]
+    pairs_gs = pairs_gs[order]
+    pairs_tiles = pairs_tiles[order]
+    tiles_unique, tiles_pairs_counts = torch.unique_consecutive(
+        pairs_tiles,
+        return_counts=True,
+    )
+    pairs_rank = torch.arange(len(pairs_gs), device=device) - torch.repeat_interleave(
+        torch.cumsum(tiles_pairs_counts, dim=0) - tiles_pairs_counts,
+        tiles_pairs_counts,
+    )
+
+    tile_dy, tile_dx = torch.meshgrid(
+        torch.arange(T, device=device),
+        torch.arange(T, device=device),
+        indexing="ij",
+    )
+    tile_dx = tile_dx.reshape(-1)
+    tile_dy = tile_dy.reshape(-1)
+    tiles_px_x = ((tiles_unique % tiles_x) * T)[:, None] + tile_dx[None]
+    tiles_px_y = (((tiles_unique // tiles_x) % tiles_y) * T)[:, None] + tile_dy[None]
+    tiles_px = torch.stack([tiles_px_x, tiles_px_y], dim=-1).to(dtype=dtype)
+
+    # composite in slices of at most S gaussians per tile, front to back
+    S = max(1, max_candidates // (len(tiles_unique) * T * T))
+    tiles_transmittance = torch.ones(
+        (len(tiles_unique), T * T), dtype=dtype, device=device
+    )
+    tiles_opacity_total = torch.zeros(
+        (len(tiles_unique), T * T), dtype=dtype, device=device
+    )
+    tiles_gs_id = torch.zeros(
+        (len(tiles_unique), T * T, K), dtype=torch.long, device=device
+    )
+    tiles_gs_opacity = torch.zeros(
+        (len(tiles_unique), T * T, K), dtype=dtype, device=device
+    )
+    pairs_tiles_local = torch.repeat_interleave(
+        torch.arange(len(tiles_unique), device=device),
+        tiles_pairs_counts,
+    )
+    slices_count = int(tiles_pairs_counts.max())
+    for slice_start in range(0, slices_count, S):
+        slice_tiles = (tiles_pairs_counts > slice_start).nonzero()[:, 0]
+        slice_pairs_mask = (pairs_rank >= slice_start) & (pairs_rank < slice_start + S)
+        slice_pairs = slice_pairs_mask.nonzero()[:, 0]
+        # tiles_active x S, padded with the first gaussian at zero opacity
+        slice_tiles_local = torch.searchsorted(
+            slice_tiles, pairs_tiles_local[slice_pairs]
+        )
+        slice_gs = torch.zeros((len(slice_tiles), S), dtype=torch.long, device=device)
+        slice_gs_mask = torch.zeros(
+            (len(slice_tiles), S), dtype=torch.bool, device=device
+        )
+        slice_gs[slice_tiles_local, pairs_rank[slice_pairs] - slice_start] = pairs_gs[
+            slice_pairs
+        ]
+        slice_gs_mask[slice_tiles_local, pairs_rank[slice_pairs] - slice_start] = True
+        slice_b = gs_b[slice_gs]
+        slice_n = gs_n[slice_gs]
+
+        # tiles_active x T*T x S
+        dist2d = (
+            tiles_px[slice_tiles][:, :, None] - means2d[slice_b, slice_n][:, None]
+        ).abs()
+        slice_inv_cov2d = inv_cov2d[slice_b, slice_n][:, None]
+        cov_dist = (
+            (dist2d[..., 0] ** 2) * slice_inv_cov2d[..., 0, 0]
+            + (dist2d[..., 1] ** 2) * slice_inv_cov2d[..., 1, 1]
+            + 2 * dist2d[..., 0] * dist2d[..., 1] * slice_inv_cov2d[..., 0, 1]
+        )
+        slice_px_x = tiles_px_x[slice_tiles][:, :, None]
+        slice_px_y = tiles_px_y[slice_tiles][:, :, None]
+        footprint = (
+            slice_gs_mask[:, None]
+            & (slice_px_x >= x_min[slice_b, slice_n][:, None])
+            & (slice_px_x <= x_max[slice_b, slice_n][:, None])
+            & (slice_px_y >= y_min[slice_b, slice_n][:, None])
+            & (slice_px_y <= y_max[slice_b, slice_n][:, None])
+        )
+        alpha = (
+            pts3d_opacity[slice_b, slice_n][:, None]
+            * torch.exp(-0.5 * cov_dist)
+            * footprint
+        )
+        transmittance_excl = torch.cumprod(
+            torch.cat([torch.ones_like(alpha[..., :1]), 1.0 - alpha[..., :-1]], dim=-1),
+            dim=-1,
+        )
+        opacity = (
+            tiles_transmittance[slice_tiles][..., None] * alpha * transmittance_excl
+        )
+        tiles_transmittance[slice_tiles] = tiles_transmittance[slice_tiles] * (
+            transmittance_excl[..., -1] * (1.0 - alpha[..., -1])
+        )
+        tiles_opacity_total[slice_tiles] += opacity.detach().sum(dim=-1)
+
+        # streaming top-K merge
+        cand_opacity = torch.cat([tiles_gs_opacity[slice_tiles], opacity], dim=-1)
+        cand_gs_id = torch.cat(
+            [tiles_gs_id[slice_tiles], slice_n[:, None].expand(-1, T * T, -1)],
+            dim=-1,
+        )
+        topk_ids = cand_opacity.detach().topk(k=K, dim=-1).indices
+        tiles_gs_opacity[slice_tiles] = torch.gather(
+            cand_opacity, dim=-1, index=topk_ids
+        )
+        tiles_gs_id[slice_tiles] = torch.gather(cand_gs_id, dim=-1, index=topk_ids)
+
+    # rescale the topK contributions to the total contribution
+    tiles_gs_opacity_partial = tiles_gs_opacity.detach().sum(dim=-1, keepdim=True)
+    tiles_gs_opacity = tiles_gs_opacity * (
+        tiles_opacity_total[..., None] / (tiles_gs_opacity_partial + 1e-10)
+    ).clamp(0, 10)
+
+    px_to_gs_id = px_to_gs_id.index_put((tiles_unique,), tiles_gs_id)
+    px_to_gs_opacity = px_to_gs_opacity.index_put((tiles_unique,), tiles_gs_opacity)
+    return get_outputs()
+
+
+def rasterize_gaussians_dense(
     cams_tform4x4_obj: torch.Tensor,
     cams_intr4x4: torch.Tensor,
     imgs_size: torch.Tensor,
@@ -21,6 +308,8 @@ def rasterize_gaussians(
     topK: int = 3,
 ):
     """
+    Rasterizes per batch element with dense pixel x gaussian buffers (H x W x N).
+
     Args:
         cams_tform4x4_obj (torch.Tensor): B x 4 x 4,
         cams_intr4x4 (torch.Tensor): B x 4 x 4,
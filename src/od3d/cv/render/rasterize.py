@@ -0,0 +1,320 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+from dataclasses import dataclass
+
+import torch
+
+
+@dataclass
+class RasterFragments:
+    """
+    Output of rasterize_meshes, with the same fields as pytorch3d Fragments.
+    Attributes:
+        pix_to_face (torch.Tensor): (B, H, W, K) ids of the K nearest faces per pixel in the packed faces, -1 if empty.
+        zbuf (torch.Tensor): (B, H, W, K) depth of the faces per pixel, -1 if empty.
+        bary_coords (torch.Tensor): (B, H, W, K, 3) barycentric coordinates of the pixel per face, -1 if empty.
+        dists (torch.Tensor): (B, H, W, K) signed squared distance in NDC units of the pixel to the face boundary,
+            negative inside of the face, -1 if empty.
+    """
+
+    pix_to_face: torch.Tensor
+    zbuf: torch.Tensor
+    bary_coords: torch.Tensor
+    dists: torch.Tensor
+
+
+def _edge(a: torch.Tensor, b: torch.Tensor, p: torch.Tensor):
+    return (p[..., 0] - a[..., 0]) * (b[..., 1] - a[..., 1]) - (
+        p[..., 1] - a[..., 1]
+    ) * (b[..., 0] - a[..., 0])
+
+
+def _dist2_pt_to_segment(p: torch.Tensor, a: torch.Tensor, b: torch.Tensor):
+    ab = b - a
+    t = ((p - a) * ab).sum(dim=-1) / (ab * ab).sum(dim=-1).clamp(min=1e-12)
+    closest = a + t.clamp(0.0, 1.0)[..., None] * ab
+    return ((p - closest) ** 2).sum(dim=-1)
+
+
+def rasterize_meshes(
+    verts_cam: torch.Tensor,
+    faces: torch.Tensor,
+    faces_scene_ids: torch.Tensor,
+    cams_intr4x4: torch.Tensor,
+    imgs_size,
+    faces_per_pixel: int = 1,
+    blur_radius: float = 0.0,
+    cull_backfaces: bool = False,
+    perspective_correct: bool = False,
+    znear: float = 1e-2,
+    zfar: float = None,
+    tile_size: int = 8,
+    max_candidates: int = 2**23,
+):
+    """
+    Rasterizes triangle meshes with tensor operations only, e.g. on cpu.
+    Faces are binned into tiles of tile_size x tile_size pixels, all face-pixel candidates of a set of tiles
+    are evaluated at once, and the faces_per_pixel nearest faces per pixel are kept (z-buffer).
+
+    Args:
+        verts_cam (torch.Tensor): (V, 3) packed vertices in camera coordinates (x right, y down, z forward).
+        faces (torch.Tensor): (F, 3) packed faces, indexing verts_cam.
+        faces_scene_ids (torch.Tensor): (F,) id of the rendered image for each face.
+        cams_intr4x4 (torch.Tensor): (B, 4, 4) camera intrinsics in pixels.
+        imgs_size: (H, W)
+        faces_per_pixel (int): K, number of nearest faces stored per pixel.
+        blur_radius (float): squared distance in NDC units within which faces are still assigned to a pixel.
+        cull_backfaces (bool): ignore faces with normals pointing away from the camera.
+        perspective_correct (bool): use perspective correct barycentric coordinates.
+        max_candidates (int): upper bound of face-pixel candidates evaluated at once.
+    Returns:
+        fragments (RasterFragments)
+    """
+    device = verts_cam.device
+    dtype = verts_cam.dtype
+    B = cams_intr4x4.shape[0]
+    H, W = int(imgs_size[0]), int(imgs_size[1])
+    K = faces_per_pixel
+    T = tile_size
+    tiles_x = (W + T - 1) // T
+    tiles_y = (H + T - 1) // T
+    ndc_scale = 2.0 / min(H, W)
+    faces = faces.to(device=device, dtype=torch.long)
+    faces_scene_ids = faces_scene_ids.to(device=device, dtype=torch.long)
+
+    pix_to_face = torch.full((B * H * W, K), -1, dtype=torch.long, device=device)
+    zbuf = torch.full((B * H * W, K), -1.0, dtype=dtype, device=device)
+    bary_coords = torch.full((B * H * W, K, 3), -1.0, dtype=dtype, device=device)
+    dists = torch.full((B * H * W, K), -1.0, dtype=dtype, device=device)
+
+    def get_fragments():
+        return RasterFragments(
+            pix_to_face=pix_to_face.reshape(B, H, W, K),
+            zbuf=zbuf.reshape(B, H, W, K),
+            bary_coords=bary_coords.reshape(B, H, W, K, 3),
+            dists=dists.reshape(B, H, W, K),
+        )
+
+    if len(faces) == 0:
+        return get_fragments()
+
+    # F x 3 x 3
+    faces_verts = verts_cam[faces]
+    faces_intr = cams_intr4x4.to(device=device, dtype=dtype)[faces_scene_ids]
+    faces_z = faces_verts[..., 2]
+    faces_valid = (faces_z > znear).all(dim=-1)
+    if zfar is not None:
+        faces_valid &= (faces_z < zfar).all(dim=-1)
+    faces_z_clamped = faces_z.clamp(min=znear)
+    # F x 3 x 2, pixel centers are at integer + 0.5
+    faces_pxl2d = torch.stack(
+        [
+            faces_intr[:, None, 0, 0] * faces_verts[..., 0] / faces_z_clamped
+            + faces_intr[:, None, 0, 2],
+            faces_intr[:, None, 1, 1] * faces_verts[..., 1] / faces_z_clamped
+            + faces_intr[:, None, 1, 2],
+        ],
+        dim=-1,
+    )
+    faces_area = _edge(faces_pxl2d[:, 0], faces_pxl2d[:, 1], faces_pxl2d[:, 2])
+    faces_valid &= faces_area.abs() > 1e-10
+    if cull_backfaces:
+        faces_normals = torch.cross(
+            faces_verts[:, 1] - faces_verts[:, 0],
+            faces_verts[:, 2] - faces_verts[:, 0],
+            dim=-1,
+        )
+        faces_valid &= (faces_normals * faces_verts[:, 0]).sum(dim=-1) < 0.0
+
+    # pixel index bounding boxes, expanded by the blur radius
+    blur_pxl = (blur_radius**0.5) / ndc_scale if blur_radius > 0.0 else 0.0
+    faces_pxl2d_detached = faces_pxl2d.detach()
+    x_min = torch.ceil(faces_pxl2d_detached[..., 0].min(dim=-1).values - 0.5 - blur_pxl)
+    x_max = torch.floor(
+        faces_pxl2d_detached[..., 0].max(dim=-1).values - 0.5 + blur_pxl
+    )
+    y_min = torch.ceil(faces_pxl2d_detached[..., 1].min(dim=-1).values - 0.5 - blur_pxl)
+    y_max = torch.floor(
+        faces_pxl2d_detached[..., 1].max(dim=-1).values - 0.5 + blur_pxl
+    )
+    x_min = x_min.clamp(0, W - 1).long()
+    x_max = x_max.clamp(-1, W - 1).long()
+    y_min = y_min.clamp(0, H - 1).long()
+    y_max = y_max.clamp(-1, H - 1).long()
+    faces_valid &= (x_max >= x_min) & (y_max >= y_min)
+
+    faces_ids = faces_valid.nonzero()[:, 0]
+    if len(faces_ids) == 0:
+        return get_fragments()
+
+    # bin faces into tiles: one (face, tile) pair per overlapped tile
+    tx0 = x_min[faces_ids] // T
+    ty0 = y_min[faces_ids] // T
+    tnx = x_max[faces_ids] // T - tx0 + 1
+    tny = y_max[faces_ids] // T - ty0 + 1
+    tcounts = tnx * tny
+    pairs_faces_local = torch.repeat_interleave(
+        torch.arange(len(faces_ids), device=device),
+        tcounts,
+    )
+    pairs_offsets = torch.arange(len(pairs_faces_local), device=device) - (
+        torch.repeat_interleave(torch.cumsum(tcounts, dim=0) - tcounts, tcounts)
+    )
+    pairs_faces = faces_ids[pairs_faces_local]
+    pairs_tx = tx0[pairs_faces_local] + pairs_offsets % tnx[pairs_faces_local]
+    pairs_ty = ty0[pairs_faces_local] + pairs_offsets // tnx[pairs_faces_local]
+    pairs_tiles = (
+        faces_scene_ids[pairs_faces] * tiles_y + pairs_ty
+    ) * tiles_x + pairs_tx
+    pairs_tiles, pairs_order = torch.sort(pairs_tiles, stable=True)
+    pairs_faces = pairs_faces[pairs_order]
+
+    # group whole tiles into chunks of at most ~max_candidates face-pixel candidates
+    tiles_unique, tiles_counts = torch.unique_consecutive(
+        pairs_tiles,
+        return_counts=True,
+    )
+    pairs_per_chunk = max(1, max_candidates // (T * T))
+    tiles_chunks = (torch.cumsum(tiles_counts, dim=0) - tiles_counts) // pairs_per_chunk
+    _, chunks_tiles_counts = torch.unique_consecutive(tiles_chunks, return_counts=True)
+    chunks_pairs_counts = [
+        int(c)
+        for c in torch.stack(
+            [t.sum() for t in torch.split(tiles_counts, chunks_tiles_counts.tolist())],
+        )
+    ]
+
+    tile_dy, tile_dx = torch.meshgrid(
+        torch.arange(T, device=device),
+        torch.arange(T, device=device),
+        indexing="ij",
+    )
+    tile_dx = tile_dx.reshape(-1)
+    tile_dy = tile_dy.reshape(-1)
+
+    pairs_start = 0
+    for chunk_pairs_count in chunks_pairs_counts:
+        chunk_faces = pairs_faces[pairs_start : pairs_start + chunk_pairs_count]
+        chunk_tiles = pairs_tiles[pairs_start : pairs_start + chunk_pairs_count]
+        pairs_start += chunk_pairs_count
+
+        # P x T*T candidate pixels
+        cand_x = (chunk_tiles % tiles_x)[:, None] * T + tile_dx[None]
+        cand_y = ((chunk_tiles // tiles_x) % tiles_y)[:, None] * T + tile_dy[None]
+        cand_mask = (
+            (cand_x >= x_min[chunk_faces, None])
+            & (cand_x <= x_max[chunk_faces, None])
+            & (cand_y >= y_min[chunk_faces, None])
+            & (cand_y <= y_max[chunk_faces, None])
+        )
+        cand_pair, cand_pxl = cand_mask.nonzero(as_tuple=True)
+        if len(cand_pair) == 0:
+            continue
+        cand_faces = chunk_faces[cand_pair]
+        cand_x = cand_x[cand_pair, cand_pxl]
+        cand_y = cand_y[cand_pair, cand_pxl]
+        cand_pxl2d = torch.stack([cand_x, cand_y], dim=-1).to(dtype=dtype) + 0.5
+
+        v = faces_pxl2d[cand_faces]
+        area = faces_area[cand_faces]
+        cand_bary = (
+            torch.stack(
+                [
+                    _edge(v[:, 1], v[:, 2], cand_pxl2d),
+                    _edge(v[:, 2], v[:, 0], cand_pxl2d),
+                    _edge(v[:, 0], v[:, 1], cand_pxl2d),
+                ],
+                dim=-1,
+            )
+            / area[:, None]
+        )
+        cand_inside = (cand_bary >= 0.0).all(dim=-1)
+        cand_dist2 = (
+            torch.stack(
+                [
+                    _dist2_pt_to_segment(cand_pxl2d, v[:, 1], v[:, 2]),
+                    _dist2_pt_to_segment(cand_pxl2d, v[:, 2], v[:, 0]),
+                    _dist2_pt_to_segment(cand_pxl2d, v[:, 0], v[:, 1]),
+                ],
+                dim=-1,
+            ).min(dim=-1)
+        ).values * (ndc_scale**2)
+        cand_dists = torch.where(cand_inside, -cand_dist2, cand_dist2)
+
+        if blur_radius > 0.0:
+            cand_keep = cand_inside | (cand_dist2.detach() < blur_radius)
+            # outside of the face, the barycentric coordinates are clipped to the face
+            cand_bary_clipped = cand_bary.clamp(min=0.0)
+            cand_bary = torch.where(
+                cand_inside[:, None],
+                cand_bary,
+                cand_bary_clipped
+                / cand_bary_clipped.sum(dim=-1, keepdim=True).clamp(min=1e-10),
+            )
+        else:
+            cand_keep = cand_inside
+
+        cand_z_verts = faces_z_clamped[cand_faces]
+        if perspective_correct:
+            cand_bary = cand_bary / cand_z_verts
+            cand_bary = cand_bary / cand_bary.sum(dim=-1, keepdim=True).clamp(
+                min=1e-10,
+            )
+        cand_z = (cand_bary * cand_z_verts).sum(dim=-1)
+        cand_keep &= cand_z.detach() > znear
+
+        cand_keep_ids = cand_keep.nonzero()[:, 0]
+        if len(cand_keep_ids) == 0:
+            continue
+        cand_faces = cand_faces[cand_keep_ids]
+        cand_z = cand_z[cand_keep_ids]
+        cand_bary = cand_bary[cand_keep_ids]
+        cand_dists = cand_dists[cand_keep_ids]
+        cand_pix = (
+            faces_scene_ids[cand_faces] * H + cand_y[cand_keep_ids]
+        ) * W + cand_x[cand_keep_ids]
+
+        # z-buffer: sort by depth, then by pixel, and keep the K nearest faces per pixel
+        order = torch.sort(cand_z.detach(), stable=True).indices
+        order = order[torch.sort(cand_pix[order], stable=True).indices]
+        cand_pix_sorted = cand_pix[order]
+        pix_unique, pix_counts = torch.unique_consecutive(
+            cand_pix_sorted,
+            return_counts=True,
+        )
+        cand_rank = torch.arange(len(order), device=device) - torch.repeat_interleave(
+            torch.cumsum(pix_counts, dim=0) - pix_counts,
+            pix_counts,
+        )
+        cand_rank_mask = cand_rank < K
+        order = order[cand_rank_mask]
+        cand_rank = cand_rank[cand_rank_mask]
+        cand_pix_sorted = cand_pix_sorted[cand_rank_mask]
+
+        pix_to_face[cand_pix_sorted, cand_rank] = cand_faces[order]
+        zbuf[cand_pix_sorted, cand_rank] = cand_z[order]
+        bary_coords[cand_pix_sorted, cand_rank] = cand_bary[order]
+        dists[cand_pix_sorted, cand_rank] = cand_dists[order]
+
+    return get_fragments()
+
+
+def interpolate_face_attributes(
+    pix_to_face: torch.Tensor,
+    bary_coords: torch.Tensor,
+    faces_attrs: torch.Tensor,
+):
+    """
+    Args:
+        pix_to_face (torch.Tensor): (B, H, W, K)
+        bary_coords (torch.Tensor): (B, H, W, K, 3)
+        faces_attrs (torch.Tensor): (F, 3, D)
+    Returns:
+        pix_attrs (torch.Tensor): (B, H, W, K, D), zero for empty pixels.
+    """
+    mask = pix_to_face >= 0
+    pix_faces_attrs = faces_attrs[pix_to_face.clamp(min=0)]  # (B, H, W, K, 3, D)
+    pix_attrs = (bary_coords[..., None] * pix_faces_attrs).sum(dim=-2)
+    return pix_attrs * mask[..., None]
@@ -360,14 +360,57 @@ def render_trimesh_to_tensor(
         torch.Tensor: Rendered RGB image as a torch tensor of shape (3, H, W).
         torch.Tensor: Rendered Depth image as a torch tensor of shape (1, H, W).
     """
+    rgbs, depths = render_trimesh_to_tensors(
+        mesh_trimesh=mesh_trimesh,
+        cams_intr4x4=cam_intr4x4[None,],
+        cams_tform4x4_obj=cam_tform4x4_obj[None,],
+        H=H,
+        W=W,
+        rgb_bg=rgb_bg,
+        ambient_light=ambient_light,
+        znear=znear,
+        zfar=zfar,
+        material=material,
+        light_tform4x4_obj=light_tform4x4_obj,
+    )
+    return rgbs[0], depths[0]
+
+
+def render_trimesh_to_tensors(
+    mesh_trimesh,
+    cams_intr4x4,
+    cams_tform4x4_obj,
+    H=512,
+    W=512,
+    rgb_bg=[0.0, 0.0, 0.0],
+    ambient_light=[1.0, 1.0, 1.0, 1.0],
+    znear=0.01,
+    zfar=100.0,
+    material=None,
+    light_tform4x4_obj=None,
+):
+    """
+    Render a trimesh mesh from multiple viewpoints. The scene and the offscreen renderer are created once,
+    only the camera is updated per viewpoint.
+
+    Args:
+        mesh_trimesh (trimesh.Trimesh): The mesh to be rendered.
+        cams_intr4x4 (torch.Tensor): Vx4x4 camera intrinsics.
+        cams_tform4x4_obj (torch.Tensor): Vx4x4 camera extrinsics.
+        H: height
+        W: width
+
+    Returns:
+        torch.Tensor: Rendered RGB images of shape (V, 3, H, W).
+        torch.Tensor: Rendered Depth images of shape (V, 1, H, W).
+    """
     # pip install pyrender
     # pip install PyOpenGL-accelerate
-    import trimesh
     import pyrender
     import numpy as np
     import torch
-    from pyrender import DirectionalLight, SpotLight, PointLight
-    from PIL import Image
+    from pyrender import PointLight
+    from od3d.cv.geometry.transform import inv_tform4x4, tform4x4_broadcast
 
     # mesh_trimesh.show()
 
@@ -381,64 +424,66 @@ def render_trimesh_to_tensor(
     )
     scene.add(pyrender_mesh)
 
-    # Create pyrender camera from intrinsic matrix
-    fx, fy = cam_intr4x4[0, 0], cam_intr4x4[1, 1]
-    cx, cy = cam_intr4x4[0, 2], cam_intr4x4[1, 2]
-    height = H
-    width = W
+    # FOLLOWING OPENGL convention
+    pyrender_cams_tform4x4_obj = tform4x4_broadcast(
+        OPEN3D_CAM_TFORM_CAM.clone().to(device=cams_tform4x4_obj.device)[None,],
+        cams_tform4x4_obj,
+    )
+    objs_tform4x4_pyrender_cam_np = (
+        inv_tform4x4(pyrender_cams_tform4x4_obj).detach().cpu().numpy()
+    )
+    cams_intr4x4 = cams_intr4x4.detach().cpu()
+
     camera = pyrender.IntrinsicsCamera(
-        float(fx),
-        float(fy),
-        float(cx),
-        float(cy),
+        float(cams_intr4x4[0, 0, 0]),
+        float(cams_intr4x4[0, 1, 1]),
+        float(cams_intr4x4[0, 0, 2]),
+        float(cams_intr4x4[0, 1, 2]),
         znear=znear,
         zfar=zfar,
     )
-
-    # FOLLOWING OPENGL convention
-    pyrender_cam_tform4x4_obj = tform4x4(
-        OPEN3D_CAM_TFORM_CAM.clone().to(device=cam_tform4x4_obj.device),
-        cam_tform4x4_obj,
-    )
-    # pyrender_cam_tform4x4_obj = tform4x4(cam_tform4x4_obj, OBJ_TFORM_OPEN3D_OBJ.clone().to(device=cam_tform4x4_obj.device),)
-
-    from od3d.cv.geometry.transform import inv_tform4x4
-
-    obj_tform4x4_pyrender_cam = inv_tform4x4(pyrender_cam_tform4x4_obj)
-    obj_tform4x4_pyrender_cam_np = obj_tform4x4_pyrender_cam.detach().cpu().numpy()
-    scene.add(camera, pose=obj_tform4x4_pyrender_cam_np)
-
-    # pyrender.Viewer(scene)
+    camera_node = scene.add(camera, pose=objs_tform4x4_pyrender_cam_np[0])
 
     direc_l = PointLight(color=np.ones(3), intensity=50.0)
     if light_tform4x4_obj is None:
-        light_tform4x4_obj = CAM_TFORM_OBJ.clone().to(device=cam_tform4x4_obj.device)
+        light_tform4x4_obj = CAM_TFORM_OBJ.clone().to(device=cams_tform4x4_obj.device)
 
     pyrender_light_tform4x4_obj = light_tform4x4_obj
     obj_tform4x4_pyrender_light = inv_tform4x4(pyrender_light_tform4x4_obj)
     obj_tform4x4_pyrender_light_np = obj_tform4x4_pyrender_light.detach().cpu().numpy()
 
-    direc_l_node = scene.add(direc_l, pose=obj_tform4x4_pyrender_light_np)
-
-    # pyrender.Viewer(scene, shadows=True)
+    scene.add(direc_l, pose=obj_tform4x4_pyrender_light_np)
 
     # Create an offscreen renderer
     import os
 
     if "DISPLAY" not in os.environ:
         os.environ["PYOPENGL_PLATFORM"] = "egl"
-    renderer = pyrender.OffscreenRenderer(width, height)
-
-    # Render the scene
-    color, depth = renderer.render(scene)
+    renderer = pyrender.OffscreenRenderer(W, H)
 
-    # Convert to torch tensor (C, H, W) format
-    rgb_tensor = (
-        torch.from_numpy(color.copy()).to(dtype=torch.float32).permute(2, 0, 1) / 255.0
-    )
-    depth_tensor = torch.from_numpy(depth.copy()).to(dtype=torch.float32)[None,]
+    rgbs = []
+    depths = []
+    try:
+        for v in range(len(objs_tform4x4_pyrender_cam_np)):
+            camera.fx = float(cams_intr4x4[v, 0, 0])
+            camera.fy = float(cams_intr4x4[v, 1, 1])
+            camera.cx = float(cams_intr4x4[v, 0, 2])
+            camera.cy = float(cams_intr4x4[v, 1, 2])
+            scene.set_pose(camera_node, pose=objs_tform4x4_pyrender_cam_np[v])
+
+            # Render the scene
+            color, depth = renderer.render(scene)
+
+            # Convert to torch tensor (C, H, W) format
+            rgbs.append(
+                torch.from_numpy(color.copy()).to(dtype=torch.float32).permute(2, 0, 1)
+                / 255.0,
+            )
+            depths.append(torch.from_numpy(depth.copy()).to(dtype=torch.float32)[None,])
+    finally:
+        renderer.delete()
 
-    return rgb_tensor, depth_tensor
+    return torch.stack(rgbs, dim=0), torch.stack(depths, dim=0)
 
 
 def show_scene(
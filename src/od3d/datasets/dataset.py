@@ -1,4 +1,5 @@
 import logging
+import os
 import warnings
 
 from od3d.cli.write import sequence
@@ -15,6 +16,7 @@ from typing import List, Dict
 from od3d.datasets.frame import OD3D_FRAME_MODALITIES, OD3D_Frame, OD3D_FrameMeta
 from od3d.datasets.sequence_meta import OD3D_SequenceMetaCategoryMixin
 from od3d.datasets.frames import OD3D_Frames
+from od3d.datasets.frames_index import OD3D_FramesIndex, OD3D_FramesView
 from od3d.data import ExtEnum
 import inspect
 from tqdm import tqdm
@@ -28,6 +30,7 @@ from od3d.datasets.frame import (
 from od3d.cv.geometry.transform import proj3d2d_broadcast
 from od3d.datasets.sequence import OD3D_Sequence
 from od3d.datasets.sequence_meta import OD3D_SequenceMeta
+from od3d.datasets.meta import OD3D_Meta
 
 
 class OD3D_SEQ_MODALITIES(str, Enum):
@@ -62,13 +65,51 @@ class OD3D_Dataset(Dataset):
     transform = None
     index_shift = 0
     subset_fraction = 1.0
-    dict_nested_frames: Dict = None
+    _dict_nested_frames: Dict = None
     dict_nested_frames_ban: Dict = None
+    frames_index: OD3D_FramesIndex = None
     scale_type = OD3D_SCALE_TYPES.NORM
     dict_nested_frames_struct = "category/frame"
+    frame_index_snapshot_enabled = True
+    # the snapshot stamp misses metas written without OD3D_Meta.save(), rebuild to include them
+    frame_index_snapshot_rebuild = False
+    fpath_frame_index_snapshot: Path = None
+    frame_index_snapshot: Dict = None
+    # attributes which do not influence which frames are indexed
+    frame_index_snapshot_ignore_keys = [
+        "name",
+        "path_raw",
+        "transform",
+        "index_shift",
+        "modalities",
+        "subset_fraction",
+        "splits_featured",
+        "scale_type",
+    ]
 
     @classmethod
     def create_from_config(cls, config: DictConfig, transform=None):
+        if config.get("meta_backend", None) is not None:
+            OD3D_Meta.set_meta_backend(
+                path_meta=cls.get_path_meta(config=config),
+                meta_backend=config.get("meta_backend"),
+            )
+        if config.get("frame_index_snapshot", None) is not None:
+            cls.frame_index_snapshot_enabled = config.get("frame_index_snapshot")
+        if config.get("frame_index_snapshot_rebuild", None) is not None:
+            cls.frame_index_snapshot_rebuild = config.get(
+                "frame_index_snapshot_rebuild"
+            )
+        if config.get("meta_cache_maxsize", None) is not None:
+            from od3d.datasets.meta_cache import OD3D_META_CACHE
+
+            OD3D_META_CACHE.maxsize = config.get("meta_cache_maxsize")
+        if config.get("mesh_cache_dir", None) is not None:
+            from od3d.cv.geometry.objects3d.meshes.cache import OD3D_MESH_CACHE
+
+            OD3D_MESH_CACHE.path_cache = Path(config.get("mesh_cache_dir"))
+            if config.get("mesh_cache_max_memory_mb", None) is not None:
+                OD3D_MESH_CACHE.max_memory_mb = config.get("mesh_cache_max_memory_mb")
         if config.get("setup", False).get("enabled", False):
             cls.setup(config=config)
         if config.get("extract_meta", False).get("enabled", False):
@@ -160,22 +201,35 @@ class OD3D_Dataset(Dataset):
         self.modalities = modalities
         self.splits_featured = [OD3D_DATASET_SPLITS.RANDOM]
 
-        logger.info("completing nested frames..., can take up to 500 seconds...")
-        dict_nested_frames = self.frame_type.meta_type.complete_nested_metas(
-            path_meta=self.path_meta,
-            dict_nested_metas=dict_nested_frames,
-            dict_nested_metas_ban=dict_nested_frames_ban,
-        )
+        if self.fpath_frame_index_snapshot is None:
+            # sequence datasets look up the snapshot before filtering sequences
+            self.fpath_frame_index_snapshot = self.get_fpath_frame_index_snapshot(
+                dict_nested_frames=dict_nested_frames,
+                dict_nested_frames_ban=dict_nested_frames_ban,
+            )
+            self.frame_index_snapshot = self.read_frame_index_snapshot()
 
-        dict_nested_frames = self.filter_dict_nested_frames(dict_nested_frames)
+        if self.frame_index_snapshot is not None:
+            list_frames_unique = self.frame_index_snapshot["list_frames_unique"]
+        else:
+            logger.info("completing nested frames..., can take up to 500 seconds...")
+            dict_nested_frames = self.frame_type.meta_type.complete_nested_metas(
+                path_meta=self.path_meta,
+                dict_nested_metas=dict_nested_frames,
+                dict_nested_metas_ban=dict_nested_frames_ban,
+            )
 
-        logger.info("unrolling nested frames...")
-        list_frames_unique = self.frame_type.meta_type.unroll_nested_metas(
-            dict_nested_meta=dict_nested_frames,
-        )
+            dict_nested_frames = self.filter_dict_nested_frames(dict_nested_frames)
 
-        logger.info("filtering frames...")
-        list_frames_unique = self.filter_list_frames_unique(list_frames_unique)
+            logger.info("unrolling nested frames...")
+            list_frames_unique = self.frame_type.meta_type.unroll_nested_metas(
+                dict_nested_meta=dict_nested_frames,
+            )
+
+            logger.info("filtering frames...")
+            list_frames_unique = self.filter_list_frames_unique(list_frames_unique)
+            self.write_frame_index_snapshot(list_frames_unique=list_frames_unique)
+        self.frame_index_snapshot = None
 
         self.frames_count = len(list_frames_unique)
         if self.subset_fraction is not None and self.subset_fraction != 1.0:
@@ -188,6 +242,131 @@ class OD3D_Dataset(Dataset):
         self.set_list_frames_unique(list_frames_unique=list_frames_unique)
         logger.info(f"found {self.frames_count} frames.")
 
+    def get_frame_index_snapshot_config(
+        self,
+        dict_nested_frames: Dict = None,
+        dict_nested_frames_ban: Dict = None,
+    ):
+        # all plain attributes set so far (categories, filters, counts), are considered as dataset config
+        config = {
+            "class_name": type(self).__name__,
+            "path_meta": str(self.path_meta),
+            "dict_nested_frames": dict_nested_frames,
+            "dict_nested_frames_ban": dict_nested_frames_ban,
+        }
+        for key, val in vars(self).items():
+            if (
+                key in self.frame_index_snapshot_ignore_keys
+                or "frame_index_snapshot" in key
+            ):
+                continue
+            if isinstance(val, (str, int, float, bool, Path, list, tuple, dict)):
+                config[key] = val
+            elif isinstance(val, DictConfig) or OmegaConf.is_list(val):
+                config[key] = OmegaConf.to_container(val)
+        return config
+
+    def get_fpath_frame_index_snapshot(
+        self,
+        dict_nested_frames: Dict = None,
+        dict_nested_frames_ban: Dict = None,
+    ):
+        import hashlib
+        import json
+
+        if OmegaConf.is_config(dict_nested_frames):
+            dict_nested_frames = OmegaConf.to_container(dict_nested_frames)
+        if OmegaConf.is_config(dict_nested_frames_ban):
+            dict_nested_frames_ban = OmegaConf.to_container(dict_nested_frames_ban)
+        config = self.get_frame_index_snapshot_config(
+            dict_nested_frames=dict_nested_frames,
+            dict_nested_frames_ban=dict_nested_frames_ban,
+        )
+        config_hash = hashlib.sha1(
+            json.dumps(config, sort_keys=True, default=str).encode("utf-8"),
+        ).hexdigest()[:16]
+        return self.path_preprocess.joinpath(
+            "frame_index",
+            f"{type(self).__name__}_{config_hash}.json",
+        )
+
+    def get_meta_tree_stamp(self):
+        # coarse, the meta tree is not walked: meta stores, save stamps and top level meta directories
+        from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+        stamp = {}
+        for meta_type in [self.frame_type.meta_type, OD3D_SequenceMeta]:
+            rfpath_metas = meta_type.get_rfpath_metas()
+            for fpath in [
+                OD3D_MetaColumnarStore.get_fpath(
+                    path_meta=self.path_meta,
+                    rfpath_metas=rfpath_metas,
+                ),
+                OD3D_MetaColumnarStore.get_fpath_stamp(
+                    path_meta=self.path_meta,
+                    rfpath_metas=rfpath_metas,
+                ),
+                self.path_meta.joinpath(rfpath_metas),
+            ]:
+                if fpath.exists():
+                    rfpath = str(fpath.relative_to(self.path_meta))
+                    stamp[rfpath] = fpath.stat().st_mtime_ns
+        return stamp
+
+    def read_frame_index_snapshot(self):
+        if (
+            not self.frame_index_snapshot_enabled
+            or self.fpath_frame_index_snapshot is None
+            or not self.fpath_frame_index_snapshot.exists()
+        ):
+            return None
+        if self.frame_index_snapshot_rebuild:
+            logger.info(f"rebuilding frame index {self.fpath_frame_index_snapshot}")
+            return None
+        try:
+            frame_index_snapshot = od3d.io.read_json(self.fpath_frame_index_snapshot)
+        except ValueError:
+            logger.warning(
+                f"could not read frame index snapshot {self.fpath_frame_index_snapshot}",
+            )
+            return None
+        if (
+            frame_index_snapshot.get("meta_tree_stamp", None)
+            != self.get_meta_tree_stamp()
+        ):
+            logger.info(
+                f"meta tree changed, rebuilding frame index {self.fpath_frame_index_snapshot}",
+            )
+            return None
+        logger.info(f"using frame index snapshot {self.fpath_frame_index_snapshot}")
+        return frame_index_snapshot
+
+    def write_frame_index_snapshot(self, list_frames_unique: List[str]):
+        if (
+            not self.frame_index_snapshot_enabled
+            or self.fpath_frame_index_snapshot is None
+        ):
+            return
+        dict_nested_sequences = getattr(self, "dict_nested_sequences", None)
+        if OmegaConf.is_config(dict_nested_sequences):
+            dict_nested_sequences = OmegaConf.to_container(dict_nested_sequences)
+        frame_index_snapshot = {
+            "meta_tree_stamp": self.get_meta_tree_stamp(),
+            "list_frames_unique": list(list_frames_unique),
+            "dict_nested_sequences": dict_nested_sequences,
+        }
+        # write to temporary file first, several jobs may start with the same dataset
+        fpath_tmp = self.fpath_frame_index_snapshot.with_suffix(
+            f".{os.getpid()}.tmp",
+        )
+        try:
+            od3d.io.write_json(config=frame_index_snapshot, fpath=fpath_tmp)
+            fpath_tmp.replace(self.fpath_frame_index_snapshot)
+        except OSError as e:
+            logger.warning(
+                f"could not write frame index snapshot {self.fpath_frame_index_snapshot}: {e}",
+            )
+
     @classmethod
     def get_class_specific_categories(cls, categories):
         if categories is not None:
@@ -236,41 +415,115 @@ class OD3D_Dataset(Dataset):
     def __len__(self):
         return self.frames_count
 
-    def get_subset_with_dict_nested_frames(self, dict_nested_frames: Dict):
+    @property
+    def dict_nested_frames(self):
+        if self._dict_nested_frames is None and isinstance(
+            self.__dict__.get("list_frames_unique", None),
+            OD3D_FramesView,
+        ):
+            # views roll up their nested frames only when accessed
+            self._dict_nested_frames = OD3D_FrameMeta.rollup_flattened_frames(
+                list_meta_names_unique=self.list_frames_unique,
+            )
+        return self._dict_nested_frames
+
+    @dict_nested_frames.setter
+    def dict_nested_frames(self, dict_nested_frames: Dict):
+        self._dict_nested_frames = dict_nested_frames
+
+    def get_frames_index(self):
+        if isinstance(self.list_frames_unique, OD3D_FramesView):
+            return self.list_frames_unique.frames_index
+        if (
+            self.frames_index is None
+            or self.frames_index.names_unique is not self.list_frames_unique
+        ):
+            self.frames_index = OD3D_FramesIndex(names_unique=self.list_frames_unique)
+        return self.frames_index
+
+    def get_subset_view(self, list_frames_unique: OD3D_FramesView):
+        """
+        Returns a copy of the dataset which shares transform and frame index with this dataset,
+        and holds its own list of frames and copies of all other containers, e.g. modalities and categories.
+        """
         import copy
 
-        dataset = copy.deepcopy(self)
-        dict_nested_frames_compl = OD3D_FrameMeta.complete_nested_metas(
-            path_meta=self.path_meta,
-            dict_nested_metas=dict_nested_frames,
+        dataset = copy.copy(self)
+        for key, val in vars(self).items():
+            if key in ["list_frames_unique", "_dict_nested_frames"]:
+                continue
+            if isinstance(val, (list, dict, set)) or OmegaConf.is_config(val):
+                dataset.__dict__[key] = copy.deepcopy(val)
+        dataset.set_list_frames_unique(list_frames_unique=list_frames_unique)
+        return dataset
+
+    def get_subset_view_with_names_unique(self, list_frames_unique: List[str]):
+        frames_index = self.get_frames_index()
+        frames_ids = frames_index.get_ids_with_names_unique(list_frames_unique)
+        if frames_ids is None:
+            # frames which are not indexed by this dataset get an index of their own
+            frames_index = OD3D_FramesIndex(names_unique=list(list_frames_unique))
+            frames_ids = np.arange(len(list_frames_unique))
+        return self.get_subset_view(
+            OD3D_FramesView(frames_index=frames_index, ids=frames_ids),
         )
+
+    def get_subset_with_dict_nested_frames(self, dict_nested_frames: Dict):
+        if OmegaConf.is_config(dict_nested_frames):
+            dict_nested_frames = OmegaConf.to_container(dict_nested_frames)
+        if not self.is_dict_nested_frames_complete(dict_nested_frames):
+            dict_nested_frames = OD3D_FrameMeta.complete_nested_metas(
+                path_meta=self.path_meta,
+                dict_nested_metas=dict_nested_frames,
+            )
         list_frames_unique = OD3D_FrameMeta.unroll_nested_metas(
-            dict_nested_meta=dict_nested_frames_compl,
+            dict_nested_meta=dict_nested_frames,
         )
-        dataset.set_list_frames_unique(list_frames_unique=list_frames_unique)
-        return dataset
+        return self.get_subset_view_with_names_unique(list_frames_unique)
+
+    @staticmethod
+    def is_dict_nested_frames_complete(dict_nested_frames: Dict):
+        if dict_nested_frames is None:
+            return False
+        for value in dict_nested_frames.values():
+            if value is None:
+                return False
+            if isinstance(
+                value, Dict
+            ) and not OD3D_Dataset.is_dict_nested_frames_complete(
+                value,
+            ):
+                return False
+        return True
 
     def set_list_frames_unique(self, list_frames_unique):
         self.list_frames_unique = list_frames_unique
-        self.dict_nested_frames = OD3D_FrameMeta.rollup_flattened_frames(
-            list_meta_names_unique=self.list_frames_unique,
-        )
+        if isinstance(list_frames_unique, OD3D_FramesView):
+            self.dict_nested_frames = None
+            keys = list(
+                dict.fromkeys(
+                    name_unique.split("/")[0] if "/" in name_unique else ""
+                    for name_unique in list_frames_unique
+                ),
+            )
+        else:
+            self.dict_nested_frames = OD3D_FrameMeta.rollup_flattened_frames(
+                list_meta_names_unique=self.list_frames_unique,
+            )
+            keys = list(self.dict_nested_frames.keys())
         # check the number of keys in dict_nested_frames
-        keys = list(self.dict_nested_frames.keys())
         if len(keys) == 1:
-            self.subset = list(self.dict_nested_frames.keys())[0]
+            self.subset = keys[0]
         else:
             warnings.warn(f"More than one subset in dict_nested_frames: {keys}")
         self.frames_count = len(self.list_frames_unique)
 
     def get_subset_with_item_ids(self, item_ids):
         list_frames_unique = [self.list_frames_unique[id] for id in item_ids]
-        dict_nested_frames = OD3D_FrameMeta.rollup_flattened_frames(
-            list_meta_names_unique=list_frames_unique,
-        )
-        return self.get_subset_with_dict_nested_frames(dict_nested_frames)
+        return self.get_subset_with_names_unique(list_frames_unique)
 
     def get_subset_with_names_unique(self, list_frames_unique: List[str]):
+        # frames are grouped by their nested keys, subclasses may override the subset with nested frames
         dict_nested_frames = OD3D_FrameMeta.rollup_flattened_frames(
             list_meta_names_unique=list_frames_unique,
         )
@@ -406,14 +659,40 @@ class OD3D_Dataset(Dataset):
     def record_video(config: DictConfig):
         raise NotImplementedError
 
+    @staticmethod
+    def migrate_meta(config: DictConfig, remove_yaml=False):
+        from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+        path_meta = OD3D_Dataset.get_path_meta(config=config)
+        for meta_type in [OD3D_FrameMeta, OD3D_SequenceMeta]:
+            OD3D_MetaColumnarStore.migrate_from_yaml(
+                path_meta=path_meta,
+                rfpath_metas=meta_type.get_rfpath_metas(),
+                remove_yaml=remove_yaml,
+            )
+
     def preprocess(self, config_preprocess: DictConfig):
         logger.info("preprocess")
         for key in config_preprocess.keys():
             if key == "mask" and config_preprocess.mask.get("enabled", False):
                 override = config_preprocess.mask.get("override", False)
-                self.preprocess_mask(override=override)
+                self.preprocess_mask(
+                    override=override,
+                    batch_size=config_preprocess.mask.get("batch_size", 8),
+                    num_workers=config_preprocess.mask.get("num_workers", 0),
+                )
 
-    def preprocess_mask(self, override=False, remove_previous=False):
+    def preprocess_mask(
+        self,
+        override=False,
+        remove_previous=False,
+        batch_size=8,
+        num_workers=0,
+    ):
+        """
+        SAM masks are predicted for batches of up to batch_size frames of equal size with one image encoder pass,
+        and written in a background thread.
+        """
         logger.info("preprocess masks...")
         from functools import partial
 
@@ -453,11 +732,13 @@ class OD3D_Dataset(Dataset):
 
         modalities_orig = self.modalities
         self.modalities = modalities
+        # frames are loaded one by one, as image sizes and prompts may differ between frames
         dataloader = torch.utils.data.DataLoader(
             dataset=self,
             batch_size=1,
             shuffle=False,
             collate_fn=partial(self.collate_fn, modalities=modalities),
+            num_workers=num_workers,
         )
         logging.info(f"Dataset contains {len(self)} frames.")
 
@@ -477,9 +758,39 @@ class OD3D_Dataset(Dataset):
         else:
             pass
 
+        from concurrent.futures import ThreadPoolExecutor
         from od3d.cv.io import get_default_device
 
         device = get_default_device()
+        writer_pool = ThreadPoolExecutor(max_workers=4)
+        writes = []
+
+        def predict_masks_sam(batches):
+            # one image encoder pass for all frames, the prompts of each frame reuse the cached embeddings
+            model.backbone.encode(
+                x=torch.cat([_batch.rgb for _batch, _, _, _ in batches], dim=0),
+                frames_names=[_batch.name_unique[0] for _batch, _, _, _ in batches],
+            )
+            for _batch, _frames, _center_pxl2d, _bbox in batches:
+                model_out = model(
+                    x=_batch.rgb,
+                    points_xy=_center_pxl2d,
+                    bbox=_bbox,
+                    bbox_from_single_point=mask_type
+                    == OD3D_FRAME_MASK_TYPES.SAM_SFM_RAYS_CENTER3D,
+                    oppress_single_point=mask_type
+                    == OD3D_FRAME_MASK_TYPES.SAM_SFM_RAYS_CENTER3D,
+                    bbox_from_points=False,
+                    frames_names=_batch.name_unique,
+                )
+                masks = model_out.masks
+                scores = model_out.masks_scores
+                for b in range(len(_batch.name_unique)):
+                    sam_lvl = scores[b].argmax()
+                    mask = masks[b, sam_lvl : sam_lvl + 1]
+                    writes.append(writer_pool.submit(_frames[b].write_mask, mask))
+
+        batches_pending = []
         for batch in iter(dataloader):
             logger.info(f"{batch.name_unique[0]}")  # sequence_name[0]}')
             frames = [
@@ -558,29 +869,19 @@ class OD3D_Dataset(Dataset):
                 ):
                     bbox = batch.bbox
 
-                model_out = model(
-                    x=batch.rgb,
-                    points_xy=center_pxl2d,
-                    bbox=bbox,
-                    bbox_from_single_point=mask_type
-                    == OD3D_FRAME_MASK_TYPES.SAM_SFM_RAYS_CENTER3D,
-                    oppress_single_point=mask_type
-                    == OD3D_FRAME_MASK_TYPES.SAM_SFM_RAYS_CENTER3D,
-                    bbox_from_points=False,
-                )
-                masks = model_out.masks
-                scores = model_out.masks_scores
-
-                # from od3d.cv.visual.show import show_imgs
-                # show_imgs(mask[None,])
-                for b in range(len(batch.name_unique)):
-                    masks_b = masks[b]
-                    frame = frames[b]
-                    sam_lvl = scores[b].argmax()
-                    mask = masks[b, sam_lvl : sam_lvl + 1]
-                    # from od3d.cv.visual.draw import draw_pixels
-                    # mask = draw_pixels(mask, pxls=center_pxl2d[b:b+1])
-                    frame.write_mask(mask)
+                if len(batches_pending) > 0 and (
+                    len(batches_pending) >= batch_size
+                    or batches_pending[0][0].rgb.shape != batch.rgb.shape
+                ):
+                    predict_masks_sam(batches_pending)
+                    batches_pending = []
+                batches_pending.append((batch, frames, center_pxl2d, bbox))
+        if len(batches_pending) > 0:
+            predict_masks_sam(batches_pending)
+
+        writer_pool.shutdown(wait=True)
+        for write in writes:
+            write.result()
         self.modalities = modalities_orig
 
     def preprocess_depth(self, override=False, remove_previous=False):
@@ -766,38 +1067,48 @@ class OD3D_SequenceDataset(OD3D_Dataset):
         self.path_preprocess = Path(path_preprocess)
         self.modalities = modalities
 
-        logger.info("filtering sequences...")
-        self.dict_nested_sequences = self.filter_dict_nested_sequences(
+        self.fpath_frame_index_snapshot = self.get_fpath_frame_index_snapshot(
             dict_nested_frames=dict_nested_frames,
             dict_nested_frames_ban=dict_nested_frames_ban,
-            count_max_per_category=self.sequences_count_max_per_category,
         )
+        self.frame_index_snapshot = self.read_frame_index_snapshot()
 
-        dict_nested_frames = self.get_dict_nested_frames_from_sequences(
-            dict_nested_sequences=self.dict_nested_sequences,
-            dict_nested_frames_orig=dict_nested_frames,
-        )
-        dict_nested_frames = self.frame_type.meta_type.complete_nested_metas(
-            path_meta=self.path_meta,
-            dict_nested_metas=dict_nested_frames,
-            dict_nested_metas_ban=dict_nested_frames_ban,
-        )
-        self.frames_count_max_per_sequence = frames_count_max_per_sequence
-        self.dict_nested_frames = dict_nested_frames
-        if self.frames_count_max_per_sequence is not None:
-            dict_nested_frames_unroll = unroll_nested_dict(self.dict_nested_frames)
-            dict_nested_frames_unroll_filtered = {}
-            for key, frames_names in dict_nested_frames_unroll.items():
-                frames_names_filtered = (
-                    self.sequence_type.get_subset_frames_names_uniform(
-                        frames_names=frames_names,
-                        count_max_per_sequence=frames_count_max_per_sequence,
+        if self.frame_index_snapshot is not None:
+            self.dict_nested_sequences = self.frame_index_snapshot[
+                "dict_nested_sequences"
+            ]
+        else:
+            logger.info("filtering sequences...")
+            self.dict_nested_sequences = self.filter_dict_nested_sequences(
+                dict_nested_frames=dict_nested_frames,
+                dict_nested_frames_ban=dict_nested_frames_ban,
+                count_max_per_category=self.sequences_count_max_per_category,
+            )
+
+            dict_nested_frames = self.get_dict_nested_frames_from_sequences(
+                dict_nested_sequences=self.dict_nested_sequences,
+                dict_nested_frames_orig=dict_nested_frames,
+            )
+            dict_nested_frames = self.frame_type.meta_type.complete_nested_metas(
+                path_meta=self.path_meta,
+                dict_nested_metas=dict_nested_frames,
+                dict_nested_metas_ban=dict_nested_frames_ban,
+            )
+            self.dict_nested_frames = dict_nested_frames
+            if self.frames_count_max_per_sequence is not None:
+                dict_nested_frames_unroll = unroll_nested_dict(self.dict_nested_frames)
+                dict_nested_frames_unroll_filtered = {}
+                for key, frames_names in dict_nested_frames_unroll.items():
+                    frames_names_filtered = (
+                        self.sequence_type.get_subset_frames_names_uniform(
+                            frames_names=frames_names,
+                            count_max_per_sequence=frames_count_max_per_sequence,
+                        )
                     )
+                    dict_nested_frames_unroll_filtered[key] = frames_names_filtered
+                dict_nested_frames = rollup_flattened_dict(
+                    dict_nested_frames_unroll_filtered,
                 )
-                dict_nested_frames_unroll_filtered[key] = frames_names_filtered
-            dict_nested_frames = rollup_flattened_dict(
-                dict_nested_frames_unroll_filtered,
-            )
 
         super().__init__(
             categories=categories,
@@ -1168,118 +1479,205 @@ class OD3D_SequenceDataset(OD3D_Dataset):
 
         return co3d_subsetA, co3d_subsetB
 
-    def preprocess_sfm(self, override=False):
+    def preprocess_sfm(self, override=False, workers=0, devices=None):
         logger.info("preprocess sfm...")
-        from od3d.datasets.sequence_meta import OD3D_SequenceMeta
-
-        for sequence_name_unique in OD3D_SequenceMeta.unroll_nested_metas(
-            self.dict_nested_sequences,
-        ):
-            sequence = self.get_sequence_by_name_unique(
-                name_unique=sequence_name_unique,
-            )
-            sequence.preprocess_sfm(override=override)
+        self.run_sequences_preprocess(
+            method="preprocess_sfm",
+            override=override,
+            workers=workers,
+            devices=devices,
+            get_fpath_output=lambda sequence: sequence.path_sfm,
+        )
 
-    def preprocess_pcl(self, override=False):
+    def preprocess_pcl(
+        self,
+        override=False,
+        workers=0,
+        devices=None,
+        masks_scale=1.0,
+        frames_chunk_size=16,
+    ):
         logger.info("preprocess pcl...")
-        from od3d.datasets.sequence_meta import OD3D_SequenceMeta
-
-        for sequence_name_unique in tqdm(
-            OD3D_SequenceMeta.unroll_nested_metas(
-                self.dict_nested_sequences,
-            ),
-        ):
-            sequence = self.get_sequence_by_name_unique(
-                name_unique=sequence_name_unique,
-            )
-            sequence.preprocess_pcl(override=override)
+        self.run_sequences_preprocess(
+            method="preprocess_pcl",
+            override=override,
+            workers=workers,
+            devices=devices,
+            get_fpath_output=lambda sequence: sequence.fpath_pcl,
+            method_kwargs={
+                "masks_scale": masks_scale,
+                "frames_chunk_size": frames_chunk_size,
+            },
+        )
 
-    def preprocess_mesh(self, override=False):
+    def preprocess_mesh(self, override=False, workers=0, devices=None):
         logger.info("preprocess mesh...")
-        from od3d.datasets.sequence_meta import OD3D_SequenceMeta
-
-        for sequence_name_unique in tqdm(
-            OD3D_SequenceMeta.unroll_nested_metas(
-                self.dict_nested_sequences,
-            ),
-        ):
-            sequence = self.get_sequence_by_name_unique(
-                name_unique=sequence_name_unique,
-            )
-            sequence.preprocess_mesh(override=override)
+        self.run_sequences_preprocess(
+            method="preprocess_mesh",
+            override=override,
+            workers=workers,
+            devices=devices,
+            get_fpath_output=lambda sequence: sequence.fpath_mesh,
+        )
 
-    def preprocess_mesh_feats(self, override=False):
+    def preprocess_mesh_feats(self, override=False, workers=0, devices=None):
         logger.info("preprocess mesh feats...")
+        self.run_sequences_preprocess(
+            method="preprocess_mesh_feats",
+            override=override,
+            workers=workers,
+            devices=devices,
+            get_fpath_output=lambda sequence: sequence.fpath_mesh_feats,
+        )
+
+    def preprocess_mesh_feats_dist(self, override=False, pairs_batch_verts=8192):
+        """
+        Computes the mesh feats dist of all sequence pairs within each category into one store per category.
+        Each sequence features are read once and only one of the symmetric pairs (a, b), (b, a) is computed.
+        """
+        logger.info("preprocess mesh feats dist...")
         from od3d.datasets.sequence_meta import OD3D_SequenceMeta
+        from od3d.datasets.mesh_feats_dist import OD3D_MeshFeatsDistStore
+        from od3d.cv.io import get_default_device
 
-        for sequence_name_unique in OD3D_SequenceMeta.unroll_nested_metas(
+        sequences_names_unique = OD3D_SequenceMeta.unroll_nested_metas(
             self.dict_nested_sequences,
-        ):
+        )
+        fpaths_store_sequences = {}
+        fpaths_store_reduce_type = {}
+        for sequence_name_unique in sequences_names_unique:
             sequence = self.get_sequence_by_name_unique(
                 name_unique=sequence_name_unique,
             )
-            sequence.preprocess_mesh_feats(override=override)
+            fpath_store = sequence.get_fpath_mesh_feats_dist_store()
+            fpaths_store_sequences.setdefault(fpath_store, []).append(
+                sequence_name_unique,
+            )
+            fpaths_store_reduce_type[fpath_store] = sequence.mesh_feats_dist_reduce_type
+
+        def read_mesh_feats(name_unique):
+            return self.get_sequence_by_name_unique(
+                name_unique=name_unique,
+            ).read_mesh_feats(cache=False)
+
+        for fpath_store, names_unique in fpaths_store_sequences.items():
+            OD3D_MeshFeatsDistStore.preprocess(
+                fpath=fpath_store,
+                names_unique=names_unique,
+                read_mesh_feats=read_mesh_feats,
+                mesh_feats_dist_reduce_type=fpaths_store_reduce_type[fpath_store],
+                device=get_default_device(),
+                pairs_batch_verts=pairs_batch_verts,
+                override=override,
+            )
 
-    def preprocess_mesh_feats_dist(self, override=False):
-        logger.info("preprocess mesh feats dist...")
-        from od3d.datasets.sequence_meta import OD3D_SequenceMeta
+    def preprocess_tform_obj(self, override=False, workers=0, devices=None):
+        logger.info("preprocess tform obj...")
+        self.run_sequences_preprocess(
+            method="preprocess_tform_obj",
+            override=override,
+            workers=workers,
+            devices=devices,
+            get_fpath_output=lambda sequence: sequence.get_fpath_tform_obj(),
+        )
+
+    def run_sequences_preprocess(
+        self,
+        method: str,
+        override=False,
+        workers=0,
+        devices=None,
+        get_fpath_output=None,
+        method_kwargs=None,
+    ):
+        from od3d.datasets.preprocess_executor import OD3D_PreprocessExecutor
 
         sequences_names_unique = OD3D_SequenceMeta.unroll_nested_metas(
             self.dict_nested_sequences,
         )
-        for sequence_name_unique1 in sequences_names_unique:
-            for sequence_name_unique2 in sequences_names_unique:
-                sequence1 = self.get_sequence_by_name_unique(
-                    name_unique=sequence_name_unique1,
-                )
-                sequence2 = self.get_sequence_by_name_unique(
-                    name_unique=sequence_name_unique2,
-                )
-                sequence1.preprocess_mesh_feats_dist(
-                    sequence=sequence2,
-                    override=override,
-                )
-
-    def preprocess_tform_obj(self, override=False):
-        logger.info("preprocess tform obj...")
-        for sequence_name_unique in OD3D_SequenceMeta.unroll_nested_metas(
-            self.dict_nested_sequences,
-        ):
-            sequence = self.get_sequence_by_name_unique(
-                name_unique=sequence_name_unique,
-            )
-            sequence.preprocess_tform_obj(override=override)
+        return OD3D_PreprocessExecutor(
+            dataset=self,
+            workers=workers,
+            devices=devices,
+        ).run(
+            method=method,
+            sequences_names_unique=sequences_names_unique,
+            override=override,
+            get_fpath_output=get_fpath_output,
+            method_kwargs=method_kwargs,
+        )
 
     def preprocess(self, config_preprocess: DictConfig):
         logger.info("preprocess")
         for key in config_preprocess.keys():
             if key == "sfm" and config_preprocess.sfm.get("enabled", False):
                 override = config_preprocess.sfm.get("override", False)
-                self.preprocess_sfm(override=override)
+                self.preprocess_sfm(
+                    override=override,
+                    workers=config_preprocess.sfm.get("workers", 0),
+                    devices=config_preprocess.sfm.get("devices", None),
+                )
             if key == "mask" and config_preprocess.mask.get("enabled", False):
                 override = config_preprocess.mask.get("override", False)
-                self.preprocess_mask(override=override)
+                self.preprocess_mask(
+                    override=override,
+                    batch_size=config_preprocess.mask.get("batch_size", 8),
+                    num_workers=config_preprocess.mask.get("num_workers", 0),
+                )
             if key == "pcl" and config_preprocess.pcl.get("enabled", False):
                 override = config_preprocess.pcl.get("override", False)
-                self.preprocess_pcl(override=override)
+                self.preprocess_pcl(
+                    override=override,
+                    workers=config_preprocess.pcl.get("workers", 0),
+                    devices=config_preprocess.pcl.get("devices", None),
+                    masks_scale=config_preprocess.pcl.get("masks_scale", 1.0),
+                    frames_chunk_size=config_preprocess.pcl.get(
+                        "frames_chunk_size",
+                        16,
+                    ),
+                )
             if key == "tform_obj" and config_preprocess.tform_obj.get("enabled", False):
                 override = config_preprocess.tform_obj.get("override", False)
-                self.preprocess_tform_obj(override=override)
+                self.preprocess_tform_obj(
+                    override=override,
+                    workers=config_preprocess.tform_obj.get("workers", 0),
+                    devices=config_preprocess.tform_obj.get("devices", None),
+                )
             if key == "mesh" and config_preprocess.mesh.get("enabled", False):
                 override = config_preprocess.mesh.get("override", False)
-                self.preprocess_mesh(override=override)
+                self.preprocess_mesh(
+                    override=override,
+                    workers=config_preprocess.mesh.get("workers", 0),
+                    devices=config_preprocess.mesh.get("devices", None),
+                )
             if key == "mesh_feats" and config_preprocess.mesh_feats.get(
                 "enabled",
                 False,
             ):
                 override = config_preprocess.mesh_feats.get("override", False)
-                self.preprocess_mesh_feats(override=override)
+                self.preprocess_mesh_feats(
+                    override=override,
+                    workers=config_preprocess.mesh_feats.get("workers", 0),
+                    devices=config_preprocess.mesh_feats.get("devices", None),
+                )
             if key == "mesh_feats_dist" and config_preprocess.mesh_feats_dist.get(
                 "enabled",
                 False,
             ):
                 override = config_preprocess.mesh_feats_dist.get("override", False)
-                self.preprocess_mesh_feats_dist(override=override)
+                self.preprocess_mesh_feats_dist(
+                    override=override,
+                    pairs_batch_verts=config_preprocess.mesh_feats_dist.get(
+                        "pairs_batch_verts",
+                        8192,
+                    ),
+                )
+
+        from od3d.cv.geometry.objects3d.meshes.cache import OD3D_MESH_CACHE
+
+        if OD3D_MESH_CACHE.enabled:
+            # meshes read by this process, sequences preprocessed in workers are not included
+            OD3D_MESH_CACHE.log_stats()
 
     def get_sequence_by_name_unique(self, name_unique: str):
         raise NotImplementedError
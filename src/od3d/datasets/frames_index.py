@@ -0,0 +1,80 @@
+import logging
+
+logger = logging.getLogger(__name__)
+from collections.abc import Sequence
+from typing import List
+
+import numpy as np
+
+
+class OD3D_FramesIndex:
+    """
+    Immutable list of unique frame names, shared by a dataset and all views created from it.
+    The lookup from name to id is built once, on the first subset by names.
+    """
+
+    def __init__(self, names_unique: List[str]):
+        self.names_unique = names_unique
+        self._ids_by_name = None
+
+    def __len__(self):
+        return len(self.names_unique)
+
+    def __getitem__(self, item):
+        return self.names_unique[item]
+
+    def get_ids_with_names_unique(self, names_unique: List[str]):
+        """
+        Returns:
+            ids (np.ndarray): int64 ids of the names in the index, None if any name is not indexed.
+        """
+        if self._ids_by_name is None:
+            self._ids_by_name = {name: id for id, name in enumerate(self.names_unique)}
+        ids = np.empty(len(names_unique), dtype=np.int64)
+        for i, name in enumerate(names_unique):
+            id = self._ids_by_name.get(name, None)
+            if id is None:
+                return None
+            ids[i] = id
+        return ids
+
+
+class OD3D_FramesView(Sequence):
+    """
+    Read-only list of unique frame names, which selects frames of a shared OD3D_FramesIndex with an id array.
+    Views of views select from the same index, such that the names are never copied.
+    """
+
+    def __init__(self, frames_index: OD3D_FramesIndex, ids):
+        self.frames_index = frames_index
+        self.ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+
+    @classmethod
+    def create_from_frames(cls, frames, ids):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if isinstance(frames, OD3D_FramesView):
+            return cls(frames_index=frames.frames_index, ids=frames.ids[ids])
+        if not isinstance(frames, OD3D_FramesIndex):
+            frames = OD3D_FramesIndex(names_unique=frames)
+        return cls(frames_index=frames, ids=ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return OD3D_FramesView(frames_index=self.frames_index, ids=self.ids[item])
+        return self.frames_index.names_unique[self.ids[item]]
+
+    def __iter__(self):
+        names_unique = self.frames_index.names_unique
+        for id in self.ids:
+            yield names_unique[id]
+
+    def __eq__(self, other):
+        if isinstance(other, (OD3D_FramesView, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"OD3D_FramesView({len(self)} of {len(self.frames_index)} frames)"
@@ -0,0 +1,185 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import torch
+
+OD3D_MESH_FEATS_AGG_REDUCE_TYPES = ["acc", "avg", "avg_norm", "min50"]
+
+
+class OD3D_MeshFeatsAggregator:
+    """
+    Aggregates features and viewpoints of mesh vertices, sampled in many frames, in flat buffers indexed by vertex id.
+        avg, avg_norm: running sums per vertex, updated with scatter add.
+        min50: reservoir of at most reservoir_size samples per vertex, exact as long as no vertex has more samples.
+        acc: all samples, kept on cpu.
+    """
+
+    def __init__(
+        self,
+        verts_count: int,
+        feats_dim: int,
+        reduce_type: str,
+        device="cpu",
+        reservoir_size: int = 64,
+        dtype=torch.float32,
+    ):
+        if reduce_type not in OD3D_MESH_FEATS_AGG_REDUCE_TYPES:
+            raise NotImplementedError(f"unknown mesh feats reduce type {reduce_type}")
+        self.verts_count = verts_count
+        self.feats_dim = feats_dim
+        self.reduce_type = reduce_type
+        self.device = device
+        self.reservoir_size = reservoir_size
+
+        # number of samples seen per vertex
+        self.counts = torch.zeros(verts_count, dtype=torch.long, device=device)
+        if reduce_type in ["avg", "avg_norm"]:
+            self.feats_sum = torch.zeros(
+                (verts_count, feats_dim),
+                dtype=dtype,
+                device=device,
+            )
+            self.viewpoints_sum = torch.zeros(
+                (verts_count, 3),
+                dtype=dtype,
+                device=device,
+            )
+        elif reduce_type == "min50":
+            self.feats_reservoir = torch.full(
+                (verts_count, reservoir_size, feats_dim),
+                torch.nan,
+                dtype=dtype,
+                device=device,
+            )
+            self.viewpoints_reservoir = torch.full(
+                (verts_count, reservoir_size, 3),
+                torch.nan,
+                dtype=dtype,
+                device=device,
+            )
+        else:
+            self.verts_ids_chunks = []
+            self.feats_chunks = []
+            self.viewpoints_chunks = []
+
+    def add(
+        self,
+        verts_ids: torch.Tensor,
+        feats: torch.Tensor,
+        viewpoints: torch.Tensor,
+    ):
+        """
+        Args:
+            verts_ids (torch.Tensor): N vertex ids of the samples.
+            feats (torch.Tensor): NxC features.
+            viewpoints (torch.Tensor): Nx3 viewpoints.
+        """
+        verts_ids = verts_ids.detach().to(device=self.device, dtype=torch.long)
+        feats = feats.detach()
+        viewpoints = viewpoints.detach()
+
+        if self.reduce_type in ["avg", "avg_norm"]:
+            self.feats_sum.index_add_(
+                0,
+                verts_ids,
+                feats.to(device=self.device, dtype=self.feats_sum.dtype),
+            )
+            self.viewpoints_sum.index_add_(
+                0,
+                verts_ids,
+                viewpoints.to(device=self.device, dtype=self.viewpoints_sum.dtype),
+            )
+        elif self.reduce_type == "min50":
+            self.add_to_reservoir(verts_ids, feats, viewpoints)
+        else:
+            self.verts_ids_chunks.append(verts_ids.cpu())
+            self.feats_chunks.append(feats.cpu())
+            self.viewpoints_chunks.append(viewpoints.cpu())
+
+        self.counts += torch.bincount(verts_ids, minlength=self.verts_count)
+
+    def add_to_reservoir(self, verts_ids, feats, viewpoints):
+        N = len(verts_ids)
+        if N == 0:
+            return
+        R = self.reservoir_size
+        samples_ids = torch.arange(N, device=self.device)
+
+        # rank of each sample among the samples of the same vertex in this batch
+        verts_ids_sorted, samples_ids_sorted = torch.sort(verts_ids, stable=True)
+        verts_counts = torch.bincount(verts_ids_sorted, minlength=self.verts_count)
+        verts_offsets = torch.cumsum(verts_counts, dim=0) - verts_counts
+        ranks = torch.empty_like(samples_ids)
+        ranks[samples_ids_sorted] = samples_ids - verts_offsets[verts_ids_sorted]
+
+        # reservoir sampling: the n-th sample of a vertex fills slot n, or replaces a random slot with prob. R / n
+        seen = self.counts[verts_ids] + ranks
+        slots = torch.where(
+            seen < R,
+            seen,
+            (torch.rand(N, device=self.device) * (seen + 1)).long(),
+        )
+        accepted = slots < R
+        keys = verts_ids[accepted] * R + slots[accepted]
+        samples_ids = samples_ids[accepted]
+
+        # of several samples for the same slot, the latest one is kept
+        keys_unique, keys_inverse = torch.unique(keys, return_inverse=True)
+        samples_ids_latest = torch.full_like(keys_unique, -1).scatter_reduce(
+            0,
+            keys_inverse,
+            samples_ids,
+            reduce="amax",
+        )
+        verts_ids_write = keys_unique // R
+        slots_write = keys_unique % R
+        self.feats_reservoir[verts_ids_write, slots_write] = feats[
+            samples_ids_latest.to(feats.device)
+        ].to(device=self.device, dtype=self.feats_reservoir.dtype)
+        self.viewpoints_reservoir[verts_ids_write, slots_write] = viewpoints[
+            samples_ids_latest.to(viewpoints.device)
+        ].to(device=self.device, dtype=self.viewpoints_reservoir.dtype)
+
+    def reduce(self):
+        """
+        Returns:
+            feats (torch.Tensor | List[torch.Tensor]): VxC reduced features, for acc a list of KxC features per vertex.
+            viewpoints (torch.Tensor | List[torch.Tensor]): Vx3 reduced viewpoints, for acc a list of Kx3 per vertex.
+        """
+        if self.reduce_type in ["avg", "avg_norm"]:
+            counts = self.counts[:, None].to(dtype=self.feats_sum.dtype)
+            # vertices without samples are nan, as the mean of no samples
+            feats = self.feats_sum / counts
+            viewpoints = self.viewpoints_sum / counts
+            if self.reduce_type == "avg_norm":
+                feats = torch.nn.functional.normalize(feats, dim=-1)
+            return feats, viewpoints
+
+        elif self.reduce_type == "min50":
+            # sample with the minimum median distance to the other samples of its vertex
+            dists = torch.cdist(self.feats_reservoir, self.feats_reservoir)
+            dists_median = torch.nanquantile(dists, q=0.5, dim=-1)
+            ids = dists_median.nan_to_num(torch.inf).argmin(dim=-1)
+            verts_ids = torch.arange(self.verts_count, device=self.device)
+            return (
+                self.feats_reservoir[verts_ids, ids],
+                self.viewpoints_reservoir[verts_ids, ids],
+            )
+
+        else:
+            if len(self.verts_ids_chunks) > 0:
+                # latest samples first
+                verts_ids = torch.cat(self.verts_ids_chunks, dim=0).flip(dims=(0,))
+                feats = torch.cat(self.feats_chunks, dim=0).flip(dims=(0,))
+                viewpoints = torch.cat(self.viewpoints_chunks, dim=0).flip(dims=(0,))
+            else:
+                verts_ids = torch.zeros((0,), dtype=torch.long)
+                feats = torch.zeros((0, self.feats_dim))
+                viewpoints = torch.zeros((0, 3))
+            verts_ids, ids = torch.sort(verts_ids, stable=True)
+            counts = self.counts.cpu().tolist()
+            return (
+                list(feats[ids].split(counts, dim=0)),
+                list(viewpoints[ids].split(counts, dim=0)),
+            )
@@ -0,0 +1,469 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+from od3d.datasets.object import OD3D_MESH_FEATS_DIST_REDUCE_TYPES
+
+# layout of a mesh feats dist store (lower triangle, appendable):
+#   <fpath>.json: names_unique, verts counts and byte offsets of each row
+#   <fpath>.bin:  row i is a dense float32 matrix N_i x (N_0 + ... + N_i),
+#                 holding the distances of sequence i to all sequences j <= i.
+# distances (i, j) with j > i are read as transposed (j, i), as all reduce types are symmetric.
+
+OD3D_MESH_FEATS_DIST_STORE_VERSION = 1
+
+
+def parse_mesh_feats_dist_reduce_type(mesh_feats_dist_reduce_type: str):
+    match = re.match(
+        r"(pca)?([0-9]*)_?([a-z_]*)",
+        mesh_feats_dist_reduce_type,
+        re.I,
+    )
+    if match:
+        embed_type, embed_dim, reduce_type = match.groups()
+        if len(embed_dim) > 0:
+            embed_dim = int(embed_dim)
+    else:
+        msg = f"could not retrieve embed_type, embed_dim, and reduce type from mesh feats type {mesh_feats_dist_reduce_type}"
+        raise Exception(msg)
+    return embed_type, embed_dim, reduce_type
+
+
+def pad_mesh_feats(feats):
+    """
+    Args:
+        feats (List(torch.Tensor) | torch.Tensor): per vertex features, either as list of Viewpoints x F or as N x F.
+    Returns:
+        feats_padded (torch.Tensor): N x V x F, nan for missing viewpoints.
+        feats_mask (torch.Tensor): N x V
+    """
+    if isinstance(feats, list):
+        feats_padded = torch.nn.utils.rnn.pad_sequence(
+            feats,
+            batch_first=True,
+            padding_value=torch.nan,
+        )
+    else:
+        feats_padded = feats[:, None]
+    feats_mask = ~feats_padded.isnan().all(dim=-1)
+    return feats_padded, feats_mask
+
+
+def cat_padded_mesh_feats(feats_padded: List[torch.Tensor]):
+    """Concatenates padded features of multiple sequences along the vertices, padding the viewpoints to the max."""
+    V = max(feats.shape[1] for feats in feats_padded)
+    feats_padded = torch.cat(
+        [
+            torch.nn.functional.pad(
+                feats,
+                (0, 0, 0, V - feats.shape[1]),
+                value=torch.nan,
+            )
+            for feats in feats_padded
+        ],
+        dim=0,
+    )
+    return feats_padded, ~feats_padded.isnan().all(dim=-1)
+
+
+def get_mesh_feats_dist_padded(
+    feats1_padded: torch.Tensor,
+    feats1_mask: torch.Tensor,
+    feats2_padded: torch.Tensor,
+    feats2_mask: torch.Tensor,
+    reduce_type: str,
+    max_elements: int = 2**28,
+):
+    """
+    Reduces the distances between all viewpoint features of two vertex sets.
+    Args:
+        feats1_padded (torch.Tensor): N1 x V1 x F
+        feats1_mask (torch.Tensor): N1 x V1
+        feats2_padded (torch.Tensor): N2 x V2 x F
+        feats2_mask (torch.Tensor): N2 x V2
+        reduce_type (str): one of OD3D_MESH_FEATS_DIST_REDUCE_TYPES without embedding prefix.
+        max_elements (int): upper bound of elements of the N1' x V1 x N2 x V2 distance tensor per iteration.
+    Returns:
+        dist (torch.Tensor): N1 x N2
+    """
+    N1, V1, F = feats1_padded.shape
+    N2, V2, _ = feats2_padded.shape
+    device = feats1_padded.device
+    dist = torch.ones(size=(N1, N2), device=device) * torch.inf
+    if N1 == 0 or N2 == 0:
+        return dist
+
+    P = max(1, min(N1, max_elements // max(1, V1 * N2 * V2)))
+    feats2_padded_flat = feats2_padded.reshape(-1, F)[None,]
+    feats2_mask = feats2_mask.to(dtype=feats1_padded.dtype)
+    for p in range(0, N1, P):
+        feats1_partial = feats1_padded[p : p + P]
+        n = len(feats1_partial)
+        # Vertices1 x Viewpoints x Vertices2 x Viewpoints
+        if reduce_type.startswith("negdot"):
+            dists = -torch.einsum(
+                "bnf,bkf->bnk",
+                feats1_partial.reshape(-1, F)[None,],
+                feats2_padded_flat,
+            ).reshape(n, V1, N2, V2)
+        else:
+            dists = torch.cdist(
+                feats1_partial.reshape(-1, F)[None,],
+                feats2_padded_flat,
+            ).reshape(n, V1, N2, V2)
+        # Vertices1 x Vertices2 x Viewpoints x Viewpoints
+        dists = dists.permute(0, 2, 1, 3)
+        dists_mask = (
+            feats1_mask[p : p + P].to(dtype=dists.dtype)[:, None, :, None]
+            * feats2_mask[None, :, None, :]
+        )
+        dist_inf_mask = dists_mask.flatten(2).sum(dim=-1) == 0.0
+
+        if (
+            reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.MIN
+            or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_MIN
+        ):
+            dist[p : p + P] = dists.nan_to_num(torch.inf).flatten(2).min(dim=-1).values
+        elif (
+            reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.AVG
+            or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_AVG
+        ):
+            dist_partial = (dists.nan_to_num(0.0) * dists_mask).flatten(2).sum(
+                dim=-1,
+            ) / (dists_mask.flatten(2).sum(dim=-1) + 1e-10)
+            dist_partial[dist_inf_mask] = torch.inf
+            dist[p : p + P] = dist_partial
+        elif (
+            reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.MIN_AVG
+            or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_MIN_AVG
+        ):
+            dists = dists.nan_to_num(torch.inf)
+            dist_partial = (
+                (
+                    dists.min(dim=-1).values.nan_to_num(posinf=0.0)
+                    * dists_mask[:, :, :, 0]
+                ).sum(dim=-1)
+                + (
+                    dists.min(dim=-2).values.nan_to_num(posinf=0.0)
+                    * dists_mask[:, :, 0, :]
+                ).sum(dim=-1)
+            ) / (
+                dists_mask[:, :, 0, :].sum(dim=-1)
+                + dists_mask[:, :, :, 0].sum(dim=-1)
+                + 1e-10
+            )
+            dist_partial[dist_inf_mask] = torch.inf
+            dist[p : p + P] = dist_partial
+        else:
+            logger.warning(f"Unknown reduce type {reduce_type}.")
+        del dists
+        del dists_mask
+    return dist
+
+
+def get_mesh_feats_dist(
+    feats1,
+    feats2,
+    mesh_feats_dist_reduce_type: str,
+    device="cpu",
+    max_elements: int = 2**28,
+):
+    """
+    Args:
+        feats1 (List(torch.Tensor) | torch.Tensor): per vertex features of the first sequence.
+        feats2 (List(torch.Tensor) | torch.Tensor): per vertex features of the second sequence.
+        mesh_feats_dist_reduce_type (str): e.g. min_avg, pca32_avg.
+    Returns:
+        dist (torch.Tensor): N1 x N2
+    """
+    embed_type, embed_dim, reduce_type = parse_mesh_feats_dist_reduce_type(
+        mesh_feats_dist_reduce_type,
+    )
+    feats1_padded, feats1_mask = pad_mesh_feats(feats1)
+    feats2_padded, feats2_mask = pad_mesh_feats(feats2)
+    feats1_padded = feats1_padded.to(device=device)
+    feats2_padded = feats2_padded.to(device=device)
+    feats1_mask = feats1_mask.to(device=device)
+    feats2_mask = feats2_mask.to(device=device)
+
+    if embed_type is None or len(embed_type) == 0:
+        pass
+    elif embed_type == "pca":
+        from od3d.cv.cluster.embed import pca
+
+        # the embedding is fit jointly on both sequences
+        feats12_embed = pca(
+            torch.cat([feats1_padded[feats1_mask], feats2_padded[feats2_mask]], dim=0),
+            C=embed_dim,
+        )
+        feats1_padded_embed = torch.full(
+            size=feats1_padded.shape[:-1] + (embed_dim,),
+            fill_value=torch.nan,
+            dtype=feats1_padded.dtype,
+            device=device,
+        )
+        feats2_padded_embed = feats1_padded_embed.new_full(
+            size=feats2_padded.shape[:-1] + (embed_dim,),
+            fill_value=torch.nan,
+        )
+        feats1_padded_embed[feats1_mask] = feats12_embed[: feats1_mask.sum()]
+        feats2_padded_embed[feats2_mask] = feats12_embed[feats1_mask.sum() :]
+        feats1_padded = feats1_padded_embed
+        feats2_padded = feats2_padded_embed
+    else:
+        logger.warning(f"unknown embed type {embed_type}")
+
+    return get_mesh_feats_dist_padded(
+        feats1_padded=feats1_padded,
+        feats1_mask=feats1_mask,
+        feats2_padded=feats2_padded,
+        feats2_mask=feats2_mask,
+        reduce_type=reduce_type,
+        max_elements=max_elements,
+    )
+
+
+class OD3D_MeshFeatsDistStore:
+    """
+    Symmetric pairwise mesh feats distances of a set of sequences, stored as appendable lower triangle in a single file.
+    Each row is written at once, such that an interrupted preprocessing resumes with the first missing row.
+    """
+
+    _cache: Dict[str, "OD3D_MeshFeatsDistStore"] = {}
+
+    def __init__(self, fpath: Path):
+        self.fpath = Path(fpath)
+        self.fpath_index = self.fpath.with_suffix(".json")
+        self.fpath_data = self.fpath.with_suffix(".bin")
+        if self.fpath_index.exists():
+            with open(self.fpath_index, "r") as f:
+                index = json.load(f)
+            if index["version"] != OD3D_MESH_FEATS_DIST_STORE_VERSION:
+                raise ValueError(
+                    f"Unsupported mesh feats dist store version {index['version']} at {self.fpath_index}.",
+                )
+            self.names_unique: List[str] = index["names_unique"]
+            self.verts_counts: List[int] = index["verts_counts"]
+            self.rows_offsets: List[int] = index["rows_offsets"]
+        else:
+            self.names_unique = []
+            self.verts_counts = []
+            self.rows_offsets = [0]
+        self.rows = {name_unique: i for i, name_unique in enumerate(self.names_unique)}
+        self.cols_offsets = np.concatenate(
+            [[0], np.cumsum(self.verts_counts, dtype=np.int64)],
+        ).tolist()
+        self._data = None
+
+    @classmethod
+    def open(cls, fpath: Path):
+        """Returns the store at fpath, cached per process until its index changed, or None if it does not exist."""
+        fpath = Path(fpath)
+        fpath_index = fpath.with_suffix(".json")
+        try:
+            mtime = os.stat(fpath_index).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        key = str(fpath)
+        entry = cls._cache.get(key, None)
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, cls(fpath))
+            cls._cache[key] = entry
+        return entry[1]
+
+    def __len__(self):
+        return len(self.names_unique)
+
+    def __contains__(self, name_unique: str):
+        return name_unique in self.rows
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(
+                self.fpath_data,
+                dtype=np.float32,
+                mode="r",
+                shape=(self.rows_offsets[-1] // 4,),
+            )
+        return self._data
+
+    def get_row(self, name_unique: str):
+        """Returns the distances of name_unique to all previous sequences in the store as N_i x (N_0 + ... + N_i)."""
+        i = self.rows[name_unique]
+        return self.data[
+            self.rows_offsets[i] // 4 : self.rows_offsets[i + 1] // 4
+        ].reshape(
+            self.verts_counts[i],
+            self.cols_offsets[i + 1],
+        )
+
+    def get(self, name_unique1: str, name_unique2: str):
+        i = self.rows[name_unique1]
+        j = self.rows[name_unique2]
+        if j <= i:
+            dist = self.get_row(name_unique1)[
+                :,
+                self.cols_offsets[j] : self.cols_offsets[j + 1],
+            ]
+        else:
+            dist = self.get_row(name_unique2)[
+                :,
+                self.cols_offsets[i] : self.cols_offsets[i + 1],
+            ].T
+        return torch.from_numpy(np.array(dist))
+
+    def append_row(self, name_unique: str, dist_row: torch.Tensor):
+        """Appends the distances of a new sequence to all sequences in the store and to itself."""
+        N = dist_row.shape[0]
+        if dist_row.shape[1] != self.cols_offsets[-1] + N:
+            raise ValueError(
+                f"Expected row of width {self.cols_offsets[-1] + N}, got {dist_row.shape[1]}.",
+            )
+        self.fpath.parent.mkdir(parents=True, exist_ok=True)
+        dist_row = dist_row.detach().cpu().to(dtype=torch.float32).numpy()
+        with open(self.fpath_data, "r+b" if self.fpath_data.exists() else "wb") as f:
+            # drop a partial row of an interrupted run
+            f.truncate(self.rows_offsets[-1])
+            f.seek(self.rows_offsets[-1])
+            f.write(np.ascontiguousarray(dist_row).tobytes())
+        self.names_unique.append(name_unique)
+        self.verts_counts.append(N)
+        self.rows[name_unique] = len(self.names_unique) - 1
+        self.rows_offsets.append(self.rows_offsets[-1] + dist_row.nbytes)
+        self.cols_offsets.append(self.cols_offsets[-1] + N)
+        self._data = None
+        self.write_index()
+
+    def write_index(self):
+        fpath_index_tmp = self.fpath_index.with_suffix(".json.tmp")
+        with open(fpath_index_tmp, "w") as f:
+            json.dump(
+                {
+                    "version": OD3D_MESH_FEATS_DIST_STORE_VERSION,
+                    "names_unique": self.names_unique,
+                    "verts_counts": self.verts_counts,
+                    "rows_offsets": self.rows_offsets,
+                },
+                f,
+            )
+        fpath_index_tmp.replace(self.fpath_index)
+
+    def remove(self):
+        for fpath in [self.fpath_index, self.fpath_data]:
+            if fpath.exists():
+                fpath.unlink()
+        self._cache.pop(str(self.fpath), None)
+
+    @staticmethod
+    def preprocess(
+        fpath: Path,
+        names_unique: List[str],
+        read_mesh_feats,
+        mesh_feats_dist_reduce_type: str,
+        device="cpu",
+        pairs_batch_verts: int = 8192,
+        max_elements: int = 2**28,
+        override=False,
+    ):
+        """
+        Computes all missing pairwise distances of names_unique and appends them to the store at fpath.
+        Each sequence features are read once, only pairs (i, j) with j <= i are computed,
+        and multiple sequences j are batched per device call up to pairs_batch_verts vertices.
+        Args:
+            read_mesh_feats (Callable): returns the mesh feats for a name_unique.
+        """
+        store = OD3D_MeshFeatsDistStore(fpath)
+        if override:
+            logger.info(f"overriding mesh feats dist store at {fpath}")
+            store.remove()
+            store = OD3D_MeshFeatsDistStore(fpath)
+
+        names_unique_todo = [
+            name_unique for name_unique in names_unique if name_unique not in store
+        ]
+        if len(names_unique_todo) == 0:
+            logger.info(f"mesh feats dist already exist at {fpath}")
+            return store
+        logger.info(
+            f"mesh feats dist store at {fpath}: {len(store)} sequences done, {len(names_unique_todo)} to do",
+        )
+
+        embed_type, _, reduce_type = parse_mesh_feats_dist_reduce_type(
+            mesh_feats_dist_reduce_type,
+        )
+        pairwise_embed = embed_type is not None and len(embed_type) > 0
+
+        # features of all sequences in the store, read once, kept padded on cpu
+        feats = {}
+
+        def get_feats(name_unique):
+            if name_unique not in feats:
+                feats[name_unique] = read_mesh_feats(name_unique)
+                if not pairwise_embed:
+                    feats[name_unique] = pad_mesh_feats(feats[name_unique])
+            return feats[name_unique]
+
+        sequences_count = len(store) + len(names_unique_todo)
+        time_start = time.time()
+        pairs_count = 0
+        for name_unique in names_unique_todo:
+            names_unique_cols = store.names_unique + [name_unique]
+            dists = []
+            if pairwise_embed:
+                # the embedding is fit per pair, therefore pairs cannot be batched
+                for name_unique_col in names_unique_cols:
+                    dists.append(
+                        get_mesh_feats_dist(
+                            get_feats(name_unique),
+                            get_feats(name_unique_col),
+                            mesh_feats_dist_reduce_type=mesh_feats_dist_reduce_type,
+                            device=device,
+                            max_elements=max_elements,
+                        ),
+                    )
+            else:
+                feats_row_padded, feats_row_mask = get_feats(name_unique)
+                feats_row_padded = feats_row_padded.to(device=device)
+                feats_row_mask = feats_row_mask.to(device=device)
+                cols_batch = []
+                cols_batch_verts = 0
+                for c, name_unique_col in enumerate(names_unique_cols):
+                    cols_batch.append(get_feats(name_unique_col))
+                    cols_batch_verts += len(cols_batch[-1][0])
+                    if (
+                        cols_batch_verts >= pairs_batch_verts
+                        or c == len(names_unique_cols) - 1
+                    ):
+                        feats_cols_padded, feats_cols_mask = cat_padded_mesh_feats(
+                            [feats_col[0] for feats_col in cols_batch],
+                        )
+                        dists.append(
+                            get_mesh_feats_dist_padded(
+                                feats1_padded=feats_row_padded,
+                                feats1_mask=feats_row_mask,
+                                feats2_padded=feats_cols_padded.to(device=device),
+                                feats2_mask=feats_cols_mask.to(device=device),
+                                reduce_type=reduce_type,
+                                max_elements=max_elements,
+                            ).cpu(),
+                        )
+                        cols_batch = []
+                        cols_batch_verts = 0
+            store.append_row(name_unique, torch.cat([d.cpu() for d in dists], dim=1))
+            pairs_count += len(names_unique_cols)
+            duration = time.time() - time_start
+            logger.info(
+                f"mesh feats dist {len(store)}/{sequences_count} sequences, "
+                f"{pairs_count / max(duration, 1e-10):.2f} pairs/s",
+            )
+        return store
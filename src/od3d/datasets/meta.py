@@ -8,13 +8,25 @@ from dataclasses import dataclass
 from typing import List, Union, Dict
 from abc import ABC
 from od3d.data.ext_dicts import unroll_nested_dict, rollup_flattened_dict
+from od3d.data.ext_enum import StrEnum
 import re
 
 
+class OD3D_META_BACKENDS(StrEnum):
+    YAML = "yaml"
+    COLUMNAR = "columnar"
+
+
 @dataclass
 class OD3D_Meta(ABC):
     name: str
 
+    # process wide, path_meta -> backend, set by datasets, otherwise detected once from the files
+    meta_backends = {}
+    meta_backends_detected = {}
+    # process wide, fpath store -> opened columnar meta store
+    meta_stores = {}
+
     # @staticmethod
     # @abstractmethod
     @classmethod
@@ -52,6 +64,110 @@ class OD3D_Meta(ABC):
     def get_path_metas(cls, path_meta: Path):
         return path_meta.joinpath(cls.get_rfpath_metas())
 
+    @staticmethod
+    def set_meta_backend(path_meta: Path, meta_backend: OD3D_META_BACKENDS = None):
+        if meta_backend is None:
+            OD3D_Meta.meta_backends.pop(str(path_meta), None)
+        else:
+            OD3D_Meta.meta_backends[str(path_meta)] = OD3D_META_BACKENDS(meta_backend)
+
+    @staticmethod
+    def get_meta_backend(path_meta: Path, rfpath_metas: Path):
+        meta_backend = OD3D_Meta.meta_backends.get(str(path_meta), None)
+        if meta_backend is None:
+            from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+            fpath_store = OD3D_MetaColumnarStore.get_fpath(
+                path_meta=path_meta,
+                rfpath_metas=rfpath_metas,
+            )
+            meta_backend = OD3D_Meta.meta_backends_detected.get(str(fpath_store), None)
+            if meta_backend is None:
+                meta_store = OD3D_Meta.meta_stores.get(str(fpath_store), None)
+                if meta_store is not None and meta_store.is_outdated():
+                    OD3D_Meta.meta_stores.pop(str(fpath_store))
+                if not fpath_store.exists():
+                    meta_backend = OD3D_META_BACKENDS.YAML
+                elif OD3D_MetaColumnarStore.is_older_than_yaml(
+                    path_meta=path_meta,
+                    rfpath_metas=rfpath_metas,
+                ):
+                    logger.warning(
+                        f"yaml metas saved after writing meta store {fpath_store}, use yaml metas. Migrate again to update the store.",
+                    )
+                    meta_backend = OD3D_META_BACKENDS.YAML
+                else:
+                    meta_backend = OD3D_META_BACKENDS.COLUMNAR
+                OD3D_Meta.meta_backends_detected[str(fpath_store)] = meta_backend
+        return meta_backend
+
+    @staticmethod
+    def get_meta_store(path_meta: Path, rfpath_metas: Path):
+        from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+        fpath_store = OD3D_MetaColumnarStore.get_fpath(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        meta_store = OD3D_Meta.meta_stores.get(str(fpath_store), None)
+        if meta_store is None:
+            meta_store = OD3D_MetaColumnarStore(fpath=fpath_store)
+            OD3D_Meta.meta_stores[str(fpath_store)] = meta_store
+        return meta_store
+
+    @classmethod
+    def get_fpath_meta_source(cls, path_meta: Path, name_unique: str):
+        # file which has to be read to load the meta, either yaml file or meta store
+        rfpath_metas = cls.get_rfpath_metas()
+        if (
+            cls.get_meta_backend(path_meta=path_meta, rfpath_metas=rfpath_metas)
+            == OD3D_META_BACKENDS.COLUMNAR
+        ):
+            from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+            return OD3D_MetaColumnarStore.get_fpath(
+                path_meta=path_meta,
+                rfpath_metas=rfpath_metas,
+            )
+        else:
+            return path_meta.joinpath(
+                cls.get_rfpath_from_name_unique(name_unique=name_unique),
+            )
+
+    @staticmethod
+    def split_rfpath(rfpath: Path):
+        # frames/category/sequence/frame.yaml -> frames, category/sequence/frame
+        rfpath = Path(rfpath)
+        return (
+            Path(rfpath.parts[0]),
+            rfpath.relative_to(rfpath.parts[0])
+            .with_suffix(
+                "",
+            )
+            .as_posix(),
+        )
+
+    @classmethod
+    def listdir_metas(cls, path_meta: Path, rpath: str):
+        """
+        Returns names and whether the first child is a directory for the children at rpath of the meta tree.
+        """
+        rfpath_metas = cls.get_rfpath_metas()
+        if (
+            cls.get_meta_backend(path_meta=path_meta, rfpath_metas=rfpath_metas)
+            == OD3D_META_BACKENDS.COLUMNAR
+        ):
+            children = cls.get_meta_store(
+                path_meta=path_meta,
+                rfpath_metas=rfpath_metas,
+            ).listdir(rpath)
+            return [name for name, _ in children], children[0][1]
+        else:
+            dir_fpaths = list(
+                cls.get_path_metas(path_meta=path_meta).joinpath(rpath).iterdir(),
+            )
+            return [dir_fpath.stem for dir_fpath in dir_fpaths], dir_fpaths[0].is_dir()
+
     @staticmethod
     def atoi(text):
         return int(text) if text.isdigit() else text
@@ -75,10 +191,11 @@ class OD3D_Meta(ABC):
         for key, value in dict_nested_metas.items():
             new_key = f"{parent_key}{separator}{key}" if parent_key else key
             if value is None:
-                dir_fpaths = list(
-                    cls.get_path_metas(path_meta=path_meta).joinpath(new_key).iterdir(),
+                dir_names, dir_names_are_dirs = cls.listdir_metas(
+                    path_meta=path_meta,
+                    rpath=new_key,
                 )
-                if dir_fpaths[0].is_dir():
+                if dir_names_are_dirs:
                     if (
                         dict_nested_metas_ban is None
                         or key not in dict_nested_metas_ban
@@ -87,7 +204,7 @@ class OD3D_Meta(ABC):
                             path_meta=path_meta,
                             parent_key=new_key,
                             dict_nested_metas={
-                                f"{dir_fpath.stem}": None for dir_fpath in dir_fpaths
+                                f"{dir_name}": None for dir_name in dir_names
                             },
                         )
                     elif dict_nested_metas_ban[key] is not None:
@@ -95,7 +212,7 @@ class OD3D_Meta(ABC):
                             path_meta=path_meta,
                             parent_key=new_key,
                             dict_nested_metas={
-                                f"{dir_fpath.stem}": None for dir_fpath in dir_fpaths
+                                f"{dir_name}": None for dir_name in dir_names
                             },
                             dict_nested_metas_ban=dict_nested_metas_ban[key],
                         )
@@ -107,26 +224,24 @@ class OD3D_Meta(ABC):
                         or key not in dict_nested_metas_ban
                     ):
                         dict_nested_frames_completed[key] = [
-                            dir_fpath.stem
-                            for dir_fpath in sorted(
-                                dir_fpaths,
+                            dir_name
+                            for dir_name in sorted(
+                                dir_names,
                                 key=lambda f: [
-                                    OD3D_Meta.atoi(val)
-                                    for val in re.split(r"(\d+)", f.stem)
+                                    OD3D_Meta.atoi(val) for val in re.split(r"(\d+)", f)
                                 ],
                             )
                         ]
                     elif dict_nested_metas_ban[key] is not None:
                         dict_nested_frames_completed[key] = [
-                            dir_fpath.stem
-                            for dir_fpath in sorted(
-                                dir_fpaths,
+                            dir_name
+                            for dir_name in sorted(
+                                dir_names,
                                 key=lambda f: [
-                                    OD3D_Meta.atoi(val)
-                                    for val in re.split(r"(\d+)", f.stem)
+                                    OD3D_Meta.atoi(val) for val in re.split(r"(\d+)", f)
                                 ],
                             )
-                            if dir_fpath.stem not in dict_nested_metas_ban[key]
+                            if dir_name not in dict_nested_metas_ban[key]
                         ]
                     else:
                         pass
@@ -196,6 +311,15 @@ class OD3D_Meta(ABC):
 
     @staticmethod
     def load_omega_conf_with_rfpath(path_meta: Path, rfpath: Path):
+        rfpath_metas, name_unique = OD3D_Meta.split_rfpath(rfpath)
+        if (
+            OD3D_Meta.get_meta_backend(path_meta=path_meta, rfpath_metas=rfpath_metas)
+            == OD3D_META_BACKENDS.COLUMNAR
+        ):
+            return OD3D_Meta.get_meta_store(
+                path_meta=path_meta,
+                rfpath_metas=rfpath_metas,
+            ).get_record(name_unique)
         fpath_meta = path_meta.joinpath(rfpath)
         if not fpath_meta.exists():
             logger.error(f"Missing meta fpath {fpath_meta}. Preprocess meta before.")
@@ -207,3 +331,17 @@ class OD3D_Meta(ABC):
         if not frame_meta_fpath.parent.exists():
             frame_meta_fpath.parent.mkdir(parents=True)
         OmegaConf.save(frame_meta_config, frame_meta_fpath, resolve=True)
+
+        # yaml metas are newer than a possible meta store now, also for other processes
+        from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+        rfpath_metas = OD3D_Meta.split_rfpath(self.rfpath)[0]
+        OD3D_MetaColumnarStore.touch_stamp(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        fpath_store = OD3D_MetaColumnarStore.get_fpath(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        OD3D_Meta.meta_backends_detected[str(fpath_store)] = OD3D_META_BACKENDS.YAML
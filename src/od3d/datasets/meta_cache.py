@@ -0,0 +1,89 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+from pathlib import Path
+import os
+
+
+class OD3D_MetaCache:
+    """
+    Bounded LRU cache for loaded metas, keyed by path_meta, meta type and name_unique.
+    Entries are invalidated if the modification time of the meta file (or meta store) changed.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, meta_type, path_meta: Path, name_unique: str):
+        if self.maxsize is None or self.maxsize <= 0:
+            self.misses += 1
+            return meta_type.load_from_meta_with_name_unique(
+                path_meta=path_meta,
+                name_unique=name_unique,
+            )
+
+        key = (str(path_meta), meta_type, name_unique)
+        fpath_meta = meta_type.get_fpath_meta_source(
+            path_meta=path_meta,
+            name_unique=name_unique,
+        )
+        try:
+            mtime = os.stat(fpath_meta).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        entry = self.entries.get(key, None)
+        if entry is not None and mtime is not None and entry[0] == mtime:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        meta = meta_type.load_from_meta_with_name_unique(
+            path_meta=path_meta,
+            name_unique=name_unique,
+        )
+        if mtime is not None:
+            self.entries[key] = (mtime, meta)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return meta
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_stats(self):
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / requests if requests > 0 else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(
+            f"meta cache (pid {os.getpid()}): {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions, {stats['size']}/{stats['maxsize']} entries, "
+            f"hit rate {stats['hit_rate']:.3f}",
+        )
+
+
+# process wide, shared by all OD3D_Object subclasses, each DataLoader worker holds its own copy
+OD3D_META_CACHE = OD3D_MetaCache(maxsize=4096)
@@ -0,0 +1,314 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from omegaconf import OmegaConf
+from tqdm import tqdm
+
+# layout of a columnar meta store file:
+#   MAGIC | uint64 header size | json header | (aligned) column buffers
+# numeric columns are stored as dense arrays (N, *shape), all other columns are stored as
+# json encoded records with an int64 offsets array (N+1,). An empty json slot marks a record
+# without this field.
+
+OD3D_META_STORE_MAGIC = b"OD3DMETA"
+OD3D_META_STORE_VERSION = 1
+OD3D_META_STORE_SUFFIX = ".od3dmeta"
+# touched whenever a yaml meta is saved, a store older than the stamp misses yaml metas
+OD3D_META_STAMP_SUFFIX = ".stamp"
+OD3D_META_STORE_ALIGN = 64
+
+
+def _align(offset: int):
+    return (
+        (offset + OD3D_META_STORE_ALIGN - 1)
+        // OD3D_META_STORE_ALIGN
+        * (OD3D_META_STORE_ALIGN)
+    )
+
+
+def _contains_path(value):
+    if isinstance(value, Path):
+        return True
+    elif isinstance(value, (list, tuple)):
+        return any(_contains_path(val) for val in value)
+    return False
+
+
+def _to_path(value):
+    if isinstance(value, str):
+        return Path(value)
+    elif isinstance(value, list):
+        return [_to_path(val) for val in value]
+    return value
+
+
+def _get_numeric_array(values: List):
+    """Returns values as dense numeric array, or None if values are ragged, missing or non numeric."""
+    if any(val is None for val in values) or len(values) == 0:
+        return None
+    try:
+        arr = np.asarray(values)
+    except (ValueError, TypeError):
+        return None
+    if arr.dtype == np.bool_:
+        return arr
+    if np.issubdtype(arr.dtype, np.integer):
+        return arr.astype(np.int64)
+    if np.issubdtype(arr.dtype, np.floating):
+        return arr.astype(np.float64)
+    return None
+
+
+class OD3D_MetaColumnarStore:
+    """
+    Packs all meta records (e.g. frames or sequences) of a dataset into a single columnar file.
+    The file is memory-mapped on open, records are decoded lazily per row.
+    """
+
+    def __init__(self, fpath: Path):
+        self.fpath = Path(fpath)
+        self.mtime = self.fpath.stat().st_mtime
+        with open(self.fpath, "rb") as f:
+            magic = f.read(len(OD3D_META_STORE_MAGIC))
+            if magic != OD3D_META_STORE_MAGIC:
+                raise ValueError(f"Not an od3d meta store {self.fpath}.")
+            header_size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            self.header = json.loads(f.read(header_size).decode("utf-8"))
+        # column offsets are stored relative to the first aligned byte after the header
+        self.data_start = _align(len(OD3D_META_STORE_MAGIC) + 8 + header_size)
+        if self.header["version"] != OD3D_META_STORE_VERSION:
+            raise ValueError(
+                f"Unsupported meta store version {self.header['version']} at {self.fpath}.",
+            )
+        self.buffer = np.memmap(self.fpath, dtype=np.uint8, mode="r")
+        self.names_unique: List[str] = self.header["names_unique"]
+        self.rows: Dict[str, int] = {
+            name_unique: row for row, name_unique in enumerate(self.names_unique)
+        }
+        self._children = None
+
+    def __len__(self):
+        return len(self.names_unique)
+
+    def __contains__(self, name_unique: str):
+        return name_unique in self.rows
+
+    def _get_column_array(self, offset: int, dtype: str, shape: List[int]):
+        count = int(np.prod(shape))
+        itemsize = np.dtype(dtype).itemsize
+        offset = self.data_start + offset
+        return (
+            self.buffer[offset : offset + count * itemsize].view(dtype).reshape(shape)
+        )
+
+    def get_column(self, key: str, row: int):
+        column = self.header["columns"][key]
+        if column["type"] == "numeric":
+            arr = self._get_column_array(
+                column["offset"],
+                column["dtype"],
+                [len(self)] + column["shape"],
+            )
+            return arr[row].tolist()
+        else:
+            offsets = self._get_column_array(
+                column["offsets_offset"],
+                "int64",
+                [len(self) + 1],
+            )
+            start, end = int(offsets[row]), int(offsets[row + 1])
+            if start == end:
+                raise KeyError(key)
+            data_offset = self.data_start + column["data_offset"]
+            value = json.loads(
+                bytes(self.buffer[data_offset + start : data_offset + end]).decode(
+                    "utf-8",
+                ),
+            )
+            if column.get("path", False):
+                value = _to_path(value)
+            return value
+
+    def get_record(self, name_unique: str):
+        if name_unique not in self.rows:
+            raise KeyError(f"Missing meta {name_unique} in meta store {self.fpath}.")
+        row = self.rows[name_unique]
+        record = {}
+        for key in self.header["columns"].keys():
+            try:
+                record[key] = self.get_column(key, row)
+            except KeyError:
+                pass
+        return record
+
+    def listdir(self, rpath: str = ""):
+        """
+        Returns the sorted direct children of rpath in the names tree of the store,
+        and whether these children are directories (as a directory tree of meta files would).
+        """
+        if self._children is None:
+            self._children = {}
+            for name_unique in self.names_unique:
+                parts = name_unique.split("/")
+                for i in range(len(parts)):
+                    parent = "/".join(parts[:i])
+                    children = self._children.setdefault(parent, {})
+                    children[parts[i]] = children.get(parts[i], False) or (
+                        i < len(parts) - 1
+                    )
+        rpath = str(rpath).strip("/")
+        if rpath not in self._children:
+            raise FileNotFoundError(f"{rpath} not in meta store {self.fpath}.")
+        return list(self._children[rpath].items())
+
+    def is_outdated(self):
+        """Returns True if the store file was rewritten since it was opened."""
+        return not self.fpath.exists() or self.fpath.stat().st_mtime != self.mtime
+
+    @staticmethod
+    def is_older_than_yaml(path_meta: Path, rfpath_metas: Path):
+        """
+        Returns True if a yaml meta below path_meta/rfpath_metas was saved after the store file was written,
+        compares the yaml stamp with the store file, the yaml metas are not scanned.
+        """
+        fpath_store = OD3D_MetaColumnarStore.get_fpath(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        fpath_stamp = OD3D_MetaColumnarStore.get_fpath_stamp(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        try:
+            mtime_ns_stamp = fpath_stamp.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        return mtime_ns_stamp > fpath_store.stat().st_mtime_ns
+
+    @staticmethod
+    def touch_stamp(path_meta: Path, rfpath_metas: Path):
+        fpath_stamp = OD3D_MetaColumnarStore.get_fpath_stamp(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        fpath_stamp.parent.mkdir(parents=True, exist_ok=True)
+        fpath_stamp.touch()
+
+    @staticmethod
+    def get_fpath(path_meta: Path, rfpath_metas: Path):
+        return Path(path_meta).joinpath(f"{rfpath_metas}{OD3D_META_STORE_SUFFIX}")
+
+    @staticmethod
+    def get_fpath_stamp(path_meta: Path, rfpath_metas: Path):
+        return Path(path_meta).joinpath(f"{rfpath_metas}{OD3D_META_STAMP_SUFFIX}")
+
+    @staticmethod
+    def write(fpath: Path, records: Dict[str, Dict]):
+        names_unique = list(records.keys())
+        keys = []
+        for record in records.values():
+            for key in record.keys():
+                if key not in keys:
+                    keys.append(key)
+
+        header = {
+            "version": OD3D_META_STORE_VERSION,
+            "names_unique": names_unique,
+            "columns": {},
+        }
+        buffers = []
+        offset = 0
+        for key in keys:
+            values = [
+                records[name_unique].get(key, None) for name_unique in names_unique
+            ]
+            arr = _get_numeric_array(values)
+            if arr is not None:
+                arr = np.ascontiguousarray(arr)
+                header["columns"][key] = {
+                    "type": "numeric",
+                    "dtype": arr.dtype.str,
+                    "shape": list(arr.shape[1:]),
+                    "offset": offset,
+                }
+                buffers.append((offset, arr.tobytes()))
+                offset = _align(offset + arr.nbytes)
+            else:
+                encoded = [
+                    json.dumps(val, default=str).encode("utf-8")
+                    if key in records[name_unique]
+                    else b""
+                    for val, name_unique in zip(values, names_unique)
+                ]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                offsets[1:] = np.cumsum([len(enc) for enc in encoded])
+                header["columns"][key] = {
+                    "type": "json",
+                    "path": any(_contains_path(val) for val in values),
+                    "offsets_offset": offset,
+                }
+                buffers.append((offset, offsets.tobytes()))
+                offset = _align(offset + offsets.nbytes)
+                header["columns"][key]["data_offset"] = offset
+                data = b"".join(encoded)
+                buffers.append((offset, data))
+                offset = _align(offset + len(data))
+
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = _align(len(OD3D_META_STORE_MAGIC) + 8 + len(header_bytes))
+
+        fpath = Path(fpath)
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        fpath_tmp = fpath.with_suffix(fpath.suffix + ".tmp")
+        with open(fpath_tmp, "wb") as f:
+            f.write(OD3D_META_STORE_MAGIC)
+            f.write(np.array([len(header_bytes)], dtype=np.uint64).tobytes())
+            f.write(header_bytes)
+            for buffer_offset, buffer in buffers:
+                f.seek(data_start + buffer_offset)
+                f.write(buffer)
+        fpath_tmp.replace(fpath)
+
+    @staticmethod
+    def migrate_from_yaml(path_meta: Path, rfpath_metas: Path, remove_yaml=False):
+        """
+        Packs all yaml meta files below path_meta/rfpath_metas into a single meta store file.
+        """
+        path_metas = Path(path_meta).joinpath(rfpath_metas)
+        fpath_store = OD3D_MetaColumnarStore.get_fpath(
+            path_meta=path_meta,
+            rfpath_metas=rfpath_metas,
+        )
+        if not path_metas.exists():
+            logger.warning(f"No yaml metas found at {path_metas}, skip migration.")
+            return None
+
+        logger.info(f"collecting yaml metas at {path_metas}...")
+        fpaths = sorted(path_metas.rglob("*.yaml"))
+        records = {}
+        for fpath in tqdm(fpaths):
+            name_unique = fpath.relative_to(path_metas).with_suffix("").as_posix()
+            records[name_unique] = OmegaConf.to_container(
+                OmegaConf.load(fpath),
+                resolve=True,
+            )
+
+        logger.info(f"writing {len(records)} metas to {fpath_store}...")
+        OD3D_MetaColumnarStore.write(fpath=fpath_store, records=records)
+
+        # detect the backend again, reopen the store
+        from od3d.datasets.meta import OD3D_Meta
+
+        OD3D_Meta.meta_backends_detected.pop(str(fpath_store), None)
+
+        if remove_yaml:
+            import shutil
+
+            shutil.rmtree(path_metas)
+        return fpath_store
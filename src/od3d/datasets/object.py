@@ -2,6 +2,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 from od3d.datasets.meta import OD3D_Meta
+from od3d.datasets.meta_cache import OD3D_META_CACHE
 from abc import ABC
 from dataclasses import dataclass
 from pathlib import Path
@@ -22,7 +23,8 @@ class OD3D_Object(ABC):
 
     @property
     def meta(self):
-        return self.meta_type.load_from_meta_with_name_unique(
+        return OD3D_META_CACHE.get(
+            meta_type=self.meta_type,
             path_meta=self.path_meta,
             name_unique=self.name_unique,
         )
@@ -0,0 +1,225 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# dataset of the current worker process, set once by the pool initializer
+_worker_dataset = None
+
+
+def _init_worker(dataset, devices_queue, log_level):
+    global _worker_dataset
+    logging.basicConfig(level=log_level)
+    if devices_queue is not None:
+        device = devices_queue.get()
+        if device is not None:
+            # must be set before cuda is initialized in this process
+            os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+    _worker_dataset = dataset
+
+
+def _run_sequence_job(
+    method: str,
+    sequence_name_unique: str,
+    override: bool,
+    method_kwargs: Dict = None,
+):
+    time_start = time.time()
+    try:
+        sequence = _worker_dataset.get_sequence_by_name_unique(
+            name_unique=sequence_name_unique,
+        )
+        getattr(sequence, method)(override=override, **(method_kwargs or {}))
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return sequence_name_unique, error, time.time() - time_start
+
+
+class OD3D_PreprocessExecutor:
+    """
+    Runs a per sequence preprocessing method (e.g. preprocess_pcl) for many sequences of a dataset,
+    optionally in a process pool with one device per worker. Finished sequences are recorded in a manifest
+    together with their resolved output fpath, such that interrupted runs resume with the remaining sequences,
+    and sequences are run again if their output fpath changes (e.g. with the pcl or sfm type).
+    """
+
+    def __init__(self, dataset, workers: int = 0, devices: List = None):
+        self.dataset = dataset
+        self.workers = workers if workers is not None else 0
+        self.devices = list(devices) if devices is not None else None
+
+    def get_fpath_manifest(self, method: str):
+        return self.dataset.path_preprocess.joinpath(
+            "manifests",
+            f"{method}.jsonl",
+        )
+
+    def get_fpath_output(self, sequence_name_unique: str, get_fpath_output: Callable):
+        if get_fpath_output is None:
+            return None
+        sequence = self.dataset.get_sequence_by_name_unique(
+            name_unique=sequence_name_unique,
+        )
+        return str(get_fpath_output(sequence))
+
+    @staticmethod
+    def read_manifest(fpath_manifest: Path):
+        """
+        Returns:
+            sequences_done (set): (name_unique, fpath) of the sequences finished last without failure.
+        """
+        sequences_done = set()
+        if not fpath_manifest.exists():
+            return sequences_done
+        with open(fpath_manifest, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line may be incomplete if the run was killed
+                    continue
+                key = (entry["name_unique"], entry.get("fpath", None))
+                if entry["status"] == "done":
+                    sequences_done.add(key)
+                else:
+                    sequences_done.discard(key)
+        return sequences_done
+
+    def run(
+        self,
+        method: str,
+        sequences_names_unique: List[str],
+        override=False,
+        get_fpath_output: Callable = None,
+        method_kwargs: Dict = None,
+    ):
+        """
+        Args:
+            get_fpath_output (Callable): returns the output fpath of the method for a sequence,
+                a sequence counts as finished only for the output fpath it was recorded with.
+            method_kwargs (Dict): further keyword arguments of the method, e.g. from the preprocess config.
+        """
+        fpath_manifest = self.get_fpath_manifest(method=method)
+        fpath_manifest.parent.mkdir(parents=True, exist_ok=True)
+
+        if override:
+            sequences_done = set()
+        else:
+            sequences_done = self.read_manifest(fpath_manifest)
+        sequences_names_done = {name_unique for name_unique, _ in sequences_done}
+        sequences_todo = [
+            name_unique
+            for name_unique in sequences_names_unique
+            if name_unique not in sequences_names_done
+            or (
+                name_unique,
+                self.get_fpath_output(name_unique, get_fpath_output),
+            )
+            not in sequences_done
+        ]
+        skipped_count = len(sequences_names_unique) - len(sequences_todo)
+        if skipped_count > 0:
+            logger.info(
+                f"{method}: skipping {skipped_count} sequences finished in {fpath_manifest}",
+            )
+
+        failures = {}
+        done_count = 0
+        time_start = time.time()
+
+        with open(fpath_manifest, "a") as manifest:
+
+            def record(name_unique, error, duration):
+                nonlocal done_count
+                if error is None:
+                    done_count += 1
+                else:
+                    failures[name_unique] = error
+                    logger.error(f"{method} failed for {name_unique}:\n{error}")
+                manifest.write(
+                    json.dumps(
+                        {
+                            "name_unique": name_unique,
+                            "fpath": self.get_fpath_output(
+                                name_unique,
+                                get_fpath_output,
+                            ),
+                            "status": "done" if error is None else "failed",
+                            "duration": duration,
+                        },
+                    )
+                    + "\n",
+                )
+                manifest.flush()
+                processed_count = done_count + len(failures)
+                logger.info(
+                    f"{method}: {processed_count}/{len(sequences_todo)} sequences, "
+                    f"{self.get_throughput(processed_count, time_start):.2f} sequences/min",
+                )
+
+            if self.workers <= 0:
+                global _worker_dataset
+                _worker_dataset = self.dataset
+                for name_unique in sequences_todo:
+                    record(
+                        *_run_sequence_job(
+                            method, name_unique, override, method_kwargs
+                        ),
+                    )
+                _worker_dataset = None
+            else:
+                import multiprocessing
+
+                # spawn, as forked processes cannot re-initialize cuda
+                mp_context = multiprocessing.get_context("spawn")
+                devices_queue = None
+                if self.devices is not None and len(self.devices) > 0:
+                    devices_queue = mp_context.Queue()
+                    for w in range(self.workers):
+                        devices_queue.put(self.devices[w % len(self.devices)])
+                with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp_context,
+                    initializer=_init_worker,
+                    initargs=(
+                        self.dataset,
+                        devices_queue,
+                        logging.getLogger().level,
+                    ),
+                ) as executor:
+                    futures = [
+                        executor.submit(
+                            _run_sequence_job,
+                            method,
+                            name_unique,
+                            override,
+                            method_kwargs,
+                        )
+                        for name_unique in sequences_todo
+                    ]
+                    for future in as_completed(futures):
+                        record(*future.result())
+
+        duration = time.time() - time_start
+        logger.info(
+            f"{method}: finished {done_count} sequences, skipped {skipped_count}, failed {len(failures)} "
+            f"in {duration / 60.:.2f} min ({self.get_throughput(done_count, time_start):.2f} sequences/min).",
+        )
+        if len(failures) > 0:
+            logger.warning(
+                f"{method}: failed sequences (retried on next run): {list(failures.keys())}",
+            )
+        return failures
+
+    @staticmethod
+    def get_throughput(count: int, time_start: float):
+        duration = time.time() - time_start
+        return count / (duration / 60.0) if duration > 0 else 0.0
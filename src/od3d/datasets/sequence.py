@@ -556,7 +556,7 @@ class OD3D_SequencePCLMixin(
             pts3d_normals=None,  # pts3d_normals.detach().cpu(),
         )
 
-    def preprocess_pcl(self, override=False):
+    def preprocess_pcl(self, override=False, masks_scale=1.0, frames_chunk_size=16):
         if self.pcl_type == OD3D_PCL_TYPES.META:
             logger.info("no need to preprocess pcl for meta pcl type")
             return
@@ -622,16 +622,20 @@ class OD3D_SequencePCLMixin(
             device = get_default_device()
 
             H, W = self.get_min_HW()
-            # note: this is only required if the frames have different sizes
-            if H is not None and W is not None:
-                masks = torch.stack(
-                    [frame.read_mask()[:, :H, :W] for frame in frames],
-                    dim=0,
-                ).to(device=device)
-            else:
-                masks = torch.stack([frame.read_mask() for frame in frames], dim=0).to(
-                    device=device,
-                )
+
+            # masks are read per chunk of frames, to keep memory constant for long sequences
+            def read_masks(frames_ids):
+                # note: this is only required if the frames have different sizes
+                if H is not None and W is not None:
+                    return torch.stack(
+                        [frames[i].read_mask()[:, :H, :W] for i in frames_ids],
+                        dim=0,
+                    )
+                else:
+                    return torch.stack(
+                        [frames[i].read_mask() for i in frames_ids],
+                        dim=0,
+                    )
 
             cams_intr4x4 = torch.stack(
                 [frame.read_cam_intr4x4() for frame in frames],
@@ -652,13 +656,15 @@ class OD3D_SequencePCLMixin(
             )
             pts3d, pts3d_mask = get_pcl_clean_with_masks(
                 pcl=pts3d,
-                masks=masks,
+                masks=read_masks,
                 cams_intr4x4=cams_intr4x4,
                 cams_tform4x4_obj=cams_tform4x4_obj,
                 pts3d_prob_thresh=0.6,
                 pts3d_max_count=20000,
                 pts3d_count_min=10,
                 return_mask=True,
+                frames_chunk_size=frames_chunk_size,
+                masks_scale=masks_scale,
             )
             pts3d_colors = pts3d_colors[pts3d_mask]
             pts3d_normals = pts3d_normals[pts3d_mask]
@@ -1446,13 +1452,14 @@ class OD3D_SequenceMeshMixin(
             down_sample_rate = model.downsample_rate
             feature_dim = model.out_dim
 
-            meshes_verts_aggregated_features = [
-                torch.zeros((0, feature_dim), device="cpu"),
-            ] * meshes_smpl.verts.shape[0]
-            meshes_verts_aggregated_viewpoints = [
-                torch.zeros((0, 3), device="cpu"),
-            ] * meshes_smpl.verts.shape[0]
-            vertices_count = len(meshes_verts_aggregated_features)
+            from od3d.datasets.mesh_feats_agg import OD3D_MeshFeatsAggregator
+
+            mesh_feats_agg = OD3D_MeshFeatsAggregator(
+                verts_count=meshes_smpl.verts.shape[0],
+                feats_dim=feature_dim,
+                reduce_type=reduce_type,
+                device=device,
+            )
 
             viewpoints_count = cam_tform4x4_obj.shape[0]
             viewpoints_count_batch = 6
@@ -1475,8 +1482,7 @@ class OD3D_SequenceMeshMixin(
                 rgb_mask = mods["mask"][0] > 0.5
                 # show_imgs(rgb)
                 self.add_mesh_verts_agg_feats_and_viewpoints(
-                    meshes_verts_aggregated_features,
-                    meshes_verts_aggregated_viewpoints,
+                    mesh_feats_agg,
                     b_cam_intr4x4,
                     b_cam_tform4x4_obj,
                     imgs_sizes,
@@ -1491,11 +1497,8 @@ class OD3D_SequenceMeshMixin(
             (
                 meshes_verts_aggregated_features,
                 meshes_verts_aggregated_viewpoints,
-            ) = self.reduce_mesh_verts_agg_feats_and_viewpoints(
-                meshes_verts_aggregated_features,
-                meshes_verts_aggregated_viewpoints,
-                reduce_type=reduce_type,
-            )
+            ) = mesh_feats_agg.reduce()
+            del mesh_feats_agg
 
             del model
 
@@ -2178,6 +2181,15 @@ class OD3D_SequenceMeshMixin(
             msg = f"could not retrieve model, transform, and reduce type from mesh feats type {self.mesh_feats_type}"
             raise Exception(msg)
 
+        from od3d.datasets.mesh_feats_agg import (
+            OD3D_MeshFeatsAggregator,
+            OD3D_MESH_FEATS_AGG_REDUCE_TYPES,
+        )
+
+        if reduce_type not in OD3D_MESH_FEATS_AGG_REDUCE_TYPES:
+            logger.warning(f"Unknown mesh feature reduce_type {reduce_type}.")
+            return
+
         # if self.mesh_feats_type == FEATURE_TYPES.
         model = OD3D_Model.create_by_name(model_name)
         model.cuda()
@@ -2202,13 +2214,13 @@ class OD3D_SequenceMeshMixin(
         # show_scene(meshes=meshes, cams_tform4x4_world=cams_tform4x4_world, cams_intr4x4=cams_intr4x4, cams_imgs=cams_imgs )
         ## DEBUG BLOCK END
 
-        meshes_verts_aggregated_features = [
-            torch.zeros((0, feature_dim), device="cpu"),
-        ] * meshes.verts.shape[0]
-        meshes_verts_aggregated_viewpoints = [
-            torch.zeros((0, 3), device="cpu"),
-        ] * meshes.verts.shape[0]
-        vertices_count = len(meshes_verts_aggregated_features)
+        # running sums (avg), bounded reservoirs (min50) or samples on cpu (acc) per vertex
+        mesh_feats_agg = OD3D_MeshFeatsAggregator(
+            verts_count=meshes.verts.shape[0],
+            feats_dim=feature_dim,
+            reduce_type=reduce_type,
+            device=device,
+        )
 
         for batch in tqdm(iter(dataloader)):
             B = len(batch)
@@ -2301,21 +2313,11 @@ class OD3D_SequenceMeshMixin(
                 dim=0,
             )
 
-            for b, vertex_id in enumerate(batch_vts_ids):
-                meshes_verts_aggregated_features[vertex_id] = torch.cat(
-                    [
-                        net_feats[b : b + 1].detach().cpu(),
-                        meshes_verts_aggregated_features[vertex_id].detach().cpu(),
-                    ],
-                    dim=0,
-                )
-                meshes_verts_aggregated_viewpoints[vertex_id] = torch.cat(
-                    [
-                        viewpoints3d[b : b + 1].detach().cpu(),
-                        meshes_verts_aggregated_viewpoints[vertex_id].detach().cpu(),
-                    ],
-                    dim=0,
-                )
+            mesh_feats_agg.add(
+                verts_ids=batch_vts_ids,
+                feats=net_feats,
+                viewpoints=viewpoints3d,
+            )
 
         # for v in range(len(meshes_verts_aggregated_viewpoints)):
         #     #  - meshes.get_verts_stacked_with_mesh_ids(mesh_ids=[0,] * B)
@@ -2332,117 +2334,26 @@ class OD3D_SequenceMeshMixin(
         logger.info(f"save mesh feats at {self.fpath_mesh_feats}")
         logger.info(f"save mesh feats viewpoint at {self.fpath_mesh_feats_viewpoint}")
 
-        if reduce_type == "acc":
-            if not self.fpath_mesh_feats.parent.exists():
-                self.fpath_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
-            torch.save(meshes_verts_aggregated_features, f=self.fpath_mesh_feats)
-            torch.save(
-                meshes_verts_aggregated_viewpoints,
-                f=self.fpath_mesh_feats_viewpoint,
-            )
-            meshes_verts_aggregated_features.clear()
-        elif reduce_type == "avg":
-            if not self.fpath_mesh_feats.parent.exists():
-                self.fpath_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
-            meshes_verts_aggregated_features_avg = torch.stack(
-                [
-                    agg_feats.mean(dim=0)
-                    for agg_feats in meshes_verts_aggregated_features
-                ],
-                dim=0,
-            )
-            torch.save(
-                meshes_verts_aggregated_features_avg.detach().cpu(),
-                f=self.fpath_mesh_feats,
-            )
-            meshes_verts_aggregated_viewpoints_avg = torch.stack(
-                [
-                    agg_viewpoints.mean(dim=0)
-                    for agg_viewpoints in meshes_verts_aggregated_viewpoints
-                ],
-                dim=0,
-            )
-            torch.save(
-                meshes_verts_aggregated_viewpoints_avg.detach().cpu(),
-                f=self.fpath_mesh_feats_viewpoint,
-            )
-
-            del meshes_verts_aggregated_features_avg
-        elif reduce_type == "avg_norm":
-            if not self.fpath_mesh_feats.parent.exists():
-                self.fpath_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
-            meshes_verts_aggregated_features_avg_norm = torch.nn.functional.normalize(
-                torch.stack(
-                    [
-                        agg_feats.mean(dim=0)
-                        for agg_feats in meshes_verts_aggregated_features
-                    ],
-                    dim=0,
-                ),
-                dim=-1,
-            )
-            torch.save(
-                meshes_verts_aggregated_features_avg_norm.detach().cpu(),
-                f=self.fpath_mesh_feats,
-            )
-            del meshes_verts_aggregated_features_avg_norm
-            meshes_verts_aggregated_viewpoints_avg = torch.stack(
-                [
-                    agg_viewpoints.mean(dim=0)
-                    for agg_viewpoints in meshes_verts_aggregated_viewpoints
-                ],
-                dim=0,
-            )
-            torch.save(
-                meshes_verts_aggregated_viewpoints_avg.detach().cpu(),
-                f=self.fpath_mesh_feats_viewpoint,
-            )
-
-        elif reduce_type == "min50":
-            if not self.fpath_mesh_feats.parent.exists():
-                self.fpath_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
-
-            meshes_verts_aggregated_features_padded = torch.nn.utils.rnn.pad_sequence(
-                meshes_verts_aggregated_features,
-                padding_value=torch.nan,
-                batch_first=True,
-            )
-            meshes_verts_aggregated_viewpoints_padded = torch.nn.utils.rnn.pad_sequence(
-                meshes_verts_aggregated_viewpoints,
-                padding_value=torch.nan,
-                batch_first=True,
-            )
-
-            meshes_verts_aggregated_features_dists = torch.cdist(
-                meshes_verts_aggregated_features_padded,
-                meshes_verts_aggregated_features_padded,
-            )
-            c = torch.nanquantile(meshes_verts_aggregated_features_dists, q=0.5, dim=-1)
-            vals, indices = c.nan_to_num(torch.inf).min(dim=-1)
-            from od3d.cv.select import batched_index_select
-
-            mesh_verts_aggregated_features_min50 = batched_index_select(
-                input=meshes_verts_aggregated_features_padded,
-                index=indices[:, None],
-                dim=1,
-            )[:, 0]
-            mesh_verts_aggregated_viewpoints_min50 = batched_index_select(
-                input=meshes_verts_aggregated_viewpoints_padded,
-                index=indices[:, None],
-                dim=1,
-            )[:, 0]
-
-            torch.save(
-                mesh_verts_aggregated_features_min50.detach().cpu(),
-                f=self.fpath_mesh_feats,
-            )
-            torch.save(
-                mesh_verts_aggregated_viewpoints_min50.detach().cpu(),
-                f=self.fpath_mesh_feats_viewpoint,
-            )
-
-        else:
-            logger.warning(f"Unknown mesh feature reduce_type {reduce_type}.")
+        (
+            meshes_verts_aggregated_features,
+            meshes_verts_aggregated_viewpoints,
+        ) = mesh_feats_agg.reduce()
+        del mesh_feats_agg
+        if reduce_type != "acc":
+            meshes_verts_aggregated_features = (
+                meshes_verts_aggregated_features.detach().cpu()
+            )
+            meshes_verts_aggregated_viewpoints = (
+                meshes_verts_aggregated_viewpoints.detach().cpu()
+            )
+
+        if not self.fpath_mesh_feats.parent.exists():
+            self.fpath_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
+        torch.save(meshes_verts_aggregated_features, f=self.fpath_mesh_feats)
+        torch.save(
+            meshes_verts_aggregated_viewpoints,
+            f=self.fpath_mesh_feats_viewpoint,
+        )
 
         del dataloader
         del model
@@ -2471,10 +2382,27 @@ class OD3D_SequenceMeshMixin(
             "mesh_feats_dist.pt",
         )
 
+    def get_fpath_mesh_feats_dist_store(self, mesh_type=None, mesh_feats_type=None):
+        """Store with the pairwise mesh feats dist of all sequences of the same category."""
+        if mesh_type is None:
+            mesh_type = self.mesh_type
+        if mesh_feats_type is None:
+            mesh_feats_type = self.mesh_feats_type
+
+        return self.path_preprocess.joinpath(
+            "feats_dist",
+            f"{self.mesh_feats_dist_reduce_type}",
+            f"{mesh_feats_type}",
+            f"{mesh_type}",
+            f"{self.pcl_type}",
+            f"{self.sfm_type}",
+            f"{getattr(self, 'category', '')}",
+            "mesh_feats_dist_store",
+        )
+
     def add_mesh_verts_agg_feats_and_viewpoints(
         self,
-        meshes_verts_aggregated_features,
-        meshes_verts_aggregated_viewpoints,
+        mesh_feats_agg,
         cam_intr4x4,
         cam_tform4x4_obj,
         imgs_sizes,
@@ -2576,110 +2504,11 @@ class OD3D_SequenceMeshMixin(
             dim=0,
         )
 
-        for b, vertex_id in enumerate(batch_vts_ids):
-            meshes_verts_aggregated_features[vertex_id] = torch.cat(
-                [
-                    net_feats[b : b + 1].detach().cpu(),
-                    meshes_verts_aggregated_features[vertex_id].detach().cpu(),
-                ],
-                dim=0,
-            )
-            meshes_verts_aggregated_viewpoints[vertex_id] = torch.cat(
-                [
-                    viewpoints3d[b : b + 1].detach().cpu(),
-                    meshes_verts_aggregated_viewpoints[vertex_id].detach().cpu(),
-                ],
-                dim=0,
-            )
-
-    def reduce_mesh_verts_agg_feats_and_viewpoints(
-        self,
-        meshes_verts_aggregated_features,
-        meshes_verts_aggregated_viewpoints,
-        reduce_type,
-    ):
-        if reduce_type == "acc":
-            return meshes_verts_aggregated_features, meshes_verts_aggregated_viewpoints
-
-        elif reduce_type == "avg":
-            meshes_verts_aggregated_features_avg = torch.stack(
-                [
-                    agg_feats.mean(dim=0)
-                    for agg_feats in meshes_verts_aggregated_features
-                ],
-                dim=0,
-            )
-
-            meshes_verts_aggregated_viewpoints_avg = torch.stack(
-                [
-                    agg_viewpoints.mean(dim=0)
-                    for agg_viewpoints in meshes_verts_aggregated_viewpoints
-                ],
-                dim=0,
-            )
-            return (
-                meshes_verts_aggregated_features_avg,
-                meshes_verts_aggregated_viewpoints_avg,
-            )
-        elif reduce_type == "avg_norm":
-            meshes_verts_aggregated_features_avg_norm = torch.nn.functional.normalize(
-                torch.stack(
-                    [
-                        agg_feats.mean(dim=0)
-                        for agg_feats in meshes_verts_aggregated_features
-                    ],
-                    dim=0,
-                ),
-                dim=-1,
-            )
-            meshes_verts_aggregated_viewpoints_avg = torch.stack(
-                [
-                    agg_viewpoints.mean(dim=0)
-                    for agg_viewpoints in meshes_verts_aggregated_viewpoints
-                ],
-                dim=0,
-            )
-            return (
-                meshes_verts_aggregated_features_avg_norm,
-                meshes_verts_aggregated_viewpoints_avg,
-            )
-
-        elif reduce_type == "min50":
-            meshes_verts_aggregated_features_padded = torch.nn.utils.rnn.pad_sequence(
-                meshes_verts_aggregated_features,
-                padding_value=torch.nan,
-                batch_first=True,
-            )
-            meshes_verts_aggregated_viewpoints_padded = torch.nn.utils.rnn.pad_sequence(
-                meshes_verts_aggregated_viewpoints,
-                padding_value=torch.nan,
-                batch_first=True,
-            )
-
-            meshes_verts_aggregated_features_dists = torch.cdist(
-                meshes_verts_aggregated_features_padded,
-                meshes_verts_aggregated_features_padded,
-            )
-            c = torch.nanquantile(meshes_verts_aggregated_features_dists, q=0.5, dim=-1)
-            vals, indices = c.nan_to_num(torch.inf).min(dim=-1)
-            from od3d.cv.select import batched_index_select
-
-            mesh_verts_aggregated_features_min50 = batched_index_select(
-                input=meshes_verts_aggregated_features_padded,
-                index=indices[:, None],
-                dim=1,
-            )[:, 0]
-            mesh_verts_aggregated_viewpoints_min50 = batched_index_select(
-                input=meshes_verts_aggregated_viewpoints_padded,
-                index=indices[:, None],
-                dim=1,
-            )[:, 0]
-            return (
-                mesh_verts_aggregated_features_min50,
-                mesh_verts_aggregated_viewpoints_min50,
-            )
-        else:
-            raise NotImplementedError
+        mesh_feats_agg.add(
+            verts_ids=batch_vts_ids,
+            feats=net_feats,
+            viewpoints=viewpoints3d,
+        )
 
     def read_mesh_feats_dist(
         self,
@@ -2687,6 +2516,21 @@ class OD3D_SequenceMeshMixin(
         mesh_type=None,
         mesh_feats_type=None,
     ):
+        from od3d.datasets.mesh_feats_dist import OD3D_MeshFeatsDistStore
+
+        store = OD3D_MeshFeatsDistStore.open(
+            self.get_fpath_mesh_feats_dist_store(
+                mesh_type=mesh_type,
+                mesh_feats_type=mesh_feats_type,
+            ),
+        )
+        if (
+            store is not None
+            and self.name_unique in store
+            and sequence.name_unique in store
+        ):
+            return store.get(self.name_unique, sequence.name_unique)
+
         fpath_mesh_feats_dist = self.get_fpath_mesh_feats_dist(
             sequence,
             mesh_type=mesh_type,
@@ -2716,293 +2560,15 @@ class OD3D_SequenceMeshMixin(
             mesh_feats_type=self.mesh_feats_type,
         )
 
-        from od3d.cv.cluster.embed import pca
+        from od3d.datasets.mesh_feats_dist import get_mesh_feats_dist
 
-        dist_verts_mesh_feats_reduce_type = self.mesh_feats_dist_reduce_type
-        match = re.match(
-            r"(pca)?([0-9]*)_?([a-z_]*)",
-            dist_verts_mesh_feats_reduce_type,
-            re.I,
+        dist_verts_seq1_seq2 = get_mesh_feats_dist(
+            seq1_feats,
+            seq2_feats,
+            mesh_feats_dist_reduce_type=self.mesh_feats_dist_reduce_type,
+            device=device,
         )
 
-        if match:
-            embed_type, embed_dim, reduce_type = match.groups()
-            if len(embed_dim) > 0:
-                embed_dim = int(embed_dim)
-            # print(embed_type, embed_dim, reduce_type)
-        else:
-            msg = f"could not retrieve embed_type, embed_dim, and reduce type from mesh feats type {dist_verts_mesh_feats_reduce_type}"
-            raise Exception(msg)
-
-        # perform pca on seq1_feats and seq2_feats and visualize
-        if isinstance(seq1_feats, list):
-            seq1_verts_count = len(seq1_feats)
-            seq2_verts_count = len(seq2_feats)
-            dist_verts_seq1_seq2 = (
-                torch.ones(size=(seq1_verts_count, seq2_verts_count)).to(
-                    device=device,
-                )
-                * torch.inf
-            )
-
-            # Vertices1+2 x Viewpoints x F
-            seq12_feats_padded = torch.nn.utils.rnn.pad_sequence(
-                seq1_feats + seq2_feats,
-                batch_first=True,
-                padding_value=torch.nan,
-            ).to(device=device)
-            F = seq12_feats_padded.shape[-1]
-            V = seq12_feats_padded.shape[-2]
-            seq12_feats_padded_mask = ~seq12_feats_padded.isnan().all(dim=-1)
-
-            if embed_type is None:
-                pass
-            elif embed_type == "pca":
-                seq12_feats_padded_embed = torch.zeros(
-                    size=(seq12_feats_padded.shape[:-1] + (embed_dim,)),
-                ).to(
-                    device=device,
-                    dtype=seq12_feats_padded.dtype,
-                )
-                seq12_feats_padded_embed[:] = torch.nan
-                seq12_feats_padded_embed[seq12_feats_padded_mask] = pca(
-                    seq12_feats_padded[seq12_feats_padded_mask],
-                    C=embed_dim,
-                )
-                seq12_feats_padded = seq12_feats_padded_embed
-                F = embed_dim
-            else:
-                logger.warning(f"unknown embed type {embed_type}")
-
-            P = seq1_verts_count  # ensures that 11 GB are enough
-            logger.info(
-                f"seq1 verts {seq1_verts_count}, seq2 verts {seq2_verts_count}, seq1 partial {(seq1_verts_count // P)}, viewpoints max {V}",
-            )
-
-            for p in range(P):
-                if p < P - 1:
-                    seq1_verts_partial = torch.arange(seq1_verts_count)[
-                        (seq1_verts_count // P) * p : (seq1_verts_count // P) * (p + 1)
-                    ].to(device=device)
-                else:
-                    seq1_verts_partial = torch.arange(seq1_verts_count)[
-                        (seq1_verts_count // P) * p :
-                    ].to(
-                        device=device,
-                    )
-                seq1_verts_partial_count = len(seq1_verts_partial)
-                # logger.info(seq1_verts_partial)
-                # Vertices1 x Viewpoints x F
-                seq1_feats_padded = seq12_feats_padded[seq1_verts_partial].clone()
-                seq2_feats_padded = seq12_feats_padded[seq1_verts_count:].clone()
-
-                seq1_feats_padded_mask = seq12_feats_padded_mask[
-                    seq1_verts_partial
-                ].clone()
-                seq2_feats_padded_mask = seq12_feats_padded_mask[
-                    seq1_verts_count:
-                ].clone()
-
-                # Vertices1 x Viewpoints x Vertices2 x Viewpoints
-                if reduce_type.startswith("negdot"):
-                    dists_verts_feats_seq1_seq2 = -torch.einsum(
-                        "bnf,bkf->bnk",
-                        seq1_feats_padded.reshape(-1, F)[None,],
-                        seq2_feats_padded.reshape(-1, F)[None,],
-                    ).reshape(
-                        seq1_verts_partial_count,
-                        V,
-                        seq2_verts_count,
-                        V,
-                    )
-                else:
-                    dists_verts_feats_seq1_seq2 = torch.cdist(
-                        seq1_feats_padded.reshape(-1, F)[None,],
-                        seq2_feats_padded.reshape(-1, F)[None,],
-                    ).reshape(
-                        seq1_verts_partial_count,
-                        V,
-                        seq2_verts_count,
-                        V,
-                    )
-                dists_verts_feats_seq1_seq2_mask = (
-                    seq1_feats_padded_mask[:, :, None, None]
-                    * seq2_feats_padded_mask[None, None, :, :]
-                )
-                dist_verts_seq1_seq2_inf_mask = (
-                    dists_verts_feats_seq1_seq2_mask.permute(0, 2, 1, 3)
-                    .flatten(
-                        2,
-                    )
-                    .sum(
-                        dim=-1,
-                    )
-                    == 0.0
-                )
-
-                if (
-                    reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.MIN
-                    or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_MIN
-                ):
-                    # replace nan values with inf
-                    dists_verts_feats_seq1_seq2 = (
-                        dists_verts_feats_seq1_seq2.nan_to_num(torch.inf)
-                    )
-                    dist_verts_seq1_seq2[seq1_verts_partial] = (
-                        dists_verts_feats_seq1_seq2.permute(
-                            0,
-                            2,
-                            1,
-                            3,
-                        )
-                        .flatten(
-                            2,
-                        )
-                        .min(dim=-1)
-                        .values
-                    )
-                elif (
-                    reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.AVG
-                    or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_AVG
-                ):
-                    dists_verts_feats_seq1_seq2 = (
-                        dists_verts_feats_seq1_seq2.nan_to_num(0.0)
-                    )
-                    dists_verts_feats_seq1_seq2_mask = (
-                        dists_verts_feats_seq1_seq2_mask.nan_to_num(0.0)
-                    )
-
-                    dist_verts_seq1_seq2_partial = (
-                        dists_verts_feats_seq1_seq2.permute(0, 2, 1, 3).flatten(
-                            2,
-                        )
-                        * dists_verts_feats_seq1_seq2_mask.permute(0, 2, 1, 3).flatten(
-                            2,
-                        )
-                    ).sum(dim=-1) / (
-                        dists_verts_feats_seq1_seq2_mask.permute(
-                            0,
-                            2,
-                            1,
-                            3,
-                        )
-                        .flatten(2)
-                        .sum(
-                            dim=-1,
-                        )
-                        + 1e-10
-                    )
-                    dist_verts_seq1_seq2_partial[
-                        dist_verts_seq1_seq2_inf_mask
-                    ] = torch.inf
-                    dist_verts_seq1_seq2[
-                        seq1_verts_partial
-                    ] = dist_verts_seq1_seq2_partial
-                    del dist_verts_seq1_seq2_partial
-                elif (
-                    reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.MIN_AVG
-                    or reduce_type == OD3D_MESH_FEATS_DIST_REDUCE_TYPES.NEGDOT_MIN_AVG
-                ):
-                    dists_verts_feats_seq1_seq2 = (
-                        dists_verts_feats_seq1_seq2.nan_to_num(torch.inf)
-                    )
-                    dists_verts_feats_seq1_seq2_mask = (
-                        dists_verts_feats_seq1_seq2_mask.nan_to_num(0.0)
-                    )
-                    dist_verts_seq1_seq2_partial = (
-                        (
-                            dists_verts_feats_seq1_seq2.permute(
-                                0,
-                                2,
-                                1,
-                                3,
-                            )
-                            .min(
-                                dim=-1,
-                            )
-                            .values.nan_to_num(
-                                posinf=0.0,
-                            )
-                            * dists_verts_feats_seq1_seq2_mask.permute(
-                                0,
-                                2,
-                                1,
-                                3,
-                            )[:, :, :, 0]
-                        ).sum(dim=-1)
-                        + (
-                            dists_verts_feats_seq1_seq2.permute(
-                                0,
-                                2,
-                                1,
-                                3,
-                            )
-                            .min(
-                                dim=-2,
-                            )
-                            .values.nan_to_num(
-                                posinf=0.0,
-                            )
-                            * dists_verts_feats_seq1_seq2_mask.permute(
-                                0,
-                                2,
-                                1,
-                                3,
-                            )[:, :, 0, :]
-                        ).sum(dim=-1)
-                    ) / (
-                        dists_verts_feats_seq1_seq2_mask.permute(0, 2, 1, 3)[
-                            :,
-                            :,
-                            0,
-                            :,
-                        ].sum(
-                            dim=-1,
-                        )
-                        + dists_verts_feats_seq1_seq2_mask.permute(
-                            0,
-                            2,
-                            1,
-                            3,
-                        )[
-                            :,
-                            :,
-                            :,
-                            0,
-                        ].sum(dim=-1)
-                        + 1e-10
-                    )
-                    dist_verts_seq1_seq2_partial[
-                        dist_verts_seq1_seq2_inf_mask
-                    ] = torch.inf
-                    dist_verts_seq1_seq2[
-                        seq1_verts_partial
-                    ] = dist_verts_seq1_seq2_partial
-                    del dist_verts_seq1_seq2_partial
-                else:
-                    logger.warning(f"Unknown reduce type {reduce_type}.")
-
-                del dists_verts_feats_seq1_seq2
-                del dists_verts_feats_seq1_seq2_mask
-                del dist_verts_seq1_seq2_inf_mask
-                del seq1_verts_partial
-            del seq12_feats_padded
-            del seq12_feats_padded_mask
-            seq1_feats.clear()
-            seq2_feats.clear()
-        else:
-            if reduce_type.startswith("negdot"):
-                dist_verts_seq1_seq2 = -torch.einsum(
-                    "nf,kf->nk",
-                    seq1_feats.to(device=device),
-                    seq2_feats.to(device=device),
-                )
-            else:
-                dist_verts_seq1_seq2 = torch.cdist(
-                    seq1_feats.to(device=device),
-                    seq2_feats.to(device=device),
-                )
-
         if not fpath_dist_verts_mesh_feats.parent.exists():
             fpath_dist_verts_mesh_feats.parent.mkdir(parents=True, exist_ok=True)
         torch.save(dist_verts_seq1_seq2.detach().cpu(), fpath_dist_verts_mesh_feats)
@@ -379,6 +379,10 @@ class ShapeNet(OD3D_SequenceDataset):
             SHAPENET_SUBSETS.R2N2_V2_ICOTRAJ100_UNI64_THETA_UNI1,
         ]
 
+        # sequences already extracted are skipped, the remaining ones are rendered at once
+        render_jobs = []
+        # subset/category -> count of sequences to render, further jobs are candidates replacing failed sequences
+        render_sequences_count_max = {}
         for subset in subsets:
             if subset in subsets_rendering:
                 logger.info(f"render and extract meta for subset {subset}...")
@@ -481,228 +485,40 @@ class ShapeNet(OD3D_SequenceDataset):
                             sequences_count = sequences_count + 1
                             continue
 
-                        # pip install "pyglet<2"
-                        import trimesh
-
-                        _mesh_trimesh = trimesh.load(
-                            frame_fpath_mesh_orig,
-                            force="mesh",
-                        )
-
-                        if subset_type == "r2n2notxt":
-                            import numpy as np
-
-                            # Define a single grey color (RGBA format)
-                            grey_color = np.array([64, 64, 64, 255], dtype=np.uint8)
-                            # Apply the color to all faces/vertices
-                            _mesh_trimesh.visual = trimesh.visual.color.ColorVisuals(
-                                _mesh_trimesh,
-                                vertex_colors=grey_color,
-                            )
-
-                        logger.info(
-                            f"sequence {sequence_id} in {category}, {len(_mesh_trimesh.vertices)} vertices",
-                        )
-                        # _mesh_trimesh.show()
-
-                        if len(_mesh_trimesh.vertices) > 0:
-                            pass
-                            # _ = _mesh_trimesh.export(file_obj=frame_fpath_mesh)
-                        else:
-                            logger.info(
-                                f"skip sequence {sequence_id} in {category} because could not convert to single mesh.",
-                            )
-
-                        from od3d.cv.geometry.transform import (
-                            get_ico_cam_tform4x4_obj_for_viewpoints_count,
-                            get_ico_traj_cam_tform4x4_obj_for_viewpoints_count,
-                            get_cam_tform4x4_obj_for_viewpoints_count,
-                            tform4x4_broadcast,
-                        )
-                        from od3d.cv.visual.show import (
-                            get_default_camera_intrinsics_from_img_size,
-                        )
-                        import torch
-                        from od3d.cv.geometry.objects3d.meshes import Meshes
-                        from od3d.cv.visual.show import OBJ_TFORM_OBJ_SHAPENET
-                        from od3d.cv.io import (
-                            write_image,
-                            write_mask_image,
-                            write_depth_image,
-                            write_pts3d_with_colors_and_normals,
-                        )
-                        from od3d.cv.visual.show import render_trimesh_to_tensor
-                        from od3d.cv.geometry.transform import (
-                            depth2pts3d_grid,
-                            inv_tform4x4,
-                        )
-                        from od3d.cv.geometry.downsample import random_sampling, fps
-
-                        # random_sampling(pts3d_cls, pts3d_max_count, return_mask=False)
-                        # pts3d_ids, pts3d = fps(pts3d=pts3d, K=1024, fill=True)
-                        W = 512
-                        H = 512
-                        device = "cuda"
-
-                        imgs_sizes = torch.LongTensor([W, H])
-
-                        if viewpoints_type.startswith(
-                            "icotraj",
-                        ) or viewpoints_type.startswith("icorealtraj"):
-                            if viewpoints_type.startswith("icotraj"):
-                                prefix = "icotraj"
-                                real = False
-                            elif viewpoints_type.startswith("icorealtraj"):
-                                prefix = "icorealtraj"
-                                real = True
-
-                            traj_length = (
-                                float(viewpoints_type.removeprefix(prefix))
-                                / 100
-                                * math.pi
-                                * 2
-                            )
-                            cams_tform4x4_obj = (
-                                get_ico_traj_cam_tform4x4_obj_for_viewpoints_count(
-                                    viewpoints_count=viewpoints_count,
-                                    radius=2.5,
-                                    theta_count=theta_count,
-                                    geodesic_distance=traj_length,
-                                    real=real,
-                                ).to(device)
-                            )
-                            # from od3d.cv.visual.show import show_scene
-                            # show_scene(cams_tform4x4_world=cams_tform4x4_obj, cams_intr4x4=cam_intr4x4[None,].repeat(64, 1, 1))
-                        else:
-                            cams_tform4x4_obj = (
-                                get_ico_cam_tform4x4_obj_for_viewpoints_count(
-                                    viewpoints_count=viewpoints_count,
-                                    radius=2.5,
-                                    theta_count=theta_count,
-                                    viewpoints_uniform=viewpoints_sample_uni,
-                                    theta_uniform=theta_sample_uni,
-                                ).to(device)
-                            )
-
-                        # front, top, right, bottom
-                        # cams_tform4x4_obj = get_cam_tform4x4_obj_for_viewpoints_count(viewpoints_count=3, dist=2.).to(device)
-
-                        cams_tform4x4_obj = tform4x4_broadcast(
-                            cams_tform4x4_obj,
-                            OBJ_TFORM_OBJ_SHAPENET.to(device),
-                        )
-                        cam_intr4x4 = get_default_camera_intrinsics_from_img_size(
-                            W=W,
-                            H=H,
-                        ).to(device)
-                        try:
-                            mesh = Meshes.read_from_ply_file(
-                                fpath=frame_fpath_mesh,
-                                device=device,
-                                load_texts=True,
-                            )
-                        except Exception:
-                            logger.warning(f"could not load texture {frame_fpath_mesh}")
-                            continue
-
-                        logger.info(
-                            f"sequence {sequence_id} in {category}, {len(mesh.verts)} vertices",
-                        )
-                        logger.info(f"{frame_fpath_mesh}")
-
-                        mods = mesh.render(
-                            cams_tform4x4_obj=cams_tform4x4_obj,
-                            cams_intr4x4=cam_intr4x4,
-                            imgs_sizes=imgs_sizes,
-                            modalities=["mask"],
-                            broadcast_batch_and_cams=True,
-                            rgb_bg=[0.0, 0.0, 0.0],
-                            rgb_diffusion_alpha=0.3,
+                        render_jobs.append(
+                            {
+                                "subset": str(subset),
+                                "subset_type": subset_type,
+                                "viewpoints_type": viewpoints_type,
+                                "viewpoints_count": viewpoints_count,
+                                "viewpoints_sample_uni": viewpoints_sample_uni,
+                                "theta_count": theta_count,
+                                "theta_sample_uni": theta_sample_uni,
+                                "category": category,
+                                "sequence_id": sequence_id,
+                                "path_raw": path_raw,
+                                "path_meta": path_meta,
+                                "frame_fpath_mesh": frame_fpath_mesh,
+                                "frame_fpath_pcl": frame_fpath_pcl,
+                            },
                         )
-                        # rgbs = mods['rgb'][0]
-                        masks = mods["mask"][0]
-
-                        # from od3d.cv.visual.show import show_imgs
-                        # show_imgs(rgbs)
-                        pts3d = []
-                        for i, cam_tform4x4_obj in enumerate(cams_tform4x4_obj):
-                            frame_name = f"{int(i):03}"
-                            frame_fpath_rgb = path_raw.joinpath(
-                                f"rgb/{subset}/{category}/{sequence_id}/{frame_name}.png",
-                            )
-                            frame_fpath_mask = path_raw.joinpath(
-                                f"mask/{subset}/{category}/{sequence_id}/{frame_name}.png",
-                            )
-                            frame_fpath_depth = path_raw.joinpath(
-                                f"depth/{subset}/{category}/{sequence_id}/{frame_name}.png",
-                            )
-                            frame_fpath_depth_mask = path_raw.joinpath(
-                                f"depth_mask/{subset}/{category}/{sequence_id}/{frame_name}.png",
-                            )
 
-                            rgb, depth = render_trimesh_to_tensor(
-                                mesh_trimesh=_mesh_trimesh,
-                                cam_tform4x4_obj=cam_tform4x4_obj,
-                                cam_intr4x4=cam_intr4x4,
-                                H=H,
-                                W=W,
-                                rgb_bg=[0.8, 0.8, 0.8],
-                            )
-                            depth_mask = depth > 0.0
-
-                            _pts3d = depth2pts3d_grid(
-                                depth=depth.to(device),
-                                cam_intr4x4=cam_intr4x4,
-                            ).permute(1, 2, 0)[depth_mask[0]]
-                            _pts3d = random_sampling(
-                                pts3d_cls=_pts3d,
-                                pts3d_max_count=1024,
-                            )
-                            _pts3d = transf3d_broadcast(
-                                pts3d=_pts3d,
-                                transf4x4=inv_tform4x4(cam_tform4x4_obj),
-                            )
-                            pts3d.append(_pts3d)
-                            write_image(img=rgb, path=frame_fpath_rgb)
-                            write_image(img=masks[i], path=frame_fpath_mask)
-                            write_depth_image(img=depth, path=frame_fpath_depth)
-                            write_mask_image(
-                                img=depth_mask,
-                                path=frame_fpath_depth_mask,
-                            )
-
-                            frame_meta = ShapeNet_FrameMeta(
-                                name=frame_name,
-                                sequence_name=sequence_id,
-                                rfpath_rgb=frame_fpath_rgb.relative_to(path_raw),
-                                rfpath_mask=frame_fpath_mask.relative_to(path_raw),
-                                rfpath_depth=frame_fpath_depth.relative_to(path_raw),
-                                rfpath_depth_mask=frame_fpath_depth_mask.relative_to(
-                                    path_raw,
-                                ),
-                                # rfpath_mesh=frame_fpath_mesh.relative_to(path_raw),
-                                category=category,
-                                l_size=imgs_sizes.tolist(),
-                                l_cam_tform4x4_obj=cam_tform4x4_obj.tolist(),
-                                l_cam_intr4x4=cam_intr4x4.tolist(),
-                                subset=subset,
-                            )
-
-                            if frame_meta is not None:
-                                frame_meta.save(path_meta=path_meta)
-
-                        pts3d = torch.cat(pts3d, dim=0)
-                        pts3d_ids, pts3d = fps(pts3d=pts3d, K=1024, fill=True)
-                        write_pts3d_with_colors_and_normals(
-                            pts3d,
-                            pts3d_colors=None,
-                            pts3d_normals=None,
-                            fpath=frame_fpath_pcl,
-                        )
+                    render_sequences_count_max[f"{str(subset)}/{category}"] = (
+                        sequences_count_max_per_category - sequences_count
+                    )
 
-                        if sequence_meta is not None:
-                            sequence_meta.save(path_meta=path_meta)
-                        sequences_count = sequences_count + 1
+        if len(render_jobs) > 0:
+            from od3d.datasets.shapenet.render import ShapeNet_RenderFarm
+
+            logger.info(f"render sequences of {len(render_jobs)} candidates...")
+            ShapeNet_RenderFarm(
+                workers=config.extract_meta.get("workers", 0),
+                devices=config.extract_meta.get("devices", None),
+                writers=config.extract_meta.get("writers", 8),
+            ).run(
+                jobs=render_jobs,
+                sequences_count_max=render_sequences_count_max,
+            )
 
         if SHAPENET_SUBSETS.R2N2 in subsets:
             # R2N2
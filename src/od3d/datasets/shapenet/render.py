@@ -0,0 +1,517 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import math
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# writer pool of the current process, created lazily with the count set by the pool initializer
+_writer_pool = None
+_writers_count = 8
+# sequences of the current process whose frames are still written, bounds the rendered frames held in memory
+_sequences_writing = threading.Semaphore(2)
+
+
+def _init_worker(devices_queue, writers_count, log_level):
+    global _writers_count
+    logging.basicConfig(level=log_level)
+    if devices_queue is not None:
+        device = devices_queue.get()
+        if device is not None:
+            # must be set before cuda is initialized in this process
+            os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+    _writers_count = writers_count
+
+
+def get_writer_pool():
+    global _writer_pool
+    if _writer_pool is None:
+        _writer_pool = ThreadPoolExecutor(
+            max_workers=_writers_count,
+            thread_name_prefix="od3d_render_writer",
+        )
+    return _writer_pool
+
+
+def flush_writer_pool():
+    global _writer_pool
+    if _writer_pool is not None:
+        _writer_pool.shutdown(wait=True)
+        _writer_pool = None
+
+
+def save_sequence_meta_when_written(writes: List, sequence_meta, path_meta: Path):
+    """
+    Saves the sequence meta once all writes of the sequence completed, in the writer thread of the last write.
+    If any write failed, the sequence meta is not saved and the sequence is rendered again on the next run.
+
+    Returns:
+        written (Future): done once the sequence meta is saved, with the exception of the first failed write.
+    """
+    written = Future()
+
+    def save_sequence_meta(errors):
+        try:
+            if len(errors) > 0:
+                logger.error(
+                    f"could not write sequence {sequence_meta.name_unique}: {errors[0]}",
+                )
+                written.set_exception(errors[0])
+            else:
+                sequence_meta.save(path_meta=path_meta)
+                written.set_result(True)
+        except Exception as e:
+            written.set_exception(e)
+        finally:
+            _sequences_writing.release()
+
+    if len(writes) == 0:
+        save_sequence_meta(errors=[])
+        return written
+
+    lock = threading.Lock()
+    writes_remaining = [len(writes)]
+
+    def on_write_done(_):
+        with lock:
+            writes_remaining[0] -= 1
+            if writes_remaining[0] > 0:
+                return
+        save_sequence_meta(
+            errors=[write.exception() for write in writes if write.exception()],
+        )
+
+    for write in writes:
+        write.add_done_callback(on_write_done)
+    return written
+
+
+def submit_sequence_writes(frames_writes: List, sequence_meta, path_meta: Path):
+    """
+    Submits the frames writes of a sequence to the writer pool, at most two sequences are written at a time.
+
+    Args:
+        frames_writes (List): (write, kwargs) per file.
+    Returns:
+        written (Future): done once all frames and the sequence meta are written.
+    """
+    _sequences_writing.acquire()
+    writer_pool = get_writer_pool()
+    writes = [writer_pool.submit(write, **kwargs) for write, kwargs in frames_writes]
+    return save_sequence_meta_when_written(
+        writes=writes,
+        sequence_meta=sequence_meta,
+        path_meta=path_meta,
+    )
+
+
+def render_sequence(
+    subset: str,
+    subset_type: str,
+    viewpoints_type: str,
+    viewpoints_count: int,
+    viewpoints_sample_uni: bool,
+    theta_count: int,
+    theta_sample_uni: bool,
+    category: str,
+    sequence_id: str,
+    path_raw: Path,
+    path_meta: Path,
+    frame_fpath_mesh: Path,
+    frame_fpath_pcl: Path,
+    W=512,
+    H=512,
+):
+    """
+    Renders all viewpoints of a single ShapeNet sequence and writes rgb, mask, depth, depth mask and frame metas
+    in the writer pool. Returns without waiting for the writes, such that they overlap with rendering the next
+    sequence. The sequence meta is written last, once all frames are written, and marks the sequence as finished.
+
+    Returns:
+        views_count (int): number of rendered viewpoints
+        written (Future): done once all frames and the sequence meta are written.
+    """
+    import numpy as np
+    import torch
+    import trimesh
+    from od3d.cv.geometry.downsample import fps, random_sampling
+    from od3d.cv.geometry.objects3d.meshes import Meshes
+    from od3d.cv.geometry.transform import (
+        depth2pts3d_grid,
+        get_ico_cam_tform4x4_obj_for_viewpoints_count,
+        get_ico_traj_cam_tform4x4_obj_for_viewpoints_count,
+        inv_tform4x4,
+        tform4x4_broadcast,
+        transf3d_broadcast,
+    )
+    from od3d.cv.io import (
+        get_default_device,
+        write_depth_image,
+        write_image,
+        write_mask_image,
+        write_pts3d_with_colors_and_normals,
+    )
+    from od3d.cv.visual.show import (
+        OBJ_TFORM_OBJ_SHAPENET,
+        get_default_camera_intrinsics_from_img_size,
+        render_trimesh_to_tensors,
+    )
+    from od3d.datasets.shapenet.dataset import (
+        ShapeNet_FrameMeta,
+        ShapeNet_SequenceMeta,
+    )
+
+    path_raw = Path(path_raw)
+    sequence_meta = ShapeNet_SequenceMeta(
+        subset=subset,
+        category=category,
+        name=sequence_id,
+        rfpath_pcl=Path(frame_fpath_pcl).relative_to(path_raw),
+        rfpath_mesh=Path(frame_fpath_mesh).relative_to(path_raw),
+    )
+
+    # pip install "pyglet<2"
+    _mesh_trimesh = trimesh.load(frame_fpath_mesh, force="mesh")
+
+    if subset_type == "r2n2notxt":
+        # Define a single grey color (RGBA format)
+        grey_color = np.array([64, 64, 64, 255], dtype=np.uint8)
+        # Apply the color to all faces/vertices
+        _mesh_trimesh.visual = trimesh.visual.color.ColorVisuals(
+            _mesh_trimesh,
+            vertex_colors=grey_color,
+        )
+
+    logger.info(
+        f"sequence {sequence_id} in {category}, {len(_mesh_trimesh.vertices)} vertices",
+    )
+    if len(_mesh_trimesh.vertices) == 0:
+        logger.info(
+            f"skip sequence {sequence_id} in {category} because could not convert to single mesh.",
+        )
+
+    device = get_default_device()
+    imgs_sizes = torch.LongTensor([W, H])
+
+    if viewpoints_type.startswith("icotraj") or viewpoints_type.startswith(
+        "icorealtraj",
+    ):
+        if viewpoints_type.startswith("icotraj"):
+            prefix = "icotraj"
+            real = False
+        else:
+            prefix = "icorealtraj"
+            real = True
+
+        traj_length = float(viewpoints_type.removeprefix(prefix)) / 100 * math.pi * 2
+        cams_tform4x4_obj = get_ico_traj_cam_tform4x4_obj_for_viewpoints_count(
+            viewpoints_count=viewpoints_count,
+            radius=2.5,
+            theta_count=theta_count,
+            geodesic_distance=traj_length,
+            real=real,
+        ).to(device)
+    else:
+        cams_tform4x4_obj = get_ico_cam_tform4x4_obj_for_viewpoints_count(
+            viewpoints_count=viewpoints_count,
+            radius=2.5,
+            theta_count=theta_count,
+            viewpoints_uniform=viewpoints_sample_uni,
+            theta_uniform=theta_sample_uni,
+        ).to(device)
+
+    cams_tform4x4_obj = tform4x4_broadcast(
+        cams_tform4x4_obj,
+        OBJ_TFORM_OBJ_SHAPENET.to(device),
+    )
+    cam_intr4x4 = get_default_camera_intrinsics_from_img_size(W=W, H=H).to(device)
+
+    mesh = Meshes.read_from_ply_file(
+        fpath=frame_fpath_mesh,
+        device=device,
+        load_texts=True,
+    )
+    logger.info(f"sequence {sequence_id} in {category}, {len(mesh.verts)} vertices")
+
+    masks = mesh.render(
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        cams_intr4x4=cam_intr4x4,
+        imgs_sizes=imgs_sizes,
+        modalities=["mask"],
+        broadcast_batch_and_cams=True,
+        rgb_bg=[0.0, 0.0, 0.0],
+        rgb_diffusion_alpha=0.3,
+    )["mask"][0].cpu()
+
+    # all viewpoints share one scene and offscreen renderer
+    rgbs, depths = render_trimesh_to_tensors(
+        mesh_trimesh=_mesh_trimesh,
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        cams_intr4x4=cam_intr4x4[None,].expand(*cams_tform4x4_obj.shape),
+        H=H,
+        W=W,
+        rgb_bg=[0.8, 0.8, 0.8],
+    )
+    depths_mask = depths > 0.0
+
+    frames_writes = []
+    pts3d = []
+    for i, cam_tform4x4_obj in enumerate(cams_tform4x4_obj):
+        frame_name = f"{int(i):03}"
+        frame_fpath_rgb = path_raw.joinpath(
+            f"rgb/{subset}/{category}/{sequence_id}/{frame_name}.png",
+        )
+        frame_fpath_mask = path_raw.joinpath(
+            f"mask/{subset}/{category}/{sequence_id}/{frame_name}.png",
+        )
+        frame_fpath_depth = path_raw.joinpath(
+            f"depth/{subset}/{category}/{sequence_id}/{frame_name}.png",
+        )
+        frame_fpath_depth_mask = path_raw.joinpath(
+            f"depth_mask/{subset}/{category}/{sequence_id}/{frame_name}.png",
+        )
+
+        _pts3d = depth2pts3d_grid(
+            depth=depths[i].to(device),
+            cam_intr4x4=cam_intr4x4,
+        ).permute(1, 2, 0)[depths_mask[i, 0].to(device)]
+        _pts3d = random_sampling(pts3d_cls=_pts3d, pts3d_max_count=1024)
+        _pts3d = transf3d_broadcast(
+            pts3d=_pts3d,
+            transf4x4=inv_tform4x4(cam_tform4x4_obj),
+        )
+        pts3d.append(_pts3d)
+
+        frame_meta = ShapeNet_FrameMeta(
+            name=frame_name,
+            sequence_name=sequence_id,
+            rfpath_rgb=frame_fpath_rgb.relative_to(path_raw),
+            rfpath_mask=frame_fpath_mask.relative_to(path_raw),
+            rfpath_depth=frame_fpath_depth.relative_to(path_raw),
+            rfpath_depth_mask=frame_fpath_depth_mask.relative_to(path_raw),
+            category=category,
+            l_size=imgs_sizes.tolist(),
+            l_cam_tform4x4_obj=cam_tform4x4_obj.tolist(),
+            l_cam_intr4x4=cam_intr4x4.tolist(),
+            subset=subset,
+        )
+
+        frames_writes += [
+            (write_image, {"img": rgbs[i], "path": frame_fpath_rgb}),
+            (write_image, {"img": masks[i], "path": frame_fpath_mask}),
+            (write_depth_image, {"img": depths[i], "path": frame_fpath_depth}),
+            (write_mask_image, {"img": depths_mask[i], "path": frame_fpath_depth_mask}),
+            (frame_meta.save, {"path_meta": path_meta}),
+        ]
+
+    pts3d = torch.cat(pts3d, dim=0)
+    pts3d_ids, pts3d = fps(pts3d=pts3d, K=1024, fill=True)
+    write_pts3d_with_colors_and_normals(
+        pts3d,
+        pts3d_colors=None,
+        pts3d_normals=None,
+        fpath=frame_fpath_pcl,
+    )
+
+    # encoding and writing overlaps with rendering the next sequence
+    written = submit_sequence_writes(
+        frames_writes=frames_writes,
+        sequence_meta=sequence_meta,
+        path_meta=path_meta,
+    )
+    return len(cams_tform4x4_obj), written
+
+
+def _run_render_job(job: Dict, wait_written=True, render=None):
+    """
+    Args:
+        wait_written (bool): waits until the sequence is written, such that a failed write fails the job.
+            Otherwise, the written future is returned and the writes overlap with the next job.
+        render (Callable): renders a sequence like render_sequence, which is used if None.
+    Returns:
+        name (str), views_count (int), error (str), duration (float), written (Future): None if waited.
+    """
+    time_start = time.time()
+    name = f"{job['subset']}/{job['category']}/{job['sequence_id']}"
+    written = None
+    try:
+        views_count, written = (render or render_sequence)(**job)
+        if wait_written:
+            written.result()
+            written = None
+        error = None
+    except Exception:
+        views_count = 0
+        written = None
+        error = traceback.format_exc()
+    return name, views_count, error, time.time() - time_start, written
+
+
+class ShapeNet_RenderFarm:
+    """
+    Renders ShapeNet sequences, sharded across worker processes with one device per worker.
+    Each worker renders all viewpoints of a sequence at once and hands encoding and writing to a thread pool.
+    Finished sequences are marked by their sequence meta, such that interrupted runs resume
+    with the remaining sequences.
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        devices: List = None,
+        writers: int = 8,
+        render: Callable = None,
+    ):
+        """
+        Args:
+            render (Callable): renders a sequence, render_sequence if None, must be picklable for workers.
+        """
+        self.workers = workers if workers is not None else 0
+        self.devices = list(devices) if devices is not None else None
+        self.writers = writers
+        self.render = render
+
+    @staticmethod
+    def get_job_group(job: Dict):
+        return f"{job['subset']}/{job['category']}"
+
+    def run(self, jobs: List[Dict], sequences_count_max: Dict[str, int] = None):
+        """
+        Args:
+            jobs (List[Dict]): render_sequence arguments, candidates in order of preference.
+            sequences_count_max (Dict[str, int]): maximum count of sequences to render per subset/category,
+                candidates of a subset/category are rendered until this count succeeded. All jobs if None.
+        """
+        jobs_groups = {}
+        for job in jobs:
+            jobs_groups.setdefault(self.get_job_group(job), deque()).append(job)
+
+        # initially as many jobs as sequences are required, a failed job is replaced by the next candidate
+        jobs_initial = []
+        for group, jobs_group in jobs_groups.items():
+            count = len(jobs_group)
+            if sequences_count_max is not None:
+                count = min(count, max(sequences_count_max.get(group, count), 0))
+            jobs_initial += [jobs_group.popleft() for _ in range(count)]
+        jobs_count = len(jobs_initial)
+
+        failures = {}
+        views_count = 0
+        sequences_count = 0
+        time_start = time.time()
+
+        def record(job, name, _views_count, error, duration):
+            nonlocal views_count, sequences_count, jobs_count
+            job_next = None
+            if error is None:
+                sequences_count += 1
+                views_count += _views_count
+            else:
+                failures[name] = error
+                logger.error(f"render failed for {name}:\n{error}")
+                jobs_group = jobs_groups[self.get_job_group(job)]
+                if len(jobs_group) > 0:
+                    job_next = jobs_group.popleft()
+                    jobs_count += 1
+            logger.info(
+                f"render: {sequences_count + len(failures)}/{jobs_count} sequences, "
+                f"{self.get_throughput(views_count, time_start):.2f} views/sec",
+            )
+            return job_next
+
+        if self.workers <= 0:
+            global _writers_count
+            _writers_count = self.writers
+            jobs_todo = deque(jobs_initial)
+            # rendered sequences which are still written, recorded in order once written
+            jobs_writing = deque()
+
+            def is_written(result):
+                written = result[-1]
+                return written is None or written.done()
+
+            while len(jobs_todo) > 0 or len(jobs_writing) > 0:
+                if len(jobs_todo) > 0:
+                    job = jobs_todo.popleft()
+                    result = _run_render_job(
+                        job,
+                        wait_written=False,
+                        render=self.render,
+                    )
+                    jobs_writing.append((job, result))
+                # without jobs left to render, waits for the remaining writes
+                while len(jobs_writing) > 0 and (
+                    is_written(jobs_writing[0][1]) or len(jobs_todo) == 0
+                ):
+                    job, result = jobs_writing.popleft()
+                    name, _views_count, error, duration, written = result
+                    if written is not None and written.exception() is not None:
+                        _views_count = 0
+                        error = "".join(traceback.format_exception(written.exception()))
+                    job_next = record(job, name, _views_count, error, duration)
+                    if job_next is not None:
+                        jobs_todo.append(job_next)
+            flush_writer_pool()
+        else:
+            import multiprocessing
+
+            # spawn, as forked processes cannot re-initialize cuda
+            mp_context = multiprocessing.get_context("spawn")
+            devices_queue = None
+            if self.devices is not None and len(self.devices) > 0:
+                devices_queue = mp_context.Queue()
+                for w in range(self.workers):
+                    devices_queue.put(self.devices[w % len(self.devices)])
+            # workers wait for the writes of each sequence, futures cannot be returned from processes
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(devices_queue, self.writers, logging.getLogger().level),
+            ) as executor:
+                futures = {
+                    executor.submit(_run_render_job, job, True, self.render): job
+                    for job in jobs_initial
+                }
+                while len(futures) > 0:
+                    futures_done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in futures_done:
+                        job = futures.pop(future)
+                        job_next = record(job, *future.result()[:-1])
+                        if job_next is not None:
+                            future_next = executor.submit(
+                                _run_render_job,
+                                job_next,
+                                True,
+                                self.render,
+                            )
+                            futures[future_next] = job_next
+
+        duration = time.time() - time_start
+        logger.info(
+            f"render: finished {sequences_count} sequences, {views_count} views, failed {len(failures)} "
+            f"in {duration / 60.:.2f} min ({self.get_throughput(views_count, time_start):.2f} views/sec).",
+        )
+        if len(failures) > 0:
+            logger.warning(
+                f"render: failed sequences (retried on next run): {list(failures.keys())}",
+            )
+        return failures
+
+    @staticmethod
+    def get_throughput(count: int, time_start: float):
+        duration = time.time() - time_start
+        return count / duration if duration > 0 else 0.0
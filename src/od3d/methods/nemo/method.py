@@ -10,6 +10,8 @@ from od3d.cv.metric.pose import get_pose_diff_in_rad
 from od3d.cv.select import batched_index_select
 from od3d.datasets.dataset import OD3D_Dataset
 from od3d.methods.method import OD3D_Method
+from od3d.methods.nemo.pseudo_labels import NeMo_PseudoLabels
+from od3d.methods.nemo.refine import NeMo_RefineActiveSet
 from omegaconf import DictConfig
 
 logger = logging.getLogger(__name__)
@@ -90,6 +92,9 @@ class SIM_FEATS_MESH_WITH_IMAGE(StrEnum):
 
 
 class NeMo(OD3D_Method):
+    # fused validation computes the losses with the test transform, their metric names get this suffix
+    val_fused_metrics_suffix = "_tform_test"
+
     def setup(self):
         pass
 
@@ -269,6 +274,8 @@ class NeMo(OD3D_Method):
         self.refine_update_max[:, :3] = (
             self.refine_update_max[:, :3] * self.meshes_ranges
         )
+        # pose templates per feature map size, invalidated when the meshes are trained
+        self.templates = {}
 
         # self.meshes.rgb = (self.meshes.geodesic_prob[3, :, None].repeat(1, 3)).clamp(0, 1)
         # self.meshes.show()
@@ -322,10 +329,8 @@ class NeMo(OD3D_Method):
         self.net.cuda()
         self.meshes.cuda()
 
-        self.pseudo_labels_fraction = (
-            -self.config.train.pseudo_labels_fraction_per_epoch
-        )
-        self.pseudo_tform4x4_obj = {}
+        self.pseudo_labels_fraction = 0.0
+        self.pseudo_labels = NeMo_PseudoLabels()
 
         # load checkpoint
         self.load_checkpoint_params(
@@ -563,6 +568,10 @@ class NeMo(OD3D_Method):
     def rfpath_checkpoint(self):
         return Path("nemo.ckpt")
 
+    @property
+    def fpath_pseudo_labels(self):
+        return self.logging_dir.joinpath("nemo_pseudo_labels.pt")
+
     def train(
         self,
         datasets_train: Dict[str, OD3D_Dataset],
@@ -621,17 +630,19 @@ class NeMo(OD3D_Method):
                 pin_memory=self.config.train.dataloader.pin_memory,
                 num_workers=self.config.train.dataloader.num_workers,
                 device=self.device,
+                fpath_stats=self.logging_dir.joinpath("pca_stats.pt"),
             )
 
         # first validation
         if self.config.train.val:
             for dataset_val_key, dataset_val in datasets_val.items():
-                results_val = self.test(dataset_val, val=True, multiview=False)
-                with torch.no_grad():
-                    results_val += self.train_epoch(dataset_val, val=True)
+                results_val = self.validate(dataset_val)
                 results_val.log_with_prefix(prefix=f"val/{dataset_val.name}")
                 if dataset_val_key == "main":
-                    score_latest = results_val[score_metric_name]
+                    score_latest = self.get_score_val(
+                        results_val=results_val,
+                        score_metric_name=score_metric_name,
+                    )
                     if score_metric_neg:
                         score_latest = -score_latest
             if not self.config.train.early_stopping or score_latest >= score_ckpt_val:
@@ -640,46 +651,23 @@ class NeMo(OD3D_Method):
         else:
             self.save_checkpoint(path_checkpoint=self.fpath_checkpoint)
 
+        # resumed runs continue with the pseudo labels of the previous run
+        if (
+            self.config.train.pseudo_labels_fraction_per_epoch > 0.0
+            and self.fpath_pseudo_labels.exists()
+        ):
+            self.pseudo_labels = NeMo_PseudoLabels.read(fpath=self.fpath_pseudo_labels)
+
         # self.scheduler.last_epoch
         for epoch in range(self.scheduler.last_epoch, self.config.train.epochs):
             # pseudo
             if self.config.train.pseudo_labels_fraction_per_epoch > 0.0:
-                # from od3d.datasets.dataset import OD3D_DATASET_SPLITS
-                # dataset_train_sub_sub, _ = dataset_train_sub.get_split(
-                #     fraction1=0.1,
-                #     fraction2=0.9,
-                #     split=OD3D_DATASET_SPLITS.RANDOM,
-                # )
-                results_train_pseudo_mean, results_train_pseudo = self.test(
-                    dataset_train_sub,
-                    val=True,
-                    multiview=True,
-                    return_results_epoch=True,
-                )
-                results_train_pseudo_mean.log_with_prefix(
-                    prefix=f"train_pseudo/{dataset_train_sub.name}",
+                self.refresh_pseudo_labels(dataset=dataset_train_sub, epoch=epoch)
+                self.pseudo_labels_fraction = min(
+                    self.config.train.pseudo_labels_fraction_per_epoch * epoch,
+                    1.0,
                 )
 
-                tform_obj = tform4x4(
-                    inv_tform4x4(results_train_pseudo["cam_tform4x4_obj"]),
-                    results_train_pseudo["cam_tform4x4_obj_gt"],
-                ).detach()
-
-                del self.pseudo_tform4x4_obj
-                self.pseudo_tform4x4_obj = {}
-                for b, name_unique in enumerate(results_train_pseudo["name_unique"]):
-                    name_seq = "/".join(name_unique.split("/")[:-1])
-                    if name_seq not in self.pseudo_tform4x4_obj.keys():
-                        self.pseudo_tform4x4_obj[name_seq] = tform_obj[b]
-
-                # results_train_pseudo['cam_tform4x4_obj']
-                # results_train_pseudo['cam_tform4x4_obj_gt']
-                # results_train_pseudo['name_unique']
-                self.pseudo_labels_fraction += (
-                    self.config.train.pseudo_labels_fraction_per_epoch
-                )
-                self.pseudo_labels_fraction = min(self.pseudo_labels_fraction, 1.0)
-
             results_epoch = self.train_epoch(dataset=dataset_train_sub)
             results_epoch.log_with_prefix("train")
             if (
@@ -688,12 +676,13 @@ class NeMo(OD3D_Method):
                 and epoch % self.config.train.epochs_to_next_test == 0
             ):
                 for dataset_val_key, dataset_val in datasets_val.items():
-                    results_val = self.test(dataset_val, val=True, multiview=False)
-                    with torch.no_grad():
-                        results_val += self.train_epoch(dataset_val, val=True)
+                    results_val = self.validate(dataset_val)
                     results_val.log_with_prefix(prefix=f"val/{dataset_val.name}")
                     if dataset_val_key == "main":
-                        score_latest = results_val[score_metric_name]
+                        score_latest = self.get_score_val(
+                            results_val=results_val,
+                            score_metric_name=score_metric_name,
+                        )
                         if score_metric_neg:
                             score_latest = -score_latest
 
@@ -715,18 +704,147 @@ class NeMo(OD3D_Method):
 
         self.load_checkpoint(path_checkpoint=self.fpath_checkpoint)
 
-    def test(
-        self,
-        dataset: OD3D_Dataset,
-        val=False,
-        multiview=True,
-        return_results_epoch=False,
-    ):
+    def refresh_pseudo_labels(self, dataset: OD3D_Dataset, epoch: int):
+        """
+        Re-estimates the pseudo labels of at most train.pseudo_labels.sequences_count_per_epoch sequences,
+        without estimate, stalest or least confident first, with multiview inference on a few uniformly
+        sampled frames per sequence. The store is written next to the checkpoint.
+        """
+        config_pseudo_labels = self.config.train.get("pseudo_labels", {})
+        names_seqs = [
+            f"{category}/{sequence_name}"
+            for category, dict_sequences in dataset.dict_nested_frames.items()
+            for sequence_name in dict_sequences.keys()
+        ]
+        names_seqs = self.pseudo_labels.get_names_seqs_to_refresh(
+            names_seqs=names_seqs,
+            count=config_pseudo_labels.get("sequences_count_per_epoch", None),
+        )
+        if len(names_seqs) == 0:
+            return
+
+        dict_category_sequences = {}
+        for name_seq in names_seqs:
+            category, sequence_name = name_seq.split("/", 1)
+            if category not in dict_category_sequences:
+                dict_category_sequences[category] = []
+            dict_category_sequences[category].append(sequence_name)
+        dataset_pseudo = dataset.get_subset_by_sequences(
+            dict_category_sequences=dict_category_sequences,
+            frames_count_max_per_sequence=config_pseudo_labels.get(
+                "frames_count_per_sequence",
+                None,
+            ),
+        )
+
+        results_pseudo_mean, results_pseudo = self.test(
+            dataset_pseudo,
+            val=True,
+            multiview=True,
+            return_results_epoch=True,
+        )
+        results_pseudo_mean.log_with_prefix(prefix=f"train_pseudo/{dataset.name}")
+
+        tforms4x4_obj = tform4x4(
+            inv_tform4x4(results_pseudo["cam_tform4x4_obj"]),
+            results_pseudo["cam_tform4x4_obj_gt"],
+        ).detach()
+        self.pseudo_labels.update(
+            names_unique=results_pseudo["name_unique"],
+            tforms4x4_obj=tforms4x4_obj,
+            confidences=results_pseudo["sim"],
+            epoch=epoch,
+        )
+        self.pseudo_labels.save(fpath=self.fpath_pseudo_labels)
+        logger.info(
+            f"refreshed pseudo labels of {len(names_seqs)} sequences, "
+            f"{len(self.pseudo_labels)} sequences labeled.",
+        )
+
+    def get_score_val(self, results_val: OD3D_Results, score_metric_name: str):
+        if (
+            score_metric_name not in results_val
+            and f"{score_metric_name}{self.val_fused_metrics_suffix}" in results_val
+        ):
+            score_metric_name = f"{score_metric_name}{self.val_fused_metrics_suffix}"
+        return results_val[score_metric_name]
+
+    def validate(self, dataset: OD3D_Dataset) -> OD3D_Results:
+        """
+        Returns pose metrics of test and loss metrics of train_epoch for the validation dataset.
+        With train.val_fused, each batch is loaded and passed through the network only once,
+        and the featmaps are shared by train_batch and inference_batch. The losses are then computed
+        with the test transform, their metric names end with val_fused_metrics_suffix.
+        """
+        if not self.config.train.get("val_fused", True) or isinstance(
+            dataset,
+            SPair71K,
+        ):
+            results_val = self.test(dataset, val=True, multiview=False)
+            with torch.no_grad():
+                results_val += self.train_epoch(dataset, val=True)
+            return results_val
+
+        logger.info(f"validate dataset {dataset.name}")
+        # the deterministic test transform for poses and losses
+        dataloader, _ = self.prepare_test(dataset, multiview=False)
+
+        results_epoch_test = OD3D_Results(logging_dir=self.logging_dir)
+        results_epoch_train = OD3D_Results(logging_dir=self.logging_dir)
+        with torch.no_grad():
+            for i, batch in tqdm(enumerate(iter(dataloader))):
+                batch.to(device=self.device)
+                backbone_out, net_out = self.net(
+                    batch.rgb,
+                    return_backbone_output=True,
+                )
+                # inference first, train_batch may normalize the batch meshes with pseudo labels
+                latent = getattr(backbone_out, "latent", None)
+                results_epoch_test += self.inference_batch(
+                    batch=batch,
+                    multiview=False,
+                    val=True,
+                    net_outs=(backbone_out, net_out),
+                )
+                # refinement overwrites the latent of the backbone output
+                backbone_out.latent = latent
+                results_epoch_train += self.train_batch(
+                    batch=batch,
+                    net_outs=(backbone_out, net_out),
+                )
+        self.optim.zero_grad()
+
+        logger.info(f"Predicted {len(results_epoch_test['item_id'])} frames.")
+        results_visual_test = self.get_results_visual(
+            results_epoch=results_epoch_test,
+            dataset=dataset,
+            config_visualize=self.config.test.visualize,
+        )
+        results_visual_train = self.get_results_visual(
+            results_epoch=results_epoch_train,
+            dataset=dataset,
+            config_visualize=self.config.train.visualize,
+        )
+        results_val = results_epoch_test.mean()
+        results_val += results_visual_test
+        results_val += {
+            f"{key}{self.val_fused_metrics_suffix}": val
+            for key, val in results_epoch_train.mean().items()
+        }
+        results_val += results_visual_train
+        return results_val
+
+    def prepare_test(self, dataset: OD3D_Dataset, multiview=False):
+        """
+        Saves the checkpoint if missing, sets the eval mode, the keypoints and the test transform.
+        Returns:
+            dataloader (torch.utils.data.DataLoader): test batches, with multiview one batch per sequence.
+            dataset_test (OD3D_Dataset): dataset of the dataloader, with multiview the subset of the batches.
+        """
         # note: ensure that checkpoint is saved for checkpointed runs
         if not self.fpath_checkpoint.exists():
             self.save_checkpoint(path_checkpoint=self.fpath_checkpoint)
 
-        logger.info(f"test dataset {dataset.name}")
         self.net.eval()
         if self.net_pose is not None:
             self.net_pose.eval()
@@ -735,12 +853,6 @@ class NeMo(OD3D_Method):
         if OD3D_FRAME_MODALITIES.KPTS2D_ANNOT in dataset.modalities:
             self.set_kpts(dataset)
 
-        multiview = (
-            (isinstance(dataset, CO3D) or isinstance(dataset, Omni6DPose))
-            and multiview
-            and self.config.multiview.get("enabled", True)
-        )
-
         if not isinstance(dataset, SPair71K):
             dataset.transform = copy.deepcopy(self.transform_test)
         else:
@@ -761,26 +873,42 @@ class NeMo(OD3D_Method):
                 pin_memory=self.config.test.dataloader.pin_memory,
             )
             logger.info(f"Dataset contains {len(dataset)} frames.")
+            return dataloader, dataset
+
+        dict_category_sequences = {
+            category: list(sequence_dict.keys())
+            for category, sequence_dict in dataset.dict_nested_frames.items()
+        }
+        dataset_sub = dataset.get_subset_by_sequences(
+            dict_category_sequences=dict_category_sequences,
+            frames_count_max_per_sequence=self.config.multiview.batch_size,
+        )
 
-        else:
-            dict_category_sequences = {
-                category: list(sequence_dict.keys())
-                for category, sequence_dict in dataset.dict_nested_frames.items()
-            }
-            dataset_sub = dataset.get_subset_by_sequences(
-                dict_category_sequences=dict_category_sequences,
-                frames_count_max_per_sequence=self.config.multiview.batch_size,
-            )
+        dataloader = torch.utils.data.DataLoader(
+            dataset=dataset_sub,
+            batch_size=self.config.multiview.batch_size,
+            shuffle=False,
+            collate_fn=dataset_sub.collate_fn,
+            num_workers=self.config.test.dataloader.num_workers,
+            pin_memory=self.config.test.dataloader.pin_memory,
+        )
+        logger.info(f"Dataset contains {len(dataset_sub)} frames.")
+        return dataloader, dataset_sub
 
-            dataloader = torch.utils.data.DataLoader(
-                dataset=dataset_sub,
-                batch_size=self.config.multiview.batch_size,
-                shuffle=False,
-                collate_fn=dataset_sub.collate_fn,
-                num_workers=self.config.test.dataloader.num_workers,
-                pin_memory=self.config.test.dataloader.pin_memory,
-            )
-            logger.info(f"Dataset contains {len(dataset_sub)} frames.")
+    def test(
+        self,
+        dataset: OD3D_Dataset,
+        val=False,
+        multiview=True,
+        return_results_epoch=False,
+    ):
+        logger.info(f"test dataset {dataset.name}")
+        multiview = (
+            (isinstance(dataset, CO3D) or isinstance(dataset, Omni6DPose))
+            and multiview
+            and self.config.multiview.get("enabled", True)
+        )
+        dataloader, dataset_test = self.prepare_test(dataset, multiview=multiview)
 
         results_epoch = OD3D_Results(logging_dir=self.logging_dir)
         for i, batch in tqdm(enumerate(iter(dataloader))):
@@ -859,18 +987,11 @@ class NeMo(OD3D_Method):
         if not val and self.config.test.save_results:
             results_epoch.save_with_dataset(prefix="test", dataset=dataset)
 
-        if not multiview:
-            results_visual = self.get_results_visual(
-                results_epoch=results_epoch,
-                dataset=dataset,
-                config_visualize=self.config.test.visualize,
-            )
-        else:
-            results_visual = self.get_results_visual(
-                results_epoch=results_epoch,
-                dataset=dataset_sub,
-                config_visualize=self.config.test.visualize,
-            )
+        results_visual = self.get_results_visual(
+            results_epoch=results_epoch,
+            dataset=dataset_test,
+            config_visualize=self.config.test.visualize,
+        )
 
         results_epoch_mean = results_epoch.mean()
         results_epoch_mean += results_visual
@@ -886,6 +1007,7 @@ class NeMo(OD3D_Method):
             if self.net_pose is not None:
                 self.net_pose.train()
             self.meshes.del_pre_rendered()
+            self.templates.clear()
             self.meshes.train()
         else:
             logger.info(f"test dataset {dataset.name}")
@@ -944,7 +1066,7 @@ class NeMo(OD3D_Method):
         results_epoch += results_visual
         return results_epoch
 
-    def train_batch(self, batch) -> OD3D_Results:
+    def train_batch(self, batch, net_outs=None) -> OD3D_Results:
         results_batch = OD3D_Results(logging_dir=self.logging_dir)
         B = len(batch)
 
@@ -972,9 +1094,12 @@ class NeMo(OD3D_Method):
                 for name_unique in batch.name_unique
             ]
             for b in range(B):
-                if torch.rand(1)[0] < self.pseudo_labels_fraction:
+                if (
+                    seq_names[b] in self.pseudo_labels
+                    and torch.rand(1)[0] < self.pseudo_labels_fraction
+                ):
                     pseudo_tform_obj_b = (
-                        self.pseudo_tform4x4_obj[seq_names[b]]
+                        self.pseudo_labels[seq_names[b]]
                         .detach()
                         .clone()
                         .to(cam_tform4x4_obj.device)
@@ -1064,7 +1189,9 @@ class NeMo(OD3D_Method):
         # logger.info(f"batch.size {batch.size}")
         logger.info(f"categories before network {batch.category_id}")
 
-        backbone_out, net_out = self.net(batch.rgb, return_backbone_output=True)
+        if net_outs is None:
+            net_outs = self.net(batch.rgb, return_backbone_output=True)
+        backbone_out, net_out = net_outs
         feats2d_img = net_out.featmap
         logger.info(f"categories {batch.category_id}")
 
@@ -2084,6 +2211,7 @@ class NeMo(OD3D_Method):
         return_samples_with_sim=True,
         multiview=False,
         val=False,
+        net_outs=None,
     ):
         results = OD3D_Results(logging_dir=self.logging_dir)
         B = len(batch)
@@ -2101,7 +2229,9 @@ class NeMo(OD3D_Method):
 
         time_loaded = time.time()
         with torch.no_grad():
-            backbone_out, net_out = self.net(batch.rgb, return_backbone_output=True)
+            if net_outs is None:
+                net_outs = self.net(batch.rgb, return_backbone_output=True)
+            backbone_out, net_out = net_outs
             feats2d_net = net_out.featmap
 
             if (
@@ -2294,28 +2424,64 @@ class NeMo(OD3D_Method):
             logger.info(b_cams_multiview_intr4x4.shape)
 
             logger.info(batch.category_id)
-            #  OPTION A: Use 2d gradient of rendered features
-            sim = self.meshes.get_sim_render(
-                feats2d_img=feats2d_net,
-                cams_tform4x4_obj=b_cams_multiview_tform4x4_obj,
-                cams_intr4x4=b_cams_multiview_intr4x4,
-                objects_ids=batch.category_id,
-                broadcast_batch_and_cams=True,
-                down_sample_rate=self.down_sample_rate,
-                feats2d_img_mask=feats2d_net_mask,
-                allow_clutter=self.config.inference.allow_clutter,
-                return_sim_pxl=False,
-                add_clutter=True,
-                temp=self.config.train.T,
-                instance_deform=instance_deform
-                if self.config.inference.sample.get("use_instance_deform", True)
-                else None,
-                normalize_surface=self.config.inference.normalize_surface,
-                object_mask=batch.mask
-                if self.config.inference.add_mask_object_to_sim
-                else None,
-                use_neg_mse="sim_neg_mse_max" in self.config.train.loss.appear.type,
+
+            use_instance_deform = self.config.inference.sample.get(
+                "use_instance_deform",
+                True,
+            )
+            # templates only cover the uniform grid of the undeformed meshes
+            use_templates = (
+                "uniform" in self.config.inference.sample.method
+                and "affine" not in self.config.inference.sample.method
+                and not multiview
+                and self.config.inference.sample.uniform.get("templates", {}).get(
+                    "enabled",
+                    False,
+                )
+                and (instance_deform is None or not use_instance_deform)
             )
+            if use_templates:
+                sim = self.meshes.get_sim_templates(
+                    templates=self.get_templates(
+                        config_sample=self.config.inference.sample,
+                        imgs_sizes=feats2d_net.shape[-2:],
+                    ),
+                    feats2d_img=feats2d_net,
+                    cams_tform4x4_obj=b_cams_multiview_tform4x4_obj,
+                    cams_intr4x4=b_cams_multiview_intr4x4,
+                    objects_ids=batch.category_id,
+                    down_sample_rate=self.down_sample_rate,
+                    feats2d_img_mask=feats2d_net_mask,
+                    allow_clutter=self.config.inference.allow_clutter,
+                    return_sim_pxl=False,
+                    temp=self.config.train.T,
+                    normalize_surface=self.config.inference.normalize_surface,
+                    object_mask=batch.mask
+                    if self.config.inference.add_mask_object_to_sim
+                    else None,
+                    use_neg_mse="sim_neg_mse_max" in self.config.train.loss.appear.type,
+                )
+            else:
+                #  OPTION A: Use 2d gradient of rendered features
+                sim = self.meshes.get_sim_render(
+                    feats2d_img=feats2d_net,
+                    cams_tform4x4_obj=b_cams_multiview_tform4x4_obj,
+                    cams_intr4x4=b_cams_multiview_intr4x4,
+                    objects_ids=batch.category_id,
+                    broadcast_batch_and_cams=True,
+                    down_sample_rate=self.down_sample_rate,
+                    feats2d_img_mask=feats2d_net_mask,
+                    allow_clutter=self.config.inference.allow_clutter,
+                    return_sim_pxl=False,
+                    add_clutter=True,
+                    temp=self.config.train.T,
+                    instance_deform=instance_deform if use_instance_deform else None,
+                    normalize_surface=self.config.inference.normalize_surface,
+                    object_mask=batch.mask
+                    if self.config.inference.add_mask_object_to_sim
+                    else None,
+                    use_neg_mse="sim_neg_mse_max" in self.config.train.loss.appear.type,
+                )
 
             if multiview:
                 sim = sim.mean(dim=0, keepdim=True).expand(*sim.shape)
@@ -2462,7 +2628,37 @@ class NeMo(OD3D_Method):
             # if not self.config.inference.refine.latent_detached and instance_deform_latent_tmp is not None:
             #    self.meshes.instance_deform_net.train()
 
+            # adaptive: converged samples keep their pose and are dropped from rendering,
+            # not for multiview as all views share the same update
+            refine_set = NeMo_RefineActiveSet(
+                B=B,
+                device=cam_tform4x4_obj.device,
+                adaptive=self.config.inference.refine.get("adaptive", False)
+                and not multiview,
+                sim_tol=self.config.inference.refine.get("adaptive_sim_tol", 1e-4),
+                update_tol=self.config.inference.refine.get(
+                    "adaptive_update_tol",
+                    1e-3,
+                ),
+                patience=self.config.inference.refine.get("adaptive_patience", 3),
+                epochs_min=self.config.inference.refine.get("adaptive_epochs_min", 5),
+            )
+
             for epoch in range(self.config.inference.optimizer.epochs):
+                if refine_set.converged:
+                    break
+                if refine_set.update_ids():
+                    # compact inputs only when the active set changed
+                    feats2d_net_active = refine_set.select(feats2d_net)
+                    feats2d_net_mask_active = refine_set.select(feats2d_net_mask)
+                    cam_intr4x4_active = refine_set.select(cam_intr4x4)
+                    category_id_active = refine_set.select(batch.category_id)
+                    object_mask_active = (
+                        refine_set.select(batch.mask)
+                        if self.config.inference.add_mask_object_to_sim
+                        else None
+                    )
+
                 if multiview and instance_deform_latent_tmp is not None:
                     instance_deform_latent_tmp = (
                         instance_deform_latent_tmp_param.repeat(B, 1).clone()
@@ -2517,22 +2713,20 @@ class NeMo(OD3D_Method):
                     )
 
                 sim, sim_pxl = self.meshes.get_sim_render(
-                    feats2d_img=feats2d_net,
-                    cams_tform4x4_obj=cam_tform4x4_obj,
-                    cams_intr4x4=cam_intr4x4,
-                    objects_ids=batch.category_id,
+                    feats2d_img=feats2d_net_active,
+                    cams_tform4x4_obj=refine_set.select(cam_tform4x4_obj),
+                    cams_intr4x4=cam_intr4x4_active,
+                    objects_ids=category_id_active,
                     broadcast_batch_and_cams=False,
                     down_sample_rate=self.down_sample_rate,
-                    feats2d_img_mask=feats2d_net_mask,
+                    feats2d_img_mask=feats2d_net_mask_active,
                     allow_clutter=self.config.inference.allow_clutter,
                     return_sim_pxl=True,
                     add_clutter=True,
                     temp=self.config.train.T,
                     normalize_surface=self.config.inference.normalize_surface,
-                    object_mask=batch.mask
-                    if self.config.inference.add_mask_object_to_sim
-                    else None,
-                    instance_deform=instance_deform,
+                    object_mask=object_mask_active,
+                    instance_deform=refine_set.select(instance_deform),
                     use_neg_mse="sim_neg_mse_max" in self.config.train.loss.appear.type,
                 )
 
@@ -2590,9 +2784,22 @@ class NeMo(OD3D_Method):
 
                 loss = mesh_cam_loss.sum()
                 loss.backward()
+                if refine_set.adaptive and instance_deform_latent_tmp_param is not None:
+                    instance_deform_latent_prev = (
+                        instance_deform_latent_tmp_param.data.clone()
+                    )
+                else:
+                    instance_deform_latent_prev = None
                 optim_inference.step()
                 optim_inference.zero_grad()
 
+                # adam momentum must not move converged samples
+                refine_set.freeze_inactive(
+                    obj_tform6=obj_tform6_tmp,
+                    latent=instance_deform_latent_tmp_param,
+                    latent_prev=instance_deform_latent_prev,
+                )
+
                 # detach update
                 obj_tform6_tmp.data[:, dims_detached] = 0.0
                 if multiview and 6 in dims_detached:
@@ -2619,6 +2826,8 @@ class NeMo(OD3D_Method):
                     logger.warning("refinement contains Infs")
                     obj_tform6_tmp.data[refine_update_mask_infs] = 0.0
 
+                refine_set.update(epoch=epoch, sim=sim, obj_tform6=obj_tform6_tmp.data)
+
             cam_tform4x4_obj = tform4x4_broadcast(
                 cam_tform4x4_obj.detach(),
                 se3_exp_map(obj_tform6_tmp[:, :6].detach()),
@@ -2637,6 +2846,10 @@ class NeMo(OD3D_Method):
             results["time_pose_iterative"] = (
                 torch.Tensor([time.time() - time_before_pose_iterative]) / B
             )
+            results["refine_iterations"] = refine_set.iterations.to(dtype=torch.float)
+            if refine_set.sim is not None:
+                # similarity of all samples, converged samples keep the one of their last iteration
+                sim = refine_set.sim
 
         cam_tform4x4_obj = cam_tform4x4_obj.clone().detach()
 
@@ -4091,6 +4304,70 @@ class NeMo(OD3D_Method):
 
         return poses_tform4x4
 
+    def get_uniform_cams_tform4x4_obj(self, config_sample: DictConfig):
+        azim = torch.linspace(
+            start=eval(config_sample.uniform.azim.min),
+            end=eval(config_sample.uniform.azim.max),
+            steps=config_sample.uniform.azim.steps,
+        ).to(
+            device=self.device,
+        )  # 12
+        elev = torch.linspace(
+            start=eval(config_sample.uniform.elev.min),
+            end=eval(config_sample.uniform.elev.max),
+            steps=config_sample.uniform.elev.steps,
+        ).to(
+            device=self.device,
+        )  # start=-torch.pi / 6, end=torch.pi / 3, steps=4
+        theta = torch.linspace(
+            start=eval(config_sample.uniform.theta.min),
+            end=eval(config_sample.uniform.theta.max),
+            steps=config_sample.uniform.theta.steps,
+        ).to(
+            device=self.device,
+        )  # -torch.pi / 6, end=torch.pi / 6, steps=3
+
+        # dist = torch.linspace(start=eval(config_sample.uniform.dist.min), end=eval(config_sample.uniform.dist.max), steps=config_sample.uniform.dist.steps).to(
+        #    device=self.device)
+        dist = torch.linspace(start=1.0, end=1.0, steps=1).to(
+            device=self.device,
+        )
+
+        azim_shape = azim.shape
+        elev_shape = elev.shape
+        theta_shape = theta.shape
+        dist_shape = dist.shape
+        in_shape = azim_shape + elev_shape + theta_shape + dist_shape
+        azim = azim[:, None, None, None].expand(in_shape).reshape(-1)
+        elev = elev[None, :, None, None].expand(in_shape).reshape(-1)
+        theta = theta[None, None, :, None].expand(in_shape).reshape(-1)
+        dist = dist[None, None, None, :].expand(in_shape).reshape(-1)
+        return transf4x4_from_spherical(
+            azim=azim,
+            elev=elev,
+            theta=theta,
+            dist=dist,
+        )
+
+    def get_templates(self, config_sample: DictConfig, imgs_sizes):
+        """Returns the pose templates of the uniform grid for feature maps of size imgs_sizes (H, W)."""
+        from od3d.cv.geometry.objects3d.templates import OD3D_Objects3D_Templates
+
+        key = tuple(int(s) for s in imgs_sizes)
+        if key not in self.templates:
+            path_templates = config_sample.uniform.templates.get("path", None)
+            if path_templates is None:
+                path_templates = Path(self.logging_dir).joinpath("templates")
+            self.templates[key] = OD3D_Objects3D_Templates.create_from_objects3d(
+                objects3d=self.meshes,
+                cams_tform4x4_obj=self.get_uniform_cams_tform4x4_obj(
+                    config_sample=config_sample,
+                ),
+                imgs_sizes=key,
+                path_cache=Path(path_templates),
+            )
+        return self.templates[key]
+
     def get_samples(
         self,
         config_sample: DictConfig,
@@ -4185,48 +4462,8 @@ class NeMo(OD3D_Method):
                 b_cams_multiview_intr4x4 = cam_intr4x4[:, None].repeat(1, C, 1, 1)
 
             elif "uniform" in config_sample.method:
-                azim = torch.linspace(
-                    start=eval(config_sample.uniform.azim.min),
-                    end=eval(config_sample.uniform.azim.max),
-                    steps=config_sample.uniform.azim.steps,
-                ).to(
-                    device=self.device,
-                )  # 12
-                elev = torch.linspace(
-                    start=eval(config_sample.uniform.elev.min),
-                    end=eval(config_sample.uniform.elev.max),
-                    steps=config_sample.uniform.elev.steps,
-                ).to(
-                    device=self.device,
-                )  # start=-torch.pi / 6, end=torch.pi / 3, steps=4
-                theta = torch.linspace(
-                    start=eval(config_sample.uniform.theta.min),
-                    end=eval(config_sample.uniform.theta.max),
-                    steps=config_sample.uniform.theta.steps,
-                ).to(
-                    device=self.device,
-                )  # -torch.pi / 6, end=torch.pi / 6, steps=3
-
-                # dist = torch.linspace(start=eval(config_sample.uniform.dist.min), end=eval(config_sample.uniform.dist.max), steps=config_sample.uniform.dist.steps).to(
-                #    device=self.device)
-                dist = torch.linspace(start=1.0, end=1.0, steps=1).to(
-                    device=self.device,
-                )
-
-                azim_shape = azim.shape
-                elev_shape = elev.shape
-                theta_shape = theta.shape
-                dist_shape = dist.shape
-                in_shape = azim_shape + elev_shape + theta_shape + dist_shape
-                azim = azim[:, None, None, None].expand(in_shape).reshape(-1)
-                elev = elev[None, :, None, None].expand(in_shape).reshape(-1)
-                theta = theta[None, None, :, None].expand(in_shape).reshape(-1)
-                dist = dist[None, None, None, :].expand(in_shape).reshape(-1)
-                cams_multiview_tform4x4_cuboid = transf4x4_from_spherical(
-                    azim=azim,
-                    elev=elev,
-                    theta=theta,
-                    dist=dist,
+                cams_multiview_tform4x4_cuboid = self.get_uniform_cams_tform4x4_obj(
+                    config_sample=config_sample,
                 )
 
                 C = len(cams_multiview_tform4x4_cuboid)
@@ -0,0 +1,101 @@
+import logging
+
+logger = logging.getLogger(__name__)
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+
+class NeMo_PseudoLabels:
+    """
+    Per-sequence pseudo object transforms, with the confidence and the epoch of their estimate.
+    Sequences are re-estimated stalest first, and the least confident first among equally stale sequences.
+    """
+
+    def __init__(self):
+        self.tforms4x4_obj: Dict[str, torch.Tensor] = {}
+        self.confidences: Dict[str, float] = {}
+        self.epochs: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.tforms4x4_obj)
+
+    def __contains__(self, name_seq: str):
+        return name_seq in self.tforms4x4_obj
+
+    def __getitem__(self, name_seq: str):
+        return self.tforms4x4_obj[name_seq]
+
+    def get_names_seqs_to_refresh(self, names_seqs: List[str], count: int = None):
+        """
+        Returns:
+            names_seqs (List[str]): the sequences without estimate, followed by the stalest and least confident
+                sequences, at most count sequences, all sequences if count is None.
+        """
+        names_seqs = sorted(
+            names_seqs,
+            key=lambda name_seq: (
+                name_seq in self,
+                self.epochs.get(name_seq, -1),
+                self.confidences.get(name_seq, 0.0),
+            ),
+        )
+        if count is not None:
+            names_seqs = names_seqs[:count]
+        return names_seqs
+
+    def update(
+        self,
+        names_unique: List[str],
+        tforms4x4_obj: torch.Tensor,
+        confidences: torch.Tensor,
+        epoch: int,
+    ):
+        """
+        Keeps one transform per sequence, the one of the most confident frame, and the mean confidence.
+
+        Args:
+            names_unique (List[str]): frames names unique, category/sequence/frame.
+            tforms4x4_obj (torch.Tensor): Bx4x4 pseudo object transforms of the frames.
+            confidences (torch.Tensor): B confidences of the frames.
+            epoch (int): epoch of the estimate.
+        """
+        tforms4x4_obj = tforms4x4_obj.detach().cpu()
+        confidences = confidences.detach().cpu().float().reshape(len(names_unique), -1)
+        confidences = confidences.mean(dim=-1)
+        names_seqs = ["/".join(name.split("/")[:-1]) for name in names_unique]
+        for name_seq in dict.fromkeys(names_seqs):
+            ids = torch.LongTensor(
+                [b for b, _name_seq in enumerate(names_seqs) if _name_seq == name_seq],
+            )
+            id_best = ids[confidences[ids].argmax()]
+            self.tforms4x4_obj[name_seq] = tforms4x4_obj[id_best].clone()
+            self.confidences[name_seq] = confidences[ids].mean().item()
+            self.epochs[name_seq] = epoch
+
+    def state_dict(self):
+        return {
+            "tforms4x4_obj": self.tforms4x4_obj,
+            "confidences": self.confidences,
+            "epochs": self.epochs,
+        }
+
+    def load_state_dict(self, state_dict: Dict):
+        self.tforms4x4_obj = state_dict["tforms4x4_obj"]
+        self.confidences = state_dict["confidences"]
+        self.epochs = state_dict["epochs"]
+
+    def save(self, fpath: Path):
+        fpath = Path(fpath)
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        fpath_tmp = fpath.with_suffix(fpath.suffix + ".tmp")
+        torch.save(self.state_dict(), fpath_tmp)
+        fpath_tmp.replace(fpath)
+
+    @classmethod
+    def read(cls, fpath: Path):
+        pseudo_labels = cls()
+        pseudo_labels.load_state_dict(torch.load(Path(fpath)))
+        logger.info(f"read pseudo labels of {len(pseudo_labels)} sequences {fpath}")
+        return pseudo_labels
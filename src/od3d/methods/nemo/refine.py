@@ -0,0 +1,115 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import torch
+
+
+class NeMo_RefineActiveSet:
+    """
+    Samples of a batch under iterative pose refinement.
+    If adaptive, converged samples keep their pose and are dropped from the refinement, otherwise all samples are
+    refined for all epochs.
+    """
+
+    def __init__(
+        self,
+        B: int,
+        device=None,
+        adaptive: bool = False,
+        sim_tol: float = 1e-4,
+        update_tol: float = 1e-3,
+        patience: int = 3,
+        epochs_min: int = 5,
+    ):
+        self.adaptive = adaptive
+        self.sim_tol = sim_tol
+        self.update_tol = update_tol
+        self.patience = patience
+        self.epochs_min = epochs_min
+
+        self.active = torch.ones(size=(B,), dtype=torch.bool, device=device)
+        self.ids = None
+        self.iterations = torch.zeros_like(self.active, dtype=torch.long)
+        self.converged_epochs = torch.zeros_like(self.iterations)
+        self.sim_prev = torch.full_like(
+            self.active,
+            fill_value=torch.inf,
+            dtype=torch.float,
+        )
+        # similarity of the last iteration of each sample, first dimension B
+        self.sim = None
+
+    @property
+    def converged(self):
+        return not self.active.any()
+
+    def update_ids(self):
+        """
+        Returns:
+            changed (bool): True if the active samples changed since the last call, inputs need to be compacted.
+        """
+        if self.ids is not None and len(self.ids) == int(self.active.sum()):
+            return False
+        self.ids = self.active.nonzero()[:, 0]
+        return True
+
+    def select(self, x):
+        """
+        Returns:
+            x: the rows of the active samples, x itself if not adaptive.
+        """
+        if x is None or not self.adaptive:
+            return x
+        return x[self.ids]
+
+    def freeze_inactive(
+        self,
+        obj_tform6: torch.Tensor,
+        latent: torch.Tensor = None,
+        latent_prev: torch.Tensor = None,
+    ):
+        """
+        Resets the update and latent of inactive samples after an optimizer step, adam momentum must not move
+        converged samples.
+        """
+        if not self.adaptive:
+            return
+        obj_tform6.data[~self.active] = 0.0
+        if latent is not None:
+            latent.data[~self.active] = latent_prev[~self.active]
+
+    def update(self, epoch: int, sim: torch.Tensor, obj_tform6: torch.Tensor):
+        """
+        Counts the iteration of the active samples and drops the converged ones,
+        converged if similarity and update stagnate for patience epochs.
+
+        Args:
+            epoch (int): epoch of the refinement, starting with 0.
+            sim (torch.Tensor): similarity of the active samples, first dimension the active samples.
+            obj_tform6 (torch.Tensor): Bx6 update of all samples.
+        """
+        self.iterations[self.active] += 1
+        if not self.adaptive:
+            self.sim = sim.detach()
+            return
+        if self.sim is None:
+            self.sim = torch.zeros(
+                size=(len(self.active),) + sim.shape[1:],
+                dtype=sim.dtype,
+                device=sim.device,
+            )
+        self.sim[self.ids] = sim.detach()
+        sim = sim.detach().reshape(len(self.ids), -1).mean(dim=-1)
+        update = obj_tform6.detach()[self.ids].abs().max(dim=-1).values
+        converged = ((sim - self.sim_prev[self.ids]).abs() < self.sim_tol) & (
+            update < self.update_tol
+        )
+        self.converged_epochs[self.ids] = torch.where(
+            converged,
+            self.converged_epochs[self.ids] + 1,
+            0,
+        )
+        self.sim_prev[self.ids] = sim
+        if epoch + 1 >= self.epochs_min:
+            self.active &= self.converged_epochs < self.patience
@@ -12,6 +12,7 @@ from od3d.data.batch_datatypes import OD3D_ModelData
 from od3d.data.ext_enum import ExtEnum
 from od3d.cv.visual.resize import resize
 from typing import Tuple
+from pathlib import Path
 import math
 import types
 
@@ -103,16 +104,49 @@ class DINOv2(OD3D_Backbone):
         else:
             self.pca_enabled = False
 
-    def set_pca(self, dataset, transform, batch_size, num_workers, pin_memory, device):
+    def set_pca(
+        self,
+        dataset,
+        transform,
+        batch_size,
+        num_workers,
+        pin_memory,
+        device,
+        fpath_stats=None,
+    ):
+        """
+        Fits the pca layer on the masked features of the dataset, streamed batch by batch in constant memory.
+        With pca.convergence_tol, fitting stops once the pca subspace changes less than the tolerance between
+        checks every pca.convergence_check_every batches. With fpath_stats, partial statistics are written at
+        each check and a restarted fit continues with the remaining frames.
+        """
         import copy
         from tqdm import tqdm
         from od3d.datasets.frame import OD3D_FRAME_MODALITIES
-        from od3d.cv.geometry.objects3d.objects3d import PROJECT_MODALITIES
+        from od3d.cv.cluster.pca import IncrementalPCA
 
         self.pca_enabled = False
         self.eval()
         logger.info(f"Dataset contains {len(dataset)} frames.")
 
+        convergence_tol = self.config.pca.get("convergence_tol", None)
+        convergence_check_every = self.config.pca.get("convergence_check_every", 10)
+        C = self.out_dims[-1]
+
+        # fixed order of frames, such that a restarted fit skips the frames already accumulated
+        frames_ids = torch.randperm(
+            len(dataset),
+            generator=torch.Generator().manual_seed(0),
+        )
+        frames_count = 0
+        pca_stats = IncrementalPCA()
+        if fpath_stats is not None and Path(fpath_stats).exists():
+            pca_stats, state_dict = IncrementalPCA.read(fpath=fpath_stats)
+            frames_count = state_dict["frames_count"]
+            logger.info(
+                f"continue pca with {pca_stats.count} features of {frames_count} frames.",
+            )
+
         if OD3D_FRAME_MODALITIES.PCL in dataset.modalities:
             dataset.modalities.remove(OD3D_FRAME_MODALITIES.PCL)
             add_pcl = True
@@ -120,10 +154,13 @@ class DINOv2(OD3D_Backbone):
             add_pcl = False
 
         dataset.transform = copy.deepcopy(transform)
+        dataset_remaining = dataset.get_subset_with_item_ids(
+            item_ids=frames_ids[frames_count:],
+        )
         dataloader_train = torch.utils.data.DataLoader(
-            dataset=dataset,
+            dataset=dataset_remaining,
             batch_size=batch_size,
-            shuffle=True,
+            shuffle=False,
             collate_fn=dataset.collate_fn,
             num_workers=num_workers,
             pin_memory=pin_memory,
@@ -132,12 +169,8 @@ class DINOv2(OD3D_Backbone):
         if add_pcl:
             dataset.modalities.append(OD3D_FRAME_MODALITIES.PCL)
 
-        net_feats_all = []
-        net_feats_all_count = 0
         for i, batch in tqdm(enumerate(iter(dataloader_train))):
             batch.to(device=device)
-            batch.cam_tform4x4_obj = batch.cam_tform4x4_obj.detach()
-            logger.info(batch.category_id)
             with torch.no_grad():
                 # B x F+N x C
                 net_out = self(batch.rgb)
@@ -152,29 +185,32 @@ class DINOv2(OD3D_Backbone):
                     )
                     > 0.5
                 )
-                net_feats_all.append(
+                pca_stats.partial_fit(
                     feats2d_net.permute(0, 2, 3, 1)[feats2d_net_mask[:, 0]],
                 )
+            frames_count += len(batch)
+
+            if (i + 1) % convergence_check_every == 0:
+                if fpath_stats is not None:
+                    pca_stats.save(fpath=fpath_stats, frames_count=frames_count)
+                if convergence_tol is not None:
+                    change = pca_stats.get_components_change(C=C)
+                    logger.info(
+                        f"pca with {pca_stats.count} features, subspace change {change:.2e}",
+                    )
+                    if change < convergence_tol:
+                        logger.info(f"pca converged after {frames_count} frames.")
+                        break
 
-                net_feats_all_count += net_feats_all[-1].shape[0]
-
-                if net_feats_all_count > 500000:
-                    break
-        net_feats_all = torch.cat(net_feats_all, dim=0)
-
-        # feature_vector_mean = net_feats_all.mean(dim=0)
-        # logger.info(f"shape of mean feature vectors:{feature_vector_mean.shape}")
-        # self.mean_features = feature_vector_mean
-
-        # logger.info(
-        #    f"shape of accumulated feature vectors:{net_feats_all.shape}",
-        # )
-        from od3d.cv.cluster.embed import pca
+        if fpath_stats is not None:
+            pca_stats.save(fpath=fpath_stats, frames_count=frames_count)
 
-        pca_V = pca(net_feats_all, C=self.out_dims[-1], return_V=True)
+        pca_V = pca_stats.get_components(C=C).to(
+            dtype=self.pca_layer.weight.dtype,
+            device=self.pca_layer.weight.device,
+        )
         self.pca_layer.weight.copy_(pca_V.T)
         self.pca_enabled = True
-        del net_feats_all
 
     def forward(self, x):
         if x.dim() == 3:
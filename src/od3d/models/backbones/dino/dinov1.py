@@ -302,6 +302,67 @@ class ViTExtractor:
         :param hierarchy: how many bin hierarchies to use.
         """
         B = x.shape[0]
+
+        bin_x = x.permute(0, 2, 3, 1).flatten(start_dim=-2, end_dim=-1)  # Bx(t-1)x(dxh)
+        bin_x = bin_x.permute(0, 2, 1)
+        bin_x = bin_x.reshape(
+            B,
+            bin_x.shape[1],
+            self.num_patches[0],
+            self.num_patches[1],
+        )
+        # Bx(dxh)xnum_patches[0]xnum_patches[1]
+
+        avg_pools = []
+        # compute bins of all sizes for all spatial locations.
+        for k in range(0, hierarchy):
+            # avg pooling with kernel 3**kx3**k
+            win_size = 3**k
+            avg_pool = torch.nn.AvgPool2d(
+                win_size,
+                stride=1,
+                padding=win_size // 2,
+                count_include_pad=False,
+            )
+            avg_pools.append(avg_pool(bin_x))
+
+        # slice the 3x3 shifted bins of each hierarchy from border padded pooled maps,
+        # out of bounds neighbors take the value of the closest patch.
+        bins = []
+        for k in range(0, hierarchy):
+            kernel_size = 3**k
+            avg_pool_padded = torch.nn.functional.pad(
+                avg_pools[k],
+                (kernel_size, kernel_size, kernel_size, kernel_size),
+                mode="replicate",
+            )
+            for i in range(0, 3 * kernel_size, kernel_size):
+                for j in range(0, 3 * kernel_size, kernel_size):
+                    if i == kernel_size and j == kernel_size and k != 0:
+                        continue
+                    bins.append(
+                        avg_pool_padded[
+                            :,
+                            :,
+                            i : i + self.num_patches[0],
+                            j : j + self.num_patches[1],
+                        ],
+                    )
+        bin_x = torch.cat(bins, dim=1)
+        # Bx(dxhxnum_bins)xnum_patches[0]xnum_patches[1]
+        bin_x = (
+            bin_x.flatten(start_dim=-2, end_dim=-1).permute(0, 2, 1).unsqueeze(dim=1)
+        )
+        # Bx1x(t-1)x(dxh)
+        return bin_x
+
+    def _log_bin_naive(self, x: torch.Tensor, hierarchy: int = 2) -> torch.Tensor:
+        """
+        create a log-binned descriptor, reference implementation of _log_bin looping over all patches.
+        :param x: tensor of features. Has shape Bxhxtxd.
+        :param hierarchy: how many bin hierarchies to use.
+        """
+        B = x.shape[0]
         num_bins = 1 + 8 * hierarchy
 
         bin_x = x.permute(0, 2, 3, 1).flatten(start_dim=-2, end_dim=-1)  # Bx(t-1)x(dxh)
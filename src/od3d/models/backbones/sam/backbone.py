@@ -7,6 +7,8 @@ from od3d.cv.transforms.sequential import SequentialTransform
 from od3d.models.backbones.backbone import OD3D_Backbone
 from segment_anything import SamPredictor, sam_model_registry
 from pathlib import Path
+from collections import OrderedDict
+from typing import List
 from od3d.io import download
 from od3d.data.batch_datatypes import OD3D_ModelData
 
@@ -39,10 +41,74 @@ class SAM(OD3D_Backbone):
         sam = sam_model_registry[config.model_type](checkpoint=config.sam_checkpoint)
         sam.to(device=device)
         self.predictor = SamPredictor(sam)
+        self.encoder_batch_size = config.get("encoder_batch_size", 4)
+        self.embeddings_cache_size = config.get("embeddings_cache_size", 16)
+        self.embeddings_cache = OrderedDict()
         self.out_downsample_scales = []
         self.downsample_rate = 1
         self.out_dims = [1]
 
+    def encode(self, x, frames_names: List[str] = None):
+        """
+        Encodes the images with batches of the image encoder on the device. With frames names,
+        the embeddings are cached by frame name and image size, such that several prompts per frame reuse them.
+
+        Args:
+            x (torch.Tensor): Bx3xHxW RGB, uint8 range.
+            frames_names (List[str]): B names which identify the images, e.g. frames names unique.
+        Returns:
+            embeddings (List[dict]): B embeddings with features (1x256x64x64), input size and original size.
+        """
+        if frames_names is None:
+            frames_names = [None] * len(x)
+        original_size = tuple(x.shape[-2:])
+        # the same frame may be encoded at another resolution, e.g. after resizing
+        keys = [
+            (frame_name, original_size) if frame_name is not None else None
+            for frame_name in frames_names
+        ]
+        embeddings = [
+            self.embeddings_cache.get(key, None) if key is not None else None
+            for key in keys
+        ]
+        ids_missing = [b for b, embedding in enumerate(embeddings) if embedding is None]
+        for i in range(0, len(ids_missing), self.encoder_batch_size):
+            ids_chunk = ids_missing[i : i + self.encoder_batch_size]
+            x_chunk = x[ids_chunk].detach()
+            x_chunk = x_chunk.to(device=self.predictor.device, dtype=torch.float32)
+            x_chunk = self.predictor.transform.apply_image_torch(x_chunk)
+            input_size = tuple(x_chunk.shape[-2:])
+            with torch.no_grad():
+                features = self.predictor.model.image_encoder(
+                    self.predictor.model.preprocess(x_chunk),
+                )
+            for j, b in enumerate(ids_chunk):
+                embeddings[b] = {
+                    "features": features[j : j + 1],
+                    "input_size": input_size,
+                    "original_size": original_size,
+                }
+                if keys[b] is not None:
+                    self.embeddings_cache[keys[b]] = embeddings[b]
+
+        for key in keys:
+            if key is not None:
+                self.embeddings_cache.move_to_end(key)
+        # the embeddings of the current images are never evicted
+        while len(self.embeddings_cache) > max(
+            self.embeddings_cache_size,
+            len(frames_names),
+        ):
+            self.embeddings_cache.popitem(last=False)
+        return embeddings
+
+    def set_embedding(self, embedding: dict):
+        self.predictor.reset_image()
+        self.predictor.features = embedding["features"]
+        self.predictor.input_size = embedding["input_size"]
+        self.predictor.original_size = embedding["original_size"]
+        self.predictor.is_image_set = True
+
     def forward(
         self,
         x,
@@ -51,15 +117,14 @@ class SAM(OD3D_Backbone):
         oppress_single_point=False,
         bbox_from_single_point=False,
         bbox_from_points=False,
+        frames_names: List[str] = None,
     ):
         batch_size = x.shape[0]
 
+        embeddings = self.encode(x, frames_names=frames_names)
         masks, scores, logits = [], [], []
         for b in range(batch_size):
-            x_b = x[b]
-            self.predictor.set_image(
-                x_b.permute(1, 2, 0).contiguous().detach().cpu().numpy(),
-            )
+            self.set_embedding(embeddings[b])
 
             import numpy as np
 
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+from od3d.datasets.dataset import OD3D_SequenceDataset
+from od3d.datasets.frame import OD3D_FRAME_MODALITIES
+from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+
+DICT_NESTED_FRAMES = {"car": {"seq1": ["0", "1"]}}
+
+
+class DatasetFake(OD3D_SequenceDataset):
+    frame_index_snapshot_enabled = False
+
+    def get_sequence_by_name_unique(self, name_unique: str):
+        category, sequence_name = name_unique.split("/")
+        return SimpleNamespace(
+            frames_names=DICT_NESTED_FRAMES[category][sequence_name],
+        )
+
+
+def test_frame_index_snapshot_stamp(tmp_path: Path, monkeypatch):
+    dataset = DatasetFake(
+        name="fake",
+        modalities=[OD3D_FRAME_MODALITIES.RGB],
+        path_raw=tmp_path,
+        path_preprocess=tmp_path,
+        categories=["car"],
+        dict_nested_frames=DICT_NESTED_FRAMES,
+    )
+    rfpath_metas = dataset.frame_type.meta_type.get_rfpath_metas()
+    dataset.path_meta.joinpath(rfpath_metas).mkdir(parents=True)
+    monkeypatch.setattr(dataset, "frame_index_snapshot_enabled", True)
+    dataset.write_frame_index_snapshot(list_frames_unique=dataset.list_frames_unique)
+
+    # the meta tree is not walked
+    def scandir_fail(*args, **kwargs):
+        raise AssertionError("meta tree scanned")
+
+    with monkeypatch.context() as m:
+        m.setattr(os, "scandir", scandir_fail)
+        m.setattr(Path, "iterdir", scandir_fail)
+        m.setattr(Path, "rglob", scandir_fail)
+        frame_index_snapshot = dataset.read_frame_index_snapshot()
+    assert frame_index_snapshot["list_frames_unique"] == ["car/seq1/0", "car/seq1/1"]
+
+    # metas saved after the snapshot touch the stamp
+    OD3D_MetaColumnarStore.touch_stamp(
+        path_meta=dataset.path_meta,
+        rfpath_metas=rfpath_metas,
+    )
+    assert dataset.read_frame_index_snapshot() is None
+    dataset.write_frame_index_snapshot(list_frames_unique=dataset.list_frames_unique)
+    assert dataset.read_frame_index_snapshot() is not None
+
+    # metas copied into the meta tree require an explicit rebuild
+    monkeypatch.setattr(dataset, "frame_index_snapshot_rebuild", True)
+    assert dataset.read_frame_index_snapshot() is None
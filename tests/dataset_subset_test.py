@@ -0,0 +1,115 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+from od3d.datasets.dataset import OD3D_SequenceDataset
+from od3d.datasets.frame import OD3D_FRAME_MODALITIES
+
+
+DICT_NESTED_FRAMES = {
+    "car": {"seq1": ["0", "1", "2", "3"], "seq2": ["0", "1"]},
+    "chair": {"seq3": ["0", "1", "2"]},
+}
+
+
+class DatasetFake(OD3D_SequenceDataset):
+    frame_index_snapshot_enabled = False
+
+    def get_sequence_by_name_unique(self, name_unique: str):
+        category, sequence_name = name_unique.split("/")
+        return SimpleNamespace(
+            frames_names=DICT_NESTED_FRAMES[category][sequence_name],
+        )
+
+
+class DatasetFakeOverride(DatasetFake):
+    def get_subset_with_dict_nested_frames(self, dict_nested_frames):
+        return DatasetFakeOverride(
+            name=self.name,
+            modalities=self.modalities,
+            path_raw=self.path_raw,
+            path_preprocess=self.path_preprocess,
+            categories=self.categories,
+            dict_nested_frames=dict_nested_frames,
+        )
+
+
+def get_dataset(tmp_path: Path, cls=DatasetFake):
+    return cls(
+        name="fake",
+        modalities=[OD3D_FRAME_MODALITIES.RGB],
+        path_raw=tmp_path,
+        path_preprocess=tmp_path,
+        categories=["car", "chair"],
+        dict_nested_frames=DICT_NESTED_FRAMES,
+    )
+
+
+def test_dataset_subset_with_item_ids(tmp_path: Path):
+    dataset = get_dataset(tmp_path)
+    assert len(dataset) == 9
+
+    # frames are grouped by sequence as before
+    subset = dataset.get_subset_with_item_ids(torch.LongTensor([6, 1, 0, 4]))
+    assert list(subset.list_frames_unique) == [
+        "chair/seq3/0",
+        "car/seq1/1",
+        "car/seq1/0",
+        "car/seq2/0",
+    ]
+    assert len(subset) == 4
+    assert subset.dict_nested_frames == {
+        "chair": {"seq3": ["0"]},
+        "car": {"seq1": ["1", "0"], "seq2": ["0"]},
+    }
+
+    # subsets of subsets select from the frames of the subset
+    subset_subset = subset.get_subset_with_item_ids([3, 0])
+    assert list(subset_subset.list_frames_unique) == ["car/seq2/0", "chair/seq3/0"]
+    assert list(subset.list_frames_unique)[0] == "chair/seq3/0"
+    assert len(dataset) == 9
+
+
+def test_dataset_split_random_isolated(tmp_path: Path):
+    dataset = get_dataset(tmp_path)
+    modalities = list(dataset.modalities)
+    subsetA, subsetB = dataset.get_split_random(fraction1=0.5)
+    framesA = list(subsetA.list_frames_unique)
+    framesB = list(subsetB.list_frames_unique)
+    assert len(framesA) == 4 and len(framesB) == 5
+    assert sorted(framesA + framesB) == sorted(dataset.list_frames_unique)
+
+    # modifying a subset does not affect the dataset or the other subset
+    subsetA.modalities.append(OD3D_FRAME_MODALITIES.MASK)
+    subsetA.categories.remove("chair")
+    subsetA.dict_nested_frames["car"]["seq1"].append("9")
+    assert dataset.modalities == modalities
+    assert subsetB.modalities == modalities
+    assert dataset.categories == ["car", "chair"]
+    assert subsetB.categories == ["car", "chair"]
+    assert "9" not in dataset.dict_nested_frames["car"]["seq1"]
+    assert len(dataset) == 9 and list(subsetB.list_frames_unique) == framesB
+
+
+def test_dataset_subset_by_sequences(tmp_path: Path):
+    dataset = get_dataset(tmp_path)
+    subset = dataset.get_subset_by_sequences(
+        dict_category_sequences={"chair": ["seq3"], "car": ["seq1"]},
+        frames_count_max_per_sequence=2,
+    )
+    assert list(subset.list_frames_unique) == [
+        "chair/seq3/0",
+        "chair/seq3/2",
+        "car/seq1/0",
+        "car/seq1/3",
+    ]
+    subset.modalities.append(OD3D_FRAME_MODALITIES.MASK)
+    assert OD3D_FRAME_MODALITIES.MASK not in dataset.modalities
+    assert len(dataset) == 9
+
+
+def test_dataset_subset_with_override(tmp_path: Path):
+    dataset = get_dataset(tmp_path, cls=DatasetFakeOverride)
+    subset = dataset.get_subset_with_item_ids([8, 0])
+    assert isinstance(subset, DatasetFakeOverride)
+    assert list(subset.list_frames_unique) == ["chair/seq3/2", "car/seq1/0"]
@@ -0,0 +1,33 @@
+import logging
+import time
+
+import torch
+from od3d.models.backbones.dino.dinov1 import ViTExtractor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# zsp setting: dino_vits8, 224px, stride 4 -> 55x55 patches, 6 heads x 64 dims
+device = "cuda" if torch.cuda.is_available() else "cpu"
+extractor = ViTExtractor.__new__(ViTExtractor)
+extractor.device = device
+extractor.num_patches = (55, 55)
+x = torch.randn(4, 6, 55 * 55, 64, device=device)
+
+for name, log_bin in [
+    ("vectorized", extractor._log_bin),
+    ("naive", extractor._log_bin_naive),
+]:
+    log_bin(x)  # warm up
+    if device == "cuda":
+        torch.cuda.synchronize()
+    runs = 3
+    time_start = time.time()
+    for _ in range(runs):
+        log_bin(x)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    duration = (time.time() - time_start) / runs
+    logger.info(
+        f"{name}: {duration:.4f}s per batch, {x.shape[0] / duration:.1f} imgs/s ({device})",
+    )
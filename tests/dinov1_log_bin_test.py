@@ -0,0 +1,20 @@
+import torch
+from od3d.models.backbones.dino.dinov1 import ViTExtractor
+
+
+def get_extractor(num_patches):
+    # binning only depends on the patch grid, no model needs to be loaded
+    extractor = ViTExtractor.__new__(ViTExtractor)
+    extractor.device = "cpu"
+    extractor.num_patches = num_patches
+    return extractor
+
+
+def test_log_bin():
+    for num_patches, hierarchy in [((5, 7), 2), ((12, 12), 3), ((1, 2), 2)]:
+        extractor = get_extractor(num_patches)
+        x = torch.randn(2, 3, num_patches[0] * num_patches[1], 8)
+        desc = extractor._log_bin(x, hierarchy=hierarchy)
+        desc_naive = extractor._log_bin_naive(x, hierarchy=hierarchy)
+        assert desc.shape == (2, 1, x.shape[2], 3 * 8 * (1 + 8 * hierarchy))
+        assert torch.allclose(desc, desc_naive)
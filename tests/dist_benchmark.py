@@ -0,0 +1,58 @@
+import logging
+import multiprocessing
+import resource
+import time
+
+import torch
+from od3d.cv.geometry.metrics.dist import (
+    batch_chamfer_distance,
+    batch_chamfer_distance_dense,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def run(name, B, N, queue):
+    pts1 = torch.randn(B, N, 3, device=device)
+    pts2 = torch.randn(B, N, 3, device=device)
+    if device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    time_start = time.time()
+    if name == "dense":
+        batch_chamfer_distance_dense(pts1, pts2)
+    elif name == "chunked":
+        batch_chamfer_distance(pts1, pts2, max_memory_mb=256.0)
+    elif name == "kdtree":
+        batch_chamfer_distance(pts1, pts2, use_kdtree=True)
+    if device == "cuda":
+        torch.cuda.synchronize()
+        peak_mb = torch.cuda.max_memory_allocated() / 1024**2
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((time.time() - time_start, peak_mb))
+
+
+if __name__ == "__main__":
+    # each run in a fresh process, such that the peak memory is not shared
+    mp_context = multiprocessing.get_context("spawn")
+    B = 2
+    for N in [1000, 5000, 20000]:
+        for name in ["dense", "chunked", "kdtree"]:
+            if name == "kdtree" and device == "cuda":
+                continue
+            queue = mp_context.Queue()
+            process = mp_context.Process(target=run, args=(name, B, N, queue))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                logger.info(
+                    f"{name} B={B} N={N}: failed (exit code {process.exitcode})"
+                )
+                continue
+            duration, peak_mb = queue.get()
+            logger.info(
+                f"{name} B={B} N={N}: {duration:.3f}s, peak memory {peak_mb:.0f}MB ({device})",
+            )
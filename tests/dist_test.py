@@ -0,0 +1,60 @@
+import torch
+from od3d.cv.geometry.metrics.dist import (
+    batch_chamfer_distance,
+    batch_chamfer_distance_dense,
+    points_faces_dist,
+)
+
+
+def test_batch_chamfer_distance_chunked():
+    torch.manual_seed(0)
+    pts1 = torch.randn(2, 100, 3, requires_grad=True)
+    pts2 = torch.randn(2, 150, 3, requires_grad=True)
+    for kwargs in [{}, {"uniform_weight_pts1": False}]:
+        dist_dense = batch_chamfer_distance_dense(pts1, pts2, **kwargs)
+        grads_dense = torch.autograd.grad(dist_dense.sum(), [pts1, pts2])
+        for max_memory_mb, use_kdtree in [(None, False), (0.01, False), (0.01, True)]:
+            dist = batch_chamfer_distance(
+                pts1,
+                pts2,
+                max_memory_mb=max_memory_mb,
+                use_kdtree=use_kdtree,
+                **kwargs,
+            )
+            grads = torch.autograd.grad(dist.sum(), [pts1, pts2])
+            assert torch.allclose(dist, dist_dense, atol=1e-5)
+            assert all(
+                torch.allclose(grad, grad_dense, atol=1e-5)
+                for grad, grad_dense in zip(grads, grads_dense)
+            )
+
+
+def test_batch_chamfer_distance_masked():
+    torch.manual_seed(0)
+    pts1 = torch.randn(2, 100, 3)
+    pts2 = torch.randn(2, 150, 3)
+    pts1_mask = torch.rand(2, 100) > 0.3
+    pts2_mask = torch.rand(2, 150) > 0.3
+    dist = batch_chamfer_distance(
+        pts1,
+        pts2,
+        pts1_mask,
+        pts2_mask,
+        max_memory_mb=0.01,
+    )
+    for b in range(2):
+        dist_b = batch_chamfer_distance_dense(
+            pts1[b : b + 1, pts1_mask[b]],
+            pts2[b : b + 1, pts2_mask[b]],
+        )
+        assert torch.allclose(dist[b], dist_b[0], atol=1e-5)
+
+
+def test_points_faces_dist_chunked():
+    torch.manual_seed(0)
+    verts = torch.randn(30, 3)
+    faces = torch.randint(0, 30, (40, 3))
+    pts3d = torch.randn(200, 3)
+    dist = points_faces_dist(pts3d, verts, faces, max_memory_mb=None)
+    dist_chunked = points_faces_dist(pts3d, verts, faces, max_memory_mb=0.05)
+    assert torch.allclose(dist, dist_chunked)
@@ -0,0 +1,34 @@
+import torch
+from od3d.cv.geometry.downsample import voxel_downsampling, voxel_downsampling_cdist
+
+
+def test_voxel_downsampling_voxel_grid():
+    torch.manual_seed(0)
+    pts3d = torch.rand(3000, 3) * torch.Tensor([1.0, 2.0, 0.5])
+    occ_grid, occ_grid_range, occ_grid_offset = voxel_downsampling(
+        pts3d,
+        K=200,
+        return_voxel_grid=True,
+        min_steps=2,
+    )
+    occ_grid_ref, occ_grid_range_ref, occ_grid_offset_ref = voxel_downsampling_cdist(
+        pts3d,
+        K=200,
+        return_voxel_grid=True,
+        min_steps=2,
+    )
+    assert torch.equal(occ_grid, occ_grid_ref)
+    assert torch.equal(occ_grid_range, occ_grid_range_ref)
+    assert torch.equal(occ_grid_offset, occ_grid_offset_ref)
+
+
+def test_voxel_downsampling_mask():
+    torch.manual_seed(0)
+    pts3d = torch.rand(3000, 3)
+    pts3d_down, pts3d_mask = voxel_downsampling(pts3d, K=100, return_mask=True)
+    _, pts3d_mask_ref = voxel_downsampling_cdist(pts3d, K=100, return_mask=True)
+    assert torch.equal(pts3d_mask, pts3d_mask_ref)
+    assert torch.equal(pts3d_down, pts3d[pts3d_mask])
+
+    pts3d_top = voxel_downsampling(pts3d, K=100, top_bins_perc=0.5)
+    assert len(pts3d_top) == int(len(pts3d_down) * 0.5)
@@ -0,0 +1,49 @@
+import logging
+import time
+
+import torch
+from od3d.cv.geometry.fit3d2d import fit_se3_to_corresp_3d_2d_opencv
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_pnp_problems(K: int, N: int):
+    proj_mat = torch.Tensor([[500.0, 0.0, 320.0], [0.0, 500.0, 240.0]])
+    pts1 = torch.rand(K, N, 3) - 0.5
+    transl = torch.Tensor([0.0, 0.0, 4.0])
+    pts_cam = pts1 + transl
+    pxl2 = torch.einsum("ij,knj->kni", proj_mat, pts_cam / pts_cam[..., 2:])
+    pxl2 += torch.randn_like(pxl2)
+    weights = (torch.rand(K, N) > 0.1).float()
+    return pts1, pxl2, weights, proj_mat
+
+
+for method in ["cpu-epnp", "cpu-iterative"]:
+    for K in [16, 64, 256]:
+        for N in [50, 500, 5000]:
+            pts1, pxl2, weights, proj_mat = get_pnp_problems(K=K, N=N)
+            for name, workers in [("serial", 0), ("pool", None)]:
+                fit_se3_to_corresp_3d_2d_opencv(
+                    pts1,
+                    pxl2,
+                    weights,
+                    proj_mat,
+                    method=method,
+                    workers=workers,
+                )  # warm up
+                runs = 3
+                time_start = time.time()
+                for _ in range(runs):
+                    fit_se3_to_corresp_3d_2d_opencv(
+                        pts1,
+                        pxl2,
+                        weights,
+                        proj_mat,
+                        method=method,
+                        workers=workers,
+                    )
+                duration = (time.time() - time_start) / runs
+                logger.info(
+                    f"{method} K={K} N={N} {name}: {duration:.4f}s, {K / duration:.1f} hypotheses/s",
+                )
@@ -0,0 +1,49 @@
+import torch
+from od3d.cv.geometry.fit3d2d import fit_se3_to_corresp_3d_2d_opencv, get_pnp_pool
+
+
+def test_fit_se3_to_corresp_3d_2d_opencv_pool():
+    K, N = 8, 100
+    proj_mat = torch.Tensor([[500.0, 0.0, 320.0], [0.0, 500.0, 240.0]])
+    pts1 = torch.rand(K, N, 3) - 0.5
+    transl = torch.Tensor([0.1, -0.2, 4.0])
+    pts_cam = pts1 + transl
+    pxl2 = torch.einsum("ij,knj->kni", proj_mat, pts_cam / pts_cam[..., 2:])
+    weights = torch.ones(K, N)
+    # too few correspondences result in identity
+    weights[-1, 3:] = 0.0
+
+    for method in ["cpu-epnp", "cpu-iterative"]:
+        se3_serial = fit_se3_to_corresp_3d_2d_opencv(
+            pts1,
+            pxl2,
+            weights,
+            proj_mat,
+            method=method,
+            workers=0,
+        )
+        se3_pool = fit_se3_to_corresp_3d_2d_opencv(
+            pts1,
+            pxl2,
+            weights,
+            proj_mat,
+            method=method,
+            workers=4,
+        )
+        assert se3_pool.shape == (K, 4, 4)
+        assert torch.allclose(se3_serial, se3_pool)
+        assert torch.allclose(se3_pool[-1], torch.eye(4))
+        assert torch.allclose(se3_pool[:-1, :3, 3], transl.expand(K - 1, 3), atol=1e-3)
+        assert torch.allclose(
+            se3_pool[:-1, :3, :3],
+            torch.eye(3).expand(K - 1, 3, 3),
+            atol=1e-3,
+        )
+
+
+def test_get_pnp_pool_reused_per_workers():
+    pool = get_pnp_pool(workers=2)
+    assert get_pnp_pool(workers=2) is pool
+    pool_resized = get_pnp_pool(workers=3)
+    assert pool_resized is not pool
+    assert get_pnp_pool(workers=3) is pool_resized
@@ -0,0 +1,31 @@
+import numpy as np
+import torch
+from od3d.datasets.frames_index import OD3D_FramesIndex, OD3D_FramesView
+
+
+def test_frames_view_shares_index():
+    names_unique = [f"cat{i % 2}/seq{i // 4}/{i:03}" for i in range(10)]
+    frames_index = OD3D_FramesIndex(names_unique=names_unique)
+
+    view = OD3D_FramesView.create_from_frames(frames=frames_index, ids=[7, 2, 5])
+    assert list(view) == [names_unique[7], names_unique[2], names_unique[5]]
+    assert view[1] == names_unique[2]
+    assert len(view) == 3
+
+    # views of views select from the same index
+    view_view = OD3D_FramesView.create_from_frames(
+        frames=view,
+        ids=torch.LongTensor([2, 0]).numpy(),
+    )
+    assert view_view.frames_index is frames_index
+    assert view_view == [names_unique[5], names_unique[7]]
+    assert view[1:] == [names_unique[2], names_unique[5]]
+
+
+def test_frames_index_ids_with_names_unique():
+    names_unique = [f"cat/seq/{i:03}" for i in range(5)]
+    frames_index = OD3D_FramesIndex(names_unique=names_unique)
+    ids = frames_index.get_ids_with_names_unique(["cat/seq/003", "cat/seq/000"])
+    assert ids.dtype == np.int64
+    assert ids.tolist() == [3, 0]
+    assert frames_index.get_ids_with_names_unique(["cat/seq/999"]) is None
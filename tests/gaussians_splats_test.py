@@ -0,0 +1,48 @@
+import torch
+from od3d.cv.render.gaussians_splats_v2 import rasterize_gaussians
+from od3d.cv.render.gaussians_splats_v2 import rasterize_gaussians_dense
+
+
+def get_gaussians(B=2, N=40, img_size=32):
+    torch.manual_seed(0)
+    pts3d = torch.randn(B, N, 3) * 0.3
+    pts3d[..., 2] += 2.0
+    cams_tform4x4_obj = torch.eye(4)[None].repeat(B, 1, 1)
+    cams_intr4x4 = torch.eye(4)[None].repeat(B, 1, 1)
+    cams_intr4x4[:, 0, 0] = img_size
+    cams_intr4x4[:, 1, 1] = img_size
+    cams_intr4x4[:, :2, 2] = img_size / 2
+    return {
+        "cams_tform4x4_obj": cams_tform4x4_obj,
+        "cams_intr4x4": cams_intr4x4,
+        "imgs_size": torch.LongTensor([img_size, img_size]),
+        "pts3d": pts3d,
+        "pts3d_mask": torch.ones(B, N, dtype=torch.bool),
+        "pts3d_size": torch.rand(B, N, 3) * 0.05 + 0.02,
+        "pts3d_opacity": torch.rand(B, N) * 0.5 + 0.4,
+        "topK": 3,
+    }
+
+
+def test_rasterize_gaussians_equals_dense():
+    gaussians = get_gaussians()
+    ids_dense, opacity_dense, depth_dense, _ = rasterize_gaussians_dense(**gaussians)
+    # without cutoff, all gaussians are composited as in the dense rasterizer
+    for tile_size, max_candidates in [(16, 2**24), (8, 4000)]:
+        ids, opacity, depth, _ = rasterize_gaussians(
+            **gaussians,
+            sigma_cutoff=1000.0,
+            tile_size=tile_size,
+            max_candidates=max_candidates,
+        )
+        assert torch.allclose(opacity, opacity_dense, atol=1e-6)
+        assert (ids == ids_dense)[opacity_dense > 1e-4].all()
+        assert torch.allclose(depth, depth_dense)
+
+
+def test_rasterize_gaussians_cutoff():
+    gaussians = get_gaussians()
+    _, opacity_dense, _, _ = rasterize_gaussians_dense(**gaussians)
+    _, opacity, _, _ = rasterize_gaussians(**gaussians, sigma_cutoff=3.0)
+    # beyond 3 sigma, the opacity of a gaussian is below exp(-4.5)
+    assert (opacity - opacity_dense).abs().max() < 2e-2
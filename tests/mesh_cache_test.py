@@ -0,0 +1,32 @@
+import torch
+import trimesh
+from od3d.cv.geometry.objects3d.meshes import Meshes
+from od3d.cv.geometry.objects3d.meshes.cache import OD3D_MeshCache
+
+
+def test_mesh_cache(tmp_path):
+    fpaths = []
+    for i in range(2):
+        mesh_trimesh = trimesh.creation.icosphere(subdivisions=2 + i)
+        mesh_trimesh.visual.vertex_colors = (mesh_trimesh.vertices * 127 + 128).astype(
+            "uint8",
+        )
+        fpaths.append(tmp_path.joinpath(f"mesh{i}.ply"))
+        mesh_trimesh.export(fpaths[-1])
+
+    # below the size of a single mesh, only the last mesh is kept open
+    mesh_cache = OD3D_MeshCache(
+        path_cache=tmp_path.joinpath("cache"), max_memory_mb=1e-3
+    )
+    for fpath in fpaths + fpaths:
+        mesh = Meshes.read_from_ply_file(fpath, use_cache=False)
+        mesh_cached = mesh_cache.read_mesh(fpath, scale=2.0)
+        assert torch.equal(mesh.faces, mesh_cached.faces)
+        assert torch.equal(mesh.rgb, mesh_cached.rgb)
+        assert torch.allclose(mesh.verts * 2.0, mesh_cached.verts)
+
+    stats = mesh_cache.get_stats()
+    assert stats["conversions"] == 2
+    assert stats["misses"] == 4
+    assert stats["evictions"] == 3
+    assert stats["size"] == 1
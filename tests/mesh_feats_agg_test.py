@@ -0,0 +1,92 @@
+import torch
+from od3d.datasets.mesh_feats_agg import OD3D_MeshFeatsAggregator
+
+
+def get_samples(verts_count=5, feats_dim=4, batches_count=3, batch_size=20):
+    torch.manual_seed(0)
+    samples = []
+    for _ in range(batches_count):
+        verts_ids = torch.randint(0, verts_count - 1, (batch_size,))
+        samples.append(
+            (verts_ids, torch.randn(batch_size, feats_dim), torch.randn(batch_size, 3)),
+        )
+    return samples
+
+
+def test_mesh_feats_agg_matches_per_vertex_lists():
+    verts_count, feats_dim = 5, 4
+    samples = get_samples(verts_count=verts_count, feats_dim=feats_dim)
+
+    # reference: per vertex lists, latest sample first
+    feats_lists = [torch.zeros((0, feats_dim))] * verts_count
+    viewpoints_lists = [torch.zeros((0, 3))] * verts_count
+    for verts_ids, feats, viewpoints in samples:
+        for b, vertex_id in enumerate(verts_ids):
+            feats_lists[vertex_id] = torch.cat(
+                [feats[b : b + 1], feats_lists[vertex_id]]
+            )
+            viewpoints_lists[vertex_id] = torch.cat(
+                [viewpoints[b : b + 1], viewpoints_lists[vertex_id]],
+            )
+
+    aggs = {}
+    for reduce_type in ["acc", "avg", "avg_norm", "min50"]:
+        aggs[reduce_type] = OD3D_MeshFeatsAggregator(
+            verts_count=verts_count,
+            feats_dim=feats_dim,
+            reduce_type=reduce_type,
+            reservoir_size=64,
+        )
+        for verts_ids, feats, viewpoints in samples:
+            aggs[reduce_type].add(verts_ids, feats, viewpoints)
+
+    feats_acc, viewpoints_acc = aggs["acc"].reduce()
+    for v in range(verts_count):
+        assert torch.equal(feats_acc[v], feats_lists[v])
+        assert torch.equal(viewpoints_acc[v], viewpoints_lists[v])
+
+    feats_avg, viewpoints_avg = aggs["avg"].reduce()
+    for v in range(verts_count - 1):
+        assert torch.allclose(feats_avg[v], feats_lists[v].mean(dim=0), atol=1e-6)
+        assert torch.allclose(
+            viewpoints_avg[v], viewpoints_lists[v].mean(dim=0), atol=1e-6
+        )
+    # the last vertex has no samples
+    assert feats_avg[-1].isnan().all()
+    feats_avg_norm, _ = aggs["avg_norm"].reduce()
+    assert torch.allclose(feats_avg_norm[0].norm(), torch.ones(1))
+
+    # min50 is exact, as the reservoir holds all samples
+    feats_padded = torch.nn.utils.rnn.pad_sequence(
+        feats_lists,
+        padding_value=torch.nan,
+        batch_first=True,
+    )
+    dists_median = torch.nanquantile(
+        torch.cdist(feats_padded, feats_padded), q=0.5, dim=-1
+    )
+    ids = dists_median.nan_to_num(torch.inf).argmin(dim=-1)
+    feats_min50, _ = aggs["min50"].reduce()
+    for v in range(verts_count - 1):
+        assert torch.equal(feats_min50[v], feats_padded[v, ids[v]])
+
+
+def test_mesh_feats_agg_reservoir_bounded():
+    samples = get_samples(verts_count=3, batches_count=10, batch_size=50)
+    agg = OD3D_MeshFeatsAggregator(
+        verts_count=3,
+        feats_dim=4,
+        reduce_type="min50",
+        reservoir_size=8,
+    )
+    feats_all = []
+    for verts_ids, feats, viewpoints in samples:
+        agg.add(verts_ids, feats, viewpoints)
+        feats_all.append(feats)
+    feats_all = torch.cat(feats_all)
+    assert agg.counts[:2].sum() == len(feats_all)
+    assert agg.feats_reservoir.shape == (3, 8, 4)
+    # the reservoirs are full with distinct samples of the stream
+    assert not agg.feats_reservoir[:2].isnan().any()
+    for feat in agg.feats_reservoir[:2].reshape(-1, 4):
+        assert (feats_all == feat).all(dim=-1).any()
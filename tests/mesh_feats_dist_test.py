@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+import torch
+from od3d.datasets.mesh_feats_dist import get_mesh_feats_dist, OD3D_MeshFeatsDistStore
+
+
+def get_feats(names_unique, F=4):
+    # per vertex features of varying viewpoints count, one vertex without features
+    torch.manual_seed(0)
+    feats = {}
+    for s, name_unique in enumerate(names_unique):
+        feats[name_unique] = [
+            torch.randn(size=(1 + (s + v) % 3, F)) for v in range(3 + s)
+        ]
+        feats[name_unique][-1][:] = torch.nan
+    return feats
+
+
+def assert_store_matches_pairs(store, feats, mesh_feats_dist_reduce_type):
+    for name_unique1 in feats.keys():
+        for name_unique2 in feats.keys():
+            dist = get_mesh_feats_dist(
+                feats[name_unique1],
+                feats[name_unique2],
+                mesh_feats_dist_reduce_type=mesh_feats_dist_reduce_type,
+            )
+            dist_store = store.get(name_unique1, name_unique2)
+            assert dist_store.shape == dist.shape
+            # cdist of batched vertices may use the matmul path, imprecise for distances close to zero
+            assert torch.allclose(dist_store, dist, atol=1e-3)
+
+
+@pytest.mark.parametrize("mesh_feats_dist_reduce_type", ["min_avg", "avg", "min"])
+def test_mesh_feats_dist_store_matches_pairs(
+    tmp_path: Path,
+    mesh_feats_dist_reduce_type,
+):
+    names_unique = [f"car/{s}" for s in range(4)]
+    feats = get_feats(names_unique)
+    reads = []
+
+    def read_mesh_feats(name_unique):
+        reads.append(name_unique)
+        return feats[name_unique]
+
+    # few vertices per device call, and few elements per partial distance
+    store = OD3D_MeshFeatsDistStore.preprocess(
+        fpath=tmp_path.joinpath("car.dist"),
+        names_unique=names_unique,
+        read_mesh_feats=read_mesh_feats,
+        mesh_feats_dist_reduce_type=mesh_feats_dist_reduce_type,
+        pairs_batch_verts=5,
+        max_elements=50,
+    )
+    assert sorted(reads) == names_unique
+    assert len(store) == 4
+    # (i, j) with j > i are transposed lookups of (j, i)
+    assert_store_matches_pairs(store, feats, mesh_feats_dist_reduce_type)
+    assert torch.equal(
+        store.get("car/0", "car/3"),
+        store.get("car/3", "car/0").T,
+    )
+
+    store_opened = OD3D_MeshFeatsDistStore.open(tmp_path.joinpath("car.dist"))
+    assert_store_matches_pairs(store_opened, feats, mesh_feats_dist_reduce_type)
+
+
+def test_mesh_feats_dist_store_resume(tmp_path: Path):
+    names_unique = [f"car/{s}" for s in range(4)]
+    feats = get_feats(names_unique)
+    fpath = tmp_path.joinpath("car.dist")
+
+    OD3D_MeshFeatsDistStore.preprocess(
+        fpath=fpath,
+        names_unique=names_unique[:2],
+        read_mesh_feats=lambda name_unique: feats[name_unique],
+        mesh_feats_dist_reduce_type="min_avg",
+    )
+    # partial row of an interrupted run, not recorded in the index
+    with open(fpath.with_suffix(".bin"), "ab") as f:
+        f.write(b"\x00" * 12)
+
+    store = OD3D_MeshFeatsDistStore.preprocess(
+        fpath=fpath,
+        names_unique=names_unique,
+        read_mesh_feats=lambda name_unique: feats[name_unique],
+        mesh_feats_dist_reduce_type="min_avg",
+    )
+    assert store.names_unique == names_unique
+    assert_store_matches_pairs(store, feats, "min_avg")
+
+    # finished stores are not computed again
+    rows = []
+    store = OD3D_MeshFeatsDistStore.preprocess(
+        fpath=fpath,
+        names_unique=names_unique,
+        read_mesh_feats=lambda name_unique: rows.append(name_unique),
+        mesh_feats_dist_reduce_type="min_avg",
+    )
+    assert rows == []
+    assert len(store) == 4
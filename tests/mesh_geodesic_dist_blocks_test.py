@@ -0,0 +1,30 @@
+import torch
+from od3d.cv.geometry.objects3d.meshes.geodesic import OD3D_GeodesicDistBlocks
+
+
+def test_geodesic_dist_blocks():
+    dists = [
+        torch.Tensor([[0.0, 0.5, 1.0], [0.5, 0.0, 0.5], [1.0, 0.5, 0.0]]),
+        torch.Tensor([[0.0, 1.0], [1.0, 0.0]]),
+    ]
+    # fully populated blocks
+    blocks = OD3D_GeodesicDistBlocks(
+        crows=[torch.arange(0, dist.numel() + 1, dist.shape[0]) for dist in dists],
+        cols=[torch.arange(dist.shape[0]).repeat(dist.shape[0]) for dist in dists],
+        vals=[dist.flatten() for dist in dists],
+    )
+
+    dist_dense = torch.full((5, 5), torch.inf)
+    dist_dense[:3, :3] = dists[0]
+    dist_dense[3:, 3:] = dists[1]
+    assert torch.equal(blocks.to_dense(), dist_dense)
+
+    sigma = 0.5
+    prob_dense = torch.exp(-0.5 * (dist_dense / sigma) ** 2)
+    prob_dense = prob_dense / prob_dense.sum(dim=-1, keepdim=True)
+    assert torch.allclose(blocks.to_dense(sigma=sigma), prob_dense)
+    assert torch.allclose(blocks.get_block(1, sigma=sigma), prob_dense[3:, 3:])
+    assert torch.allclose(
+        blocks.get_rows(torch.LongTensor([4, 0]), sigma=sigma),
+        prob_dense[[4, 0]],
+    )
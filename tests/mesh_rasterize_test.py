@@ -0,0 +1,78 @@
+import torch
+from od3d.cv.render.rasterize import interpolate_face_attributes
+from od3d.cv.render.rasterize import rasterize_meshes
+
+
+def get_square(z=2.0, shift_x=0.0):
+    verts = torch.Tensor(
+        [[-1.0, -1.0, z], [1.0, -1.0, z], [1.0, 1.0, z], [-1.0, 1.0, z]],
+    )
+    verts[:, 0] += shift_x
+    faces = torch.LongTensor([[0, 2, 1], [0, 3, 2]])
+    return verts, faces
+
+
+def get_cam_intr4x4():
+    cam_intr4x4 = torch.eye(4)
+    cam_intr4x4[0, 0] = 20.0
+    cam_intr4x4[1, 1] = 20.0
+    cam_intr4x4[0, 2] = 32.0
+    cam_intr4x4[1, 2] = 24.0
+    return cam_intr4x4
+
+
+def test_rasterize_meshes_hard():
+    verts, faces = get_square()
+    fragments = rasterize_meshes(
+        verts_cam=verts,
+        faces=faces,
+        faces_scene_ids=torch.zeros(len(faces), dtype=torch.long),
+        cams_intr4x4=get_cam_intr4x4()[None],
+        imgs_size=(48, 64),
+        cull_backfaces=True,
+        tile_size=8,
+        max_candidates=256,
+    )
+    mask = fragments.pix_to_face[0, :, :, 0] >= 0
+    ys, xs = mask.nonzero(as_tuple=True)
+    # square projects to pixels [22, 42) x [14, 34)
+    assert mask.sum() == 400
+    assert xs.min() == 22 and xs.max() == 41 and ys.min() == 14 and ys.max() == 33
+    assert torch.allclose(fragments.zbuf[0][mask], torch.Tensor([2.0]))
+
+    pts3d = interpolate_face_attributes(
+        fragments.pix_to_face,
+        fragments.bary_coords,
+        verts[faces],
+    )[0, :, :, 0]
+    assert torch.allclose(pts3d[24, 32], torch.Tensor([0.05, 0.05, 2.0]), atol=1e-5)
+
+    # flipped winding is culled
+    fragments = rasterize_meshes(
+        verts_cam=verts,
+        faces=faces.flip(dims=(-1,)),
+        faces_scene_ids=torch.zeros(len(faces), dtype=torch.long),
+        cams_intr4x4=get_cam_intr4x4()[None],
+        imgs_size=(48, 64),
+        cull_backfaces=True,
+    )
+    assert (fragments.pix_to_face >= 0).sum() == 0
+
+
+def test_rasterize_meshes_zbuf():
+    verts1, faces1 = get_square(z=2.0)
+    verts2, faces2 = get_square(z=3.0, shift_x=0.5)
+    verts = torch.cat([verts2, verts1], dim=0)
+    faces = torch.cat([faces2, faces1 + 4], dim=0)
+    fragments = rasterize_meshes(
+        verts_cam=verts,
+        faces=faces,
+        faces_scene_ids=torch.zeros(len(faces), dtype=torch.long),
+        cams_intr4x4=get_cam_intr4x4()[None],
+        imgs_size=(48, 64),
+        faces_per_pixel=2,
+    )
+    assert torch.allclose(fragments.zbuf[0, 24, 34], torch.Tensor([2.0, 3.0]))
+    assert fragments.pix_to_face[0, 24, 34, 0] >= 2
+    assert fragments.pix_to_face[0, 24, 34, 1] < 2
+    assert (fragments.dists[0, 24, 34] < 0).all()
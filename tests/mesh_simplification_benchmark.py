@@ -0,0 +1,42 @@
+import logging
+import time
+
+import numpy as np
+import open3d
+from od3d.cv.geometry.mesh_simplification import AstakaPeMesh
+from od3d.cv.geometry.mesh_simplification import simplify_mesh_arrays
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# compares the heap based simplification with the previous AstakaPeMesh implementation
+mesh_vertices_count = 500
+for resolution in [20, 40, 80]:
+    mesh = open3d.geometry.TriangleMesh.create_sphere(radius=1.0, resolution=resolution)
+    verts = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.triangles)
+    for isotropic in [True, False]:
+        time_start = time.time()
+        verts_simplified, _ = simplify_mesh_arrays(
+            verts=verts,
+            faces=faces,
+            target_v=mesh_vertices_count,
+            isotropic=isotropic,
+        )
+        duration = time.time() - time_start
+
+        time_start = time.time()
+        mesh_astakape = AstakaPeMesh(vs=verts.copy(), faces=faces.copy())
+        if isotropic:
+            mesh_astakape = mesh_astakape.edge_based_simplification(
+                target_v=mesh_vertices_count,
+            )
+        else:
+            mesh_astakape = mesh_astakape.simplification(target_v=mesh_vertices_count)
+        duration_astakape = time.time() - time_start
+
+        logger.info(
+            f"verts {len(verts)} -> {len(verts_simplified)}, isotropic {isotropic}: "
+            f"heap {duration:.2f}s, astakape {duration_astakape:.2f}s "
+            f"(x{duration_astakape / duration:.1f})",
+        )
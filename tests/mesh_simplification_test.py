@@ -0,0 +1,19 @@
+import numpy as np
+import open3d
+from od3d.cv.geometry.mesh_simplification import simplify_mesh
+
+
+def test_simplify_mesh():
+    mesh = open3d.geometry.TriangleMesh.create_sphere(radius=1.0, resolution=30)
+    for isotropic in [True, False]:
+        mesh_simplified = simplify_mesh(
+            mesh,
+            mesh_vertices_count=200,
+            isotropic=isotropic,
+            valence_aware=True,
+        )
+        faces = np.asarray(mesh_simplified.triangles)
+        assert len(mesh_simplified.vertices) == 200
+        assert len(faces) == 2 * 200 - 4
+        assert (faces[:, 0] != faces[:, 1]).all() and (faces[:, 1] != faces[:, 2]).all()
+        assert mesh_simplified.is_watertight()
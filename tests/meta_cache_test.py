@@ -0,0 +1,85 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from od3d.datasets.frame_meta import OD3D_FrameMeta
+from od3d.datasets.meta import OD3D_Meta
+from od3d.datasets.meta_cache import OD3D_MetaCache
+
+
+@dataclass
+class FrameMetaFake(OD3D_FrameMeta):
+    l_size: List[float]
+
+
+def save_metas(path_meta: Path, count: int):
+    OD3D_Meta.set_meta_backend(path_meta=path_meta, meta_backend="yaml")
+    names_unique = [f"car/1_2_3/{frame_name}" for frame_name in range(count)]
+    for name_unique in names_unique:
+        FrameMetaFake(name=name_unique, l_size=[480.0, 640.0]).save(
+            path_meta=path_meta,
+        )
+    return names_unique
+
+
+def test_meta_cache_hit_miss(tmp_path: Path):
+    names_unique = save_metas(tmp_path, count=2)
+    cache = OD3D_MetaCache(maxsize=4)
+
+    meta = cache.get(FrameMetaFake, path_meta=tmp_path, name_unique=names_unique[0])
+    assert list(meta.l_size) == [480.0, 640.0]
+    assert cache.get(FrameMetaFake, tmp_path, names_unique[0]) is meta
+    assert cache.get(FrameMetaFake, tmp_path, names_unique[1]) is not meta
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+    assert cache.get_stats()["size"] == 2
+
+    # disabled cache loads every time
+    cache_disabled = OD3D_MetaCache(maxsize=0)
+    meta1 = cache_disabled.get(FrameMetaFake, tmp_path, names_unique[0])
+    meta2 = cache_disabled.get(FrameMetaFake, tmp_path, names_unique[0])
+    assert meta1 is not meta2
+    assert cache_disabled.get_stats()["misses"] == 2
+    assert cache_disabled.get_stats()["size"] == 0
+
+
+def test_meta_cache_lru_eviction(tmp_path: Path):
+    names_unique = save_metas(tmp_path, count=3)
+    cache = OD3D_MetaCache(maxsize=2)
+
+    meta0 = cache.get(FrameMetaFake, tmp_path, names_unique[0])
+    cache.get(FrameMetaFake, tmp_path, names_unique[1])
+    # least recently used is names_unique[1], evicted at capacity
+    assert cache.get(FrameMetaFake, tmp_path, names_unique[0]) is meta0
+    cache.get(FrameMetaFake, tmp_path, names_unique[2])
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["size"] == 2
+    assert [key[2] for key in cache.entries] == [names_unique[0], names_unique[2]]
+
+    assert cache.get(FrameMetaFake, tmp_path, names_unique[0]) is meta0
+    cache.get(FrameMetaFake, tmp_path, names_unique[1])
+    assert cache.get_stats()["misses"] == 4
+
+
+def test_meta_cache_invalidated_by_mtime(tmp_path: Path):
+    names_unique = save_metas(tmp_path, count=1)
+    cache = OD3D_MetaCache(maxsize=2)
+
+    meta = cache.get(FrameMetaFake, tmp_path, names_unique[0])
+    FrameMetaFake(name=names_unique[0], l_size=[240.0, 320.0]).save(
+        path_meta=tmp_path,
+    )
+    fpath_meta = FrameMetaFake.get_fpath_meta_source(
+        path_meta=tmp_path,
+        name_unique=names_unique[0],
+    )
+    mtime = fpath_meta.stat().st_mtime
+    os.utime(fpath_meta, (mtime + 1, mtime + 1))
+
+    meta_reloaded = cache.get(FrameMetaFake, tmp_path, names_unique[0])
+    assert meta_reloaded is not meta
+    assert list(meta_reloaded.l_size) == [240.0, 320.0]
+    assert cache.get(FrameMetaFake, tmp_path, names_unique[0]) is meta_reloaded
+    assert cache.get_stats()["misses"] == 2
+    assert cache.get_stats()["size"] == 1
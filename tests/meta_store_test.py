@@ -0,0 +1,135 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from od3d.datasets.co3d.enum import CO3D_FRAME_TYPES
+from od3d.datasets.co3d.frame import CO3D_FrameMeta
+from od3d.datasets.frame_meta import OD3D_FrameMeta
+from od3d.datasets.meta import OD3D_Meta
+from od3d.datasets.meta import OD3D_META_BACKENDS
+from od3d.datasets.meta_store import OD3D_MetaColumnarStore
+
+
+def test_meta_store_migrate(tmp_path: Path):
+    for sequence_name in ["1_2_3", "1_2_4"]:
+        for frame_name in range(3):
+            CO3D_FrameMeta(
+                name=f"{frame_name}",
+                category="car",
+                sequence_name=sequence_name,
+                l_size=[480.0, 640.0],
+                rfpath_rgb=Path(f"car/{sequence_name}/images/{frame_name}.jpg"),
+                rfpath_mask=Path(f"car/{sequence_name}/masks/{frame_name}.png"),
+                rfpath_depth=Path(f"car/{sequence_name}/depths/{frame_name}.png"),
+                rfpath_depth_mask=Path(f"car/{sequence_name}/dmasks/{frame_name}.png"),
+                l_cam_intr4x4=[[float(i == j) for j in range(4)] for i in range(4)],
+                l_cam_tform4x4_obj=[
+                    [float(i == j) for j in range(4)] for i in range(4)
+                ],
+                depth_scale=1.0,
+                co3d_frame_type=CO3D_FRAME_TYPES.TEST_KNOWN,
+            ).save(path_meta=tmp_path)
+
+    OD3D_Meta.set_meta_backend(path_meta=tmp_path, meta_backend="yaml")
+    dict_nested_yaml = CO3D_FrameMeta.complete_nested_metas(
+        path_meta=tmp_path,
+        dict_nested_metas=None,
+    )
+    meta_yaml = CO3D_FrameMeta.load_from_meta_with_name_unique(
+        path_meta=tmp_path,
+        name_unique="car/1_2_4/2",
+    )
+
+    OD3D_MetaColumnarStore.migrate_from_yaml(
+        path_meta=tmp_path,
+        rfpath_metas=CO3D_FrameMeta.get_rfpath_metas(),
+    )
+    OD3D_Meta.set_meta_backend(
+        path_meta=tmp_path,
+        meta_backend=OD3D_META_BACKENDS.COLUMNAR,
+    )
+    dict_nested_columnar = CO3D_FrameMeta.complete_nested_metas(
+        path_meta=tmp_path,
+        dict_nested_metas=None,
+    )
+    meta_columnar = CO3D_FrameMeta.load_from_meta_with_name_unique(
+        path_meta=tmp_path,
+        name_unique="car/1_2_4/2",
+    )
+    OD3D_Meta.set_meta_backend(path_meta=tmp_path, meta_backend=None)
+
+    assert dict_nested_yaml == dict_nested_columnar
+    assert meta_yaml == meta_columnar
+    assert (meta_yaml.cam_intr4x4 == meta_columnar.cam_intr4x4).all()
+
+
+@dataclass
+class FrameMetaFake(OD3D_FrameMeta):
+    l_size: List[float]
+
+
+def test_meta_store_outdated_by_yaml(tmp_path: Path, monkeypatch):
+    rfpath_metas = FrameMetaFake.get_rfpath_metas()
+    for frame_name in range(3):
+        FrameMetaFake(name=f"car/1_2_3/{frame_name}", l_size=[480.0, 640.0]).save(
+            path_meta=tmp_path,
+        )
+    fpath_store = OD3D_MetaColumnarStore.migrate_from_yaml(
+        path_meta=tmp_path,
+        rfpath_metas=rfpath_metas,
+    )
+    mtime_store = fpath_store.stat().st_mtime
+    fpath_stamp = OD3D_MetaColumnarStore.get_fpath_stamp(
+        path_meta=tmp_path,
+        rfpath_metas=rfpath_metas,
+    )
+    os.utime(fpath_stamp, (mtime_store - 1, mtime_store - 1))
+
+    # detection compares the stamp with the store, the yaml metas are not scanned
+    def scandir_fail(*args, **kwargs):
+        raise AssertionError("yaml metas scanned")
+
+    with monkeypatch.context() as m:
+        m.setattr(os, "scandir", scandir_fail)
+        m.setattr(Path, "iterdir", scandir_fail)
+        m.setattr(Path, "rglob", scandir_fail)
+        backend = OD3D_Meta.get_meta_backend(
+            path_meta=tmp_path,
+            rfpath_metas=rfpath_metas,
+        )
+    assert backend == OD3D_META_BACKENDS.COLUMNAR
+
+    # a meta saved after the migration is read from yaml
+    meta = FrameMetaFake(name="car/1_2_3/2", l_size=[240.0, 320.0])
+    meta.save(path_meta=tmp_path)
+    backend = OD3D_Meta.get_meta_backend(path_meta=tmp_path, rfpath_metas=rfpath_metas)
+    assert backend == OD3D_META_BACKENDS.YAML
+
+    # also when detected again, e.g. in another process
+    OD3D_Meta.meta_backends_detected.clear()
+    os.utime(fpath_stamp, (mtime_store + 1, mtime_store + 1))
+    backend = OD3D_Meta.get_meta_backend(path_meta=tmp_path, rfpath_metas=rfpath_metas)
+    assert backend == OD3D_META_BACKENDS.YAML
+    meta_loaded = FrameMetaFake.load_from_meta_with_name_unique(
+        path_meta=tmp_path,
+        name_unique="car/1_2_3/2",
+    )
+    assert list(meta_loaded.l_size) == [240.0, 320.0]
+
+    # an explicit backend is used as it is
+    OD3D_Meta.set_meta_backend(
+        path_meta=tmp_path,
+        meta_backend=OD3D_META_BACKENDS.COLUMNAR,
+    )
+    backend = OD3D_Meta.get_meta_backend(path_meta=tmp_path, rfpath_metas=rfpath_metas)
+    assert backend == OD3D_META_BACKENDS.COLUMNAR
+    OD3D_Meta.set_meta_backend(path_meta=tmp_path, meta_backend=None)
+
+    OD3D_MetaColumnarStore.migrate_from_yaml(
+        path_meta=tmp_path,
+        rfpath_metas=rfpath_metas,
+    )
+    os.utime(fpath_store, (mtime_store + 2, mtime_store + 2))
+    backend = OD3D_Meta.get_meta_backend(path_meta=tmp_path, rfpath_metas=rfpath_metas)
+    assert backend == OD3D_META_BACKENDS.COLUMNAR
@@ -0,0 +1,79 @@
+import torch
+from od3d.methods.nemo.refine import NeMo_RefineActiveSet
+
+
+def refine(targets, refine_set, epochs=20):
+    # same steps as NeMo.inference_batch, the pose is refined by an update which is reset every epoch
+    poses = torch.zeros_like(targets)
+    obj_tform6 = torch.nn.Parameter(torch.zeros_like(targets), requires_grad=True)
+    optim = torch.optim.Adam(params=[obj_tform6], lr=0.1)
+    for epoch in range(epochs):
+        if refine_set.converged:
+            break
+        if refine_set.update_ids():
+            targets_active = refine_set.select(targets)
+        poses = poses + obj_tform6.detach()
+        obj_tform6.data[:] = 0.0
+        sim = -((refine_set.select(poses + obj_tform6) - targets_active) ** 2).sum(
+            dim=-1,
+        )
+        loss = -sim.sum()
+        loss.backward()
+        optim.step()
+        optim.zero_grad()
+        refine_set.freeze_inactive(obj_tform6=obj_tform6)
+        refine_set.update(epoch=epoch, sim=sim, obj_tform6=obj_tform6.data)
+    return poses + obj_tform6.detach()
+
+
+def get_targets():
+    targets = torch.full(size=(4, 6), fill_value=100.0)
+    targets[1] = -100.0
+    targets[2, :3] = 50.0
+    # close to the initial pose, similarity and update stagnate early
+    targets[0] = 0.5
+    return targets
+
+
+def test_refine_without_convergence_matches_full_batch():
+    targets = get_targets()
+    poses_full = refine(targets, NeMo_RefineActiveSet(B=4, adaptive=False))
+
+    # compaction enabled, but no sample converges
+    refine_set = NeMo_RefineActiveSet(B=4, adaptive=True, sim_tol=0.0, update_tol=0.0)
+    poses_adaptive = refine(targets, refine_set)
+    assert torch.equal(poses_adaptive, poses_full)
+    assert refine_set.active.all()
+    assert (refine_set.iterations == 20).all()
+
+
+def test_refine_converged_samples_frozen():
+    targets = get_targets()
+    refine_set_full = NeMo_RefineActiveSet(B=4, adaptive=False)
+    poses_full = refine(targets, refine_set_full)
+
+    refine_set = NeMo_RefineActiveSet(
+        B=4,
+        adaptive=True,
+        sim_tol=1.0,
+        update_tol=1.0,
+        patience=3,
+        epochs_min=5,
+    )
+    poses_adaptive = refine(targets, refine_set)
+    assert refine_set.active.tolist() == [False, True, True, True]
+    assert refine_set.iterations.tolist() == [5, 20, 20, 20]
+
+    # adam momentum of the converged sample is non-zero, but its pose stays at the one of its last iteration
+    refine_set_full_epochs_5 = NeMo_RefineActiveSet(B=4, adaptive=False)
+    poses_full_epochs_5 = refine(targets, refine_set_full_epochs_5, epochs=5)
+    assert not torch.equal(poses_full[0], poses_full_epochs_5[0])
+    assert torch.equal(poses_adaptive[0], poses_full_epochs_5[0])
+
+    # remaining samples are refined as in the full batch
+    assert torch.equal(poses_adaptive[1:], poses_full[1:])
+
+    # similarity of all samples, the converged sample keeps the one of its last iteration
+    assert refine_set.sim.shape[0] == 4
+    assert torch.equal(refine_set.sim[0], refine_set_full_epochs_5.sim[0])
+    assert torch.equal(refine_set.sim[1:], refine_set_full.sim[1:])
@@ -0,0 +1,126 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+from od3d.benchmark.results import OD3D_Results
+from od3d.datasets.frame import OD3D_FRAME_MODALITIES
+from od3d.methods.nemo.method import NeMo
+from omegaconf import OmegaConf
+
+
+class TransformFake:
+    def __call__(self, frame):
+        return frame
+
+
+class FramesFake:
+    def __init__(self, frames):
+        self.item_id = torch.LongTensor([frame.item_id for frame in frames])
+        self.rgb = torch.stack([frame.rgb for frame in frames], dim=0)
+
+    def __len__(self):
+        return len(self.item_id)
+
+    def to(self, device):
+        return self
+
+
+class DatasetFake(torch.utils.data.Dataset):
+    name = "fake"
+    modalities = [OD3D_FRAME_MODALITIES.RGB]
+    transform = None
+
+    def __init__(self):
+        self.rgbs = torch.randn(size=(7, 3, 4, 4))
+
+    def __len__(self):
+        return len(self.rgbs)
+
+    def __getitem__(self, item):
+        return self.transform(SimpleNamespace(item_id=item, rgb=self.rgbs[item]))
+
+    def collate_fn(self, frames):
+        return FramesFake(frames)
+
+
+class NetFake:
+    def __init__(self):
+        self.calls = 0
+
+    def eval(self):
+        pass
+
+    def __call__(self, rgb, return_backbone_output=False):
+        self.calls += 1
+        return SimpleNamespace(latent=None), SimpleNamespace(featmap=2 * rgb)
+
+
+class NeMoFake(NeMo):
+    def __init__(self, logging_dir: Path):
+        dataloader = {"batch_size": 3, "num_workers": 0, "pin_memory": False}
+        self.config = OmegaConf.create(
+            {
+                "train": {"val_fused": True, "dataloader": dataloader, "visualize": {}},
+                "test": {"dataloader": dataloader, "visualize": {}},
+            },
+        )
+        self.logging_dir = logging_dir
+        self.device = "cpu"
+        self.net = NetFake()
+        self.net_pose = None
+        self.meshes = SimpleNamespace(eval=lambda: None)
+        self.optim = SimpleNamespace(zero_grad=lambda: None)
+        self.scheduler = SimpleNamespace(last_epoch=0)
+        self.transform_test = TransformFake()
+        self.transform_train = TransformFake()
+
+    def save_checkpoint(self, path_checkpoint: Path):
+        path_checkpoint.write_text("ckpt")
+
+    def get_results_visual(self, results_epoch, dataset, config_visualize):
+        return OD3D_Results(logging_dir=self.logging_dir)
+
+    def get_results_batch(self, batch, net_outs=None):
+        if net_outs is None:
+            net_outs = self.net(batch.rgb, return_backbone_output=True)
+        featmap = net_outs[1].featmap
+        results_batch = OD3D_Results(logging_dir=self.logging_dir)
+        results_batch["item_id"] = batch.item_id
+        results_batch["sim"] = featmap.flatten(1).mean(dim=-1)
+        return results_batch, featmap
+
+    def inference_batch(self, batch, multiview=False, val=False, net_outs=None):
+        results_batch, featmap = self.get_results_batch(batch, net_outs=net_outs)
+        results_batch["pose/acc_pi18"] = (featmap.flatten(1).mean(dim=-1) > 0).float()
+        return results_batch
+
+    def train_batch(self, batch, net_outs=None):
+        results_batch, featmap = self.get_results_batch(batch, net_outs=net_outs)
+        results_batch["loss"] = featmap.flatten(1).pow(2).mean(dim=-1)
+        return results_batch
+
+
+def test_validate_fused_matches_two_pass(tmp_path: Path):
+    nemo = NeMoFake(logging_dir=tmp_path)
+    dataset = DatasetFake()
+
+    assert not nemo.fpath_checkpoint.exists()
+    results_fused = nemo.validate(dataset)
+    assert nemo.fpath_checkpoint.exists()
+    # one network pass per batch
+    assert nemo.net.calls == 3
+
+    results_test = nemo.test(dataset, val=True, multiview=False)
+    with torch.no_grad():
+        results_train = nemo.train_epoch(dataset, val=True)
+
+    assert torch.allclose(results_fused["pose/acc_pi18"], results_test["pose/acc_pi18"])
+    assert torch.allclose(results_fused["sim"], results_test["sim"])
+    # losses of the fused pass are versioned, they are computed with the test transform
+    assert "loss" not in results_fused
+    assert torch.allclose(results_fused["loss_tform_test"], results_train["loss"])
+    assert torch.allclose(results_fused["sim_tform_test"], results_train["sim"])
+    assert torch.equal(
+        nemo.get_score_val(results_fused, "loss"),
+        results_fused["loss_tform_test"],
+    )
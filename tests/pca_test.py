@@ -0,0 +1,37 @@
+import torch
+from od3d.cv.cluster.pca import IncrementalPCA
+
+
+def test_incremental_pca_matches_full_pca(tmp_path):
+    torch.manual_seed(0)
+    X = torch.randn(3000, 16) @ torch.randn(16, 16) + 3.0
+
+    pca_full = IncrementalPCA().partial_fit(X)
+    pca_stream = IncrementalPCA()
+    for X_chunk in X.split(700, dim=0):
+        pca_stream.partial_fit(X_chunk)
+    assert torch.allclose(pca_stream.mean, pca_full.mean)
+    assert torch.allclose(pca_stream.comoment, pca_full.comoment, rtol=1e-6)
+    assert torch.allclose(
+        pca_stream.get_covariance(),
+        torch.cov(X.T.double()),
+        rtol=1e-6,
+        atol=1e-8,
+    )
+
+    # same subspace as the svd of the centered features
+    V = pca_stream.get_components(C=4)
+    X_centered = X.double() - X.double().mean(dim=0)
+    V_svd = torch.linalg.svd(X_centered, full_matrices=False)[2][:4].T
+    assert (V.T @ V_svd).norm() ** 2 > 4.0 - 1e-6
+
+    assert pca_stream.get_components_change(C=4) == 1.0
+    assert pca_stream.get_components_change(C=4) < 1e-10
+
+    # partial statistics are continued after reading
+    pca_stream.save(tmp_path.joinpath("pca.pt"), frames_count=10)
+    pca_read, state_dict = IncrementalPCA.read(tmp_path.joinpath("pca.pt"))
+    assert state_dict["frames_count"] == 10
+    assert pca_read.count == len(X)
+    pca_read.partial_fit(X)
+    assert torch.allclose(pca_read.mean, pca_full.mean)
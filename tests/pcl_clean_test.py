@@ -0,0 +1,98 @@
+import torch
+from od3d.cv.reconstruction.clean import get_pcl_clean_with_masks
+
+
+def test_get_pcl_clean_with_masks_chunked():
+    torch.manual_seed(0)
+    F, H, W = 20, 60, 80
+    pcl = torch.randn(2000, 3) * 0.5
+    cams_tform4x4_obj = torch.eye(4).repeat(F, 1, 1)
+    cams_tform4x4_obj[:, 2, 3] = 3.0
+    cams_tform4x4_obj[:, 0, 3] = torch.linspace(-0.3, 0.3, F)
+    cams_intr4x4 = torch.eye(4).repeat(F, 1, 1)
+    cams_intr4x4[:, 0, 0] = 60.0
+    cams_intr4x4[:, 1, 1] = 60.0
+    cams_intr4x4[:, 0, 2] = W / 2
+    cams_intr4x4[:, 1, 2] = H / 2
+    yy, xx = torch.meshgrid(torch.arange(H), torch.arange(W), indexing="ij")
+    masks = (((xx - W / 2) ** 2 + (yy - H / 2) ** 2) < 20**2).float()
+    masks = masks[None, None].repeat(F, 1, 1, 1)
+
+    torch.manual_seed(1)
+    _, pcl_mask = get_pcl_clean_with_masks(
+        pcl,
+        masks,
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        return_mask=True,
+    )
+    torch.manual_seed(1)
+    _, pcl_mask_chunked = get_pcl_clean_with_masks(
+        pcl,
+        lambda frames_ids: masks[frames_ids],
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        return_mask=True,
+        frames_chunk_size=6,
+    )
+    assert 0 < pcl_mask.sum() < len(pcl)
+    assert torch.equal(pcl_mask, pcl_mask_chunked)
+
+
+def test_get_pcl_clean_with_masks_scaled():
+    torch.manual_seed(0)
+    F, H, W = 10, 61, 81
+    # one cluster projects into the masks, one next to them
+    pcl = torch.randn(400, 3) * 0.05
+    pcl[200:, 0] += 0.8
+    pcl[:200, 0] -= 0.8
+    cams_tform4x4_obj = torch.eye(4).repeat(F, 1, 1)
+    cams_tform4x4_obj[:, 2, 3] = 3.0
+    cams_tform4x4_obj[:, 1, 3] = torch.linspace(-0.1, 0.1, F)
+    cams_intr4x4 = torch.eye(4).repeat(F, 1, 1)
+    cams_intr4x4[:, 0, 0] = 60.0
+    cams_intr4x4[:, 1, 1] = 60.0
+    cams_intr4x4[:, 0, 2] = W / 2
+    cams_intr4x4[:, 1, 2] = H / 2
+    # mask off the image center, points are only kept with rescaled intrinsics
+    yy, xx = torch.meshgrid(torch.arange(H), torch.arange(W), indexing="ij")
+    masks = (((xx - (W / 2 - 16)) ** 2 + (yy - H / 2) ** 2) < 10**2).float()
+    masks = masks[None, None].repeat(F, 1, 1, 1)
+    cams_intr4x4_orig = cams_intr4x4.clone()
+
+    _, pcl_mask = get_pcl_clean_with_masks(
+        pcl,
+        masks,
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        return_mask=True,
+    )
+    _, pcl_mask_scaled = get_pcl_clean_with_masks(
+        pcl,
+        lambda frames_ids: masks[frames_ids],
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        return_mask=True,
+        frames_chunk_size=4,
+        masks_scale=0.5,
+    )
+    assert pcl_mask[:200].all() and not pcl_mask[200:].any()
+    assert torch.equal(pcl_mask, pcl_mask_scaled)
+    assert torch.equal(cams_intr4x4, cams_intr4x4_orig)
+
+    # downsampled masks with the full resolution intrinsics miss the cluster
+    masks_scaled = torch.nn.functional.interpolate(
+        masks,
+        size=(H // 2, W // 2),
+        mode="bilinear",
+        align_corners=True,
+    )
+    _, pcl_mask_unscaled_intr = get_pcl_clean_with_masks(
+        pcl,
+        masks_scaled,
+        cams_tform4x4_obj,
+        cams_intr4x4,
+        return_mask=True,
+        pts3d_count_min=0,
+    )
+    assert not torch.equal(pcl_mask, pcl_mask_unscaled_intr)
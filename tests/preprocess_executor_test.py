@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from od3d.datasets.preprocess_executor import OD3D_PreprocessExecutor
+
+
+class SequenceFake:
+    def __init__(self, dataset, name_unique):
+        self.dataset = dataset
+        self.name_unique = name_unique
+
+    @property
+    def fpath_pcl(self):
+        return self.dataset.path_preprocess.joinpath(
+            "pcl",
+            self.dataset.pcl_type,
+            self.dataset.sfm_type,
+            self.name_unique,
+            "pcl.ply",
+        )
+
+    def preprocess_pcl(self, override=False, masks_scale=1.0, frames_chunk_size=16):
+        self.dataset.runs.append(self.name_unique)
+        self.dataset.runs_kwargs.append((masks_scale, frames_chunk_size))
+
+
+class DatasetFake:
+    def __init__(self, path_preprocess: Path):
+        self.path_preprocess = path_preprocess
+        self.pcl_type = "poisson_disk"
+        self.sfm_type = "meta"
+        self.runs = []
+        self.runs_kwargs = []
+
+    def get_sequence_by_name_unique(self, name_unique):
+        return SequenceFake(dataset=self, name_unique=name_unique)
+
+    def preprocess_pcl(self, override=False, method_kwargs=None):
+        self.runs = []
+        OD3D_PreprocessExecutor(dataset=self).run(
+            method="preprocess_pcl",
+            sequences_names_unique=["car/1", "car/2"],
+            override=override,
+            get_fpath_output=lambda sequence: sequence.fpath_pcl,
+            method_kwargs=method_kwargs,
+        )
+        return self.runs
+
+
+def test_preprocess_executor_manifest_output_fpath(tmp_path: Path):
+    dataset = DatasetFake(path_preprocess=tmp_path)
+    assert dataset.preprocess_pcl() == ["car/1", "car/2"]
+    assert dataset.preprocess_pcl() == []
+
+    # the output fpath depends on the sfm type, not only on the pcl type
+    dataset.sfm_type = "droid_slam"
+    assert dataset.preprocess_pcl() == ["car/1", "car/2"]
+    assert dataset.preprocess_pcl() == []
+
+    dataset.sfm_type = "meta"
+    assert dataset.preprocess_pcl() == []
+
+
+def test_preprocess_executor_method_kwargs(tmp_path: Path):
+    dataset = DatasetFake(path_preprocess=tmp_path)
+    dataset.preprocess_pcl(
+        override=True,
+        method_kwargs={"masks_scale": 0.5, "frames_chunk_size": 4},
+    )
+    assert dataset.runs_kwargs == [(0.5, 4), (0.5, 4)]
@@ -0,0 +1,36 @@
+import torch
+from od3d.methods.nemo.pseudo_labels import NeMo_PseudoLabels
+
+
+def test_pseudo_labels_refresh_order_and_persistence(tmp_path):
+    pseudo_labels = NeMo_PseudoLabels()
+    names_seqs = ["car/a", "car/b", "chair/c"]
+    assert pseudo_labels.get_names_seqs_to_refresh(names_seqs, count=2) == [
+        "car/a",
+        "car/b",
+    ]
+
+    tforms4x4_obj = torch.eye(4)[None].repeat(4, 1, 1)
+    tforms4x4_obj[1, 0, 3] = 1.0
+    pseudo_labels.update(
+        names_unique=["car/a/000", "car/a/001", "car/b/000", "car/b/001"],
+        tforms4x4_obj=tforms4x4_obj,
+        confidences=torch.Tensor([0.2, 0.8, 0.3, 0.1]),
+        epoch=0,
+    )
+    # the transform of the most confident frame is kept
+    assert pseudo_labels["car/a"][0, 3] == 1.0
+    assert abs(pseudo_labels.confidences["car/b"] - 0.2) < 1e-6
+
+    # sequences without estimate first, then the least confident of the stalest
+    assert pseudo_labels.get_names_seqs_to_refresh(names_seqs) == [
+        "chair/c",
+        "car/b",
+        "car/a",
+    ]
+
+    fpath = tmp_path.joinpath("pseudo_labels.pt")
+    pseudo_labels.save(fpath)
+    pseudo_labels_read = NeMo_PseudoLabels.read(fpath)
+    assert "car/a" in pseudo_labels_read and "chair/c" not in pseudo_labels_read
+    assert torch.equal(pseudo_labels_read["car/a"], pseudo_labels["car/a"])
@@ -0,0 +1,17 @@
+import torch
+from od3d.benchmark.results import OD3D_Results
+
+
+def test_results_chunks_finalized_on_dict_access():
+    results = OD3D_Results()
+    for i in range(3):
+        results += {"rot_diff_rad": torch.full((2,), float(i)), "name_unique": [f"{i}"]}
+    rot_diff_rad = torch.Tensor([0.0, 0.0, 1.0, 1.0, 2.0, 2.0])
+    assert len(results._chunks["rot_diff_rad"]) == 2
+
+    assert torch.equal(dict(results)["rot_diff_rad"], rot_diff_rad)
+    results += {"rot_diff_rad": torch.full((2,), 3.0)}
+    assert torch.equal({**results}["rot_diff_rad"][-2:], torch.full((2,), 3.0))
+    results += {"rot_diff_rad": torch.full((2,), 4.0)}
+    assert len(results.get("rot_diff_rad")) == 10
+    assert dict(results)["name_unique"] == ["0", "1", "2"]
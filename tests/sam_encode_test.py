@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+from od3d.datasets.dataset import OD3D_Dataset
+from od3d.datasets.frame import OD3D_FRAME_MASK_TYPES
+from od3d.models.backbones.sam.backbone import SAM
+from od3d.models.model import OD3D_Model
+
+
+class PredictorFake:
+    """Image encoder averages the channels, masks threshold the features of the set image."""
+
+    device = torch.device("cpu")
+
+    def __init__(self):
+        self.encoder_batches = []
+        self.transform = SimpleNamespace(apply_image_torch=lambda x: x)
+        self.model = SimpleNamespace(
+            preprocess=lambda x: x / 255.0,
+            image_encoder=self.image_encoder,
+        )
+        self.reset_image()
+
+    def image_encoder(self, x):
+        self.encoder_batches.append(len(x))
+        return x.mean(dim=1, keepdim=True)
+
+    def reset_image(self):
+        self.features = None
+        self.input_size = None
+        self.original_size = None
+        self.is_image_set = False
+
+    def predict(self, point_coords, point_labels, box, multimask_output):
+        assert self.is_image_set
+        features = self.features[0, 0].numpy()
+        masks = features[None] > torch.Tensor([0.25, 0.5, 0.75])[:, None, None].numpy()
+        scores = masks.mean(axis=(1, 2))
+        logits = features[None].repeat(3, axis=0)
+        return masks, scores, logits
+
+
+def get_sam(encoder_batch_size=2, embeddings_cache_size=16):
+    sam = SAM.__new__(SAM)
+    torch.nn.Module.__init__(sam)
+    sam.transform = None
+    sam.predictor = PredictorFake()
+    sam.encoder_batch_size = encoder_batch_size
+    sam.embeddings_cache_size = embeddings_cache_size
+    sam.embeddings_cache = OrderedDict()
+    return sam
+
+
+def get_rgb(B, H=6, W=8):
+    torch.manual_seed(0)
+    return torch.rand(size=(B, 3, H, W)) * 255.0
+
+
+def test_sam_encode_chunks_and_cache():
+    sam = get_sam(encoder_batch_size=2)
+    rgb = get_rgb(B=5)
+    names = [f"car/seq1/{b}" for b in range(5)]
+
+    embeddings = sam.encode(rgb, frames_names=names)
+    assert sam.predictor.encoder_batches == [2, 2, 1]
+    for b in range(5):
+        assert torch.allclose(
+            embeddings[b]["features"],
+            rgb[b : b + 1].mean(dim=1, keepdim=True) / 255.0,
+        )
+        assert embeddings[b]["original_size"] == (6, 8)
+
+    # hit, embeddings are reused
+    embeddings_cached = sam.encode(rgb[[3, 1]], frames_names=[names[3], names[1]])
+    assert sam.predictor.encoder_batches == [2, 2, 1]
+    assert embeddings_cached[0] is embeddings[3]
+    assert embeddings_cached[1] is embeddings[1]
+
+    # miss, the same frame at another resolution
+    embeddings_resized = sam.encode(get_rgb(B=1, H=3, W=4), frames_names=[names[0]])
+    assert sam.predictor.encoder_batches == [2, 2, 1, 1]
+    assert embeddings_resized[0]["original_size"] == (3, 4)
+
+    # miss, without frames names nothing is cached
+    sam.encode(rgb[:1])
+    assert sam.predictor.encoder_batches == [2, 2, 1, 1, 1]
+    assert len(sam.embeddings_cache) == 6
+
+
+def test_sam_encode_cache_eviction():
+    sam = get_sam(encoder_batch_size=4, embeddings_cache_size=2)
+    rgb = get_rgb(B=3)
+    names = [f"car/seq1/{b}" for b in range(3)]
+
+    # the embeddings of the current images are never evicted
+    sam.encode(rgb, frames_names=names)
+    assert len(sam.embeddings_cache) == 3
+    sam.encode(rgb[:1], frames_names=names[:1])
+    assert list(sam.embeddings_cache) == [(names[2], (6, 8)), (names[0], (6, 8))]
+
+
+def test_sam_forward_with_frames_names():
+    rgb = get_rgb(B=3)
+    names = [f"car/seq1/{b}" for b in range(3)]
+    points_xy = torch.Tensor([[1.0, 2.0], [3.0, 4.0], [5.0, 1.0]])
+
+    sam = get_sam(encoder_batch_size=2)
+    out = sam(rgb, points_xy=points_xy)
+    out_named = sam(rgb, points_xy=points_xy, frames_names=names)
+    assert torch.equal(out.masks, out_named.masks)
+    assert torch.equal(out.masks_scores, out_named.masks_scores)
+    assert torch.equal(out.featmap, out_named.featmap)
+
+    # a second prompt reuses the cached embeddings
+    encoder_batches = list(sam.predictor.encoder_batches)
+    out_cached = sam(rgb, points_xy=points_xy.flip(dims=[0]), frames_names=names)
+    assert sam.predictor.encoder_batches == encoder_batches
+    assert torch.equal(out.masks, out_cached.masks)
+
+    # per frame
+    for b in range(3):
+        out_b = get_sam()(rgb[b : b + 1], points_xy=points_xy[b : b + 1])
+        assert torch.equal(out_b.masks[0], out.masks[b])
+        assert torch.equal(out_b.featmap[0], out.featmap[b])
+
+
+class ModelFake(torch.nn.Module):
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+        self.transform = lambda frame: frame
+
+    def cuda(self):
+        return self
+
+    def forward(self, x, **kwargs):
+        return self.backbone(x, **kwargs)
+
+
+class BatchFake:
+    def __init__(self, frames):
+        self.name_unique = [frame.name_unique for frame in frames]
+        self.rgb = torch.stack([frame.rgb for frame in frames], dim=0)
+        self.size = torch.LongTensor(list(self.rgb.shape[-2:]))
+
+    def to(self, device):
+        return self
+
+
+class DatasetFake(OD3D_Dataset):
+    def __init__(self, tmp_path: Path, rgbs):
+        self.transform = None
+        self.modalities = []
+        self.masks = {}
+        self.rgbs = rgbs
+        self.frames = [
+            SimpleNamespace(
+                name_unique=f"car/seq1/{i}",
+                rgb=rgb,
+                fpath_mask=tmp_path.joinpath(f"{i}.png"),
+                mask_type=OD3D_FRAME_MASK_TYPES.SAM,
+                write_mask=lambda mask, i=i: self.masks.__setitem__(i, mask),
+            )
+            for i, rgb in enumerate(rgbs)
+        ]
+        self.list_frames_unique = [frame.name_unique for frame in self.frames]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, item):
+        return self.frames[item]
+
+    def get_frame_by_name_unique(self, name_unique: str):
+        return self.frames[self.list_frames_unique.index(name_unique)]
+
+    def collate_fn(self, frames, modalities=None):
+        return BatchFake(frames)
+
+
+def test_sam_preprocess_mask_batched(tmp_path: Path, monkeypatch):
+    # two image sizes, frames of different size are encoded in different batches
+    rgbs = list(get_rgb(B=3)) + list(get_rgb(B=2, H=4, W=4))
+    sams = []
+
+    def create_by_name(name: str):
+        sams.append(get_sam(encoder_batch_size=2))
+        return ModelFake(backbone=sams[-1])
+
+    monkeypatch.setattr(OD3D_Model, "create_by_name", create_by_name)
+
+    dataset_frame = DatasetFake(tmp_path, rgbs)
+    dataset_frame.preprocess_mask(override=True, batch_size=1)
+    dataset_batched = DatasetFake(tmp_path, rgbs)
+    dataset_batched.preprocess_mask(override=True, batch_size=8)
+
+    # each frame is encoded once, the prompts reuse the cached embeddings
+    assert sams[0].predictor.encoder_batches == [1, 1, 1, 1, 1]
+    assert sams[1].predictor.encoder_batches == [2, 1, 2]
+    assert len(dataset_batched.masks) == 5
+    for i in range(5):
+        assert dataset_batched.masks[i].shape == (1,) + rgbs[i].shape[-2:]
+        assert torch.equal(dataset_batched.masks[i], dataset_frame.masks[i])
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from od3d.datasets.shapenet import render
+from od3d.datasets.shapenet.render import ShapeNet_RenderFarm
+
+
+class SequenceMetaFake:
+    def __init__(self, name_unique: str):
+        self.name_unique = name_unique
+
+    def save(self, path_meta: Path):
+        Path(path_meta).joinpath(self.name_unique.replace("/", "_")).touch()
+
+
+def write_fake(sequence_id: str):
+    if sequence_id.startswith("unwritable"):
+        raise OSError(f"could not write frame of {sequence_id}")
+
+
+def render_sequence_fake(subset, category, sequence_id, path_meta):
+    # picklable for worker processes, frames are written in the writer pool as by render_sequence
+    if sequence_id.startswith("broken"):
+        raise ValueError(f"could not load mesh {sequence_id}")
+    written = render.submit_sequence_writes(
+        frames_writes=[(write_fake, {"sequence_id": sequence_id})] * 3,
+        sequence_meta=SequenceMetaFake(name_unique=f"{category}/{sequence_id}"),
+        path_meta=path_meta,
+    )
+    return 3, written
+
+
+def get_jobs(path_meta: Path):
+    jobs = [
+        {"category": "car", "sequence_id": sequence_id}
+        for sequence_id in ["a", "broken_b", "c", "unwritable_d", "e", "f"]
+    ] + [
+        {"category": "bus", "sequence_id": sequence_id}
+        for sequence_id in ["broken_a", "unwritable_b", "c"]
+    ]
+    for job in jobs:
+        job["subset"] = "all"
+        job["path_meta"] = str(path_meta)
+    return jobs
+
+
+def assert_farm_replaced_failures(failures, path_meta: Path):
+    # only written sequences count, failed ones are replaced by the next candidates
+    assert sorted(failures.keys()) == [
+        "all/bus/broken_a",
+        "all/bus/unwritable_b",
+        "all/car/broken_b",
+        "all/car/unwritable_d",
+    ]
+    assert "could not write frame" in failures["all/car/unwritable_d"]
+    assert sorted(fpath.name for fpath in path_meta.iterdir()) == [
+        "bus_c",
+        "car_a",
+        "car_c",
+        "car_e",
+    ]
+
+
+def test_render_farm_replaces_failed_sequences(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(render, "render_sequence", render_sequence_fake)
+    failures = ShapeNet_RenderFarm(writers=2).run(
+        jobs=get_jobs(path_meta=tmp_path),
+        sequences_count_max={"all/car": 3, "all/bus": 1},
+    )
+    assert_farm_replaced_failures(failures, path_meta=tmp_path)
+
+
+def test_render_farm_workers_replace_failed_sequences(tmp_path: Path):
+    failures = ShapeNet_RenderFarm(
+        workers=2,
+        writers=2,
+        render=render_sequence_fake,
+    ).run(
+        jobs=get_jobs(path_meta=tmp_path),
+        sequences_count_max={"all/car": 3, "all/bus": 1},
+    )
+    assert_farm_replaced_failures(failures, path_meta=tmp_path)
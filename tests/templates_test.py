@@ -0,0 +1,107 @@
+import torch
+from od3d.cv.geometry.objects3d.objects3d import PROJECT_MODALITIES
+from od3d.cv.geometry.objects3d.templates import OD3D_Objects3D_Templates
+
+
+class Objects3DFake(torch.nn.Module):
+    def __init__(self, objects_count=2, feat_dim=4):
+        super().__init__()
+        self.feats = torch.nn.Parameter(torch.rand(objects_count, feat_dim))
+        self.feat_clutter = torch.zeros(feat_dim)
+        self.render_count = 0
+
+    def __len__(self):
+        return len(self.feats)
+
+    def sample(self, objects_ids, **kwargs):
+        return torch.ones(len(objects_ids), 8, 3) * 0.5
+
+    def render(self, cams_tform4x4_obj, imgs_sizes, objects_ids, **kwargs):
+        self.render_count += 1
+        B, T = cams_tform4x4_obj.shape[:2]
+        H, W = int(imgs_sizes[0]), int(imgs_sizes[1])
+        mask = torch.zeros(B, T, 1, H, W)
+        mask[..., H // 4 : -H // 4, W // 4 : -W // 4] = 1.0
+        feats = (
+            torch.rand(B, T, 1, H, W) * self.feats[objects_ids][:, None, :, None, None]
+        )
+        return {
+            PROJECT_MODALITIES.FEATS: feats * mask,
+            PROJECT_MODALITIES.MASK: mask,
+        }
+
+
+def get_cams_tform4x4_obj(T=3):
+    cams_tform4x4_obj = torch.eye(4)[None,].repeat(T, 1, 1)
+    angles = torch.linspace(0.0, 1.0, T)
+    cams_tform4x4_obj[:, 0, 0] = angles.cos()
+    cams_tform4x4_obj[:, 0, 2] = angles.sin()
+    cams_tform4x4_obj[:, 2, 0] = -angles.sin()
+    cams_tform4x4_obj[:, 2, 2] = angles.cos()
+    return cams_tform4x4_obj
+
+
+def test_templates_warp_identity_and_shift():
+    torch.manual_seed(0)
+    objects3d = Objects3DFake()
+    cams_tform4x4_obj = get_cams_tform4x4_obj()
+    templates = OD3D_Objects3D_Templates.create_from_objects3d(
+        objects3d=objects3d,
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        imgs_sizes=(16, 20),
+    )
+    objects_ids = torch.LongTensor([1, 0])
+    cams = templates.cams_tform4x4_obj[objects_ids].clone()
+    intr = templates.cams_intr4x4[objects_ids][:, None].expand(2, 3, 4, 4).clone()
+
+    feats, masks = templates.warp(
+        cams_tform4x4_obj=cams,
+        cams_intr4x4=intr,
+        objects_ids=objects_ids,
+    )
+    feats_ref = torch.from_numpy(templates.feats[objects_ids.numpy()]).float()
+    assert torch.allclose(feats, feats_ref, atol=1e-3)
+
+    # shifting the camera by dx at depth d shifts the image by fx * dx / d pixels
+    fx = intr[0, 0, 0, 0]
+    d = cams[:, :, 2, 3]
+    cams_shift = cams.clone()
+    cams_shift[:, :, 0, 3] = 2.0 * d / fx
+    _, masks_shift = templates.warp(
+        cams_tform4x4_obj=cams_shift,
+        cams_intr4x4=intr,
+        objects_ids=objects_ids,
+    )
+    assert torch.allclose(masks_shift[..., 2:], masks[..., :-2], atol=1e-3)
+
+
+def test_templates_cache(tmp_path):
+    objects3d = Objects3DFake()
+    cams_tform4x4_obj = get_cams_tform4x4_obj()
+    templates = OD3D_Objects3D_Templates.create_from_objects3d(
+        objects3d=objects3d,
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        imgs_sizes=(16, 20),
+        path_cache=tmp_path,
+    )
+    render_count = objects3d.render_count
+    templates_cached = OD3D_Objects3D_Templates.create_from_objects3d(
+        objects3d=objects3d,
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        imgs_sizes=(16, 20),
+        path_cache=tmp_path,
+    )
+    assert objects3d.render_count == render_count
+    assert (templates_cached.feats == templates.feats).all()
+
+    # new features (e.g. a new checkpoint) are rendered again
+    with torch.no_grad():
+        objects3d.feats.add_(1.0)
+    OD3D_Objects3D_Templates.create_from_objects3d(
+        objects3d=objects3d,
+        cams_tform4x4_obj=cams_tform4x4_obj,
+        imgs_sizes=(16, 20),
+        path_cache=tmp_path,
+    )
+    assert objects3d.render_count == 2 * render_count
+    assert len(list(tmp_path.iterdir())) == 2